@@ -0,0 +1,239 @@
+"""
+Admission control for the heavy routes
+Caps how many requests per route are handled at once and how many may wait
+for a slot, before the request body is even read. A waiting request gives up
+at its deadline, and is turned away immediately when the expected wait
+already exceeds it, so overload becomes a fast, retryable 503 instead of a
+request that sits in a worker until the gunicorn timeout kills it.
+
+Deadlines: a client may send X-Request-Timeout-Ms with its own budget;
+otherwise the route's ADMISSION_ROUTE_TIMEOUTS entry or ADMISSION_DEFAULT_TIMEOUT
+applies. The deadline is kept in a context variable so downstream waits
+(worker pools) can stop at the same moment instead of running on after the
+client has gone.
+"""
+
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_CONTROL', '1').lower() not in ('0', 'false', 'no')
+
+# Budget for requests without X-Request-Timeout-Ms
+ADMISSION_DEFAULT_TIMEOUT = float(os.environ.get('ADMISSION_DEFAULT_TIMEOUT', '110'))
+
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+
+def _parse_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """Parse 'route=concurrency:queue,...' into {route: (concurrency, queue)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, spec = item.partition('=')
+        concurrency, _, queue = spec.partition(':')
+        limits[route.strip()] = (int(concurrency), int(queue or 0))
+    return limits
+
+
+# Per route: requests handled at once, and requests allowed to wait for a slot.
+# Every admitted or waiting request holds a server thread, so keep the total
+# well below the gunicorn thread count to leave room for the light routes.
+ROUTE_LIMITS = _parse_limits(os.environ.get(
+    'ADMISSION_LIMITS',
+    '/api/extract-id=4:4,/api/scan-barcode=4:4,/api/submit-application=4:4'
+))
+
+
+
+def _parse_timeouts(value: str) -> Dict[str, float]:
+    """Parse 'route=seconds,...' into {route: seconds}"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, seconds = item.partition('=')
+        timeouts[route.strip()] = float(seconds)
+    return timeouts
+
+
+# Per-route budgets replacing ADMISSION_DEFAULT_TIMEOUT. submit-application
+# must outlast BROWSER_POOL_TIMEOUT (180s) plus a queue wait, or slow
+# submissions would be cut off while the browser keeps running. (Gunicorn's
+# gthread workers don't kill long requests; its --timeout is a heartbeat.)
+ROUTE_TIMEOUTS = _parse_timeouts(os.environ.get(
+    'ADMISSION_ROUTE_TIMEOUTS', '/api/submit-application=240'
+))
+
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    'checkin_admission_queue_depth',
+    'Requests waiting for an admission slot',
+    ('endpoint',)
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    'checkin_admission_wait_seconds',
+    'Time requests waited for an admission slot (admitted requests only)',
+    ('endpoint',)
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    'checkin_admission_rejected_total',
+    'Requests turned away by admission control (queue_full, deadline, wait_timeout)',
+    ('endpoint', 'reason')
+)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('request_deadline', default=None)
+
+
+class AdmissionRejected(Exception):
+    """Admission control turned the request away; answer 503 with Retry-After"""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{endpoint} {reason.replace('_', ' ')}")
+
+
+class RouteLimiter:
+    """
+    Concurrency cap with a bounded, deadline-aware wait queue for one route
+
+    Args:
+        endpoint: Route rule (metrics label)
+        concurrency: Requests handled at once
+        queue_size: Requests allowed to wait for a slot
+    """
+
+    def __init__(self, endpoint: str, concurrency: int, queue_size: int):
+        self.endpoint = endpoint
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        # Moving average of handling time, used to predict the wait
+        self._avg_seconds = 0.0
+
+    def expected_wait(self) -> float:
+        """Seconds a request arriving now would likely wait (call with the lock held)"""
+        if self._active < self.concurrency:
+            return 0.0
+        return math.ceil((self._waiting + 1) / self.concurrency) * self._avg_seconds
+
+    def acquire(self, deadline: float):
+        """
+        Take a slot, waiting until the deadline at most
+
+        Raises:
+            AdmissionRejected: queue full, deadline already unreachable, or no slot before the deadline
+        """
+        with self._cond:
+            if self._active < self.concurrency and not self._waiting:
+                self._active += 1
+                ADMISSION_WAIT_SECONDS.observe(0.0, self.endpoint)
+                return
+            if self._waiting >= self.queue_size:
+                self._reject('queue_full')
+            if time.monotonic() + self.expected_wait() > deadline:
+                self._reject('deadline')
+
+            start = time.monotonic()
+            self._waiting += 1
+            ADMISSION_QUEUE_DEPTH.inc(self.endpoint)
+            try:
+                while self._active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject('wait_timeout')
+                    self._cond.wait(remaining)
+                self._active += 1
+            finally:
+                self._waiting -= 1
+                ADMISSION_QUEUE_DEPTH.dec(self.endpoint)
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, self.endpoint)
+
+    def release(self, seconds: float):
+        """Free a slot held for seconds"""
+        with self._cond:
+            self._active -= 1
+            self._avg_seconds = seconds if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * seconds
+            self._cond.notify()
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(self.endpoint, reason)
+        retry_after = max(1, math.ceil(self.expected_wait() or self._avg_seconds))
+        logger.warning(f"Admission rejected for {self.endpoint} ({reason}): {self._active} active, "
+                       f"{self._waiting} waiting, retry after {retry_after}s")
+        raise AdmissionRejected(self.endpoint, reason, retry_after)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'concurrency': self.concurrency,
+                'queueSize': self.queue_size,
+                'active': self._active,
+                'waiting': self._waiting,
+                'avgSeconds': round(self._avg_seconds, 3),
+            }
+
+
+LIMITERS = {endpoint: RouteLimiter(endpoint, *limits) for endpoint, limits in ROUTE_LIMITS.items()}
+
+
+def request_deadline(timeout_header: Optional[str], endpoint: Optional[str] = None) -> float:
+    """
+    Monotonic deadline for a request
+
+    Args:
+        timeout_header: Value of X-Request-Timeout-Ms, if the client sent one
+        endpoint: Route rule, for its ADMISSION_ROUTE_TIMEOUTS budget
+
+    Returns:
+        time.monotonic() value; never later than the route's budget
+    """
+    budget = ROUTE_TIMEOUTS.get(endpoint, ADMISSION_DEFAULT_TIMEOUT)
+    if timeout_header:
+        try:
+            budget = min(budget, max(0.0, float(timeout_header) / 1000))
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+
+def set_deadline(deadline: Optional[float]):
+    """Make deadline the current request's deadline (None clears it)"""
+    _deadline.set(deadline)
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None if it has none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def admit(endpoint: str, deadline: float) -> Optional[RouteLimiter]:
+    """
+    Wait for an admission slot on a limited route
+
+    Returns:
+        The limiter to release when the request ends, or None if the route is not limited
+
+    Raises:
+        AdmissionRejected: The request should be answered with 503
+    """
+    limiter = LIMITERS.get(endpoint) if ADMISSION_ENABLED else None
+    if limiter is not None:
+        limiter.acquire(deadline)
+    return limiter
+
+
+def admission_stats() -> Dict:
+    """Current state of every route limiter, for /health"""
+    return {endpoint: limiter.stats() for endpoint, limiter in LIMITERS.items()}
@@ -0,0 +1,146 @@
+"""
+Date-of-birth parsing and 21+ eligibility
+One parser and age calculation shared by the per-request paths (extract-id,
+scan-barcode, parse-barcode, validate-age, the QuickBase automation), plus a
+NumPy batch version for audits that check thousands of birth dates at once.
+
+Accepted DOB formats: YYYY-MM-DD (forms, OCR, the database), MM/DD/YYYY,
+and the two 8-digit AAMVA layouts, MMDDYYYY (US, version 02+) and YYYYMMDD
+(version 01 and Canadian cards). An 8-digit value is unambiguous: a month is
+never 19 or 20, and years are limited to 1900-2099.
+"""
+
+import logging
+import os
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MINIMUM_AGE = 21
+
+# Most birth dates one batch request may carry
+AGE_BATCH_MAX = int(os.environ.get('AGE_BATCH_MAX', '50000'))
+
+_ISO = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+_US = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+
+def _date(year: str, month: str, day: str) -> Optional[date]:
+    try:
+        year_int = int(year)
+        if not 1900 <= year_int <= 2099:
+            return None
+        return date(year_int, int(month), int(day))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def parse_dob(value: Optional[str]) -> Optional[date]:
+    """
+    Parse a date of birth in any accepted format
+
+    Args:
+        value: DOB string (surrounding whitespace and trailing AAMVA junk are ignored)
+
+    Returns:
+        The date, or None if the value isn't a valid date
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    match = _ISO.fullmatch(text[:10])
+    if match:
+        return _date(*match.groups())
+    match = _US.fullmatch(text)
+    if match:
+        month, day, year = match.groups()
+        return _date(year, month, day)
+    digits = text[:8]
+    if len(digits) == 8 and digits.isdigit():
+        return _date(digits[4:], digits[:2], digits[2:4]) or _date(digits[:4], digits[4:6], digits[6:])
+    return None
+
+
+def normalize_dob(value: Optional[str]) -> str:
+    """DOB as YYYY-MM-DD, or empty string if it can't be parsed"""
+    parsed = parse_dob(value)
+    return parsed.isoformat() if parsed else ''
+
+
+def age_on(dob: date, today: Optional[date] = None) -> int:
+    """Completed years between dob and today"""
+    today = today or date.today()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+def dob_age(value: Optional[str], today: Optional[date] = None) -> Optional[int]:
+    """Age for a DOB string, or None if it can't be parsed"""
+    parsed = parse_dob(value)
+    return age_on(parsed, today) if parsed else None
+
+
+def _to_datetime64(values: Iterable[Optional[str]]) -> np.ndarray:
+    """DOB strings as datetime64[D], NaT where a value can't be parsed"""
+    values = ['' if v is None else str(v).strip() for v in values]
+    try:
+        # Fast path: every value is already YYYY-MM-DD (dates from the database)
+        if all(len(v) == 10 and v[4] == '-' and v[7] == '-' for v in values):
+            parsed = np.array(values, dtype='datetime64[D]')
+            years = parsed.astype('datetime64[Y]').astype(np.int64) + 1970
+            parsed[(years < 1900) | (years > 2099)] = np.datetime64('NaT')
+            return parsed
+    except ValueError:
+        pass
+    return np.array([normalize_dob(v) or 'NaT' for v in values], dtype='datetime64[D]')
+
+
+def batch_ages(values: Iterable[Optional[str]], today: Optional[date] = None) -> np.ndarray:
+    """
+    Ages for many DOB strings at once
+
+    Args:
+        values: DOB strings in any accepted format
+        today: Reference date (default: today)
+
+    Returns:
+        int64 array of ages, -1 where a value can't be parsed
+    """
+    dobs = _to_datetime64(values)
+    valid = ~np.isnat(dobs)
+    today = np.datetime64(today or date.today(), 'D')
+
+    years = dobs.astype('datetime64[Y]')
+    months = dobs.astype('datetime64[M]')
+    # Month and day folded into MMDD so "birthday not reached yet" is one comparison
+    month_day = (months - years).astype(np.int64) * 100 + (dobs - months).astype(np.int64)
+    today_years = today.astype('datetime64[Y]')
+    today_months = today.astype('datetime64[M]')
+    today_month_day = (today_months - today_years).astype(np.int64) * 100 + (today - today_months).astype(np.int64)
+
+    ages = (today_years - years).astype(np.int64) - (today_month_day < month_day)
+    return np.where(valid, ages, -1)
+
+
+def batch_eligibility(values: Iterable[Optional[str]], today: Optional[date] = None) -> Dict:
+    """
+    Ages and 21+ eligibility for many DOB strings
+
+    Returns:
+        Dictionary with 'ages' (None where invalid), 'eligible' (list of bools),
+        'invalid' (indices of unparseable values) and 'eligibleCount'
+    """
+    ages = batch_ages(values, today)
+    valid = ages >= 0
+    eligible = valid & (ages >= MINIMUM_AGE)
+    return {
+        'ages': [int(age) if ok else None for age, ok in zip(ages.tolist(), valid.tolist())],
+        'eligible': eligible.tolist(),
+        'invalid': np.flatnonzero(~valid).tolist(),
+        'eligibleCount': int(eligible.sum()),
+    }
@@ -3,11 +3,31 @@ Flask Backend for Medical Cannabis Card Application System
 Uses browser automation to submit to QuickBase
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g, Response, stream_with_context
 from flask_cors import CORS
 import os
+import contextvars
+import json
+import queue
+import threading
+import time
 import logging
-from datetime import datetime
+from metrics import REGISTRY, render_prometheus, PROMETHEUS_CONTENT_TYPE
+import failure_artifacts
+from admission import DEADLINE_HEADER, AdmissionRejected, admission_stats, admit, request_deadline, set_deadline
+from idempotency import IDEMPOTENCY_HEADER, recall, remember, run_idempotent, settle_later
+from customer_export import (
+    EXPORT_CONTENT_TYPES, ExportEncoder, export_filename, export_options, iter_pages, stream_export
+)
+from customer_lookup import CUSTOMER_CACHE, lookup_keys
+from checkins import (
+    checkin_new_customer_data, checkin_request_error, checkin_update_data, import_checkins,
+    missing_new_customer_fields, read_records
+)
+from dc_address_pool import address_pool_stats, sample_dc_address
+from age_eligibility import AGE_BATCH_MAX, MINIMUM_AGE, age_on, batch_eligibility, normalize_dob, parse_dob
+from progress import emit, reporting
+from worker_pools import PoolBusy, pool_stats, run_in_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -54,50 +74,287 @@ def get_supabase_manager():
             _supabase_manager = None
     return _supabase_manager
 
+def upload_failure_artifact(path, data, content_type):
+    """Copy a failure artifact file to Supabase Storage (used when FAILURE_ARTIFACT_UPLOAD is set)"""
+    supabase_manager = get_supabase_manager()
+    if supabase_manager and supabase_manager.is_configured():
+        return supabase_manager.upload_artifact(path, data, content_type)
+    return None
+
+failure_artifacts.set_uploader(upload_failure_artifact)
+
 # Initialize Flask app
 app = Flask(__name__)
 
 # Configure CORS with allowed origins
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'https://lucidxdreams.github.io')
-CORS(app, origins=[
+CORS_ORIGINS = [
     FRONTEND_URL,
     'https://lucidxdreams.github.io',
     'http://localhost:8080',
     'http://127.0.0.1:8080',
     'http://localhost:5001',
     'http://127.0.0.1:5001'
-])
+]
+CORS(app, origins=CORS_ORIGINS)
 
 # Increase max content length to 50MB for large images
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
 
+# Per-endpoint request metrics (exported on /metrics)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by endpoint',
+    ('endpoint', 'method', 'status')
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight',
+    'Requests currently being handled by this worker',
+    ('endpoint',)
+)
+
+
+@app.before_request
+def start_request_metrics():
+    """Start the request timer and count the request as in flight"""
+    g.request_start = time.perf_counter()
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS_IN_FLIGHT.inc(g.metrics_endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency by endpoint and status"""
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            g.metrics_endpoint, request.method, str(response.status_code)
+        )
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    """Release the in-flight slot even if the handler raised"""
+    if 'metrics_endpoint' in g:
+        REQUESTS_IN_FLIGHT.dec(g.metrics_endpoint)
+
+
+@app.before_request
+def admission_control():
+    """Wait for a slot on concurrency-limited routes, or turn the request away with 503"""
+    deadline = request_deadline(request.headers.get(DEADLINE_HEADER), g.metrics_endpoint)
+    set_deadline(deadline)
+    try:
+        g.admission = admit(g.metrics_endpoint, deadline)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    g.admitted_at = time.monotonic()
+
+
+@app.teardown_request
+def release_admission(exc):
+    """Free the admission slot and clear the deadline"""
+    limiter = g.pop('admission', None)
+    if limiter is not None:
+        limiter.release(time.monotonic() - g.admitted_at)
+    set_deadline(None)
+
+
+def take_admission_slot():
+    """
+    Take the request's admission slot away from request teardown
+    
+    For work that goes on after the response is handed off (a progress
+    stream's helper thread): the slot is held until that work ends, not until
+    the client disconnects.
+    
+    Returns:
+        Function that frees the slot
+    """
+    limiter = g.pop('admission', None)
+    if limiter is None:
+        return lambda: None
+    admitted_at = g.admitted_at
+    return lambda: limiter.release(time.monotonic() - admitted_at)
+
+
 # Frontend directory (HTML files are in docs folder)
 FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'docs')
 
 # Lazy initialization of browser automation instance
 _qb_automation_instance = None
 
+# 'sync' launches a browser per submission; 'async' runs concurrent submissions
+# as separate contexts in one shared browser (see quickbase_engine.py)
+QB_ENGINE = os.environ.get('QB_ENGINE', 'sync').lower()
+
 def get_qb_automation():
     """Lazy load QuickBase automation instance"""
     global _qb_automation_instance
     if _qb_automation_instance is None:
-        QuickBaseFormAutomation = get_qb_automation_class()
         is_production = os.environ.get('RAILWAY_ENVIRONMENT') or os.environ.get('PORT')
-        _qb_automation_instance = QuickBaseFormAutomation(headless=bool(is_production))
-        logger.info(f"QuickBase automation initialized (headless={bool(is_production)})")
+        if QB_ENGINE == 'async':
+            from quickbase_engine import QuickBaseSubmissionEngine
+            _qb_automation_instance = QuickBaseSubmissionEngine(headless=bool(is_production))
+        else:
+            QuickBaseFormAutomation = get_qb_automation_class()
+            _qb_automation_instance = QuickBaseFormAutomation(headless=bool(is_production))
+        logger.info(f"QuickBase automation initialized (engine={QB_ENGINE}, headless={bool(is_production)})")
     return _qb_automation_instance
 
 
+def submit_to_quickbase(data, resident_type, submission_id):
+    """Run a submission on the browser pool (the async engine queues submissions itself)"""
+    automation = get_qb_automation()
+    if QB_ENGINE == 'async':
+        return automation.submit_application(
+            data, auto_submit=True, resident_type=resident_type, submission_id=submission_id
+        )
+    return run_in_pool(
+        'browser', automation.submit_application,
+        data, auto_submit=True, resident_type=resident_type, submission_id=submission_id
+    )
+
+
+def busy_response(e):
+    """503 with Retry-After for a request shed by admission control or a worker pool"""
+    return jsonify({
+        'success': False,
+        'error': 'Server is busy, please try again shortly',
+        'queueFull': True,
+        'retryAfter': e.retry_after
+    }), 503, {'Retry-After': str(e.retry_after)}
+
+
+def jsonify_result(body, status, replayed=False):
+    """Response for a (body, status) result; 503s and 409s carry Retry-After"""
+    headers = {}
+    if status in (409, 503):
+        headers['Retry-After'] = str(body.get('retryAfter', 30))
+    if replayed:
+        headers['Idempotent-Replayed'] = 'true'
+    return jsonify(body), status, headers
+
+
+def idempotent_work(endpoint, work):
+    """
+    Wrap work(data) so a retry with the same Idempotency-Key header reuses the first result
+    
+    Args:
+        endpoint: Route the key is scoped to
+        work: Function returning (response body, HTTP status) for a request body
+    
+    Returns:
+        Function returning (response body, HTTP status, replayed)
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    return lambda data: run_idempotent(endpoint, key, data, work)
+
+
+# Seconds between keepalive comments on a quiet progress stream (keeps proxies from timing out)
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '10'))
+
+
+def wants_event_stream():
+    """True if the client asked for progress as Server-Sent Events"""
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_progress(work, data, error_prefix):
+    """
+    Run work(data) on a helper thread and stream its progress as Server-Sent Events
+    
+    Emits 'progress' events ({"stage": ..., "elapsed": seconds, ...details})
+    as the pipeline reaches each stage, then exactly one 'result' event
+    ({"status": HTTP status, "body": the usual JSON response}).
+    
+    Args:
+        work: Function returning (response body, HTTP status) for a request body
+        data: Parsed request body
+        error_prefix: Error message prefix if work raises
+    
+    Returns:
+        Streaming text/event-stream response
+    """
+    events = queue.Queue()
+    start = time.monotonic()
+    
+    def report(stage, details):
+        events.put(('progress', {'stage': stage, 'elapsed': round(time.monotonic() - start, 2), **details}))
+    
+    # The helper thread frees the admission slot, so a client that disconnects
+    # doesn't free it while the work is still running
+    release_slot = take_admission_slot()
+    
+    def run():
+        with reporting(report):
+            try:
+                body, status = work(data)
+            except PoolBusy as e:
+                body, status = {
+                    'success': False,
+                    'error': 'Server is busy, please try again shortly',
+                    'queueFull': True,
+                    'retryAfter': e.retry_after
+                }, 503
+            except Exception as e:
+                logger.error(f"{error_prefix}: {str(e)}", exc_info=True)
+                body, status = {'success': False, 'error': f'{error_prefix}: {str(e)}'}, 500
+            finally:
+                release_slot()
+        events.put(('result', {'status': status, 'body': body}))
+    
+    # The copied context carries the request deadline into the helper thread
+    try:
+        threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                         name='progress-stream', daemon=True).start()
+    except BaseException:
+        release_slot()
+        raise
+    
+    def generate():
+        yield sse_event('progress', {'stage': 'accepted', 'elapsed': 0})
+        while True:
+            try:
+                event, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield sse_event(event, payload)
+            if event == 'result':
+                return
+    
+    # stream_with_context keeps the request metrics open until the stream ends
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint - responds quickly without loading heavy dependencies"""
     return jsonify({
         'status': 'healthy', 
         'service': 'medical-card-backend',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'pools': pool_stats(),
+        'admission': admission_stats(),
+        'customerCache': CUSTOMER_CACHE.stats(),
+        'dcAddresses': address_pool_stats()
     }), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker: request and per-stage latency histograms"""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.route('/api/extract-id', methods=['POST'])
 def extract_id():
     """
@@ -127,50 +384,20 @@ def extract_id():
         "ocrEngine": "surya",
         "age": 33
     }
+    
+    With "Accept: text/event-stream" the response is a stream of progress
+    events (decoded, preprocessing, engine_started, ...) ending in a result
+    event; see stream_progress().
     """
     try:
-        import time
-        request_start = time.time()
-        
         data = request.json
+        if wants_event_stream():
+            return stream_progress(extract_id_result, data, 'Failed to extract ID data')
+        return jsonify_result(*extract_id_result(data))
         
-        if not data or 'image' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing image data'
-            }), 400
-        
-        image_base64 = data.get('image')
-        logger.info("Starting ID extraction...")
-        
-        # Extract data using OCR (lazy-loaded)
-        extract_id_data = get_ocr_service()
-        result = extract_id_data(image_base64)
-        
-        total_time = time.time() - request_start
-        logger.info(f"Total ID extraction took {total_time:.2f}s")
-        
-        if not result.get('success'):
-            return jsonify(result), 500
-        
-        # Calculate age from DOB
-        from datetime import datetime
-        try:
-            dob = result['data'].get('dateOfBirth', '')
-            if dob:
-                dob_date = datetime.strptime(dob, "%m/%d/%Y")
-                today = datetime.today()
-                age = today.year - dob_date.year - ((today.month, today.day) < (dob_date.month, dob_date.day))
-                result['age'] = age
-                
-                # Convert DOB to YYYY-MM-DD format for form submission
-                result['data']['dateOfBirth'] = dob_date.strftime("%Y-%m-%d")
-        except Exception as e:
-            logger.warning(f"Could not calculate age: {e}")
-            result['age'] = None
-        
-        return jsonify(result)
-        
+    except PoolBusy as e:
+        return busy_response(e)
+
     except Exception as e:
         logger.error(f"Error extracting ID: {str(e)}", exc_info=True)
         return jsonify({
@@ -179,6 +406,49 @@ def extract_id():
         }), 500
 
 
+def extract_id_result(data):
+    """
+    Run OCR for an /api/extract-id request body
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    
+    Raises:
+        PoolBusy: The OCR pool shed the request
+    """
+    request_start = time.time()
+    
+    if not data or 'image' not in data:
+        return {
+            'success': False,
+            'error': 'Missing image data'
+        }, 400
+    
+    image_base64 = data.get('image')
+    logger.info("Starting ID extraction...")
+    
+    # Extract data using OCR (lazy-loaded)
+    extract_id_data = get_ocr_service()
+    result = run_in_pool('vision', extract_id_data, image_base64)
+    
+    total_time = time.time() - request_start
+    logger.info(f"Total ID extraction took {total_time:.2f}s")
+    
+    if not result.get('success'):
+        return result, 500
+    
+    # Calculate age from DOB
+    dob_date = parse_dob(result['data'].get('dateOfBirth'))
+    if dob_date:
+        result['age'] = age_on(dob_date)
+        # YYYY-MM-DD for form submission
+        result['data']['dateOfBirth'] = dob_date.isoformat()
+    else:
+        result['age'] = None
+    
+    return result, 200
+
+
 @app.route('/api/scan-barcode', methods=['POST'])
 def scan_barcode():
     """
@@ -225,7 +495,7 @@ def scan_barcode():
         
         # Extract data using barcode scanner (lazy-loaded)
         extract_id_from_barcode = get_barcode_service()
-        result = extract_id_from_barcode(image_base64)
+        result = run_in_pool('barcode', extract_id_from_barcode, image_base64)
         
         total_time = time.time() - request_start
         logger.info(f"Total barcode scan took {total_time:.2f}s")
@@ -234,21 +504,18 @@ def scan_barcode():
             return jsonify(result), 500
         
         # Calculate age from DOB
-        from datetime import datetime
-        try:
-            dob = result['data'].get('dateOfBirth', '')
-            if dob:
-                # DOB from barcode is already in YYYY-MM-DD format
-                dob_date = datetime.strptime(dob, "%Y-%m-%d")
-                today = datetime.today()
-                age = today.year - dob_date.year - ((today.month, today.day) < (dob_date.month, dob_date.day))
-                result['age'] = age
-        except Exception as e:
-            logger.warning(f"Could not calculate age: {e}")
+        dob_date = parse_dob(result['data'].get('dateOfBirth'))
+        if dob_date:
+            result['age'] = age_on(dob_date)
+            result['data']['dateOfBirth'] = dob_date.isoformat()
+        else:
             result['age'] = None
         
         return jsonify(result)
         
+    except PoolBusy as e:
+        return busy_response(e)
+
     except Exception as e:
         logger.error(f"Error scanning barcode: {str(e)}", exc_info=True)
         return jsonify({
@@ -266,7 +533,9 @@ def parse_barcode():
     
     Request body:
     {
-        "barcodeText": "@\n\x1e\rANSI 636049030002DL00410466..."
+        "barcodeText": "@\n\x1e\rANSI 636049030002DL00410466...",
+        "addressZip": "20009",  # Optional: preferred ZIP for a non-DC ID's DC address
+        "addressWard": "1"      # Optional: preferred ward (entries that have one)
     }
     
     Response:
@@ -288,101 +557,8 @@ def parse_barcode():
     }
     """
     try:
-        import time
-        request_start = time.time()
-        
-        # Lazy import barcode parsing functions
-        from barcode_service import parse_aamva_barcode, format_date, detect_dc_from_barcode, get_random_dc_address
-        
-        data = request.json
-        
-        if not data or 'barcodeText' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing barcodeText data'
-            }), 400
-        
-        barcode_text = data.get('barcodeText')
-        logger.info(f"Parsing client-decoded barcode ({len(barcode_text)} chars)")
-        
-        # Parse AAMVA data
-        parsed_data = parse_aamva_barcode(barcode_text)
-        
-        if not parsed_data:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to parse barcode data. The barcode may be damaged or not AAMVA-compliant.'
-            }), 400
-        
-        # Format extracted data
-        extracted_data = {}
-        
-        # Name fields
-        if 'firstName' in parsed_data:
-            extracted_data['firstName'] = parsed_data['firstName'].title()
-        if 'middleName' in parsed_data:
-            middle = parsed_data['middleName']
-            extracted_data['middleInitial'] = middle[0].upper() if middle else ''
-        if 'lastName' in parsed_data:
-            extracted_data['lastName'] = parsed_data['lastName'].title()
-        if 'suffix' in parsed_data:
-            extracted_data['suffix'] = parsed_data['suffix'].upper()
-        
-        # Date of birth
-        if 'dateOfBirth' in parsed_data:
-            extracted_data['dateOfBirth'] = format_date(parsed_data['dateOfBirth'])
-        
-        # Detect DC vs Non-DC
-        is_dc = detect_dc_from_barcode(parsed_data)
-        
-        # Always extract the actual address from ID
-        actual_address = {}
-        if 'street' in parsed_data:
-            actual_address['street'] = parsed_data['street']
-        if 'street2' in parsed_data:
-            actual_address['aptSuite'] = parsed_data['street2']
-        if 'city' in parsed_data:
-            actual_address['city'] = parsed_data['city']
-        if 'state' in parsed_data:
-            actual_address['state'] = parsed_data['state']
-        if 'zip' in parsed_data:
-            actual_address['zip'] = parsed_data['zip'][:5]
-        
-        if is_dc:
-            # DC ID: Use extracted address
-            extracted_data.update(actual_address)
-            logger.info("DC ID - Using extracted address")
-        else:
-            # Non-DC ID: Use random DC address as default, but include actual address
-            dc_address = get_random_dc_address()
-            extracted_data.update(dc_address)
-            # Store actual address separately for Non-DC resident applications
-            extracted_data['actualAddress'] = actual_address
-            logger.info("Non-DC ID - Using random DC address (actual address preserved)")
-        
-        elapsed = time.time() - request_start
-        
-        # Calculate age from DOB
-        from datetime import datetime
-        age = None
-        try:
-            dob = extracted_data.get('dateOfBirth', '')
-            if dob:
-                dob_date = datetime.strptime(dob, "%Y-%m-%d")
-                today = datetime.today()
-                age = today.year - dob_date.year - ((today.month, today.day) < (dob_date.month, dob_date.day))
-        except Exception as e:
-            logger.warning(f"Could not calculate age: {e}")
-        
-        logger.info(f"Barcode parsing completed in {elapsed:.3f}s")
-        
-        return jsonify({
-            'success': True,
-            'data': extracted_data,
-            'isDC': is_dc,
-            'processingTime': round(elapsed, 3),
-            'age': age
-        })
+        body, status = parse_barcode_result(request.json)
+        return jsonify(body), status
         
     except Exception as e:
         logger.error(f"Error parsing barcode: {str(e)}", exc_info=True)
@@ -392,6 +568,102 @@ def parse_barcode():
         }), 500
 
 
+def parse_barcode_result(data):
+    """
+    Parse a client-decoded barcode request body (shared by the Flask and ASGI handlers)
+    
+    Args:
+        data: Request JSON with barcodeText
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    """
+    request_start = time.time()
+    
+    # Lazy import barcode parsing functions
+    from barcode_service import parse_aamva_barcode, format_date, detect_dc_from_barcode
+    
+    if not data or 'barcodeText' not in data:
+        return {
+            'success': False,
+            'error': 'Missing barcodeText data'
+        }, 400
+    
+    barcode_text = data.get('barcodeText')
+    logger.info(f"Parsing client-decoded barcode ({len(barcode_text)} chars)")
+    
+    # Parse AAMVA data
+    parsed_data = parse_aamva_barcode(barcode_text)
+    
+    if not parsed_data:
+        return {
+            'success': False,
+            'error': 'Failed to parse barcode data. The barcode may be damaged or not AAMVA-compliant.'
+        }, 400
+    
+    # Format extracted data
+    extracted_data = {}
+    
+    # Name fields
+    if 'firstName' in parsed_data:
+        extracted_data['firstName'] = parsed_data['firstName'].title()
+    if 'middleName' in parsed_data:
+        middle = parsed_data['middleName']
+        extracted_data['middleInitial'] = middle[0].upper() if middle else ''
+    if 'lastName' in parsed_data:
+        extracted_data['lastName'] = parsed_data['lastName'].title()
+    if 'suffix' in parsed_data:
+        extracted_data['suffix'] = parsed_data['suffix'].upper()
+    
+    # Date of birth
+    if 'dateOfBirth' in parsed_data:
+        extracted_data['dateOfBirth'] = format_date(parsed_data['dateOfBirth'])
+    
+    # Detect DC vs Non-DC
+    is_dc = detect_dc_from_barcode(parsed_data)
+    
+    # Always extract the actual address from ID
+    actual_address = {}
+    if 'street' in parsed_data:
+        actual_address['street'] = parsed_data['street']
+    if 'street2' in parsed_data:
+        actual_address['aptSuite'] = parsed_data['street2']
+    if 'city' in parsed_data:
+        actual_address['city'] = parsed_data['city']
+    if 'state' in parsed_data:
+        actual_address['state'] = parsed_data['state']
+    if 'zip' in parsed_data:
+        actual_address['zip'] = parsed_data['zip'][:5]
+    
+    if is_dc:
+        # DC ID: Use extracted address
+        extracted_data.update(actual_address)
+        logger.info("DC ID - Using extracted address")
+    else:
+        # Non-DC ID: Use a pooled DC address as default, but include actual address
+        dc_address = sample_dc_address(data.get('addressZip'), data.get('addressWard'))
+        extracted_data.update(dc_address)
+        # Store actual address separately for Non-DC resident applications
+        extracted_data['actualAddress'] = actual_address
+        logger.info("Non-DC ID - Using pooled DC address (actual address preserved)")
+    
+    elapsed = time.time() - request_start
+    
+    # Calculate age from DOB
+    dob_date = parse_dob(extracted_data.get('dateOfBirth'))
+    age = age_on(dob_date) if dob_date else None
+    
+    logger.info(f"Barcode parsing completed in {elapsed:.3f}s")
+    
+    return {
+        'success': True,
+        'data': extracted_data,
+        'isDC': is_dc,
+        'processingTime': round(elapsed, 3),
+        'age': age
+    }, 200
+
+
 @app.route('/api/debug-form', methods=['POST'])
 def debug_form():
     """
@@ -470,85 +742,21 @@ def submit_application():
             "dob": "1990-01-15"
         }
     }
+    
+    With "Accept: text/event-stream" the response is a stream of progress
+    events (stored, browser_launched, form_filled, submitted, ...) ending in a
+    result event; see stream_progress().
     """
     try:
         data = request.json
+        work = idempotent_work('/api/submit-application', submit_application_result)
+        if wants_event_stream():
+            return stream_progress(lambda d: work(d)[:2], data, 'Failed to submit application')
+        return jsonify_result(*work(data))
         
-        # Validate required fields
-        required_fields = [
-            'firstName', 'lastName', 'dateOfBirth', 'street', 
-            'zip', 'phoneNumber', 'email', 'idImageBase64'
-        ]
-        
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
-        
-        # Get resident type (default to 'dc')
-        resident_type = data.get('residentType', 'dc')
-        if resident_type not in ['dc', 'nondc']:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid residentType. Must be "dc" or "nondc"'
-            }), 400
-        
-        # For Non-DC residents, validate timePeriod
-        if resident_type == 'nondc' and not data.get('timePeriod'):
-            return jsonify({
-                'success': False,
-                'error': 'timePeriod is required for Non-DC residents'
-            }), 400
-        
-        # Validate email format
-        email = data.get('email', '')
-        if '@' not in email or '.' not in email:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid email format'
-            }), 400
-        
-        # Validate phone format (should be (XXX) XXX-XXXX)
-        phone = data.get('phoneNumber', '')
-        if len(phone.replace('(', '').replace(')', '').replace(' ', '').replace('-', '')) != 10:
-            return jsonify({
-                'success': False,
-                'error': 'Phone number must be 10 digits'
-            }), 400
-        
-        # Store customer data and ID images in Supabase (if configured)
-        customer_id = None
-        supabase_manager = get_supabase_manager()
-        if supabase_manager and supabase_manager.is_configured():
-            try:
-                customer_id, image_stored = supabase_manager.store_customer_with_images(
-                    data, 
-                    data['idImageBase64'],
-                    data.get('idImageBackBase64')
-                )
-                if customer_id:
-                    logger.info(f"Customer data stored in Supabase: ID {customer_id}")
-                else:
-                    logger.warning("Failed to store customer data in Supabase")
-            except Exception as e:
-                logger.error(f"Supabase storage error: {e}")
-        
-        # Submit via browser automation (auto_submit=True to submit the form)
-        logger.info(f"Processing {resident_type.upper()} application for {data['firstName']} {data['lastName']}")
-        result = get_qb_automation().submit_application(data, auto_submit=True, resident_type=resident_type)
-        
-        if result.get('success'):
-            logger.info(f"{resident_type.upper()} application form filled successfully: {data['email']}")
-            # Add customer ID to result if stored
-            if customer_id:
-                result['customerId'] = customer_id
-            return jsonify(result), 200
-        else:
-            logger.error(f"Application submission failed: {result.get('error')}")
-            return jsonify(result), 500
-        
+    except PoolBusy as e:
+        return busy_response(e)
+
     except Exception as e:
         logger.error(f"Error submitting application: {str(e)}", exc_info=True)
         return jsonify({
@@ -557,6 +765,159 @@ def submit_application():
         }), 500
 
 
+def submit_application_result(data):
+    """
+    Store and submit an /api/submit-application request body
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    
+    Raises:
+        PoolBusy: The browser pool shed the request
+    """
+    if not data:
+        return {'success': False, 'error': 'No data provided'}, 400
+    
+    # Validate required fields
+    required_fields = [
+        'firstName', 'lastName', 'dateOfBirth', 'street', 
+        'zip', 'phoneNumber', 'email', 'idImageBase64'
+    ]
+    
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        return {
+            'success': False,
+            'error': f'Missing required fields: {", ".join(missing_fields)}'
+        }, 400
+    
+    # Get resident type (default to 'dc')
+    resident_type = data.get('residentType', 'dc')
+    if resident_type not in ['dc', 'nondc']:
+        return {
+            'success': False,
+            'error': 'Invalid residentType. Must be "dc" or "nondc"'
+        }, 400
+    
+    # For Non-DC residents, validate timePeriod
+    if resident_type == 'nondc' and not data.get('timePeriod'):
+        return {
+            'success': False,
+            'error': 'timePeriod is required for Non-DC residents'
+        }, 400
+    
+    # Validate email format
+    email = data.get('email', '')
+    if '@' not in email or '.' not in email:
+        return {
+            'success': False,
+            'error': 'Invalid email format'
+        }, 400
+    
+    # Validate phone format (should be (XXX) XXX-XXXX)
+    phone = data.get('phoneNumber', '')
+    if len(phone.replace('(', '').replace(')', '').replace(' ', '').replace('-', '')) != 10:
+        return {
+            'success': False,
+            'error': 'Phone number must be 10 digits'
+        }, 400
+    
+    # The form, the database and the response all take YYYY-MM-DD; any
+    # accepted DOB format (MM/DD/YYYY, AAMVA 8-digit) is converted here
+    dob = normalize_dob(data['dateOfBirth'])
+    if not dob:
+        return {
+            'success': False,
+            'error': 'Invalid dateOfBirth (use YYYY-MM-DD)'
+        }, 400
+    data['dateOfBirth'] = dob
+    
+    # Store customer data and ID images in Supabase (if configured); a retry
+    # with the same Idempotency-Key reuses the row an earlier attempt stored
+    customer_id = recall('customerId')
+    supabase_manager = get_supabase_manager()
+    if customer_id:
+        logger.info(f"Reusing customer {customer_id} stored by an earlier attempt")
+        emit('stored', customerId=customer_id)
+    elif supabase_manager and supabase_manager.is_configured():
+        try:
+            customer_id, image_stored = supabase_manager.store_customer_with_images(
+                data, 
+                data['idImageBase64'],
+                data.get('idImageBackBase64')
+            )
+            if customer_id:
+                logger.info(f"Customer data stored in Supabase: ID {customer_id}")
+                remember('customerId', customer_id)
+                emit('stored', customerId=customer_id)
+            else:
+                logger.warning("Failed to store customer data in Supabase")
+        except Exception as e:
+            logger.error(f"Supabase storage error: {e}")
+    
+    # Submit via browser automation (auto_submit=True to submit the form)
+    logger.info(f"Processing {resident_type.upper()} application for {data['firstName']} {data['lastName']}")
+    submission_id = f"customer-{customer_id}" if customer_id else None
+    try:
+        result = submit_to_quickbase(data, resident_type, submission_id)
+    except PoolBusy as e:
+        if e.job is None:
+            raise
+        # The browser run outlived the wait and may still submit. With an
+        # Idempotency-Key its result answers the retries instead of a second run;
+        # without one, the answer must not invite a retry
+        if settle_later(e.job, lambda late: submission_response(late, data, resident_type, customer_id)):
+            logger.warning(f"Browser run for {data['email']} still going after {e.reason} - "
+                           f"its result will answer retries")
+            raise
+        logger.warning(f"Browser run for {data['email']} still going after {e.reason}")
+        body = {
+            'success': False,
+            'error': 'The submission is taking longer than expected and is still running - '
+                     'please check before submitting again',
+            'outcomeUnknown': True
+        }
+        if customer_id:
+            body['customerId'] = customer_id
+        return body, 504
+    
+    return submission_response(result, data, resident_type, customer_id)
+
+
+def submission_response(result, data, resident_type, customer_id):
+    """
+    Response for a QuickBase automation result
+    
+    A submission that timed out or failed after the form was sent may have
+    gone through; it is marked outcomeUnknown so the idempotency key keeps it
+    instead of letting a retry submit the form again.
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    """
+    if result.get('success'):
+        logger.info(f"{resident_type.upper()} application form filled successfully: {data['email']}")
+        # Add customer ID to result if stored
+        if customer_id:
+            result['customerId'] = customer_id
+        return result, 200
+    elif result.get('queueFull'):
+        logger.warning(f"Application not submitted - automation queue full: {data['email']}")
+        return result, 503
+    else:
+        if result.get('failureReason') == 'timeout' or result.get('outcomeUnknown'):
+            result['outcomeUnknown'] = True
+            result['error'] = ('QuickBase did not confirm the submission in time - it may have gone through, '
+                               'please check before submitting again')
+            logger.error(f"Application submitted but not confirmed - check QuickBase before resubmitting: "
+                         f"{data['email']}")
+        else:
+            logger.error(f"Application submission failed: {result.get('error')}")
+        if customer_id:
+            result['customerId'] = customer_id
+        return result, 500
+
+
 @app.route('/api/complete-checkin', methods=['POST'])
 def complete_checkin():
     """
@@ -568,8 +929,10 @@ def complete_checkin():
         "registrationId": "REG123456",
         "expirationDate": "2024-12-31",
         "barcode": "123456789",
+        "licenseNumber": "123456789",  # Optional, AAMVA DAQ (defaults to barcode)
         "location": "3106 Mt Pleasant St NW",
-        # Required if customerId is missing:
+        # Required if customerId is missing and no earlier record matches
+        # registrationId, barcode or licenseNumber:
         "firstName": "John",
         "lastName": "Doe",
         "email": "john@example.com",
@@ -579,113 +942,18 @@ def complete_checkin():
     Response:
     {
         "success": true,
-        "message": "Check-in completed successfully"
+        "message": "Check-in completed successfully",
+        "customerId": 123,  # When no customerId was sent
+        "returning": true   # When an earlier record was checked in
     }
+    
+    A retry carrying the same Idempotency-Key header as an earlier successful
+    check-in gets the earlier response instead of creating another record.
     """
     try:
         data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'No data provided'}), 400
-        
-        # Validate required check-in fields
-        registration_id = data.get('registrationId')
-        expiration_date = data.get('expirationDate')
-        
-        if not registration_id:
-            return jsonify({'success': False, 'error': 'Registration ID is required'}), 400
-        
-        if not expiration_date:
-            return jsonify({'success': False, 'error': 'Expiration date is required'}), 400
-
-        customer_id = data.get('customerId')
-        supabase_manager = get_supabase_manager()
-
-        if not supabase_manager or not supabase_manager.is_configured():
-            logger.warning("Supabase not configured - check-in data not saved")
-            return jsonify({
-                'success': False,
-                'error': 'Database not available'
-            }), 500
-
-        try:
-            # Case 1: Existing customer (Application submitted or previous record)
-            if customer_id:
-                update_data = {
-                    'registration_id': registration_id,
-                    'expiration_date': expiration_date,
-                    'barcode': data.get('barcode'),
-                    # 'raw_barcode_data': data.get('rawBarcodeData'), # Column missing in DB
-                    'location': data.get('location'),
-                    'status': 'checked_in',
-                    'checked_in_at': datetime.now().isoformat()
-                }
-                
-                # Remove None values
-                update_data = {k: v for k, v in update_data.items() if v is not None}
-                
-                success = supabase_manager.update_customer_checkin(customer_id, update_data)
-                
-                if success:
-                    logger.info(f"Check-in completed for customer {customer_id}")
-                    return jsonify({
-                        'success': True,
-                        'message': 'Check-in completed successfully'
-                    }), 200
-                else:
-                    logger.error(f"Failed to update customer {customer_id} for check-in")
-                    return jsonify({
-                        'success': False,
-                        'error': 'Failed to update customer record'
-                    }), 500
-
-            # Case 2: New customer check-in (Existing Card Holder)
-            else:
-                # Validate required customer fields for new record
-                required_new = ['firstName', 'lastName', 'email']
-                missing = [f for f in required_new if not data.get(f)]
-                if missing:
-                    return jsonify({
-                        'success': False,
-                        'error': f'Missing customer fields: {", ".join(missing)}'
-                    }), 400
-
-                # Prepare full customer data
-                new_customer_data = {
-                    'firstName': data.get('firstName'),
-                    'lastName': data.get('lastName'),
-                    'email': data.get('email'),
-                    'phoneNumber': data.get('phoneNumber'),
-                    'registrationId': registration_id,
-                    'expirationDate': expiration_date,
-                    'barcode': data.get('barcode'),
-                    'rawBarcodeData': data.get('rawBarcodeData'),
-                    'location': data.get('location'),
-                    'checkedInAt': datetime.now().isoformat()
-                }
-
-                # Store new customer with 'checked_in' status
-                new_id = supabase_manager.store_customer(new_customer_data, status='checked_in')
-
-                if new_id:
-                    logger.info(f"Created new checked-in customer: ID {new_id}")
-                    return jsonify({
-                        'success': True,
-                        'message': 'Check-in completed successfully',
-                        'customerId': new_id
-                    }), 200
-                else:
-                    logger.error("Failed to create new customer record")
-                    return jsonify({
-                        'success': False,
-                        'error': 'Failed to create customer record'
-                    }), 500
-                    
-        except Exception as e:
-            logger.error(f"Supabase check-in error: {e}")
-            return jsonify({
-                'success': False,
-                'error': f'Database operation failed: {str(e)}'
-            }), 500
+        work = idempotent_work('/api/complete-checkin', complete_checkin_result)
+        return jsonify_result(*work(data))
             
     except Exception as e:
         logger.error(f"Error completing check-in: {str(e)}", exc_info=True)
@@ -695,6 +963,95 @@ def complete_checkin():
         }), 500
 
 
+def complete_checkin_result(data):
+    """
+    Record a /api/complete-checkin request body
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    """
+    invalid = checkin_request_error(data)
+    if invalid:
+        return invalid
+
+    customer_id = data.get('customerId')
+    supabase_manager = get_supabase_manager()
+
+    if not supabase_manager or not supabase_manager.is_configured():
+        logger.warning("Supabase not configured - check-in data not saved")
+        return {
+            'success': False,
+            'error': 'Database not available'
+        }, 500
+
+    try:
+        # Case 1: Existing customer (Application submitted or previous record)
+        if customer_id:
+            success = supabase_manager.update_customer_checkin(customer_id, checkin_update_data(data))
+            
+            if success:
+                logger.info(f"Check-in completed for customer {customer_id}")
+                return {
+                    'success': True,
+                    'message': 'Check-in completed successfully'
+                }, 200
+            else:
+                logger.error(f"Failed to update customer {customer_id} for check-in")
+                return {
+                    'success': False,
+                    'error': 'Failed to update customer record'
+                }, 500
+
+        # Case 2: Existing Card Holder - update their earlier record if we have one.
+        # A failed lookup or update raises (500) rather than creating a duplicate.
+        else:
+            keys = lookup_keys(data)
+            update_data = checkin_update_data(data)
+            existing_id = supabase_manager.find_customer_id(keys)
+            if existing_id and not supabase_manager.update_customer_checkin(existing_id, update_data):
+                # A cached id whose row is gone (now dropped from the cache): ask the database
+                existing_id = supabase_manager.find_customer_id(keys)
+                if existing_id and not supabase_manager.update_customer_checkin(existing_id, update_data):
+                    existing_id = None
+            if existing_id:
+                logger.info(f"Check-in completed for returning customer {existing_id}")
+                return {
+                    'success': True,
+                    'message': 'Check-in completed successfully',
+                    'customerId': existing_id,
+                    'returning': True
+                }, 200
+
+            # Not seen before: create the record
+            missing = missing_new_customer_fields(data)
+            if missing:
+                return missing
+
+            # Store new customer with 'checked_in' status
+            new_id = supabase_manager.store_customer(checkin_new_customer_data(data), status='checked_in')
+
+            if new_id:
+                logger.info(f"Created new checked-in customer: ID {new_id}")
+                return {
+                    'success': True,
+                    'message': 'Check-in completed successfully',
+                    'customerId': new_id
+                }, 200
+            else:
+                logger.error("Failed to create new customer record")
+                return {
+                    'success': False,
+                    'error': 'Failed to create customer record'
+                }, 500
+                
+    except Exception as e:
+        logger.error(f"Supabase check-in error: {e}")
+        return {
+            'success': False,
+            'error': f'Database operation failed: {str(e)}'
+        }, 500
+
+
 @app.route('/api/validate-age', methods=['POST'])
 def validate_age():
     """
@@ -714,46 +1071,8 @@ def validate_age():
     }
     """
     try:
-        data = request.json
-        dob = data.get('dateOfBirth', '')
-        
-        if not dob:
-            return jsonify({
-                'success': False,
-                'error': 'Date of birth is required'
-            }), 400
-        
-        from datetime import datetime
-        
-        try:
-            # Support both YYYY-MM-DD and MM/DD/YYYY formats
-            if '-' in dob:
-                dob_date = datetime.strptime(dob, "%Y-%m-%d")
-            else:
-                dob_date = datetime.strptime(dob, "%m/%d/%Y")
-            
-            today = datetime.today()
-            age = today.year - dob_date.year - ((today.month, today.day) < (dob_date.month, dob_date.day))
-            
-            eligible = age >= 21
-            
-            if eligible:
-                message = "Applicant is eligible for self-certification"
-            else:
-                message = f"Applicant must be 21+ for self-certification. Current age: {age}"
-            
-            return jsonify({
-                'success': True,
-                'age': age,
-                'eligible': eligible,
-                'message': message
-            })
-            
-        except ValueError:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid date format. Use YYYY-MM-DD or MM/DD/YYYY'
-            }), 400
+        body, status = validate_age_result(request.json)
+        return jsonify(body), status
         
     except Exception as e:
         logger.error(f"Error validating age: {str(e)}", exc_info=True)
@@ -763,6 +1082,119 @@ def validate_age():
         }), 500
 
 
+def validate_age_result(data):
+    """
+    Age eligibility for a validate-age request body (shared by the Flask and ASGI handlers)
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    """
+    dob = data.get('dateOfBirth', '')
+    
+    if not dob:
+        return {
+            'success': False,
+            'error': 'Date of birth is required'
+        }, 400
+    
+    # YYYY-MM-DD, MM/DD/YYYY or an 8-digit AAMVA date
+    dob_date = parse_dob(str(dob))
+    if not dob_date:
+        return {
+            'success': False,
+            'error': 'Invalid date format. Use YYYY-MM-DD or MM/DD/YYYY'
+        }, 400
+    
+    age = age_on(dob_date)
+    
+    eligible = age >= MINIMUM_AGE
+    
+    if eligible:
+        message = "Applicant is eligible for self-certification"
+    else:
+        message = f"Applicant must be {MINIMUM_AGE}+ for self-certification. Current age: {age}"
+    
+    return {
+        'success': True,
+        'age': age,
+        'eligible': eligible,
+        'message': message
+    }, 200
+
+
+@app.route('/api/validate-ages', methods=['POST'])
+def validate_ages():
+    """
+    Batch age eligibility (21+) for many dates of birth, e.g. customer audits
+    
+    Request body:
+    {
+        "datesOfBirth": ["1990-01-15", "01/15/2005", ...],
+        "asOf": "2025-06-01"  # Optional reference date (default: today)
+    }
+    
+    Response (lists are in request order; invalid dates get age null):
+    {
+        "success": true,
+        "count": 2,
+        "ages": [35, 20],
+        "eligible": [true, false],
+        "eligibleCount": 1,
+        "invalid": []
+    }
+    """
+    try:
+        body, status = validate_ages_result(request.get_json(silent=True))
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Error validating ages: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def validate_ages_result(data):
+    """
+    Batch eligibility for a validate-ages request body (shared by the Flask and ASGI handlers)
+    
+    Returns:
+        Tuple of (response body, HTTP status)
+    """
+    if not isinstance(data, dict):
+        return {
+            'success': False,
+            'error': 'Request body must be a JSON object with datesOfBirth'
+        }, 400
+    dates = data.get('datesOfBirth')
+    if not isinstance(dates, list):
+        return {
+            'success': False,
+            'error': 'datesOfBirth must be a list'
+        }, 400
+    if len(dates) > AGE_BATCH_MAX:
+        return {
+            'success': False,
+            'error': f'At most {AGE_BATCH_MAX} dates per request'
+        }, 400
+    
+    as_of = None
+    if data.get('asOf'):
+        as_of = parse_dob(str(data['asOf']))
+        if not as_of:
+            return {
+                'success': False,
+                'error': 'Invalid asOf date. Use YYYY-MM-DD'
+            }, 400
+    
+    return {
+        'success': True,
+        'count': len(dates),
+        **batch_eligibility(dates, as_of)
+    }, 200
+
+
 @app.route('/api/admin/customers', methods=['GET'])
 def admin_list_customers():
     """
@@ -806,6 +1238,165 @@ def admin_list_customers():
         }), 500
 
 
+@app.route('/api/admin/customers/export', methods=['GET'])
+def admin_export_customers():
+    """
+    Admin API: Stream the customers table as CSV or JSON lines
+
+    Query params:
+    - format: 'csv' (default) or 'jsonl'
+    - columns: Comma-separated subset of customer_export.EXPORT_COLUMNS (id is always included)
+    - status: Filter by status ('pending', 'checked_in')
+    - dateField: 'created_at' (default) or 'checked_in_at', for since/until
+    - since / until: ISO date or timestamp range (until is exclusive)
+    - after: Resume after this customer id (rows come in id order)
+
+    E.g. September's check-ins:
+    ?status=checked_in&dateField=checked_in_at&since=2026-09-01&until=2026-10-01
+
+    Response: the file as a chunked download, gzip-encoded if the client
+    sends Accept-Encoding: gzip. A connection dropped before the end means
+    the export failed; the last id received can be passed as after to resume.
+    """
+    supabase_manager = get_supabase_manager()
+    if not supabase_manager or not supabase_manager.is_configured():
+        return jsonify({
+            'success': False,
+            'error': 'Supabase not configured'
+        }), 503
+
+    options, error = export_options(request.args)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+
+    gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    encoder = ExportEncoder(options['format'], options['columns'], gzip=gzip)
+    pages = iter_pages(
+        lambda after_id, limit: supabase_manager.customer_page(after_id, limit, options['columns'], **options['filters']),
+        after=options['after']
+    )
+
+    headers = {
+        'Content-Disposition': f"attachment; filename={export_filename(options['format'])}",
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept-Encoding'
+    }
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(stream_export(pages, encoder)),
+                    content_type=EXPORT_CONTENT_TYPES[options['format']], headers=headers)
+
+
+@app.route('/api/admin/customers/lookup', methods=['GET'])
+def admin_lookup_customer():
+    """
+    Admin API: Find a customer by registration ID, barcode or license number
+    
+    Query params (at least one):
+    - registrationId
+    - barcode
+    - licenseNumber: matched by its salted hash (needs LICENSE_HASH_SALT)
+    
+    Response:
+    {
+        "success": true,
+        "customer": {...}
+    }
+    """
+    try:
+        supabase_manager = get_supabase_manager()
+        if not supabase_manager or not supabase_manager.is_configured():
+            return jsonify({
+                'success': False,
+                'error': 'Supabase not configured'
+            }), 503
+        
+        keys = lookup_keys(request.args)
+        if not keys:
+            return jsonify({
+                'success': False,
+                'error': 'registrationId, barcode or licenseNumber is required'
+            }), 400
+        
+        customer_id = supabase_manager.find_customer_id(keys)
+        customer = supabase_manager.get_customer(customer_id) if customer_id else None
+        
+        if customer:
+            return jsonify({
+                'success': True,
+                'customer': customer
+            }), 200
+        else:
+            if customer_id:
+                CUSTOMER_CACHE.forget(customer_id)
+            return jsonify({
+                'success': False,
+                'error': 'Customer not found'
+            }), 404
+        
+    except Exception as e:
+        logger.error(f"Error looking up customer: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/admin/checkins/import', methods=['POST'])
+def admin_import_checkins():
+    """
+    Admin API: Bulk import check-ins recorded while a kiosk was offline
+
+    Body: one check-in per line, with the /api/complete-checkin fields plus an
+    optional checkedInAt (ISO timestamp of the actual check-in)
+    - JSON lines (Content-Type: application/x-ndjson), or
+    - CSV with a header row of field names (Content-Type: text/csv)
+    ?format=jsonl|csv overrides the Content-Type.
+
+    The body is read as a stream and written in chunks, so a large backlog
+    doesn't have to fit in memory. Rows that fail are reported by line number
+    and don't stop the import.
+
+    Response:
+    {
+        "success": true,
+        "total": 1200,
+        "created": 310,
+        "updated": 885,
+        "failed": 5,
+        "errors": [{"line": 17, "error": "Registration ID is required"}, ...]
+    }
+    """
+    try:
+        supabase_manager = get_supabase_manager()
+        if not supabase_manager or not supabase_manager.is_configured():
+            return jsonify({
+                'success': False,
+                'error': 'Supabase not configured'
+            }), 503
+
+        fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'jsonl')
+        if fmt not in ('jsonl', 'csv'):
+            return jsonify({
+                'success': False,
+                'error': 'format must be jsonl or csv'
+            }), 400
+
+        summary = import_checkins(supabase_manager, read_records(request.stream, fmt))
+        return jsonify({'success': True, **summary}), 200
+
+    except Exception as e:
+        logger.error(f"Error importing check-ins: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/admin/customers/<int:customer_id>', methods=['GET'])
 def admin_get_customer(customer_id):
     """
@@ -846,6 +1437,57 @@ def admin_get_customer(customer_id):
         }), 500
 
 
+@app.route('/api/admin/artifacts', methods=['GET'])
+def admin_list_artifacts():
+    """
+    Admin API: List form automation failure artifacts, newest first
+    
+    Query params:
+    - submissionId: Only artifacts for this submission (e.g. 'customer-42')
+    - limit: Maximum number of results (default: 100)
+    
+    Response:
+    {
+        "success": true,
+        "artifacts": [{"artifactId": "...", "submissionId": "...", "kind": "...", "files": {...}}],
+        "count": 3
+    }
+    """
+    try:
+        artifacts = failure_artifacts.list_artifacts(
+            submission_id=request.args.get('submissionId'),
+            limit=request.args.get('limit', 100, type=int)
+        )
+        return jsonify({
+            'success': True,
+            'artifacts': artifacts,
+            'count': len(artifacts)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error listing artifacts: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/admin/artifacts/<artifact_id>/<name>', methods=['GET'])
+def admin_get_artifact_file(artifact_id, name):
+    """
+    Admin API: Download one artifact file (screenshot.jpg, page.html.gz or meta.json)
+    
+    The HTML snapshot is served decompressed.
+    """
+    data = failure_artifacts.read_artifact_file(artifact_id, name)
+    if data is None:
+        return jsonify({
+            'success': False,
+            'error': 'Artifact not found'
+        }), 404
+    return Response(data, mimetype=failure_artifacts.ARTIFACT_FILES[name])
+
+
 @app.route('/')
 def index():
     """Serve the frontend HTML"""
@@ -867,6 +1509,7 @@ if __name__ == '__main__':
     logger.info(f"Frontend: http://localhost:{PORT}")
     logger.info(f"Health Check: http://localhost:{PORT}/health")
     logger.info(f"Barcode API: http://localhost:{PORT}/api/scan-barcode")
+    logger.info(f"Metrics: http://localhost:{PORT}/metrics")
     logger.info("=" * 60)
     
     # Production mode - use gunicorn in deployment
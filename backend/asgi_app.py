@@ -0,0 +1,372 @@
+"""
+ASGI serving mode
+Serves the I/O-bound endpoints (check-in, barcode parsing, age validation,
+admin) with async handlers on an event loop, so a request waiting on Supabase
+costs a coroutine instead of a whole worker. Every other route - OCR, image
+barcode scans, QuickBase submission, static files, /metrics - is forwarded to
+the Flask app, whose handlers run on a bounded thread pool.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port $PORT --workers 1
+
+One worker is enough (the async handlers share one event loop, Flask routes
+get ASGI_WSGI_THREADS) and is what the pools are sized for: each worker
+process would start its own OCR process pool, browsers and admission limits.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+    WSGI_BRIDGE = 'a2wsgi'
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+    WSGI_BRIDGE = 'starlette'
+
+import failure_artifacts
+from checkins import checkin_new_customer_data, checkin_request_error, checkin_update_data, missing_new_customer_fields
+from customer_export import (
+    EXPORT_CONTENT_TYPES, ExportEncoder, export_filename, export_options, iter_pages_async, stream_export_async
+)
+from customer_lookup import CUSTOMER_CACHE, lookup_keys
+from idempotency import IDEMPOTENCY_HEADER, run_idempotent_async
+from app import (
+    CORS_ORIGINS, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, app as flask_app, parse_barcode_result,
+    validate_age_result, validate_ages_result
+)
+
+logger = logging.getLogger(__name__)
+
+# Threads for CPU-bound work called from async handlers (barcode parsing)
+ASGI_CPU_WORKERS = int(os.environ.get('ASGI_CPU_WORKERS', '4'))
+# Threads running forwarded Flask routes (OCR, submissions); bounds their concurrency per worker
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix='asgi-cpu')
+
+_async_supabase_manager = None
+
+
+def get_async_supabase_manager():
+    """Lazy load the async Supabase manager"""
+    global _async_supabase_manager
+    if _async_supabase_manager is None:
+        try:
+            from supabase_client import AsyncSupabaseManager
+            _async_supabase_manager = AsyncSupabaseManager()
+        except ImportError:
+            logger.warning("Supabase client not available - install supabase-py package")
+            _async_supabase_manager = None
+    return _async_supabase_manager
+
+
+def instrumented(endpoint: str):
+    """Record the same per-endpoint request metrics Flask records for its routes"""
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            start = time.perf_counter()
+            REQUESTS_IN_FLIGHT.inc(endpoint)
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                REQUESTS_IN_FLIGHT.dec(endpoint)
+                REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method, str(status))
+        return wrapper
+    return decorator
+
+
+async def read_json(request):
+    """Request JSON body, or None if it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@instrumented('/api/parse-barcode')
+async def parse_barcode(request):
+    """Async /api/parse-barcode; parsing runs on the CPU executor"""
+    try:
+        data = await read_json(request)
+        loop = asyncio.get_running_loop()
+        body, status = await loop.run_in_executor(CPU_EXECUTOR, parse_barcode_result, data)
+        return JSONResponse(body, status)
+
+    except Exception as e:
+        logger.error(f"Error parsing barcode: {str(e)}", exc_info=True)
+        return JSONResponse({
+            'success': False,
+            'error': f'Failed to parse barcode data: {str(e)}'
+        }, 500)
+
+
+@instrumented('/api/validate-age')
+async def validate_age(request):
+    """Async /api/validate-age"""
+    try:
+        body, status = validate_age_result(await read_json(request) or {})
+        return JSONResponse(body, status)
+
+    except Exception as e:
+        logger.error(f"Error validating age: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/validate-ages')
+async def validate_ages(request):
+    """Async /api/validate-ages; the batch runs on the CPU executor"""
+    try:
+        data = await read_json(request)
+        loop = asyncio.get_running_loop()
+        body, status = await loop.run_in_executor(CPU_EXECUTOR, validate_ages_result, data)
+        return JSONResponse(body, status)
+
+    except Exception as e:
+        logger.error(f"Error validating ages: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/complete-checkin')
+async def complete_checkin(request):
+    """Async /api/complete-checkin (same request and response as the Flask route)"""
+    try:
+        data = await read_json(request)
+        body, status, replayed = await run_idempotent_async(
+            '/api/complete-checkin', request.headers.get(IDEMPOTENCY_HEADER), data, complete_checkin_result)
+        headers = {'Idempotent-Replayed': 'true'} if replayed else None
+        if status == 409:
+            headers = {'Retry-After': str(body.get('retryAfter', 5))}
+        return JSONResponse(body, status, headers=headers)
+
+    except Exception as e:
+        logger.error(f"Error completing check-in: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': f'Failed to complete check-in: {str(e)}'}, 500)
+
+
+async def complete_checkin_result(data):
+    """Record a check-in; returns (response body, HTTP status)"""
+    invalid = checkin_request_error(data)
+    if invalid:
+        return invalid
+
+    supabase_manager = get_async_supabase_manager()
+    if not supabase_manager or not supabase_manager.is_configured():
+        logger.warning("Supabase not configured - check-in data not saved")
+        return {'success': False, 'error': 'Database not available'}, 500
+
+    customer_id = data.get('customerId')
+    try:
+        # Case 1: Existing customer (Application submitted or previous record)
+        if customer_id:
+            if await supabase_manager.update_customer_checkin(customer_id, checkin_update_data(data)):
+                logger.info(f"Check-in completed for customer {customer_id}")
+                return {'success': True, 'message': 'Check-in completed successfully'}, 200
+            logger.error(f"Failed to update customer {customer_id} for check-in")
+            return {'success': False, 'error': 'Failed to update customer record'}, 500
+
+        # Case 2: Existing Card Holder - update their earlier record if we have one.
+        # A failed lookup or update raises (500) rather than creating a duplicate.
+        keys = lookup_keys(data)
+        update_data = checkin_update_data(data)
+        existing_id = await supabase_manager.find_customer_id(keys)
+        if existing_id and not await supabase_manager.update_customer_checkin(existing_id, update_data):
+            # A cached id whose row is gone (now dropped from the cache): ask the database
+            existing_id = await supabase_manager.find_customer_id(keys)
+            if existing_id and not await supabase_manager.update_customer_checkin(existing_id, update_data):
+                existing_id = None
+        if existing_id:
+            logger.info(f"Check-in completed for returning customer {existing_id}")
+            return {
+                'success': True,
+                'message': 'Check-in completed successfully',
+                'customerId': existing_id,
+                'returning': True
+            }, 200
+
+        # Not seen before: create the record
+        missing = missing_new_customer_fields(data)
+        if missing:
+            return missing
+
+        new_id = await supabase_manager.store_customer(checkin_new_customer_data(data), status='checked_in')
+        if new_id:
+            logger.info(f"Created new checked-in customer: ID {new_id}")
+            return {
+                'success': True,
+                'message': 'Check-in completed successfully',
+                'customerId': new_id
+            }, 200
+        logger.error("Failed to create new customer record")
+        return {'success': False, 'error': 'Failed to create customer record'}, 500
+
+    except Exception as e:
+        logger.error(f"Supabase check-in error: {e}")
+        return {'success': False, 'error': f'Database operation failed: {str(e)}'}, 500
+
+
+@instrumented('/api/admin/customers')
+async def admin_list_customers(request):
+    """Async /api/admin/customers"""
+    try:
+        supabase_manager = get_async_supabase_manager()
+        if not supabase_manager or not supabase_manager.is_configured():
+            return JSONResponse({'success': False, 'error': 'Supabase not configured'}, 503)
+
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            limit = 100
+        customers = await supabase_manager.list_customers(limit=limit, status=request.query_params.get('status'))
+        return JSONResponse({'success': True, 'customers': customers, 'count': len(customers)})
+
+    except Exception as e:
+        logger.error(f"Error listing customers: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/admin/customers/export')
+async def admin_export_customers(request):
+    """Async /api/admin/customers/export; pages are fetched on the event loop"""
+    supabase_manager = get_async_supabase_manager()
+    if not supabase_manager or not supabase_manager.is_configured():
+        return JSONResponse({'success': False, 'error': 'Supabase not configured'}, 503)
+
+    options, error = export_options(request.query_params)
+    if error:
+        return JSONResponse({'success': False, 'error': error}, 400)
+
+    gzip = 'gzip' in request.headers.get('accept-encoding', '')
+    encoder = ExportEncoder(options['format'], options['columns'], gzip=gzip)
+    pages = iter_pages_async(
+        lambda after_id, limit: supabase_manager.customer_page(after_id, limit, options['columns'], **options['filters']),
+        after=options['after']
+    )
+    headers = {
+        'Content-Disposition': f"attachment; filename={export_filename(options['format'])}",
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept-Encoding',
+    }
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(stream_export_async(pages, encoder),
+                             media_type=EXPORT_CONTENT_TYPES[options['format']], headers=headers)
+
+
+@instrumented('/api/admin/customers/lookup')
+async def admin_lookup_customer(request):
+    """Async /api/admin/customers/lookup"""
+    try:
+        supabase_manager = get_async_supabase_manager()
+        if not supabase_manager or not supabase_manager.is_configured():
+            return JSONResponse({'success': False, 'error': 'Supabase not configured'}, 503)
+
+        keys = lookup_keys(request.query_params)
+        if not keys:
+            return JSONResponse({'success': False, 'error': 'registrationId, barcode or licenseNumber is required'}, 400)
+
+        customer_id = await supabase_manager.find_customer_id(keys)
+        customer = await supabase_manager.get_customer(customer_id) if customer_id else None
+        if customer:
+            return JSONResponse({'success': True, 'customer': customer})
+        if customer_id:
+            CUSTOMER_CACHE.forget(customer_id)
+        return JSONResponse({'success': False, 'error': 'Customer not found'}, 404)
+
+    except Exception as e:
+        logger.error(f"Error looking up customer: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/admin/customers/<int:customer_id>')
+async def admin_get_customer(request):
+    """Async /api/admin/customers/<id>"""
+    try:
+        supabase_manager = get_async_supabase_manager()
+        if not supabase_manager or not supabase_manager.is_configured():
+            return JSONResponse({'success': False, 'error': 'Supabase not configured'}, 503)
+
+        customer = await supabase_manager.get_customer(request.path_params['customer_id'])
+        if customer:
+            return JSONResponse({'success': True, 'customer': customer})
+        return JSONResponse({'success': False, 'error': 'Customer not found'}, 404)
+
+    except Exception as e:
+        logger.error(f"Error getting customer: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/admin/artifacts')
+async def admin_list_artifacts(request):
+    """Async /api/admin/artifacts (directory scan runs on the CPU executor)"""
+    try:
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            limit = 100
+        loop = asyncio.get_running_loop()
+        artifacts = await loop.run_in_executor(
+            CPU_EXECUTOR, failure_artifacts.list_artifacts, request.query_params.get('submissionId'), limit)
+        return JSONResponse({'success': True, 'artifacts': artifacts, 'count': len(artifacts)})
+
+    except Exception as e:
+        logger.error(f"Error listing artifacts: {str(e)}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+@instrumented('/api/admin/artifacts/<artifact_id>/<name>')
+async def admin_get_artifact_file(request):
+    """Async /api/admin/artifacts/<id>/<file>"""
+    name = request.path_params['name']
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(
+        CPU_EXECUTOR, failure_artifacts.read_artifact_file, request.path_params['artifact_id'], name)
+    if data is None:
+        return JSONResponse({'success': False, 'error': 'Artifact not found'}, 404)
+    return Response(data, media_type=failure_artifacts.ARTIFACT_FILES[name])
+
+
+def create_asgi_app() -> Starlette:
+    """Async routes first; anything they don't match falls through to Flask"""
+    if WSGI_BRIDGE == 'a2wsgi':
+        flask_bridge = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+    else:
+        flask_bridge = WSGIMiddleware(flask_app)
+
+    routes = [
+        Route('/api/parse-barcode', parse_barcode, methods=['POST']),
+        Route('/api/validate-age', validate_age, methods=['POST']),
+        Route('/api/validate-ages', validate_ages, methods=['POST']),
+        Route('/api/complete-checkin', complete_checkin, methods=['POST']),
+        Route('/api/admin/customers', admin_list_customers, methods=['GET']),
+        Route('/api/admin/customers/export', admin_export_customers, methods=['GET']),
+        Route('/api/admin/customers/lookup', admin_lookup_customer, methods=['GET']),
+        Route('/api/admin/customers/{customer_id:int}', admin_get_customer, methods=['GET']),
+        Route('/api/admin/artifacts', admin_list_artifacts, methods=['GET']),
+        Route('/api/admin/artifacts/{artifact_id}/{name}', admin_get_artifact_file, methods=['GET']),
+        Mount('/', app=flask_bridge),
+    ]
+    middleware = [
+        Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['*'], allow_headers=['*']),
+    ]
+    logger.info(f"ASGI app ready ({len(routes) - 1} async routes, Flask via {WSGI_BRIDGE} "
+                f"with {ASGI_WSGI_THREADS} threads)")
+    return Starlette(routes=routes, middleware=middleware)
+
+
+app = create_asgi_app()
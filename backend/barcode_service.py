@@ -5,16 +5,16 @@ Parses AAMVA-compliant driver's license data
 """
 
 import re
-import base64
-import io
 import os
-import random
-import json
+import time
 import logging
-from datetime import datetime
 from typing import Dict, Tuple, Optional
-from PIL import Image, ImageEnhance
+from PIL import Image
 import numpy as np
+from age_eligibility import normalize_dob
+from dc_address_pool import sample_dc_address
+from image_decode import decode_base64_image
+from metrics import observe, span, timed
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -47,10 +47,28 @@ except Exception as e:
     PYZBAR_AVAILABLE = False
     logger.warning(f"pyzbar not available: {e}")
 
-# Load DC addresses for non-DC IDs (use absolute path for production compatibility)
-_dc_addresses_path = os.path.join(os.path.dirname(__file__), 'dc_addresses.json')
-with open(_dc_addresses_path, 'r') as f:
-    DC_ADDRESSES = json.load(f)['addresses']
+# OpenCV - preprocessing (ROI crop, sharpening, thresholds, rotations)
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except Exception as e:
+    CV2_AVAILABLE = False
+    logger.warning(f"OpenCV not available: {e}")
+
+# Longest image side kept when decoding uploads for barcode scanning.
+# 2048 lets a 12MP (4032px) JPEG decode at half DCT scale.
+BARCODE_MAX_DIMENSION = int(os.environ.get('BARCODE_MAX_DIMENSION', '2048'))
+
+# PDF417 localization: detection image size, accepted stripe shape and the
+# crop width handed to the decoders
+PDF417_DETECT_SIZE = 800
+PDF417_MIN_AREA_FRACTION = 0.01
+PDF417_MIN_ASPECT = 2.0
+PDF417_MAX_ASPECT = 8.0
+PDF417_TARGET_WIDTH = 1200
+
+# Sharpening kernel for slightly out-of-focus photos
+SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], dtype=np.float32)
 
 
 # AAMVA Field Mappings (based on AAMVA DL/ID Card Design Standard)
@@ -97,58 +115,64 @@ AAMVA_FIELDS = {
 }
 
 
-def process_barcode_image(image_base64: str) -> Image.Image:
+def process_barcode_image(image_base64: str) -> np.ndarray:
     """
-    Convert base64 image to PIL Image for barcode scanning
+    Convert base64 image to a grayscale uint8 array for barcode scanning
+    
+    JPEGs are decoded straight to grayscale and, for large phone photos, at
+    reduced DCT scale - the decoders only ever look at luminance.
     """
-    if ',' in image_base64:
-        image_base64 = image_base64.split(',')[1]
-    
-    image_bytes = base64.b64decode(image_base64)
-    image = Image.open(io.BytesIO(image_bytes))
-    
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Save debug image to see what we're working with
-    # DISABLED for production/clean UX
-    # try:
-    #     import time
-    #     import os
-    #     debug_dir = os.path.join(os.path.dirname(__file__), 'debug_images')
-    #     os.makedirs(debug_dir, exist_ok=True)
-    #     debug_path = os.path.join(debug_dir, f'barcode_input_{int(time.time())}.jpg')
-    #     image.save(debug_path, 'JPEG', quality=95)
-    #     logger.info(f"Saved debug image ({image.size}) to {debug_path}")
-    # except Exception as e:
-    #     logger.debug(f"Could not save debug image: {e}")
-            
-    logger.info(f"Barcode image processed: {image.size}")
-    return image
+    image = decode_base64_image(
+        image_base64,
+        max_dimension=BARCODE_MAX_DIMENSION,
+        mode='L',
+        resample=Image.Resampling.BOX
+    )
+    gray = as_gray_array(image)
+    logger.info(f"Barcode image processed: {gray.shape[1]}x{gray.shape[0]}")
+    return gray
+
+
+def as_gray_array(image) -> np.ndarray:
+    """
+    Return a C-contiguous 2D uint8 grayscale array for a PIL Image or array
+    
+    Arrays that are already contiguous grayscale are returned as-is.
+    """
+    if isinstance(image, Image.Image):
+        if image.mode != 'L':
+            image = image.convert('L')
+        return np.asarray(image)
+    
+    array = np.asarray(image, dtype=np.uint8)
+    if array.ndim == 3:
+        if CV2_AVAILABLE:
+            code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+            array = cv2.cvtColor(array, code)
+        else:
+            array = array[..., :3].mean(axis=2).astype(np.uint8)
+    return np.ascontiguousarray(array)
 
 
-def crop_to_id_card(image: Image.Image) -> Optional[Image.Image]:
+def crop_to_id_card(gray: np.ndarray) -> Optional[np.ndarray]:
     """
     Attempt to detect ID card boundary and crop to it using OpenCV.
     Returns None if no clear card boundary found.
     """
+    if not CV2_AVAILABLE:
+        return None
+    
     try:
-        import cv2
-        import numpy as np
-
-        # Convert to cv2
-        img_cv = np.array(image)
-        img_cv = cv2.cvtColor(img_cv, cv2.COLOR_RGB2BGR)
+        height, width = gray.shape
 
         # Preprocessing
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
         blur = cv2.GaussianBlur(gray, (5, 5), 0)
 
         # Edge detection
         edged = cv2.Canny(blur, 75, 200)
 
-        # Find contours
-        contours, _ = cv2.findContours(edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Find contours (OpenCV 4 leaves the source image untouched)
+        contours, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         if not contours:
             return None
@@ -158,7 +182,7 @@ def crop_to_id_card(image: Image.Image) -> Optional[Image.Image]:
 
         # Find the largest rectangular contour that looks like an ID
         card_contour = None
-        img_area = image.width * image.height
+        img_area = width * height
 
         for c in contours[:5]: # Check top 5 largest
             peri = cv2.arcLength(c, True)
@@ -179,11 +203,11 @@ def crop_to_id_card(image: Image.Image) -> Optional[Image.Image]:
             padding = 20
             x = max(0, x - padding)
             y = max(0, y - padding)
-            w = min(image.width - x, w + (padding * 2))
-            h = min(image.height - y, h + (padding * 2))
+            w = min(width - x, w + (padding * 2))
+            h = min(height - y, h + (padding * 2))
 
-            # Crop
-            cropped = image.crop((x, y, x+w, y+h))
+            # Crop (one contiguous copy, reused by every variant built from it)
+            cropped = np.ascontiguousarray(gray[y:y+h, x:x+w])
             logger.info(f"Smart ROI: Cropped to detected card ({w}x{h})")
             return cropped
 
@@ -193,109 +217,243 @@ def crop_to_id_card(image: Image.Image) -> Optional[Image.Image]:
     return None
 
 
-def preprocess_for_barcode(image: Image.Image) -> list:
+def locate_pdf417(gray: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
     """
-    Create multiple preprocessed versions of image for better barcode detection using OpenCV.
-    PDF417 barcodes need good contrast and proper orientation.
-    Optimized for mobile photos where barcode may be near edge of frame.
+    Find the PDF417 stripe in a grayscale image and return a tight, deskewed crop.
+    
+    The barcode is the largest block of dense, high-gradient texture on the
+    back of an ID. Detection runs on a downscaled copy: gradient magnitude,
+    blur + Otsu threshold, then morphological closing merges the bars into one
+    blob whose minimum-area rectangle gives the position and skew angle. The
+    crop is taken from the full-resolution image, rotated so the long axis is
+    horizontal and rescaled to a width the decoders handle well.
+    
+    Returns:
+        Tuple of (crop, angle in degrees) or None if no barcode-like region found
     """
+    if not CV2_AVAILABLE:
+        return None
+    
     try:
-        import cv2
-        import numpy as np
-    except ImportError:
-        logger.warning("OpenCV not available for preprocessing")
-        # Return basic grayscale if CV2 is missing
-        return [(image.convert('L'), "pil_gray")]
-    
-    # Limit variants to the most effective ones for speed
-    variants = []
-    
-    # 0. Check Orientation
-    is_portrait = image.height > image.width
-
-    # 1. Smart ROI Crop (First priority)
-    # If we can find the card, crop to it. This improves resolution effectively.
-    roi_image = crop_to_id_card(image)
-    if roi_image:
-        variants.append((roi_image, "smart_roi_crop"))
-        # Use the cropped image as base for subsequent operations if found
-        base_image = roi_image
-    else:
-        base_image = image
-
-    # Convert PIL directly to numpy for OpenCV ops
-    img_cv = np.array(base_image)
-    if len(img_cv.shape) == 3:
-        # Check RGB vs BGR (PIL is RGB, OpenCV assumes BGR for some ops, but for gray it matters)
-        # Using cv2.COLOR_RGB2GRAY since PIL is RGB
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = img_cv
-        
-    height, width = gray.shape
-
-    # 2. Grayscale (Native) - Basic
-    variants.append((Image.fromarray(gray), "cv_gray"))
-    
-    # CRITICAL: If portrait, add 90-degree rotation IMMEDIATELY
-    # Most barcode scanners work best with horizontal barcodes
-    if is_portrait:
-        rotated_90 = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
-        variants.append((Image.fromarray(rotated_90), "cv_gray_rotated_90_priority"))
-
-    # 3. Sharpening (Helpful for slightly blurry focus)
-    kernel_sharpen = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-    sharpened = cv2.filter2D(gray, -1, kernel_sharpen)
-    variants.append((Image.fromarray(sharpened), "cv_sharpened"))
-
-    # 4. Thresholding (very effective for barcodes)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                   cv2.THRESH_BINARY, 21, 10)
-    variants.append((Image.fromarray(thresh), "cv_adaptive_thresh"))
-    
-    # 5. Standardized Scale (Resize to ~1000px width if very large)
-    # High resolution can sometimes introduce noise or be too slow
-    if width > 1500:
-        scale_factor = 1280 / width
-        new_width = 1280
-        new_height = int(height * scale_factor)
-        downscaled = cv2.resize(gray, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        variants.append((Image.fromarray(downscaled), "cv_downscaled_1280"))
-
-    # 6. Upscaled (only if small and needed)
-    if width < 1000: # Lowered threshold, but kept logic
-         upscaled = cv2.resize(gray, (width*2, height*2), interpolation=cv2.INTER_CUBIC)
-         variants.append((Image.fromarray(upscaled), "cv_upscaled_2x"))
-
-    # 7. Smart Rotation (0, 90, 180, 270)
-    # Only rotate the best candidates (Gray and Threshold) to save time
-    for angle in [90, 180, 270]:
-        # Skip 90 if we already did it for portrait
-        if is_portrait and angle == 90:
-            # We already added cv_gray_rotated_90_priority, but we might want thresh version
-            pass
-
-        if angle == 90:
-            rotated = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
-            rotated_thresh = cv2.rotate(thresh, cv2.ROTATE_90_CLOCKWISE)
-        elif angle == 180:
-            rotated = cv2.rotate(gray, cv2.ROTATE_180)
-            rotated_thresh = cv2.rotate(thresh, cv2.ROTATE_180)
-        elif angle == 270:
-            rotated = cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            rotated_thresh = cv2.rotate(thresh, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-        variants.append((Image.fromarray(rotated), f"cv_rotated_{angle}"))
-        variants.append((Image.fromarray(rotated_thresh), f"cv_rotated_{angle}_thresh"))
-
-    return variants
-
-
-def decode_barcode_zxing(image: Image.Image) -> Optional[str]:
+        height, width = gray.shape
+        scale = min(1.0, PDF417_DETECT_SIZE / max(height, width))
+        small = cv2.resize(gray, (int(width * scale), int(height * scale)),
+                           interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+        
+        # Dense bar/space transitions give strong gradients in every orientation
+        grad_x = cv2.Sobel(small, cv2.CV_16S, 1, 0, ksize=-1)
+        grad_y = cv2.Sobel(small, cv2.CV_16S, 0, 1, ksize=-1)
+        gradient = cv2.addWeighted(cv2.convertScaleAbs(grad_x), 0.5, cv2.convertScaleAbs(grad_y), 0.5, 0)
+        del grad_x, grad_y
+        
+        blurred = cv2.blur(gradient, (7, 7))
+        _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        mask = cv2.erode(mask, None, iterations=3)
+        mask = cv2.dilate(mask, None, iterations=3)
+        
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+        
+        min_area = PDF417_MIN_AREA_FRACTION * small.shape[0] * small.shape[1]
+        best = None
+        for c in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            area = cv2.contourArea(c)
+            if area < min_area:
+                break
+            (cx, cy), (rw, rh), angle = cv2.minAreaRect(c)
+            if rw < 1 or rh < 1:
+                continue
+            aspect = max(rw, rh) / min(rw, rh)
+            # PDF417 on IDs is a wide stripe (roughly 2:1 to 8:1) that fills its box
+            if not (PDF417_MIN_ASPECT <= aspect <= PDF417_MAX_ASPECT):
+                continue
+            if area / (rw * rh) < 0.6:
+                continue
+            best = ((cx, cy), (rw, rh), angle)
+            break
+        
+        if best is None:
+            return None
+        
+        (cx, cy), (rw, rh), angle = best
+        # Make the long side horizontal
+        if rw < rh:
+            rw, rh = rh, rw
+            angle += 90
+        if angle > 90:
+            angle -= 180
+        
+        # Back to full resolution, with a quiet-zone margin
+        cx, cy = cx / scale, cy / scale
+        rw, rh = rw / scale * 1.15 + 20, rh / scale * 1.25 + 20
+        
+        # Rotate only a window around the barcode rather than the whole photo
+        radius = int(np.hypot(rw, rh) / 2) + 2
+        x0, y0 = max(0, int(cx) - radius), max(0, int(cy) - radius)
+        x1, y1 = min(width, int(cx) + radius), min(height, int(cy) + radius)
+        window = gray[y0:y1, x0:x1]
+        
+        # Output width chosen to give the decoders ~3-4 px per module
+        out_scale = PDF417_TARGET_WIDTH / rw if rw > PDF417_TARGET_WIDTH * 1.3 or rw < PDF417_TARGET_WIDTH / 2 else 1.0
+        matrix = cv2.getRotationMatrix2D((cx - x0, cy - y0), angle, out_scale)
+        out_w, out_h = int(rw * out_scale), int(rh * out_scale)
+        matrix[0, 2] += out_w / 2 - (cx - x0)
+        matrix[1, 2] += out_h / 2 - (cy - y0)
+        interpolation = cv2.INTER_AREA if out_scale < 1.0 else cv2.INTER_CUBIC
+        crop = cv2.warpAffine(window, matrix, (out_w, out_h), flags=interpolation,
+                              borderMode=cv2.BORDER_REPLICATE)
+        
+        logger.info(f"PDF417 located at ({int(cx)}, {int(cy)}), angle {angle:.1f}°, crop {out_w}x{out_h}")
+        return crop, angle
+    
+    except Exception as e:
+        logger.warning(f"PDF417 localization failed: {e}")
+        return None
+
+
+class BarcodeVariants:
+    """
+    Lazily built preprocessing variants of one grayscale image
+    
+    Variants are produced on demand, in priority order, and cached so every
+    decode engine shares the same buffers. Decoding usually succeeds on an
+    early variant, so later ones (thresholds, rescales, rotations) are never
+    allocated. Each entry is (array, name, rotated); rotations of 180 degrees
+    are views of the source array.
+    """
+    
+    def __init__(self, gray: np.ndarray):
+        self.gray = gray
+        self.height, self.width = gray.shape
+        self._cache = []
+        self._source = self._generate()
+    
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self._cache):
+                start = time.perf_counter()
+                try:
+                    variant = next(self._source)
+                except StopIteration:
+                    return
+                observe('barcode_preprocess', variant[1], time.perf_counter() - start)
+                self._cache.append(variant)
+            yield self._cache[index]
+            index += 1
+    
+    def __len__(self):
+        return len(self._cache)
+    
+    def upright(self):
+        """Iterate only the unrotated variants"""
+        return (v for v in self if not v[2])
+    
+    def _generate(self):
+        """
+        Create multiple preprocessed versions of image for better barcode detection using OpenCV.
+        PDF417 barcodes need good contrast and proper orientation.
+        Optimized for mobile photos where barcode may be near edge of frame.
+        """
+        # 0. Check Orientation
+        is_portrait = self.height > self.width
+        
+        if not CV2_AVAILABLE:
+            logger.warning("OpenCV not available for preprocessing")
+            yield self.gray, "gray", False
+            for k in (3, 2, 1):
+                yield np.rot90(self.gray, k), f"rotated_{90 * (4 - k)}", True
+            return
+        
+        # 1. Localized PDF417 stripe (First priority)
+        # A tight, deskewed crop usually decodes first. The deskew angle can't
+        # tell an upside-down stripe from an upright one, so the crop is also
+        # tried at 180; the whole-image variants below stay as a lazy fallback.
+        located = locate_pdf417(self.gray)
+        if located is not None:
+            crop, _ = located
+            yield crop, "pdf417_localized", False
+            yield cv2.adaptiveThreshold(cv2.GaussianBlur(crop, (3, 3), 0), 255,
+                                        cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                        21, 10), "pdf417_localized_thresh", False
+            yield crop[::-1, ::-1], "pdf417_localized_rotated_180", True
+        
+        # 2. Smart ROI Crop
+        # If we can find the card, crop to it. This improves resolution effectively.
+        roi = crop_to_id_card(self.gray)
+        if roi is not None:
+            gray = roi
+            yield gray, "smart_roi_crop", False
+        else:
+            gray = self.gray
+            # Grayscale (Native) - Basic
+            yield gray, "cv_gray", False
+        
+        height, width = gray.shape
+        
+        # CRITICAL: If portrait, add 90-degree rotation IMMEDIATELY
+        # Most barcode scanners work best with horizontal barcodes
+        if is_portrait:
+            yield cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE), "cv_gray_rotated_90_priority", True
+        
+        # 3. Sharpening (Helpful for slightly blurry focus)
+        yield cv2.filter2D(gray, -1, SHARPEN_KERNEL), "cv_sharpened", False
+        
+        # 4. Thresholding (very effective for barcodes)
+        blur = cv2.GaussianBlur(gray, (5, 5), 0)
+        thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, 21, 10)
+        del blur
+        yield thresh, "cv_adaptive_thresh", False
+        
+        # 5. Standardized Scale (Resize to ~1280px width if very large)
+        # High resolution can sometimes introduce noise or be too slow
+        if width > 1500:
+            new_height = int(height * 1280 / width)
+            yield cv2.resize(gray, (1280, new_height), interpolation=cv2.INTER_AREA), "cv_downscaled_1280", False
+        
+        # 6. Upscaled (only if small and needed)
+        if width < 1000:
+            yield cv2.resize(gray, (width*2, height*2), interpolation=cv2.INTER_CUBIC), "cv_upscaled_2x", False
+        
+        # 7. Rotation sweep (90, 180, 270) of the best candidates (Gray and Threshold).
+        # 180 is a strided view; 90/270 need a transpose so OpenCV writes them once.
+        for angle, code in ((90, cv2.ROTATE_90_CLOCKWISE), (180, None), (270, cv2.ROTATE_90_COUNTERCLOCKWISE)):
+            if code is None:
+                yield gray[::-1, ::-1], f"cv_rotated_{angle}", True
+                yield thresh[::-1, ::-1], f"cv_rotated_{angle}_thresh", True
+            else:
+                yield cv2.rotate(gray, code), f"cv_rotated_{angle}", True
+                yield cv2.rotate(thresh, code), f"cv_rotated_{angle}_thresh", True
+
+
+def preprocess_for_barcode(image) -> BarcodeVariants:
+    """
+    Create the lazily-evaluated preprocessing variants for an image
+    
+    Accepts a PIL Image or a NumPy array; see BarcodeVariants.
+    """
+    return BarcodeVariants(as_gray_array(image))
+
+
+def _get_variants(image) -> BarcodeVariants:
+    """Reuse variants when the caller already built them"""
+    if isinstance(image, BarcodeVariants):
+        return image
+    return preprocess_for_barcode(image)
+
+
+def decode_barcode_zxing(image) -> Optional[str]:
     """
     Decode PDF417 barcode using zxing-cpp with multiple preprocessing attempts.
     ONLY accepts PDF417 format - ignores other barcode types like DataBar, QR, etc.
+    
+    zxing-cpp reads NumPy buffers directly and searches rotations itself
+    (try_rotate), so only the upright variants are handed to it.
     """
     if not ZXING_AVAILABLE:
         return None
@@ -304,48 +462,33 @@ def decode_barcode_zxing(image: Image.Image) -> Optional[str]:
         import time
         start_time = time.time()
         
-        # Get preprocessed variants (Now returns PIL images)
-        variants = preprocess_for_barcode(image)
+        variants = _get_variants(image)
+        tried = 0
         
-        for img, variant_name in variants:
+        for img, variant_name, _ in variants.upright():
+            tried += 1
             try:
-                # Try with different zxing options
-                # zxing-cpp python usually accepts PIL Image directly
-                results = zxingcpp.read_barcodes(img)
-                
-                if results:
-                    for result in results:
-                        # CRITICAL: Only accept PDF417 barcodes for driver's licenses
-                        format_name = result.format.name.upper() if hasattr(result.format, 'name') else str(result.format).upper()
-                        
-                        if 'PDF417' not in format_name and 'PDF_417' not in format_name:
-                            logger.debug(f"Ignoring non-PDF417 barcode: {format_name}")
-                            continue
-                        
-                        barcode_text = result.text
-                        if barcode_text and len(barcode_text) > 20:  # Relaxed length check slightly, usually > 50
-                            elapsed = time.time() - start_time
-                            logger.info(f"✅ zxing-cpp decoded PDF417 via {variant_name} in {elapsed:.3f}s ({len(barcode_text)} chars)")
-                            return barcode_text
-                    
+                results = zxingcpp.read_barcodes(img, formats=zxingcpp.BarcodeFormat.PDF417, try_rotate=True)
             except Exception as e:
-                # Fallback: Convert to numpy if PIL fails
-                try:
-                    results = zxingcpp.read_barcodes(np.array(img))
-                    if results:
-                        for result in results:
-                            format_name = result.format.name.upper() if hasattr(result.format, 'name') else str(result.format).upper()
-                            if 'PDF417' in format_name or 'PDF_417' in format_name:
-                                barcode_text = result.text
-                                if barcode_text and len(barcode_text) > 20:
-                                    logger.info(f"✅ zxing-cpp decoded PDF417 via {variant_name} (numpy fallback)")
-                                    return barcode_text
-                except Exception:
-                    logger.debug(f"zxing variant {variant_name} failed: {e}")
+                logger.debug(f"zxing variant {variant_name} failed: {e}")
                 continue
+            
+            for result in results:
+                # CRITICAL: Only accept PDF417 barcodes for driver's licenses
+                format_name = result.format.name.upper() if hasattr(result.format, 'name') else str(result.format).upper()
+                
+                if 'PDF417' not in format_name and 'PDF_417' not in format_name:
+                    logger.debug(f"Ignoring non-PDF417 barcode: {format_name}")
+                    continue
+                
+                barcode_text = result.text
+                if barcode_text and len(barcode_text) > 20:  # Relaxed length check slightly, usually > 50
+                    elapsed = time.time() - start_time
+                    logger.info(f"✅ zxing-cpp decoded PDF417 via {variant_name} in {elapsed:.3f}s ({len(barcode_text)} chars)")
+                    return barcode_text
         
         elapsed = time.time() - start_time
-        logger.warning(f"zxing-cpp found no PDF417 barcodes after trying {len(variants)} variants in {elapsed:.3f}s")
+        logger.warning(f"zxing-cpp found no PDF417 barcodes after trying {tried} variants in {elapsed:.3f}s")
         return None
             
     except Exception as e:
@@ -353,7 +496,7 @@ def decode_barcode_zxing(image: Image.Image) -> Optional[str]:
         return None
 
 
-def decode_barcode_pdf417decoder(image: Image.Image) -> Optional[str]:
+def decode_barcode_pdf417decoder(image) -> Optional[str]:
     """
     Decode PDF417 barcode using pdf417decoder (specialized for driver's licenses)
     """
@@ -364,26 +507,21 @@ def decode_barcode_pdf417decoder(image: Image.Image) -> Optional[str]:
         import time
         start_time = time.time()
         
-        # pdf417decoder works with PIL images directly
-        # Use a timeout logic? No, just limit variants.
-        
         # Try with preprocessed variants (but strictly limit attempts to prevent timeout)
         # Limit to 2 variants max for pdf417decoder as it is very slow
-        variants = preprocess_for_barcode(image)
-
-        # Prioritize 90 degree rotation for pdf417decoder if portrait, as it handles rotation poorly
-        is_portrait = image.height > image.width
+        variants = _get_variants(image)
 
         count = 0
-        for img, variant_name in variants:
+        for img, variant_name, _ in variants:
             if count >= 2: break # strict limit
 
             # Skip high res images for pdf417decoder - it chokes on them
-            if img.width > 1500 or img.height > 1500:
+            if img.shape[1] > 1500 or img.shape[0] > 1500:
                 continue
 
             try:
-                decoder = PDF417Decoder(img)
+                # pdf417decoder only takes PIL images; convert just this variant
+                decoder = PDF417Decoder(Image.fromarray(img))
                 if decoder.decode() > 0:
                     barcode_text = decoder.barcode_data_index_to_string(0)
                     if barcode_text and len(barcode_text) > 20:
@@ -403,7 +541,7 @@ def decode_barcode_pdf417decoder(image: Image.Image) -> Optional[str]:
         return None
 
 
-def decode_barcode_pyzbar(image: Image.Image) -> Optional[str]:
+def decode_barcode_pyzbar(image) -> Optional[str]:
     """
     Decode PDF417 barcode using pyzbar (secondary engine)
     """
@@ -411,13 +549,10 @@ def decode_barcode_pyzbar(image: Image.Image) -> Optional[str]:
         import time
         start_time = time.time()
         
-        # Preprocessing can help pyzbar too
-        # But for speed, let's just try the base image and maybe one rotation
-        # Or better, iterate through a few key variants since pyzbar is fast
-        
-        variants = preprocess_for_barcode(image)
-        # Try top 3 variants
-        for i, (img, variant_name) in enumerate(variants):
+        # pyzbar is fast, so iterate through the top few variants.
+        # It takes 2D uint8 arrays directly.
+        variants = _get_variants(image)
+        for i, (img, variant_name, _) in enumerate(variants):
             if i > 3: break
             
             results = pyzbar.decode(img)
@@ -442,30 +577,37 @@ def decode_barcode_pyzbar(image: Image.Image) -> Optional[str]:
         return None
 
 
-def decode_barcode(image: Image.Image) -> Tuple[Optional[str], str]:
+def decode_barcode(image) -> Tuple[Optional[str], str]:
     """
     Decode barcode using multiple engines in order of preference:
     1. zxing-cpp (fastest & most accurate)
     2. pyzbar (fast fallback)
     3. pdf417decoder (slowest, last resort)
+    
+    The preprocessing variants are built once and shared by all engines.
     """
+    variants = _get_variants(image)
+    
     # 1. Try zxing-cpp first (fast and accurate)
     if ZXING_AVAILABLE:
-        barcode_text = decode_barcode_zxing(image)
+        with span('barcode_engine', 'zxing-cpp'):
+            barcode_text = decode_barcode_zxing(variants)
         if barcode_text:
             return barcode_text, 'zxing-cpp'
         logger.info("zxing-cpp failed, trying pyzbar...")
     
     # 2. Try pyzbar (fast fallback)
     if PYZBAR_AVAILABLE:
-        barcode_text = decode_barcode_pyzbar(image)
+        with span('barcode_engine', 'pyzbar'):
+            barcode_text = decode_barcode_pyzbar(variants)
         if barcode_text:
             return barcode_text, 'pyzbar'
         logger.info("pyzbar failed, trying pdf417decoder...")
 
     # 3. Try pdf417decoder (specialized but slow)
     if PDF417_AVAILABLE:
-        barcode_text = decode_barcode_pdf417decoder(image)
+        with span('barcode_engine', 'pdf417decoder'):
+            barcode_text = decode_barcode_pdf417decoder(variants)
         if barcode_text:
             return barcode_text, 'pdf417decoder'
         logger.error("pdf417decoder also failed")
@@ -473,6 +615,58 @@ def decode_barcode(image: Image.Image) -> Tuple[Optional[str], str]:
     return None, 'none'
 
 
+# List of known AAMVA Element IDs to use as delimiters
+# This prevents values like "David" (starts with Da) from being cut off,
+# because 'DAV' is not in this list, but 'Dad' (Middle Name) is.
+AAMVA_DELIMITER_CODES = [
+    'DCA', 'DCB', 'DCD', 'DBA', 'DCS', 'DAC', 'DAD', 'DBD', 'DBB', 'DBC', 
+    'DAY', 'DAU', 'DAG', 'DAI', 'DAJ', 'DAK', 'DAQ', 'DCF', 'DCG', 'DDE', 
+    'DDF', 'DDG', 'DAH', 'DAZ', 'DCI', 'DCJ', 'DCM', 'DCN', 'DCO', 'DCP', 
+    'DCQ', 'DCR', 'DDA', 'DDB', 'DDC', 'DDD', 'DAW', 'DAX', 'DCE', 'DCL', 
+    'DAA', 'DAB', 'DAE', 'DAF', 'DAM', 'DAN', 'DAO', 'DAR', 'DAS', 'DAT',
+    'Dbf', 'Dbg' # Some extra codes sometimes seen
+]
+
+# Map of Code -> Field Name extracted by parse_aamva_barcode
+AAMVA_PARSE_FIELDS = {
+    'DCS': 'lastName',
+    'DAC': 'firstName',
+    'DAD': 'middleName',
+    'DBB': 'dateOfBirth',
+    'DAG': 'street',
+    'DAH': 'street2',
+    'DAI': 'city',
+    'DAJ': 'state',
+    'DAK': 'zip',
+    'DAQ': 'licenseNumber',
+    'DBC': 'sex',
+    'DAY': 'eyeColor',
+    'DAU': 'height'
+}
+
+# Regex explanation:
+# {code}        : The specific field code we want (e.g. DAC)
+# \s*           : Optional whitespace
+# (.*?)         : Non-greedy capture of the value
+# (?=           : Positive lookahead (stop when we see...)
+#   [\n\r\x1e]  : A standard delimiter (newline, return, RS)
+#   |           : OR
+#   (?:...codes): Any valid AAMVA code (case insensitive due to re.I)
+#   |           : OR
+#   $           : End of string
+# )
+# IGNORECASE handles mixed case codes like 'Dac' or 'Dad' seen in wild.
+# Compiled once at import - this parser sits behind /api/parse-barcode.
+_KNOWN_CODES_PATTERN = '|'.join(AAMVA_DELIMITER_CODES)
+AAMVA_FIELD_PATTERNS = [
+    (code, field, re.compile(rf'({code})\s*(.*?)(?=[\n\r\x1e]|(?:{_KNOWN_CODES_PATTERN})|$)', re.IGNORECASE))
+    for code, field in AAMVA_PARSE_FIELDS.items()
+]
+_LF_LITERAL = re.compile(r'<lf>', re.IGNORECASE)
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+
+@timed('barcode_parse', 'aamva')
 def parse_aamva_barcode(barcode_text: str) -> Dict:
     """
     Parse AAMVA-compliant barcode data from driver's license
@@ -488,113 +682,47 @@ def parse_aamva_barcode(barcode_text: str) -> Dict:
     """
     logger.info(f"Parsing AAMVA barcode data ({len(barcode_text)} chars)")
     
-    clean_text = barcode_text
     parsed_data = {}
     
-    # List of known AAMVA Element IDs to use as delimiters
-    # This prevents values like "David" (starts with Da) from being cut off,
-    # because 'DAV' is not in this list, but 'Dad' (Middle Name) is.
-    aamva_codes = [
-        'DCA', 'DCB', 'DCD', 'DBA', 'DCS', 'DAC', 'DAD', 'DBD', 'DBB', 'DBC', 
-        'DAY', 'DAU', 'DAG', 'DAI', 'DAJ', 'DAK', 'DAQ', 'DCF', 'DCG', 'DDE', 
-        'DDF', 'DDG', 'DAH', 'DAZ', 'DCI', 'DCJ', 'DCM', 'DCN', 'DCO', 'DCP', 
-        'DCQ', 'DCR', 'DDA', 'DDB', 'DDC', 'DDD', 'DAW', 'DAX', 'DCE', 'DCL', 
-        'DAA', 'DAB', 'DAE', 'DAF', 'DAM', 'DAN', 'DAO', 'DAR', 'DAS', 'DAT',
-        'Dbf', 'Dbg' # Some extra codes sometimes seen
-    ]
-    
-    # Build lookahead pattern for ANY of these codes
-    # (?=...) checks for presence without consuming
-    # We match: Code + Value + (Lookahead for Next Code OR Terminator OR EndOfString)
-    
-    known_codes_pattern = '|'.join(aamva_codes)
-    
-    # Map of Code -> Field Name
-    field_map = {
-        'DCS': 'lastName',
-        'DAC': 'firstName',
-        'DAD': 'middleName',
-        'DBB': 'dateOfBirth',
-        'DAG': 'street',
-        'DAH': 'street2',
-        'DAI': 'city',
-        'DAJ': 'state',
-        'DAK': 'zip',
-        'DAQ': 'licenseNumber',
-        'DBC': 'sex',
-        'DAY': 'eyeColor',
-        'DAU': 'height'
-    }
-    
-    # We iterate nicely through our expected fields
-    for code, field in field_map.items():
-        # Regex explanation:
-        # {code}        : The specific field code we want (e.g. DAC)
-        # \s*           : Optional whitespace
-        # (.*?)         : Non-greedy capture of the value
-        # (?=           : Positive lookahead (stop when we see...)
-        #   [\n\r\x1e]  : A standard delimiter (newline, return, RS)
-        #   |           : OR
-        #   (?:...codes): Any valid AAMVA code (case insensitive due to re.I)
-        #   |           : OR
-        #   $           : End of string
-        # )
-        
-        pattern = rf'({code})\s*(.*?)(?=[\n\r\x1e]|(?:{known_codes_pattern})|$)'
-        
-        # Use IGNORECASE to handle mixed case codes like 'Dac' or 'Dad' seen in wild
-        match = re.search(pattern, clean_text, re.IGNORECASE)
+    for code, field, pattern in AAMVA_FIELD_PATTERNS:
+        match = pattern.search(barcode_text)
             
         if match:
             value = match.group(2).strip()
             
             # Aggressively clean up:
             # 1. Remove literal "<Lf>" or "<LF>" or "<lf>"
-            value = re.sub(r'<lf>', '', value, flags=re.IGNORECASE)
+            value = _LF_LITERAL.sub('', value)
             # 2. Remove all control characters (non-printable) except space
             # \x00-\x1f are standard ASCII control chars
-            value = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', value)
+            value = _CONTROL_CHARS.sub('', value)
             
             value = value.strip()
             
             if value:
                 parsed_data[field] = value
-                logger.info(f"Found {field} ({code}): {value}")
+                # Field values are PII - keep them out of production logs
+                logger.debug(f"Found {field} ({code}): {value}")
 
+    logger.info(f"Parsed AAMVA fields: {list(parsed_data.keys())}")
     return parsed_data
 
-def format_date(date_str: str, input_format: str = 'MMDDYYYY') -> str:
+def format_date(date_str: str) -> str:
     """
     Convert date from AAMVA format to YYYY-MM-DD
     
     Args:
-        date_str: Date string (e.g., "02121990" for Feb 12, 1990)
-        input_format: Format of input date
+        date_str: Date string, MMDDYYYY (e.g., "02121990" for Feb 12, 1990) or
+            YYYYMMDD (AAMVA version 01 and Canadian cards)
         
     Returns:
-        Date in YYYY-MM-DD format or empty string
+        Date in YYYY-MM-DD format, or the input unchanged if it isn't a date
     """
-    try:
-        # Some IDs have trailing data in date fields if parsing wasn't perfect,
-        # try to substring logical lengths
-        clean_date = date_str.strip()[:8]
-        
-        if input_format == 'MMDDYYYY' and len(clean_date) == 8:
-            if clean_date.isdigit():
-                month, day, year = clean_date[:2], clean_date[2:4], clean_date[4:]
-                date_obj = datetime(int(year), int(month), int(day))
-                return date_obj.strftime('%Y-%m-%d')
-        elif input_format == 'YYYYMMDD' and len(clean_date) == 8:
-            if clean_date.isdigit():
-                year, month, day = clean_date[:4], clean_date[4:6], clean_date[6:]
-                date_obj = datetime(int(year), int(month), int(day))
-                return date_obj.strftime('%Y-%m-%d')
-        
+    formatted = normalize_dob(date_str)
+    if not formatted:
         logger.warning(f"Unrecognized date format: {date_str}")
         return date_str
-    except Exception as e:
-        logger.error(f"Date parsing error: {e}")
-        return date_str
+    return formatted
 
 
 def detect_dc_from_barcode(parsed_data: Dict) -> bool:
@@ -622,13 +750,6 @@ def detect_dc_from_barcode(parsed_data: Dict) -> bool:
     return False
 
 
-def get_random_dc_address() -> Dict[str, str]:
-    """Get a random DC address for non-DC IDs"""
-    address = random.choice(DC_ADDRESSES)
-    logger.info(f"Assigned random DC address: {address['street']}")
-    return address
-
-
 def extract_id_from_barcode(image_base64: str) -> Dict:
     """
     Extract ID data from driver's license barcode (PDF417)
@@ -709,12 +830,12 @@ def extract_id_from_barcode(image_base64: str) -> Dict:
             extracted_data.update(actual_address)
             logger.info("DC ID - Using extracted address")
         else:
-            # Non-DC ID: Use random DC address as default, but include actual address
-            dc_address = get_random_dc_address()
+            # Non-DC ID: Use a pooled DC address as default, but include actual address
+            dc_address = sample_dc_address()
             extracted_data.update(dc_address)
             # Store actual address separately for Non-DC resident applications
             extracted_data['actualAddress'] = actual_address
-            logger.info("Non-DC ID - Using random DC address (actual address preserved)")
+            logger.info("Non-DC ID - Using pooled DC address (actual address preserved)")
         
         elapsed = time.time() - start_time
         logger.info(f"Barcode extraction completed in {elapsed:.3f}s")
@@ -0,0 +1,362 @@
+"""
+Check-in records
+Validation and column mapping for complete-checkin request bodies (shared by
+the Flask and ASGI handlers), and bulk import of check-ins recorded while a
+kiosk was offline.
+
+Bulk import reads a JSON-lines or CSV stream one record at a time and writes
+it in chunks of CHECKIN_IMPORT_CHUNK_SIZE: one query finds the chunk's
+existing customers (by customerId or returning-customer lookup key), one
+multi-row upsert checks them in and one multi-row insert creates the rest.
+Memory stays bounded by the chunk size however long the file is.
+"""
+
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from customer_lookup import best_match, license_hash, lookup_keys
+from metrics import REGISTRY
+from supabase_client import customer_row
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_IMPORT_CHUNK_SIZE = int(os.environ.get('CHECKIN_IMPORT_CHUNK_SIZE', '100'))
+CHECKIN_IMPORT_MAX_ROWS = int(os.environ.get('CHECKIN_IMPORT_MAX_ROWS', '100000'))
+# Row errors listed in the import response; any beyond are only counted
+CHECKIN_IMPORT_MAX_ERRORS = int(os.environ.get('CHECKIN_IMPORT_MAX_ERRORS', '500'))
+
+IMPORT_ROWS = REGISTRY.counter(
+    'checkin_import_rows_total',
+    'Bulk-imported check-in rows by result (created, updated, failed)',
+    ('result',)
+)
+
+Record = Tuple[int, Optional[Dict], Optional[str]]
+
+
+def checkin_request_error(data):
+    """
+    Validate the check-in fields of a complete-checkin request body
+
+    Returns:
+        Tuple of (error body, HTTP status), or None if the request is valid
+    """
+    if not data:
+        return {'success': False, 'error': 'No data provided'}, 400
+    if not data.get('registrationId'):
+        return {'success': False, 'error': 'Registration ID is required'}, 400
+    if not data.get('expirationDate'):
+        return {'success': False, 'error': 'Expiration date is required'}, 400
+    return None
+
+
+def checkin_update_data(data):
+    """Column updates that mark an existing customer as checked in"""
+    update_data = {
+        'registration_id': data.get('registrationId'),
+        'expiration_date': data.get('expirationDate'),
+        'barcode': data.get('barcode'),
+        # 'raw_barcode_data': data.get('rawBarcodeData'), # Column missing in DB
+        'location': data.get('location'),
+        'license_hash': license_hash(data.get('licenseNumber') or data.get('barcode')),
+        'status': 'checked_in',
+        'checked_in_at': datetime.now().isoformat()
+    }
+
+    # Remove None values
+    return {k: v for k, v in update_data.items() if v is not None}
+
+
+def missing_new_customer_fields(data):
+    """
+    Validate the customer fields required to check in someone without a record
+
+    Returns:
+        Tuple of (error body, HTTP status), or None if all are present
+    """
+    required_new = ['firstName', 'lastName', 'email']
+    missing = [f for f in required_new if not data.get(f)]
+    if missing:
+        return {
+            'success': False,
+            'error': f'Missing customer fields: {", ".join(missing)}'
+        }, 400
+    return None
+
+
+def checkin_new_customer_data(data):
+    """Customer fields for a new record created at check-in (Existing Card Holder)"""
+    return {
+        'firstName': data.get('firstName'),
+        'lastName': data.get('lastName'),
+        'email': data.get('email'),
+        'phoneNumber': data.get('phoneNumber'),
+        'registrationId': data.get('registrationId'),
+        'expirationDate': data.get('expirationDate'),
+        'barcode': data.get('barcode'),
+        'licenseNumber': data.get('licenseNumber'),
+        'rawBarcodeData': data.get('rawBarcodeData'),
+        'location': data.get('location'),
+        'checkedInAt': datetime.now().isoformat()
+    }
+
+
+def _clean_record(record: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """Strip values, drop empty ones and check customerId / checkedInAt; returns (record, error)"""
+    cleaned = {}
+    for key, value in record.items():
+        if key is None:
+            continue  # CSV cells beyond the header
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            cleaned[key.strip()] = value
+    if 'customerId' in cleaned:
+        try:
+            cleaned['customerId'] = int(cleaned['customerId'])
+        except (TypeError, ValueError):
+            return None, f"Invalid customerId: {cleaned['customerId']}"
+    if 'checkedInAt' in cleaned:
+        try:
+            datetime.fromisoformat(str(cleaned['checkedInAt']))
+        except ValueError:
+            return None, f"Invalid checkedInAt (use an ISO timestamp): {cleaned['checkedInAt']}"
+    return cleaned, None
+
+
+def _decode_lines(stream, invalid: set) -> Iterator[str]:
+    """
+    Text lines of a UTF-8 byte stream; numbers of lines that aren't valid
+    UTF-8 go into invalid (their text has U+FFFD in place of the bad bytes)
+    """
+    for line_no, raw in enumerate(io.BufferedReader(stream), 1):
+        if line_no == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield raw.decode('utf-8')
+        except UnicodeDecodeError:
+            invalid.add(line_no)
+            yield raw.decode('utf-8', errors='replace')
+
+
+def read_records(stream, fmt: str) -> Iterator[Record]:
+    """
+    Parse a JSON-lines or CSV byte stream one record at a time
+
+    Args:
+        stream: Binary file-like object (e.g. the request body stream)
+        fmt: 'jsonl' (one JSON object per line) or 'csv' (header row of field names)
+
+    Yields:
+        (line number, record, None) or (line number, None, error) per record;
+        a record with bytes that aren't UTF-8 is an error, not a failed import
+    """
+    invalid = set()
+    lines = _decode_lines(stream, invalid)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        first_line = 2
+        for record in reader:
+            record_lines = range(first_line, reader.line_num + 1)
+            first_line = reader.line_num + 1
+            if invalid.intersection(record_lines) or 1 in invalid:
+                yield reader.line_num, None, 'Not valid UTF-8 text'
+                continue
+            cleaned, error = _clean_record(record)
+            if cleaned == {} and not error:
+                continue  # blank line
+            yield reader.line_num, cleaned, error
+        return
+
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        if line_no in invalid:
+            yield line_no, None, 'Not valid UTF-8 text'
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'Each line must be a JSON object'
+            continue
+        yield (line_no, *_clean_record(record))
+
+
+class ImportReport:
+    """Counts and row errors of one bulk import"""
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.truncated = False
+
+    def succeed(self, result: str, count: int = 1):
+        setattr(self, result, getattr(self, result) + count)
+        IMPORT_ROWS.inc(result, amount=count)
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        IMPORT_ROWS.inc('failed')
+        if len(self.errors) < CHECKIN_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    def to_dict(self) -> Dict:
+        report = {
+            'total': self.total,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+        if self.truncated:
+            report['truncated'] = True
+            report['error'] = f'Import stopped after {CHECKIN_IMPORT_MAX_ROWS} rows'
+        return report
+
+
+def _write(supabase_manager, entries: List[Tuple[Dict, List[int]]], upsert: bool, report: ImportReport):
+    """
+    Write (row, source lines) entries with as few requests as possible
+
+    Rows are grouped by their columns (PostgREST takes the columns of a bulk
+    write from its first row). A group that fails is retried row by row so
+    the error lands on the lines that caused it.
+    """
+    groups: Dict[Tuple[str, ...], List[Tuple[Dict, List[int]]]] = {}
+    for row, lines in entries:
+        groups.setdefault(tuple(sorted(row)), []).append((row, lines))
+
+    for group in groups.values():
+        try:
+            written = supabase_manager.write_customers([row for row, _ in group], upsert=upsert)
+            if len(written) != len(group):
+                raise RuntimeError(f'{len(written)} of {len(group)} rows written')
+        except Exception as e:
+            if len(group) == 1:
+                for line in group[0][1]:
+                    report.fail(line, f'Database write failed: {e}')
+                continue
+            logger.warning(f"Bulk {'upsert' if upsert else 'insert'} of {len(group)} rows failed ({e}) - "
+                           f"writing them one by one")
+            for entry in group:
+                _write(supabase_manager, [entry], upsert, report)
+            continue
+
+        for _, lines in group:
+            # Later lines for the same customer count as updates of the first
+            report.succeed('updated' if upsert else 'created')
+            if len(lines) > 1:
+                report.succeed('updated', len(lines) - 1)
+
+
+def _import_chunk(supabase_manager, chunk: List[Tuple[int, Dict]], report: ImportReport):
+    """Resolve one chunk's customers with one query and write it with one upsert and one insert"""
+    chunk_keys = [lookup_keys(record) for _, record in chunk]
+    try:
+        rows = supabase_manager.find_customers_bulk(
+            [record['customerId'] for _, record in chunk if 'customerId' in record],
+            [keys for (_, record), keys in zip(chunk, chunk_keys) if 'customerId' not in record]
+        )
+    except Exception as e:
+        for line, _ in chunk:
+            report.fail(line, f'Customer lookup failed: {e}')
+        return
+    by_id = {row['id']: row for row in rows}
+
+    updates: Dict[int, Tuple[Dict, List[int]]] = {}
+    inserts: List[Tuple[Dict, List[int]]] = []
+    # Lookup key -> index in inserts, so a customer listed twice is created once
+    new_customers: Dict[Tuple[str, str], int] = {}
+
+    for (line, record), keys in zip(chunk, chunk_keys):
+        if 'customerId' in record:
+            existing = by_id.get(record['customerId'])
+            if not existing:
+                report.fail(line, f"Customer {record['customerId']} not found")
+                continue
+        else:
+            existing = best_match(rows, keys)
+
+        if existing:
+            # An upsert proposes a whole row, so it carries the NOT NULL name columns
+            row = {'id': existing['id'], 'first_name': existing['first_name'],
+                   'last_name': existing['last_name'], **checkin_update_data(record)}
+            if record.get('checkedInAt'):
+                row['checked_in_at'] = record['checkedInAt']
+            if existing['id'] in updates:
+                updates[existing['id']][0].update(row)
+                updates[existing['id']][1].append(line)
+            else:
+                updates[existing['id']] = (row, [line])
+            continue
+
+        row = customer_row(checkin_new_customer_data(record), status='checked_in')
+        if record.get('checkedInAt'):
+            row['checked_in_at'] = record['checkedInAt']
+        index = next((new_customers[key] for key in keys.items() if key in new_customers), None)
+        if index is not None:
+            # Same person again in this chunk: fold the later check-in into the new row
+            inserts[index][0].update({k: v for k, v in row.items() if v != ''})
+            inserts[index][1].append(line)
+            new_customers.update((key, index) for key in keys.items())
+            continue
+
+        missing = missing_new_customer_fields(record)
+        if missing:
+            report.fail(line, missing[0]['error'])
+            continue
+        new_customers.update((key, len(inserts)) for key in keys.items())
+        inserts.append((row, [line]))
+
+    _write(supabase_manager, list(updates.values()), True, report)
+    _write(supabase_manager, inserts, False, report)
+
+
+def import_checkins(supabase_manager, records: Iterable[Record]) -> Dict:
+    """
+    Import check-ins from read_records()
+
+    Each record has the complete-checkin request fields, plus an optional
+    checkedInAt (ISO timestamp of the actual check-in; default: now).
+    Existing customers are checked in, everyone else is created as checked in.
+
+    Returns:
+        Dictionary with total, created, updated and failed row counts and
+        errors ([{"line": ..., "error": ...}], first CHECKIN_IMPORT_MAX_ERRORS)
+    """
+    report = ImportReport()
+    chunk: List[Tuple[int, Dict]] = []
+    for line, record, error in records:
+        if report.total >= CHECKIN_IMPORT_MAX_ROWS:
+            report.truncated = True
+            break
+        report.total += 1
+        if error:
+            report.fail(line, error)
+            continue
+        invalid = checkin_request_error(record)
+        if invalid:
+            report.fail(line, invalid[0]['error'])
+            continue
+        chunk.append((line, record))
+        if len(chunk) >= CHECKIN_IMPORT_CHUNK_SIZE:
+            _import_chunk(supabase_manager, chunk, report)
+            chunk = []
+    if chunk:
+        _import_chunk(supabase_manager, chunk, report)
+
+    logger.info(f"Check-in import: {report.total} rows, {report.created} created, "
+                f"{report.updated} updated, {report.failed} failed")
+    return report.to_dict()
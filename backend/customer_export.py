@@ -0,0 +1,229 @@
+"""
+Streaming customer export
+/api/admin/customers/export pages through the customers table by id
+(keyset pagination: each page is "id > last id seen", an index range scan
+no matter how deep into the table it is) and writes each page out as CSV or
+JSON lines as soon as it arrives. The next page is fetched while the current
+one is sent, memory holds about two pages, and the CSV header goes out before
+the first query, so the download starts immediately whatever the table size.
+
+Responses are gzip-compressed on the fly when the client accepts it; each
+page is flushed so compression doesn't hold rows back.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Rows per Supabase request (PostgREST returns at most 1000 by default)
+CUSTOMER_EXPORT_PAGE_SIZE = int(os.environ.get('CUSTOMER_EXPORT_PAGE_SIZE', '1000'))
+
+# Exported by default and allowed in ?columns=, in this order (id is always
+# included); license data
+# (barcode, license_hash) and ID image references are left out
+EXPORT_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'phone', 'date_of_birth',
+    'street_address', 'city', 'state', 'zip_code', 'registration_id', 'expiration_date',
+    'resident_type', 'status', 'location', 'created_at', 'checked_in_at',
+)
+EXPORT_DATE_FIELDS = ('created_at', 'checked_in_at')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+EXPORTED_ROWS = REGISTRY.counter(
+    'customer_export_rows_total',
+    'Customer rows streamed by /api/admin/customers/export by format',
+    ('format',)
+)
+EXPORTS = REGISTRY.counter(
+    'customer_exports_total',
+    'Customer exports by result (completed, failed)',
+    ('result',)
+)
+
+
+def export_options(args) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Parse the export query parameters
+
+    Args:
+        args: Query parameters (format, columns, status, dateField, since, until, after)
+
+    Returns:
+        Tuple of (options, None) or (None, error message)
+    """
+    fmt = args.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return None, 'format must be csv or jsonl'
+
+    columns = tuple(c.strip() for c in args.get('columns', '').split(',') if c.strip()) or EXPORT_COLUMNS
+    if 'id' not in columns:
+        # The id is where an interrupted export resumes from (?after=)
+        columns = ('id',) + columns
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        return None, f'Unknown columns: {", ".join(unknown)}'
+
+    date_field = args.get('dateField', 'created_at')
+    if date_field not in EXPORT_DATE_FIELDS:
+        return None, f'dateField must be one of: {", ".join(EXPORT_DATE_FIELDS)}'
+    for name in ('since', 'until'):
+        if args.get(name):
+            try:
+                datetime.fromisoformat(args[name])
+            except ValueError:
+                return None, f'{name} must be an ISO date or timestamp'
+
+    try:
+        after = int(args.get('after', 0))
+    except ValueError:
+        return None, 'after must be a customer id'
+
+    return {
+        'format': fmt,
+        'columns': columns,
+        'after': after,
+        'filters': {
+            'status': args.get('status') or None,
+            'date_field': date_field,
+            'since': args.get('since') or None,
+            'until': args.get('until') or None,
+        },
+    }, None
+
+
+def export_filename(fmt: str) -> str:
+    return f"customers_{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+
+
+class ExportEncoder:
+    """
+    Turns pages of rows into response body chunks
+
+    Args:
+        fmt: 'csv' or 'jsonl'
+        columns: Columns written, in order
+        gzip: Compress the output (Content-Encoding: gzip)
+    """
+
+    def __init__(self, fmt: str, columns: Tuple[str, ...], gzip: bool = False):
+        self.fmt = fmt
+        self.columns = columns
+        self.rows = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer) if fmt == 'csv' else None
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits 31: gzip container
+
+    def _emit(self, text: str, final: bool = False) -> bytes:
+        data = text.encode('utf-8')
+        if self._compressor is None:
+            return data
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    def start(self) -> bytes:
+        """Header row (CSV); sent before the first page is fetched"""
+        if self._writer is None:
+            return b''
+        self._writer.writerow(self.columns)
+        return self._emit(self._drain())
+
+    def page(self, rows: List[Dict]) -> bytes:
+        if self._writer is not None:
+            self._writer.writerows([['' if row.get(c) is None else row.get(c) for c in self.columns] for row in rows])
+            text = self._drain()
+        else:
+            text = ''.join(json.dumps({c: row.get(c) for c in self.columns}, default=str) + '\n' for row in rows)
+        self.rows += len(rows)
+        EXPORTED_ROWS.inc(self.fmt, amount=len(rows))
+        return self._emit(text)
+
+    def finish(self) -> bytes:
+        return self._emit('', final=True) if self._compressor is not None else b''
+
+    def _drain(self) -> str:
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+
+def iter_pages(fetch_page: Callable[[int, int], List[Dict]], after: int = 0,
+               page_size: int = CUSTOMER_EXPORT_PAGE_SIZE) -> Iterator[List[Dict]]:
+    """
+    Pages of rows with id > after, fetching each next page in the background
+
+    Only an empty page ends the export: a short page may just mean the server
+    capped the page (PostgREST's max-rows) below page_size.
+
+    Args:
+        fetch_page: fetch_page(after_id, limit) -> rows ordered by id
+        after: Start after this id (0: from the beginning)
+        page_size: Rows per fetch
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-prefetch') as executor:
+        pending = executor.submit(fetch_page, after, page_size)
+        while True:
+            rows = pending.result()
+            if not rows:
+                return
+            pending = executor.submit(fetch_page, rows[-1]['id'], page_size)
+            yield rows
+
+
+async def iter_pages_async(fetch_page, after: int = 0,
+                           page_size: int = CUSTOMER_EXPORT_PAGE_SIZE) -> AsyncIterator[List[Dict]]:
+    """Async iter_pages; fetch_page is a coroutine function"""
+    pending = asyncio.ensure_future(fetch_page(after, page_size))
+    try:
+        while True:
+            rows = await pending
+            if not rows:
+                return
+            pending = asyncio.ensure_future(fetch_page(rows[-1]['id'], page_size))
+            yield rows
+    finally:
+        pending.cancel()
+
+
+def stream_export(pages: Iterator[List[Dict]], encoder: ExportEncoder) -> Iterator[bytes]:
+    """Response body chunks for a sync export"""
+    try:
+        yield encoder.start()
+        for rows in pages:
+            yield encoder.page(rows)
+        yield encoder.finish()
+    except Exception as e:
+        # Headers are already sent; dropping the connection tells the client the file is incomplete
+        EXPORTS.inc('failed')
+        logger.error(f"Customer export failed after {encoder.rows} rows: {e}", exc_info=True)
+        raise
+    EXPORTS.inc('completed')
+    logger.info(f"Customer export: {encoder.rows} rows ({encoder.fmt})")
+
+
+async def stream_export_async(pages: AsyncIterator[List[Dict]], encoder: ExportEncoder) -> AsyncIterator[bytes]:
+    """Response body chunks for an async export"""
+    try:
+        yield encoder.start()
+        async for rows in pages:
+            yield encoder.page(rows)
+        yield encoder.finish()
+    except Exception as e:
+        EXPORTS.inc('failed')
+        logger.error(f"Customer export failed after {encoder.rows} rows: {e}", exc_info=True)
+        raise
+    EXPORTS.inc('completed')
+    logger.info(f"Customer export: {encoder.rows} rows ({encoder.fmt})")
@@ -0,0 +1,153 @@
+"""
+Finding returning customers
+A card holder checking in without a customerId is matched to an existing
+customers row by one of three indexed columns, most specific first:
+
+- license_hash: salted HMAC of the AAMVA license number (DAQ), so the raw
+  number isn't needed to match; set LICENSE_HASH_SALT to enable it
+- registration_id: the DC ABCA registration ID
+- barcode: the number the kiosk stores from the ID barcode
+
+Recent matches are kept in an in-process LRU cache, so a returning card
+holder costs a single update by primary key. The cache only ever maps a key
+to the row it was last seen on; a stale entry (row deleted) is dropped when
+the update finds nothing. See documentation/supabase_customer_lookup.sql for
+the column and indexes.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LICENSE_HASH_SALT = os.environ.get('LICENSE_HASH_SALT', '')
+CUSTOMER_LOOKUP_CACHE_SIZE = int(os.environ.get('CUSTOMER_LOOKUP_CACHE_SIZE', '4096'))
+CUSTOMER_LOOKUP_CACHE_TTL = float(os.environ.get('CUSTOMER_LOOKUP_CACHE_TTL', '3600'))
+
+# Lookup columns, most specific first; a row matching an earlier column wins
+LOOKUP_COLUMNS = ('license_hash', 'registration_id', 'barcode')
+
+CUSTOMER_LOOKUPS = REGISTRY.counter(
+    'checkin_customer_lookups_total',
+    'Returning-customer lookups by where the answer came from (cache, database) and result (hit, miss)',
+    ('source', 'result')
+)
+
+if not LICENSE_HASH_SALT:
+    logger.info("LICENSE_HASH_SALT not set - customers are matched by registration ID and barcode only")
+
+
+def license_hash(license_number: Optional[str]) -> Optional[str]:
+    """
+    Salted hash of a license number, as stored in customers.license_hash
+
+    Args:
+        license_number: AAMVA DAQ value (spacing, dashes and case are ignored)
+
+    Returns:
+        Hex digest, or None without a number or without LICENSE_HASH_SALT
+    """
+    if not license_number or not LICENSE_HASH_SALT:
+        return None
+    normalized = re.sub(r'[^0-9A-Z]', '', str(license_number).upper())
+    if not normalized:
+        return None
+    return hmac.new(LICENSE_HASH_SALT.encode('utf-8'), normalized.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def lookup_keys(customer_data: Dict) -> Dict[str, str]:
+    """
+    Lookup column values for a request body or customer row
+
+    Accepts camelCase request fields (registrationId, barcode, licenseNumber)
+    or snake_case row columns. The kiosk sends the license number as barcode,
+    so it is hashed when no licenseNumber is given.
+
+    Returns:
+        {column: value} for the columns that have a value, in LOOKUP_COLUMNS order
+    """
+    registration_id = customer_data.get('registrationId') or customer_data.get('registration_id')
+    barcode = customer_data.get('barcode')
+    hashed = customer_data.get('license_hash') or license_hash(customer_data.get('licenseNumber') or barcode)
+    values = {'license_hash': hashed, 'registration_id': registration_id, 'barcode': barcode}
+    return {column: str(values[column]).strip() for column in LOOKUP_COLUMNS
+            if values[column] and str(values[column]).strip()}
+
+
+def best_match(rows: Iterable[Dict], keys: Dict[str, str]) -> Optional[Dict]:
+    """The row matching the most specific key (rows are newest first)"""
+    rows = list(rows)
+    for column, value in keys.items():
+        for row in rows:
+            if str(row.get(column) or '') == value:
+                return row
+    return None
+
+
+class LookupCache:
+    """
+    LRU cache of (column, value) -> customer id with a TTL
+
+    Args:
+        max_size: Entries kept (one customer has up to three)
+        ttl: Seconds an entry is trusted
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, keys: Dict[str, str]) -> Optional[int]:
+        """Customer id cached for the most specific of keys, if any"""
+        now = time.monotonic()
+        with self._lock:
+            for entry in keys.items():
+                cached = self._entries.get(entry)
+                if cached is None:
+                    continue
+                customer_id, expires = cached
+                if expires < now:
+                    del self._entries[entry]
+                    continue
+                self._entries.move_to_end(entry)
+                return customer_id
+        return None
+
+    def put(self, keys: Dict[str, str], customer_id: int):
+        if not self.max_size or not customer_id:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for entry in keys.items():
+                self._entries[entry] = (customer_id, expires)
+                self._entries.move_to_end(entry)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, customer_id: int):
+        """Drop every entry pointing at a customer (row deleted or merged)"""
+        with self._lock:
+            for entry in [e for e, (cid, _) in self._entries.items() if cid == customer_id]:
+                del self._entries[entry]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'maxSize': self.max_size, 'ttlSeconds': self.ttl}
+
+
+CUSTOMER_CACHE = LookupCache(CUSTOMER_LOOKUP_CACHE_SIZE, CUSTOMER_LOOKUP_CACHE_TTL)
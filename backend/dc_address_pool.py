@@ -0,0 +1,212 @@
+"""
+DC address pool for non-DC applicants
+Non-DC IDs get a DC address from dc_addresses.json. The file is loaded once
+per process into tuples indexed by ZIP (and ward, for entries that have one),
+and addresses are handed out round-robin over a shuffled order, so each one
+is used about equally often instead of whatever random.choice happens to pick.
+An address handed out less than DC_ADDRESS_REUSE_SECONDS ago is skipped while
+another one is free.
+
+The rotation and reuse window are per process: OCR runs in the vision
+process pool (worker_pools), and each of its processes (and each gunicorn
+worker) keeps its own pool, so two processes can hand out the same address
+within the window. Reloads keep the last-use times of addresses that are
+still in the file.
+
+Entries may carry an optional "weight" (default 1; an address with weight 2
+comes up twice per round) and "ward". Edits to the JSON are picked up without
+a restart: the file's mtime is checked at most every DC_ADDRESS_RELOAD_SECONDS,
+and a file that fails to parse leaves the current pool in place.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DC_ADDRESSES_PATH = os.environ.get(
+    'DC_ADDRESSES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dc_addresses.json'))
+# An address isn't handed out again within this window while another one is free
+DC_ADDRESS_REUSE_SECONDS = float(os.environ.get('DC_ADDRESS_REUSE_SECONDS', '600'))
+# How often the JSON file's mtime is checked for changes (0 disables hot reload)
+DC_ADDRESS_RELOAD_SECONDS = float(os.environ.get('DC_ADDRESS_RELOAD_SECONDS', '5'))
+
+ADDRESS_FIELDS = ('street', 'aptSuite', 'city', 'state', 'zip')
+ADDRESS_DEFAULTS = {'city': 'Washington', 'state': 'DC'}
+
+ADDRESS_POOL_RELOADS = REGISTRY.counter(
+    'checkin_dc_address_pool_reloads_total',
+    'DC address file (re)loads by result (loaded, failed)',
+    ('result',)
+)
+
+
+class _Rotation:
+    """Round-robin over a shuffled, weight-expanded order of address indices"""
+
+    __slots__ = ('order', 'cursor')
+
+    def __init__(self, indices: List[int], weights: List[int]):
+        self.order = [i for i in indices for _ in range(weights[i])]
+        random.shuffle(self.order)
+        self.cursor = 0
+
+
+class AddressPool:
+    """
+    Immutable set of addresses plus the rotation state used to hand them out
+
+    Args:
+        entries: Address dicts as in dc_addresses.json
+        source: (mtime_ns, size) of the file they came from
+    """
+
+    def __init__(self, entries: List[Dict], source: Tuple[int, int] = (0, 0)):
+        addresses, weights, by_zip, by_ward = [], [], {}, {}
+        for entry in entries:
+            if not entry.get('street'):
+                continue
+            index = len(addresses)
+            addresses.append(tuple(str(entry.get(field) or ADDRESS_DEFAULTS.get(field, ''))
+                                   for field in ADDRESS_FIELDS))
+            weights.append(max(1, int(entry.get('weight', 1))))
+            by_zip.setdefault(str(entry.get('zip', ''))[:5], []).append(index)
+            if entry.get('ward') is not None:
+                by_ward.setdefault(str(entry['ward']), []).append(index)
+        if not addresses:
+            raise ValueError('no addresses')
+
+        self.addresses: Tuple[Tuple[str, ...], ...] = tuple(addresses)
+        self.source = source
+        self._last_used = [float('-inf')] * len(addresses)
+        self._rotations = {None: _Rotation(list(range(len(addresses))), weights)}
+        self._rotations.update({('zip', z): _Rotation(ix, weights) for z, ix in by_zip.items()})
+        self._rotations.update({('ward', w): _Rotation(ix, weights) for w, ix in by_ward.items()})
+        self._lock = threading.Lock()
+
+    def sample(self, zip_code: Optional[str] = None, ward: Optional[str] = None) -> Dict[str, str]:
+        """
+        Next address, preferring the requested ward, then ZIP, then any
+
+        Skips addresses used within DC_ADDRESS_REUSE_SECONDS while it finds a
+        free one within one round; otherwise the least recently used in the
+        round is taken.
+        """
+        rotation = (self._rotations.get(('ward', str(ward))) if ward is not None else None) \
+            or (self._rotations.get(('zip', str(zip_code)[:5])) if zip_code else None) \
+            or self._rotations[None]
+        now = time.monotonic()
+        with self._lock:
+            order = rotation.order
+            best = None
+            for _ in range(len(order)):
+                index = order[rotation.cursor]
+                rotation.cursor = (rotation.cursor + 1) % len(order)
+                if now - self._last_used[index] >= DC_ADDRESS_REUSE_SECONDS:
+                    best = index
+                    break
+                if best is None or self._last_used[index] < self._last_used[best]:
+                    best = index
+            self._last_used[best] = now
+        return dict(zip(ADDRESS_FIELDS, self.addresses[best]))
+
+    def carry_over(self, previous: 'AddressPool'):
+        """Take over the last-use times of addresses also in the previous pool"""
+        with previous._lock:
+            last_used = dict(zip(previous.addresses, previous._last_used))
+        with self._lock:
+            for index, address in enumerate(self.addresses):
+                self._last_used[index] = last_used.get(address, self._last_used[index])
+
+    def stats(self) -> Dict:
+        return {
+            'addresses': len(self.addresses),
+            'zips': sum(1 for key in self._rotations if key and key[0] == 'zip'),
+            'wards': sum(1 for key in self._rotations if key and key[0] == 'ward'),
+        }
+
+
+_pool: Optional[AddressPool] = None
+_reload_lock = threading.Lock()
+_next_check = 0.0
+# Signature of a file that failed to load, so it is reported once rather than on every check
+_failed_signature: Optional[Tuple[int, int]] = None
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload_addresses(force: bool = False) -> bool:
+    """
+    Load dc_addresses.json if it changed since the current pool was built
+
+    Args:
+        force: Reload even if the file looks unchanged
+
+    Returns:
+        True if a new pool was installed
+    """
+    global _pool, _failed_signature
+    with _reload_lock:
+        signature = None
+        try:
+            signature = _file_signature(DC_ADDRESSES_PATH)
+            if not force and _pool is not None and signature in (_pool.source, _failed_signature):
+                return False
+            with open(DC_ADDRESSES_PATH, 'r') as f:
+                pool = AddressPool(json.load(f)['addresses'], signature)
+            if _pool is not None:
+                pool.carry_over(_pool)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if _pool is None:
+                raise
+            if signature is None or signature != _failed_signature:
+                ADDRESS_POOL_RELOADS.inc('failed')
+                logger.error(f"Could not reload {DC_ADDRESSES_PATH}, keeping {len(_pool.addresses)} addresses: {e}")
+            _failed_signature = signature
+            return False
+        # Swapped in one assignment; samplers holding the old pool finish with it
+        _pool = pool
+    ADDRESS_POOL_RELOADS.inc('loaded')
+    logger.info(f"Loaded {len(pool.addresses)} DC addresses from {DC_ADDRESSES_PATH}")
+    return True
+
+
+def get_address_pool() -> AddressPool:
+    """The current pool, reloading it first if the file changed"""
+    global _next_check
+    now = time.monotonic()
+    if _pool is None or (DC_ADDRESS_RELOAD_SECONDS > 0 and now >= _next_check):
+        _next_check = now + DC_ADDRESS_RELOAD_SECONDS
+        reload_addresses()
+    return _pool
+
+
+def sample_dc_address(zip_code: Optional[str] = None, ward: Optional[str] = None) -> Dict[str, str]:
+    """
+    DC address for a non-DC ID
+
+    Args:
+        zip_code: Prefer addresses in this ZIP (falls back to any)
+        ward: Prefer addresses in this ward, for entries that have one
+
+    Returns:
+        Dictionary with street, aptSuite, city, state and zip
+    """
+    address = get_address_pool().sample(zip_code, ward)
+    logger.debug(f"Assigned DC address: {address['street']}")
+    return address
+
+
+def address_pool_stats() -> Dict:
+    """Size of the loaded pool, for /health"""
+    return get_address_pool().stats()
@@ -0,0 +1,312 @@
+"""
+Failure artifacts for the form automation
+Takes a quick snapshot of the browser page when a submission fails (JPEG
+screenshot bytes, HTML, URL, error messages) and hands compression, disk
+writes, retention and the optional Supabase upload to a background thread,
+so the request that failed returns without waiting on any of it.
+
+Artifacts live in ARTIFACT_DIR/<artifact id>/ and are indexed by submission
+ID through the meta.json stored alongside them.
+"""
+
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.environ.get('FAILURE_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'checkin_artifacts'))
+
+# Retention: whichever limit is hit first removes the oldest artifacts
+ARTIFACT_MAX_COUNT = int(os.environ.get('FAILURE_ARTIFACT_MAX_COUNT', '200'))
+ARTIFACT_MAX_AGE_HOURS = float(os.environ.get('FAILURE_ARTIFACT_MAX_AGE_HOURS', '72'))
+ARTIFACT_MAX_MB = float(os.environ.get('FAILURE_ARTIFACT_MAX_MB', '200'))
+
+# Viewport-only JPEG is a fraction of the cost of a full-page PNG
+ARTIFACT_SCREENSHOT_QUALITY = int(os.environ.get('FAILURE_ARTIFACT_JPEG_QUALITY', '60'))
+ARTIFACT_FULL_PAGE = os.environ.get('FAILURE_ARTIFACT_FULL_PAGE', '').lower() in ('1', 'true', 'yes')
+
+# Also copy artifacts to a Supabase Storage bucket (needs an uploader, see set_uploader)
+ARTIFACT_UPLOAD = os.environ.get('FAILURE_ARTIFACT_UPLOAD', '').lower() in ('1', 'true', 'yes')
+
+# Snapshots waiting for the writer; when full, new snapshots are dropped rather than
+# blocking the request thread
+ARTIFACT_QUEUE_SIZE = int(os.environ.get('FAILURE_ARTIFACT_QUEUE_SIZE', '32'))
+
+# Generated ids are timestamp_kind_hex; no dots or separators, so an id can
+# only ever name a directory inside ARTIFACT_DIR
+ARTIFACT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+# File name inside an artifact directory -> content type
+ARTIFACT_FILES = {
+    'screenshot.jpg': 'image/jpeg',
+    'page.html.gz': 'text/html',
+    'meta.json': 'application/json',
+}
+
+_queue: Optional[queue.Queue] = None
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_uploader: Optional[Callable[[str, bytes, str], Optional[str]]] = None
+
+
+def set_uploader(uploader: Optional[Callable[[str, bytes, str], Optional[str]]]):
+    """
+    Register the function that copies artifact files to remote storage
+
+    Args:
+        uploader: Called as uploader(path, data, content_type), returns a URL or None
+    """
+    global _uploader
+    _uploader = uploader
+
+
+def capture_page(page, kind: str, submission_id: Optional[str] = None, details: Optional[Dict] = None) -> Optional[str]:
+    """
+    Snapshot a page and queue it for writing
+
+    Only the browser round trips (screenshot bytes and HTML) happen on the
+    calling thread; everything else is done by the background writer.
+
+    Args:
+        page: Playwright page
+        kind: What failed, e.g. 'validation_error' or 'submission_error'
+        submission_id: ID the artifact is indexed under
+        details: Extra JSON-serializable context (error messages, status, ...)
+
+    Returns:
+        Artifact ID, or None if nothing could be captured
+    """
+    with span('browser', 'capture_artifact'):
+        screenshot = html = url = None
+        try:
+            screenshot = page.screenshot(type='jpeg', quality=ARTIFACT_SCREENSHOT_QUALITY,
+                                         full_page=ARTIFACT_FULL_PAGE)
+        except Exception as e:
+            logger.warning(f"Could not capture failure screenshot: {e}")
+        try:
+            html = page.content()
+            url = page.url
+        except Exception as e:
+            logger.warning(f"Could not capture failure HTML: {e}")
+
+    if screenshot is None and html is None:
+        return None
+    return submit_artifact(kind, screenshot, html, url, submission_id, details)
+
+
+async def capture_page_async(page, kind: str, submission_id: Optional[str] = None,
+                             details: Optional[Dict] = None) -> Optional[str]:
+    """capture_page() for a Playwright async API page"""
+    with span('browser', 'capture_artifact'):
+        screenshot = html = url = None
+        try:
+            screenshot = await page.screenshot(type='jpeg', quality=ARTIFACT_SCREENSHOT_QUALITY,
+                                               full_page=ARTIFACT_FULL_PAGE)
+        except Exception as e:
+            logger.warning(f"Could not capture failure screenshot: {e}")
+        try:
+            html = await page.content()
+            url = page.url
+        except Exception as e:
+            logger.warning(f"Could not capture failure HTML: {e}")
+
+    if screenshot is None and html is None:
+        return None
+    return submit_artifact(kind, screenshot, html, url, submission_id, details)
+
+
+def submit_artifact(
+    kind: str,
+    screenshot: Optional[bytes],
+    html: Optional[str],
+    url: Optional[str] = None,
+    submission_id: Optional[str] = None,
+    details: Optional[Dict] = None
+) -> Optional[str]:
+    """
+    Queue already captured page state for the background writer
+
+    Returns:
+        Artifact ID, or None if the queue is full and the artifact was dropped
+    """
+    artifact_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{kind}_{uuid.uuid4().hex[:8]}"
+    meta = {
+        'artifactId': artifact_id,
+        'submissionId': submission_id,
+        'kind': kind,
+        'url': url,
+        'createdAt': datetime.now().isoformat(),
+        'details': details or {},
+    }
+    try:
+        _get_queue().put_nowait((meta, screenshot, html))
+    except queue.Full:
+        logger.warning(f"Failure artifact queue full - dropping {artifact_id}")
+        return None
+    return artifact_id
+
+
+def _get_queue() -> queue.Queue:
+    global _queue, _worker
+    if _worker is None or not _worker.is_alive():
+        with _worker_lock:
+            if _worker is None or not _worker.is_alive():
+                _queue = _queue or queue.Queue(maxsize=ARTIFACT_QUEUE_SIZE)
+                _worker = threading.Thread(target=_writer_loop, name='failure-artifacts', daemon=True)
+                _worker.start()
+    return _queue
+
+
+def _writer_loop():
+    while True:
+        meta, screenshot, html = _queue.get()
+        try:
+            write_artifact(meta, screenshot, html)
+            enforce_retention()
+        except Exception as e:
+            logger.error(f"Failed to write failure artifact {meta['artifactId']}: {e}", exc_info=True)
+        finally:
+            _queue.task_done()
+
+
+def write_artifact(meta: Dict, screenshot: Optional[bytes], html: Optional[str]) -> str:
+    """
+    Write one artifact to disk (and remote storage if enabled)
+
+    Args:
+        meta: Artifact metadata; file sizes and upload URLs are added to it
+        screenshot: JPEG bytes
+        html: Page HTML
+
+    Returns:
+        Path of the artifact directory
+    """
+    path = os.path.join(ARTIFACT_DIR, meta['artifactId'])
+    os.makedirs(path, exist_ok=True)
+
+    files = {}
+    if screenshot is not None:
+        files['screenshot.jpg'] = screenshot
+    if html is not None:
+        files['page.html.gz'] = gzip.compress(html.encode('utf-8'), compresslevel=6)
+
+    for name, data in files.items():
+        with open(os.path.join(path, name), 'wb') as f:
+            f.write(data)
+    meta['files'] = {name: len(data) for name, data in files.items()}
+
+    if ARTIFACT_UPLOAD and _uploader:
+        meta['remote'] = {}
+        for name, data in files.items():
+            try:
+                remote_url = _uploader(f"{meta['artifactId']}/{name}", data, ARTIFACT_FILES[name])
+                if remote_url:
+                    meta['remote'][name] = remote_url
+            except Exception as e:
+                logger.warning(f"Failure artifact upload failed for {name}: {e}")
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    logger.info(f"Failure artifact written: {meta['artifactId']} "
+                f"(submission {meta['submissionId']}, {sum(meta['files'].values())} bytes)")
+    return path
+
+
+def enforce_retention():
+    """Delete the oldest artifacts beyond the count, age and size limits"""
+    if not os.path.isdir(ARTIFACT_DIR):
+        return
+    entries = []
+    for name in os.listdir(ARTIFACT_DIR):
+        path = os.path.join(ARTIFACT_DIR, name)
+        if not os.path.isdir(path):
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        entries.append((os.path.getmtime(path), size, path))
+    entries.sort(reverse=True)
+
+    cutoff = time.time() - ARTIFACT_MAX_AGE_HOURS * 3600
+    max_bytes = ARTIFACT_MAX_MB * 1024 * 1024
+    kept_bytes = 0
+    for index, (mtime, size, path) in enumerate(entries):
+        kept_bytes += size
+        if index >= ARTIFACT_MAX_COUNT or mtime < cutoff or kept_bytes > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+            kept_bytes -= size
+
+
+def flush(timeout: float = 10.0) -> bool:
+    """Wait for queued artifacts to be written (for scripts and shutdown)"""
+    if _queue is None:
+        return True
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def list_artifacts(submission_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """
+    Metadata of stored artifacts, newest first
+
+    Args:
+        submission_id: Only artifacts recorded for this submission
+        limit: Maximum number of results
+
+    Returns:
+        List of metadata dictionaries
+    """
+    if not os.path.isdir(ARTIFACT_DIR):
+        return []
+    results = []
+    for name in sorted(os.listdir(ARTIFACT_DIR), reverse=True):
+        meta = get_artifact(name)
+        if meta is None or (submission_id and meta.get('submissionId') != submission_id):
+            continue
+        results.append(meta)
+        if len(results) >= limit:
+            break
+    return results
+
+
+def get_artifact(artifact_id: str) -> Optional[Dict]:
+    """Metadata for one artifact, or None if it doesn't exist (or is still being written)"""
+    if not ARTIFACT_ID_PATTERN.fullmatch(artifact_id):
+        return None
+    try:
+        with open(os.path.join(ARTIFACT_DIR, artifact_id, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_artifact_file(artifact_id: str, name: str) -> Optional[bytes]:
+    """
+    Contents of one artifact file (HTML is returned decompressed)
+
+    Returns:
+        File bytes, or None if the artifact or file doesn't exist
+    """
+    if name not in ARTIFACT_FILES or not ARTIFACT_ID_PATTERN.fullmatch(artifact_id):
+        return None
+    try:
+        with open(os.path.join(ARTIFACT_DIR, artifact_id, name), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return gzip.decompress(data) if name.endswith('.gz') else data
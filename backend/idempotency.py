@@ -0,0 +1,369 @@
+"""
+Idempotency keys for submissions and check-ins
+A client sends Idempotency-Key with a request it may retry. The first request
+with a key does the work; a retry with the same key gets the stored result,
+or waits for it while the first attempt is still running, instead of
+launching another browser run or inserting another customer row.
+
+Keys live in a local SQLite file shared by all server workers on the host,
+and expire after IDEMPOTENCY_TTL_HOURS. Only successful results are kept:
+after an error the key is released so a retry does the work again, but
+checkpoints the first attempt saved (e.g. the customer row it created) are
+kept so the retry doesn't repeat them. Two kinds of failure keep the key:
+
+- a result marked outcomeUnknown (e.g. a form that was submitted but never
+  confirmed), which is stored and replayed like a success
+- work still running in a worker when the request had to answer (see
+  settle_later()): the key stays in progress and the job's own result is
+  stored when it ends, so a retry waits for it instead of starting another
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY', '1').lower() not in ('0', 'false', 'no')
+IDEMPOTENCY_DB = os.environ.get('IDEMPOTENCY_DB', os.path.join(tempfile.gettempdir(), 'checkin_idempotency.sqlite3'))
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+# How long a retry waits for an attempt that is still running before answering 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '60'))
+# An attempt still marked running after this long is assumed dead (worker killed) and may be taken over
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '300'))
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_REQUESTS = REGISTRY.counter(
+    'checkin_idempotent_requests_total',
+    'Requests carrying an idempotency key by outcome (executed, replayed, waited, in_progress, mismatch)',
+    ('endpoint', 'outcome')
+)
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+_last_purge = 0.0
+
+
+
+class _Attempt:
+    """The idempotent request being handled, for checkpoints and settle_later()"""
+
+    __slots__ = ('endpoint', 'key', 'deferred')
+
+    def __init__(self, endpoint: str, key: str):
+        self.endpoint = endpoint
+        self.key = key
+        # Set when a job outliving the request will store the result
+        self.deferred = False
+
+
+_current: contextvars.ContextVar[Optional[_Attempt]] = contextvars.ContextVar('idempotency_key', default=None)
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread connection to the key store"""
+    global _schema_ready
+    db = getattr(_local, 'db', None)
+    if db is None:
+        os.makedirs(os.path.dirname(IDEMPOTENCY_DB) or '.', exist_ok=True)
+        db = _local.db = sqlite3.connect(IDEMPOTENCY_DB, timeout=10, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS idempotency_keys ('
+                    ' endpoint TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL,'
+                    ' state TEXT NOT NULL, status INTEGER, body TEXT, checkpoint TEXT,'
+                    ' updated_at REAL NOT NULL, expires_at REAL NOT NULL,'
+                    ' PRIMARY KEY (endpoint, key))'
+                )
+                db.execute('CREATE INDEX IF NOT EXISTS idempotency_expiry ON idempotency_keys (expires_at)')
+                _schema_ready = True
+    return db
+
+
+def fingerprint(data: Any) -> str:
+    """Hash of a request body; a key reused with a different body is rejected"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def valid_key(key: Optional[str]) -> bool:
+    return bool(key) and len(key) <= MAX_KEY_LENGTH and key.isprintable()
+
+
+def _purge_expired(db: sqlite3.Connection):
+    global _last_purge
+    now = time.time()
+    if now - _last_purge > 60:
+        _last_purge = now
+        db.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,))
+
+
+def claim(endpoint: str, key: str, request_fingerprint: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Claim a key for a new attempt, or find out what already happened with it
+
+    Returns:
+        (state, row): 'claimed' (do the work), 'completed' (row holds the stored
+        result), 'in_progress' (another attempt is running) or 'mismatch'
+        (the key was used with a different request body)
+    """
+    db = _connect()
+    now = time.time()
+    _purge_expired(db)
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute(
+            'SELECT fingerprint, state, status, body, updated_at FROM idempotency_keys '
+            'WHERE endpoint = ? AND key = ? AND expires_at >= ?', (endpoint, key, now)
+        ).fetchone()
+        if row is None or row[1] == 'released' or (row[1] == 'in_progress' and now - row[4] > IDEMPOTENCY_LOCK_SECONDS):
+            if row is not None and row[0] != request_fingerprint:
+                db.execute('COMMIT')
+                return 'mismatch', None
+            db.execute(
+                'INSERT INTO idempotency_keys (endpoint, key, fingerprint, state, updated_at, expires_at) '
+                "VALUES (?, ?, ?, 'in_progress', ?, ?) "
+                "ON CONFLICT (endpoint, key) DO UPDATE SET state = 'in_progress', status = NULL, body = NULL, "
+                'fingerprint = excluded.fingerprint, updated_at = excluded.updated_at, expires_at = excluded.expires_at, '
+                # Checkpoints survive a released attempt, not an expired key
+                'checkpoint = CASE WHEN idempotency_keys.expires_at < excluded.updated_at '
+                'THEN NULL ELSE idempotency_keys.checkpoint END',
+                (endpoint, key, request_fingerprint, now, now + IDEMPOTENCY_TTL_HOURS * 3600)
+            )
+            db.execute('COMMIT')
+            return 'claimed', None
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+
+    stored_fingerprint, state, status, body, _ = row
+    if stored_fingerprint != request_fingerprint:
+        return 'mismatch', None
+    if state == 'completed':
+        return 'completed', {'status': status, 'body': json.loads(body)}
+    return 'in_progress', None
+
+
+def finish(endpoint: str, key: str, body: Dict, status: int):
+    """
+    Store a result for replay, or release the key after an error
+
+    Errors are released unless the body has outcomeUnknown set: the work
+    may have taken effect, so a retry must not simply do it again.
+    """
+    db = _connect()
+    if status < 400 or body.get('outcomeUnknown'):
+        db.execute(
+            "UPDATE idempotency_keys SET state = 'completed', status = ?, body = ?, updated_at = ? "
+            'WHERE endpoint = ? AND key = ?', (status, json.dumps(body), time.time(), endpoint, key)
+        )
+    else:
+        db.execute(
+            "UPDATE idempotency_keys SET state = 'released', updated_at = ? WHERE endpoint = ? AND key = ?",
+            (time.time(), endpoint, key)
+        )
+
+
+def wait_for_result(endpoint: str, key: str, request_fingerprint: str, timeout: float) -> Tuple[str, Optional[Dict]]:
+    """Poll until a running attempt finishes; returns claim()'s (state, row) at the end"""
+    deadline = time.monotonic() + timeout
+    while True:
+        state, row = claim(endpoint, key, request_fingerprint)
+        if state != 'in_progress' or time.monotonic() >= deadline:
+            return state, row
+        time.sleep(0.25)
+
+
+def remember(name: str, value: Any):
+    """
+    Save a checkpoint on the current idempotent request
+
+    A retry of a failed attempt can recall() it to skip work that already
+    happened (no-op outside an idempotent request).
+    """
+    current = _current.get()
+    if current is None:
+        return
+    db = _connect()
+    row = db.execute('SELECT checkpoint FROM idempotency_keys WHERE endpoint = ? AND key = ?',
+                     (current.endpoint, current.key)).fetchone()
+    checkpoint = json.loads(row[0]) if row and row[0] else {}
+    checkpoint[name] = value
+    db.execute('UPDATE idempotency_keys SET checkpoint = ? WHERE endpoint = ? AND key = ?',
+               (json.dumps(checkpoint), current.endpoint, current.key))
+
+
+def recall(name: str) -> Any:
+    """A checkpoint saved by an earlier attempt with the current key, or None"""
+    current = _current.get()
+    if current is None:
+        return None
+    row = _connect().execute(
+        'SELECT checkpoint FROM idempotency_keys WHERE endpoint = ? AND key = ?', (current.endpoint, current.key)
+    ).fetchone()
+    return json.loads(row[0]).get(name) if row and row[0] else None
+
+
+def settle_later(job: Future, to_response: Callable[[Any], Tuple[Dict, int]]) -> bool:
+    """
+    Store the current request's result when a job that outlives it ends
+
+    For work handed to a worker that is still running when the request has
+    to answer (e.g. the browser pool stopped waiting): the key stays in
+    progress, so a retry waits for this job instead of starting another,
+    and the request itself answers 409 in progress.
+
+    Args:
+        job: Future of the running job
+        to_response: Maps the job's return value to (response body, HTTP status);
+            runs on the worker thread, outside the request's context
+
+    Returns:
+        True if the result will be stored, False outside an idempotent request
+    """
+    attempt = _current.get()
+    if attempt is None:
+        return False
+    attempt.deferred = True
+
+    def settle(done: Future):
+        try:
+            body, status = to_response(done.result())
+        except Exception as e:
+            logger.error(f"{attempt.endpoint}: job for key {attempt.key} failed: {e}")
+            body, status = {'success': False, 'error': f'Request failed: {e}'}, 500
+        finish(attempt.endpoint, attempt.key, body, status)
+        logger.info(f"{attempt.endpoint}: stored the late result ({status}) for key {attempt.key}")
+
+    job.add_done_callback(settle)
+    return True
+
+
+def in_progress_answer() -> Tuple[Dict, int, bool]:
+    """409 for a key whose attempt is still running"""
+    return {
+        'success': False,
+        'error': 'This request is still being processed, please try again shortly',
+        'inProgress': True,
+        'retryAfter': 5
+    }, 409, False
+
+
+def begin(endpoint: str, key: str, data: Any, wait: float = IDEMPOTENCY_WAIT_SECONDS
+          ) -> Optional[Tuple[Dict, int, bool]]:
+    """
+    Claim a key before doing the work
+
+    Returns:
+        None if the caller claimed the key and must do the work (then call
+        finish()), otherwise (response body, HTTP status, replayed) to answer with
+    """
+    if not valid_key(key):
+        return {'success': False, 'error': f'Invalid {IDEMPOTENCY_HEADER} header'}, 400, False
+
+    request_fingerprint = fingerprint(data)
+    state, row = claim(endpoint, key, request_fingerprint)
+    outcome = 'replayed'
+    if state == 'in_progress':
+        logger.info(f"{endpoint}: attempt with key {key} still running - waiting for its result")
+        state, row = wait_for_result(endpoint, key, request_fingerprint, wait)
+        outcome = 'waited'
+
+    if state == 'completed':
+        IDEMPOTENT_REQUESTS.inc(endpoint, outcome)
+        logger.info(f"{endpoint}: replaying stored result for key {key}")
+        return row['body'], row['status'], True
+    if state == 'mismatch':
+        IDEMPOTENT_REQUESTS.inc(endpoint, 'mismatch')
+        return {
+            'success': False,
+            'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'
+        }, 422, False
+    if state == 'in_progress':
+        IDEMPOTENT_REQUESTS.inc(endpoint, 'in_progress')
+        return in_progress_answer()
+
+    IDEMPOTENT_REQUESTS.inc(endpoint, 'executed')
+    return None
+
+
+def run_idempotent(endpoint: str, key: Optional[str], data: Any,
+                   work: Callable[[Any], Tuple[Dict, int]]) -> Tuple[Dict, int, bool]:
+    """
+    Run work(data) at most once per idempotency key
+
+    Args:
+        endpoint: Route the key is scoped to
+        key: Idempotency-Key header value (None runs work without de-duplication)
+        data: Request body (fingerprinted, and passed to work)
+        work: Returns (response body, HTTP status)
+
+    Returns:
+        Tuple of (response body, HTTP status, whether the result was replayed)
+    """
+    if not IDEMPOTENCY_ENABLED or not key:
+        body, status = work(data)
+        return body, status, False
+    answer = begin(endpoint, key, data)
+    if answer is not None:
+        return answer
+
+    attempt = _Attempt(endpoint, key)
+    token = _current.set(attempt)
+    body, status = {'success': False, 'error': 'Request failed'}, 500
+    try:
+        body, status = work(data)
+        return body, status, False
+    except Exception:
+        if attempt.deferred:
+            # The job runs on and stores its result; retries wait for it
+            return in_progress_answer()
+        raise
+    finally:
+        _current.reset(token)
+        if not attempt.deferred:
+            finish(endpoint, key, body, status)
+
+
+async def run_idempotent_async(endpoint: str, key: Optional[str], data: Any,
+                               work: Callable[[Any], Awaitable[Tuple[Dict, int]]]) -> Tuple[Dict, int, bool]:
+    """run_idempotent() for a coroutine; store access runs off the event loop"""
+    if not IDEMPOTENCY_ENABLED or not key:
+        body, status = await work(data)
+        return body, status, False
+    answer = await asyncio.to_thread(begin, endpoint, key, data)
+    if answer is not None:
+        return answer
+
+    attempt = _Attempt(endpoint, key)
+    token = _current.set(attempt)
+    body, status = {'success': False, 'error': 'Request failed'}, 500
+    try:
+        body, status = await work(data)
+        return body, status, False
+    except Exception:
+        if attempt.deferred:
+            return in_progress_answer()
+        raise
+    finally:
+        _current.reset(token)
+        if not attempt.deferred:
+            await asyncio.to_thread(finish, endpoint, key, body, status)
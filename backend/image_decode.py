@@ -0,0 +1,104 @@
+"""
+Image decoding for uploaded ID photos
+Decodes base64 uploads directly at (or near) the target resolution using
+Pillow's JPEG draft mode, so a 12MP phone photo is never fully expanded when
+a smaller image is all the OCR or barcode pipeline needs.
+"""
+
+import base64
+import io
+import logging
+from typing import Optional
+
+from PIL import Image
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+# EXIF orientation -> transpose operation(s) that make the image upright
+EXIF_TRANSPOSE = {
+    2: (Image.Transpose.FLIP_LEFT_RIGHT,),
+    3: (Image.Transpose.ROTATE_180,),
+    4: (Image.Transpose.FLIP_TOP_BOTTOM,),
+    5: (Image.Transpose.TRANSPOSE,),
+    6: (Image.Transpose.ROTATE_270,),
+    7: (Image.Transpose.TRANSVERSE,),
+    8: (Image.Transpose.ROTATE_90,),
+}
+
+
+def decode_base64_payload(image_base64: str) -> bytes:
+    """Decode base64 image data (with or without data URI prefix) to bytes"""
+    if ',' in image_base64:
+        image_base64 = image_base64.split(',')[1]
+    with span('decode', 'base64'):
+        return base64.b64decode(image_base64)
+
+
+def decode_image(
+    image_bytes: bytes,
+    max_dimension: Optional[int] = None,
+    mode: str = 'RGB',
+    resample: Image.Resampling = Image.Resampling.LANCZOS
+) -> Image.Image:
+    """
+    Decode image bytes into an upright image no larger than max_dimension
+
+    For JPEGs the decoder is put into draft mode first, which lets libjpeg
+    decode straight to grayscale (mode 'L') and scale by 1/2, 1/4 or 1/8
+    during the DCT instead of after a full-size decode. EXIF orientation is
+    applied after downscaling, so the transpose only touches the small image.
+
+    Args:
+        image_bytes: Encoded image data
+        max_dimension: Longest allowed side in pixels (None keeps full size)
+        mode: Output mode ('RGB' or 'L')
+        resample: Filter for the final resize down to max_dimension
+
+    Returns:
+        Decoded PIL Image in the requested mode
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+
+    try:
+        orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        orientation = 1
+
+    original_size = image.size
+
+    if max_dimension and max(image.size) > max_dimension:
+        ratio = max_dimension / max(image.size)
+        target = (max(1, int(image.width * ratio)), max(1, int(image.height * ratio)))
+        if image.format == 'JPEG':
+            # Returns an image at least as large as target, using the DCT scale
+            image.draft(mode, target)
+        image.thumbnail(target, resample)
+    elif image.format == 'JPEG':
+        image.draft(mode, image.size)
+
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    for op in EXIF_TRANSPOSE.get(orientation, ()):
+        image = image.transpose(op)
+
+    if image.size != original_size:
+        logger.info(f"Decoded image {original_size} -> {image.size} ({mode})")
+
+    return image
+
+
+def decode_base64_image(
+    image_base64: str,
+    max_dimension: Optional[int] = None,
+    mode: str = 'RGB',
+    resample: Image.Resampling = Image.Resampling.LANCZOS
+) -> Image.Image:
+    """Decode a base64 upload straight to an upright, size-capped image"""
+    image_bytes = decode_base64_payload(image_base64)
+    with span('decode', f'image_{mode}'):
+        return decode_image(image_bytes, max_dimension, mode, resample)
@@ -0,0 +1,262 @@
+"""
+Lightweight in-process metrics with Prometheus text export
+Named spans record stage latencies into histograms; /metrics renders them.
+Recording a sample is a perf_counter read, a bisect and a locked increment,
+so instrumentation stays on in production.
+
+Metrics are per process: with several gunicorn workers each worker reports
+its own series (scrape through the load balancer or run a single worker).
+Process-pool workers (OCR) forward their samples to the server process that
+started them (see forward_to()), so their stages show up in its /metrics.
+"""
+
+import contextvars
+import inspect
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond parsing up to browser runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Set in process-pool workers: send(name, value, labels) replaces recording here
+_forward: Optional[Callable] = None
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record one sample; labels are given positionally in labelnames order"""
+        if _forward is not None:
+            _forward(self.name, value, labels)
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f'{self.name}_bucket{le} {cumulative}'
+            label_str = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_str} {_format_value(series[-1])}'
+            yield f'{self.name}_count{label_str} {cumulative}'
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        if _forward is not None:
+            _forward(self.name, amount, labels)
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    """Value that can go up and down (e.g. requests in flight)"""
+
+    type_name = 'gauge'
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class MetricsRegistry:
+    """Holds metrics by name and renders them in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets)
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def record(self, name: str, value: float, labels: Tuple[str, ...]):
+        """Apply a sample forwarded from a pool process (counter increment or histogram sample)"""
+        metric = self._metrics.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(value, *labels)
+        elif isinstance(metric, Counter):
+            metric.inc(*labels, amount=value)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'checkin_stage_duration_seconds',
+    'Latency of individual pipeline stages (decode, preprocessing, engines, database, browser)',
+    ('stage', 'name', 'outcome')
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def forward_to(send: Optional[Callable]):
+    """
+    Send this process's counter increments and histogram samples elsewhere
+
+    Args:
+        send: send(name, value, labels), e.g. a queue put towards the process
+            whose registry should hold them (MetricsRegistry.record() on the
+            other side); None records locally again
+    """
+    global _forward
+    _forward = send
+
+
+# Outcome of the innermost span() running in this context, as a one-item list
+_span_outcome = contextvars.ContextVar('span_outcome', default=None)
+
+
+def observe(stage: str, name: str, seconds: float, outcome: str = 'ok'):
+    """Record a stage duration measured by the caller"""
+    STAGE_SECONDS.observe(seconds, stage, name, outcome)
+
+
+@contextmanager
+def span(stage: str, name: str = ''):
+    """
+    Time a block as one stage sample
+
+    Usage:
+        with span('supabase', 'store_customer'):
+            ...
+    """
+    start = time.perf_counter()
+    outcome = ['ok']
+    outer = _span_outcome.get()
+    _span_outcome.set(outcome)
+    try:
+        yield
+    except BaseException:
+        outcome[0] = 'error'
+        raise
+    finally:
+        _span_outcome.set(outer)
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage, name, outcome[0])
+
+
+def mark_failed():
+    """
+    Record the innermost running span as an error although it ends normally
+
+    For code that catches its own failures and returns a fallback (e.g. the
+    SupabaseManager methods returning None), which span() can't see.
+    """
+    outcome = _span_outcome.get()
+    if outcome is not None:
+        outcome[0] = 'error'
+
+
+def timed(stage: str, name: str = ''):
+    """Decorator form of span(); name defaults to the function name (works on coroutines too)"""
+    def decorator(func):
+        label = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus() -> str:
+    """Render every registered metric in Prometheus text exposition format"""
+    return REGISTRY.render()
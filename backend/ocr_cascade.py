@@ -0,0 +1,129 @@
+"""
+Cascade policy for choosing between OCR engines
+Orders engines by expected cost (observed latency / observed success rate) and
+decides when a secondary engine should run speculatively in parallel.
+"""
+
+import os
+import threading
+import logging
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# A result counts as a success when it yields at least this fraction of the
+# identity fields (first name, last name, DOB)
+ACCEPT_COMPLETENESS = float(os.environ.get('OCR_ACCEPT_COMPLETENESS', '1.0'))
+
+# Run the secondary engine in parallel when image quality is below this score
+SPECULATIVE_ENABLED = os.environ.get('OCR_SPECULATIVE', '').lower() in ('1', 'true', 'yes')
+SPECULATIVE_QUALITY_THRESHOLD = float(os.environ.get('OCR_SPECULATIVE_QUALITY', '0.35'))
+
+# Priors used until an engine has real history (seconds, success rate)
+ENGINE_PRIORS = {
+    'surya': {'latency': 8.0, 'success_rate': 0.8},
+    'paddle': {'latency': 12.0, 'success_rate': 0.7},
+}
+
+# Weight of the newest observation in the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+# Weight (in pseudo-attempts) given to the prior success rate
+PRIOR_WEIGHT = 5
+
+
+class OCRCascadePolicy:
+    """Tracks per-engine history and picks the cheapest expected engine order"""
+
+    def __init__(self, priors: Dict[str, Dict[str, float]] = None):
+        self._lock = threading.Lock()
+        self._stats = {}
+        for engine, prior in (priors or ENGINE_PRIORS).items():
+            self._stats[engine] = {
+                'attempts': 0,
+                'successes': 0,
+                'latency': prior['latency'],
+                'prior_success_rate': prior['success_rate'],
+            }
+
+    def _entry(self, engine: str) -> Dict:
+        if engine not in self._stats:
+            self._stats[engine] = {'attempts': 0, 'successes': 0, 'latency': 10.0, 'prior_success_rate': 0.5}
+        return self._stats[engine]
+
+    def success_rate(self, engine: str) -> float:
+        """Observed success rate, smoothed towards the prior"""
+        with self._lock:
+            s = self._entry(engine)
+            return ((s['successes'] + s['prior_success_rate'] * PRIOR_WEIGHT) /
+                    (s['attempts'] + PRIOR_WEIGHT))
+
+    def expected_cost(self, engine: str) -> float:
+        """Expected seconds spent per successful extraction with this engine"""
+        rate = max(self.success_rate(engine), 0.01)
+        with self._lock:
+            return self._entry(engine)['latency'] / rate
+
+    def order(self, engines: List[str]) -> List[str]:
+        """Return engines sorted by expected cost, cheapest first"""
+        return sorted(engines, key=self.expected_cost)
+
+    def record(self, engine: str, latency: float, completeness: float):
+        """Record the outcome of one engine run"""
+        with self._lock:
+            s = self._entry(engine)
+            s['attempts'] += 1
+            if completeness >= ACCEPT_COMPLETENESS:
+                s['successes'] += 1
+            s['latency'] = (1 - LATENCY_EWMA_ALPHA) * s['latency'] + LATENCY_EWMA_ALPHA * latency
+
+    def should_speculate(self, quality: float) -> bool:
+        """Whether to start the secondary engine alongside the primary"""
+        return SPECULATIVE_ENABLED and quality < SPECULATIVE_QUALITY_THRESHOLD
+
+    def snapshot(self) -> Dict:
+        """Current history per engine (for logging and diagnostics)"""
+        with self._lock:
+            engines = list(self._stats)
+        return {
+            engine: {
+                'attempts': self._stats[engine]['attempts'],
+                'successRate': round(self.success_rate(engine), 3),
+                'latency': round(self._stats[engine]['latency'], 3),
+            }
+            for engine in engines
+        }
+
+
+def image_quality_score(image: Image.Image) -> float:
+    """
+    Cheap 0-1 quality estimate from sharpness and contrast
+
+    Works on a small grayscale thumbnail so it costs a few milliseconds.
+    """
+    thumb = image.convert('L')
+    thumb.thumbnail((512, 512))
+    gray = np.asarray(thumb, dtype=np.float32)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+
+    # Variance of the 4-neighbour Laplacian as a focus measure
+    lap = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] -
+           4 * gray[1:-1, 1:-1])
+    sharpness = min(float(lap.var()) / 500.0, 1.0)
+    contrast = min(float(gray.std()) / 64.0, 1.0)
+
+    return round(0.7 * sharpness + 0.3 * contrast, 3)
+
+
+# Shared per-process policy; with the vision process pool each OCR process
+# learns its own engine history
+_policy = OCRCascadePolicy()
+
+
+def get_cascade_policy() -> OCRCascadePolicy:
+    """Return the process-wide cascade policy"""
+    return _policy
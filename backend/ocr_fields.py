@@ -0,0 +1,263 @@
+"""
+Single-pass field extraction for OCR text from ID cards
+All patterns are compiled once at import; OCR lines are tokenized into a
+line/label table and every field (name, DOB, street, apt, ZIP, DC indicators)
+is resolved in one walk over that table.
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Label keywords looked up once per line. Patterns that need a label are only
+# tried on lines (or two-line windows) that contain it.
+LABEL_KEYWORDS = ('LN', 'FN', 'DOB', 'BIRTH', 'NAME')
+
+# Name patterns, in priority order
+NAME_LN_FN = re.compile(r'LN[:\s]+([A-Z][A-Za-z]+)[,\s]+FN[:\s]+([A-Z][A-Za-z]+)', re.IGNORECASE)
+NAME_CAPS = re.compile(r'\b([A-Z]{2,})[,\s]+([A-Z]{2,})\b')
+NAME_LABELLED = re.compile(r'(?:Name|DL\s*Name|Full\s*Name)[:\s]+([A-Z][a-z]+)\s+([A-Z][a-z]+)', re.IGNORECASE)
+NAME_TITLE_WORD = re.compile(r'\b[A-Z][a-z]{1,}\b')
+
+NAME_SKIP_WORDS = frozenset({
+    'Date', 'Birth', 'License', 'Driver', 'Drivers', 'Class', 'Sex', 'Height',
+    'Eyes', 'Hair', 'Address', 'City', 'State', 'Zip', 'Issue', 'Expires',
+    'Endorsements', 'Restrictions', 'District', 'Columbia', 'Washington'
+})
+
+# DOB patterns, in priority order
+DOB_LABELLED = re.compile(r'DOB[:\s]*(\d{1,2})[/-](\d{1,2})[/-](\d{4})', re.IGNORECASE)
+DOB_BIRTH = re.compile(r'Birth[:\s]*(\d{1,2})[/-](\d{1,2})[/-](\d{4})', re.IGNORECASE)
+DOB_STANDALONE = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b')
+DOB_COMPACT = re.compile(r'\b(\d{2})(\d{2})(\d{4})\b')
+
+# Address patterns
+ZIP_CODE = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+STREET_TYPES = r'(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Place|Pl|Terrace|Ter|Court|Ct|Circle|Cir)'
+STREET = re.compile(rf'(\d+\s+[A-Za-z\s]+\s*{STREET_TYPES}\.?\s*(?:NW|NE|SW|SE)?)', re.IGNORECASE)
+APT_SUITE = re.compile(r'(?:Apt|Apartment|Suite|Unit|#)\s*([A-Z0-9]+)', re.IGNORECASE)
+
+# DC indicators (matched against upper-cased lines)
+DC_INDICATORS = (
+    'DISTRICT OF COLUMBIA',
+    'DISTRICT COLUMBIA',
+    'WASHINGTON DC',
+    'WASHINGTON, DC',
+    'WASH DC',
+    'DC DMV',
+    'DEPARTMENT OF MOTOR VEHICLES',
+    'DRIVER LICENSE',
+    'DRIVER\'S LICENSE',
+)
+DC_INDICATOR = re.compile('|'.join(re.escape(i) for i in DC_INDICATORS))
+DC_WITH_ZIP = re.compile(r'\bDC\b.*?\d{5}')
+
+# Reported confidence for each pattern (how reliable a hit is on real IDs)
+PATTERN_CONFIDENCE = {
+    'name_ln_fn': 0.95,
+    'name_caps': 0.6,
+    'name_labelled': 0.85,
+    'name_title_words': 0.4,
+    'dob_labelled': 0.95,
+    'dob_birth': 0.9,
+    'dob_standalone': 0.7,
+    'dob_compact': 0.5,
+    'zip_dc': 0.9,
+    'street': 0.8,
+    'apt': 0.7,
+    'dc_indicator': 0.9,
+    'dc_with_zip': 0.7,
+}
+
+# Patterns in priority order per field; lower index wins
+NAME_PATTERNS = ('name_ln_fn', 'name_caps', 'name_labelled', 'name_title_words')
+DOB_PATTERNS = ('dob_labelled', 'dob_birth', 'dob_standalone', 'dob_compact')
+
+
+def tokenize_lines(text: str) -> List[Dict]:
+    """
+    Split OCR text into a line table
+
+    Each entry holds the raw line, its upper-cased form, a two-line window
+    (this line plus the next, for patterns that span a line break) and the
+    set of label keywords present in the window.
+    """
+    lines = text.split('\n')
+    table = []
+    for i, line in enumerate(lines):
+        window = line + '\n' + lines[i + 1] if i + 1 < len(lines) else line
+        window_upper = window.upper()
+        table.append({
+            'index': i,
+            'text': line,
+            'upper': window_upper[:len(line)],
+            'window': window,
+            'labels': frozenset(k for k in LABEL_KEYWORDS if k in window_upper),
+        })
+    return table
+
+
+def _search_in_line(pattern: re.Pattern, entry: Dict) -> Optional[re.Match]:
+    """Search the line's window, keeping only matches that start on this line"""
+    match = pattern.search(entry['window'])
+    if match and match.start() < len(entry['text']):
+        return match
+    return None
+
+
+def _valid_dob(month: str, day: str, year: str, year_range: bool) -> Optional[str]:
+    """Validate a date triple and return it as YYYY-MM-DD"""
+    try:
+        year_int = int(year)
+        if year_range and not 1920 <= year_int <= 2010:
+            return None
+        datetime(year_int, int(month), int(day))
+        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+    except ValueError:
+        return None
+
+
+def _match_name(entry: Dict, skip: int) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Try name patterns ranked above `skip` against one line"""
+    for pattern_name in NAME_PATTERNS[:skip]:
+        if pattern_name == 'name_ln_fn':
+            if 'LN' not in entry['labels']:
+                continue
+            match = _search_in_line(NAME_LN_FN, entry)
+            if match:
+                return pattern_name, {'lastName': match.group(1).strip().title(),
+                                      'firstName': match.group(2).strip().title()}
+        elif pattern_name == 'name_caps':
+            match = _search_in_line(NAME_CAPS, entry)
+            if match:
+                return pattern_name, {'lastName': match.group(1).strip().title(),
+                                      'firstName': match.group(2).strip().title()}
+        elif pattern_name == 'name_labelled':
+            if 'NAME' not in entry['labels']:
+                continue
+            match = _search_in_line(NAME_LABELLED, entry)
+            if match:
+                return pattern_name, {'firstName': match.group(1).strip().title(),
+                                      'lastName': match.group(2).strip().title()}
+        else:
+            words = [w for w in NAME_TITLE_WORD.findall(entry['text']) if w not in NAME_SKIP_WORDS]
+            if len(words) >= 2:
+                return pattern_name, {'firstName': words[0], 'lastName': words[1]}
+    return None
+
+
+def _match_dob(entry: Dict, skip: int) -> Optional[Tuple[str, str]]:
+    """Try DOB patterns ranked above `skip` against one line"""
+    for pattern_name in DOB_PATTERNS[:skip]:
+        if pattern_name == 'dob_labelled':
+            if 'DOB' not in entry['labels']:
+                continue
+            match = _search_in_line(DOB_LABELLED, entry)
+            dob = _valid_dob(*match.groups(), year_range=False) if match else None
+        elif pattern_name == 'dob_birth':
+            if 'BIRTH' not in entry['labels']:
+                continue
+            match = _search_in_line(DOB_BIRTH, entry)
+            dob = _valid_dob(*match.groups(), year_range=False) if match else None
+        else:
+            pattern = DOB_STANDALONE if pattern_name == 'dob_standalone' else DOB_COMPACT
+            dob = None
+            for match in pattern.finditer(entry['text']):
+                dob = _valid_dob(*match.groups(), year_range=True)
+                if dob:
+                    break
+        if dob:
+            return pattern_name, dob
+    return None
+
+
+def extract_fields(text: str) -> Dict:
+    """
+    Resolve every OCR field in one pass over the line table
+
+    Returns:
+        Dictionary with:
+            - name: firstName, middleInitial, lastName, suffix
+            - dateOfBirth: YYYY-MM-DD or empty string
+            - address: street, aptSuite, city, state, zip
+            - isDC: whether DC indicators were found
+            - confidence: per-field confidence (0.0 when not found)
+            - patterns: per-field name of the pattern that fired
+    """
+    name = {'firstName': '', 'middleInitial': '', 'lastName': '', 'suffix': ''}
+    address = {'street': '', 'aptSuite': '', 'city': 'Washington', 'state': 'DC', 'zip': ''}
+    patterns = {}
+
+    # Best rank found so far; a field is settled once it hits rank 0
+    name_rank = len(NAME_PATTERNS)
+    dob_rank = len(DOB_PATTERNS)
+    dob = ''
+    dc_pattern = None
+
+    for entry in tokenize_lines(text):
+        if name_rank:
+            hit = _match_name(entry, name_rank)
+            if hit:
+                patterns['name'], found = hit
+                name_rank = NAME_PATTERNS.index(hit[0])
+                name.update(found)
+
+        if dob_rank:
+            hit = _match_dob(entry, dob_rank)
+            if hit:
+                patterns['dateOfBirth'], dob = hit
+                dob_rank = DOB_PATTERNS.index(hit[0])
+
+        if 'zip' not in patterns:
+            for match in ZIP_CODE.finditer(entry['text']):
+                zip_code = match.group(1)
+                if zip_code.startswith('200') or zip_code.startswith('204'):
+                    address['zip'] = zip_code
+                    patterns['zip'] = 'zip_dc'
+                    break
+
+        if 'street' not in patterns:
+            match = _search_in_line(STREET, entry)
+            if match:
+                address['street'] = match.group(1).strip()
+                patterns['street'] = 'street'
+
+        if 'aptSuite' not in patterns:
+            match = _search_in_line(APT_SUITE, entry)
+            if match:
+                address['aptSuite'] = f"Apt {match.group(1)}"
+                patterns['aptSuite'] = 'apt'
+
+        if dc_pattern != 'dc_indicator':
+            if DC_INDICATOR.search(entry['upper']):
+                dc_pattern = 'dc_indicator'
+            elif dc_pattern is None and DC_WITH_ZIP.search(entry['upper']):
+                dc_pattern = 'dc_with_zip'
+
+    if dc_pattern:
+        patterns['isDC'] = dc_pattern
+
+    confidence = {field: PATTERN_CONFIDENCE[pattern] for field, pattern in patterns.items()}
+    for field in ('name', 'dateOfBirth', 'street', 'aptSuite', 'zip', 'isDC'):
+        confidence.setdefault(field, 0.0)
+
+    logger.info(f"OCR fields resolved: {patterns}")
+
+    return {
+        'name': name,
+        'dateOfBirth': dob,
+        'address': address,
+        'isDC': dc_pattern is not None,
+        'confidence': confidence,
+        'patterns': patterns,
+    }
+
+
+def field_completeness(fields: Dict) -> float:
+    """Fraction of the identity fields (first name, last name, DOB) that were found"""
+    found = [fields['name'].get('firstName'), fields['name'].get('lastName'), fields.get('dateOfBirth')]
+    return sum(1 for f in found if f) / len(found)
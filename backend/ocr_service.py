@@ -3,17 +3,22 @@ OCR Service for ID extraction with DC vs Non-DC detection
 Uses Surya OCR (primary) and PaddleOCR (backup) for text extraction
 """
 
-import re
 import os
-import json
-import random
-import base64
-import io
+import contextvars
+import time
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 import logging
-from PIL import Image
+from PIL import Image, ImageEnhance
+from dc_address_pool import sample_dc_address
+from image_decode import decode_base64_image
+from metrics import observe, span
+from progress import emit
+from ocr_fields import extract_fields, field_completeness
+from ocr_cascade import get_cascade_policy, image_quality_score, ACCEPT_COMPLETENESS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,10 +43,19 @@ except Exception as e:
     PADDLE_AVAILABLE = False
     logger.warning(f"PaddleOCR not available: {e}")
 
-# Load DC addresses (use absolute path for production compatibility)
-_dc_addresses_path = os.path.join(os.path.dirname(__file__), 'dc_addresses.json')
-with open(_dc_addresses_path, 'r') as f:
-    DC_ADDRESSES = json.load(f)['addresses']
+# Longest image side passed to the OCR engines
+OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION', '2500'))
+
+# Text-length thresholds (characters); scripts/bench_ocr.py sweeps these.
+# PaddleOCR accepts the original image above PADDLE_ACCEPT_CHARS, stops trying
+# variants above PADDLE_VARIANT_STOP_CHARS, and results of OCR_MIN_TEXT_CHARS
+# or fewer count as no text.
+PADDLE_ACCEPT_CHARS = int(os.environ.get('OCR_PADDLE_ACCEPT_CHARS', '20'))
+PADDLE_VARIANT_STOP_CHARS = int(os.environ.get('OCR_PADDLE_VARIANT_STOP_CHARS', '50'))
+OCR_MIN_TEXT_CHARS = int(os.environ.get('OCR_MIN_TEXT_CHARS', '10'))
+
+# Write every OCR input variant to debug_output/ (disable for benchmarks)
+OCR_DEBUG_IMAGES = os.environ.get('OCR_DEBUG_IMAGES', '1').lower() in ('1', 'true', 'yes')
 
 # Initialize OCR engines (lazy loading)
 _surya_models = None
@@ -103,39 +117,11 @@ def process_image(image_base64: str) -> Image.Image:
     Returns:
         Optimized PIL Image object
     """
-    # Remove data URI prefix if present
-    if ',' in image_base64:
-        image_base64 = image_base64.split(',')[1]
-    
-    # Decode base64 to bytes
-    image_bytes = base64.b64decode(image_base64)
-    
-    # Open image
-    image = Image.open(io.BytesIO(image_bytes))
-    
-    # Handle EXIF orientation
-    try:
-        from PIL import ImageOps
-        image = ImageOps.exif_transpose(image)
-    except Exception:
-        pass
-    
-    # Optimize: Resize very large images, but keep high resolution for OCR
-    # IDs need good resolution, so we bump limit to 2500
-    MAX_WIDTH = 2500
-    MAX_HEIGHT = 2500
-    
-    if image.width > MAX_WIDTH or image.height > MAX_HEIGHT:
-        # Calculate resize ratio maintaining aspect ratio
-        ratio = min(MAX_WIDTH / image.width, MAX_HEIGHT / image.height)
-        new_size = (int(image.width * ratio), int(image.height * ratio))
-        logger.info(f"Resizing image from {image.size} to {new_size} for OCR")
-        image = image.resize(new_size, Image.Resampling.LANCZOS)
-    
-    # Convert to RGB if necessary
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
+    # Decode at reduced resolution where possible (JPEG draft mode), keeping
+    # high resolution for OCR - IDs need good resolution, so the limit is 2500
+    image = decode_base64_image(image_base64, max_dimension=OCR_MAX_DIMENSION, mode='RGB')
+    logger.info(f"Image decoded for OCR: {image.size}")
+    emit('decoded', width=image.size[0], height=image.size[1])
     return image
 
 
@@ -235,6 +221,8 @@ def extract_text_paddle_single(paddle_ocr, img_array) -> Tuple[str, float]:
 
 def save_debug_image(image: Image.Image, name: str):
     """Save debug image to disk"""
+    if not OCR_DEBUG_IMAGES:
+        return
     try:
         debug_dir = os.path.join(os.path.dirname(__file__), 'debug_output')
         os.makedirs(debug_dir, exist_ok=True)
@@ -245,13 +233,44 @@ def save_debug_image(image: Image.Image, name: str):
     except Exception as e:
         logger.warning(f"Failed to save debug image: {e}")
 
+
+def paddle_variants(image: Image.Image) -> Iterator[Tuple[str, Image.Image]]:
+    """
+    Yield the PaddleOCR retry variants in the order they are tried
+    
+    Variants are built lazily, so the preprocessing for later variants is
+    skipped when an earlier one already produced enough text.
+    
+    Args:
+        image: RGB PIL Image
+        
+    Yields:
+        Tuples of (variant name, PIL Image)
+    """
+    yield 'original', image
+    
+    gray = image.convert('L')
+    yield 'grayscale', gray
+    
+    # High Contrast
+    yield 'high_contrast', ImageEnhance.Contrast(gray).enhance(2.0)
+    
+    # Thresholding (Binarization)
+    yield 'binary', gray.point(lambda x: 255 if x > 128 else 0, mode='1')
+
+
+def paddle_variant_array(image: Image.Image) -> np.ndarray:
+    """Array handed to PaddleOCR for one variant (bilevel images as 8-bit)"""
+    if image.mode == '1':
+        image = image.convert('L')
+    return np.array(image)
+
+
 def extract_text_paddle(image: Image.Image) -> Tuple[str, float]:
     """
     Extract text from image using PaddleOCR with retries on preprocessed versions
     """
     try:
-        import time
-        from PIL import ImageEnhance, ImageOps
         start_time = time.time()
         
         paddle_ocr = get_paddle_ocr()
@@ -259,50 +278,33 @@ def extract_text_paddle(image: Image.Image) -> Tuple[str, float]:
             raise Exception("PaddleOCR not available")
         
         logger.info(f"Running PaddleOCR on {image.size} image...")
-        save_debug_image(image, "original")
-        
-        # 1. Try original image
-        # PaddleOCR expects RGB or BGR. PIL is RGB.
-        text, conf = extract_text_paddle_single(paddle_ocr, np.array(image))
         
-        # If good result, return immediately
-        if len(text.strip()) > 20:  # Arbitrary threshold for "good enough"
-            elapsed = time.time() - start_time
-            logger.info(f"PaddleOCR success on original image in {elapsed:.2f}s")
-            return text, conf
-            
-        logger.info(f"PaddleOCR original result weak ({len(text)} chars), trying variants...")
-        
-        # Prepare variants
-        variants = []
-        
-        # Grayscale
-        gray = image.convert('L')
-        variants.append((np.array(gray), "grayscale"))
-        save_debug_image(gray, "grayscale")
-        
-        # High Contrast
-        enhanced = ImageEnhance.Contrast(gray).enhance(2.0)
-        variants.append((np.array(enhanced), "high_contrast"))
-        save_debug_image(enhanced, "high_contrast")
+        best_text = ""
+        best_conf = 0.0
         
-        # Thresholding (Binarization)
-        thresh = gray.point(lambda x: 255 if x > 128 else 0, mode='1')
-        variants.append((np.array(thresh.convert('L')), "binary"))
-        save_debug_image(thresh, "binary")
-        
-        best_text = text
-        best_conf = conf
-        
-        for img_array, name in variants:
-            var_text, var_conf = extract_text_paddle_single(paddle_ocr, img_array)
+        for name, variant in paddle_variants(image):
+            emit('preprocessing', engine='paddle', variant=name)
+            save_debug_image(variant, name)
+            # PaddleOCR expects RGB or BGR. PIL is RGB.
+            with span('ocr_paddle_variant', name):
+                var_text, var_conf = extract_text_paddle_single(paddle_ocr, paddle_variant_array(variant))
             logger.info(f"PaddleOCR variant {name}: {len(var_text)} chars, conf {var_conf:.2f}")
             
+            if name == 'original':
+                best_text, best_conf = var_text, var_conf
+                # If good result, return immediately
+                if len(var_text.strip()) > PADDLE_ACCEPT_CHARS:
+                    elapsed = time.time() - start_time
+                    logger.info(f"PaddleOCR success on original image in {elapsed:.2f}s")
+                    return var_text, var_conf
+                logger.info(f"PaddleOCR original result weak ({len(var_text)} chars), trying variants...")
+                continue
+            
             if len(var_text) > len(best_text):
                 best_text = var_text
                 best_conf = var_conf
                 
-            if len(best_text.strip()) > 50:
+            if len(best_text.strip()) > PADDLE_VARIANT_STOP_CHARS:
                 break
         
         elapsed = time.time() - start_time
@@ -314,9 +316,91 @@ def extract_text_paddle(image: Image.Image) -> Tuple[str, float]:
         raise
 
 
+# OCR engines available to the cascade
+OCR_ENGINES = {
+    'surya': extract_text_surya,
+    'paddle': extract_text_paddle,
+}
+
+# Engine models are not thread-safe; a speculative run that outlives its
+# request must not overlap the next request's run of the same engine
+_engine_locks = {engine: threading.Lock() for engine in OCR_ENGINES}
+
+# Executor for speculative secondary-engine runs
+_speculative_executor = None
+
+
+def get_speculative_executor() -> ThreadPoolExecutor:
+    """Lazy create the executor used for speculative OCR runs"""
+    global _speculative_executor
+    if _speculative_executor is None:
+        _speculative_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ocr-speculative')
+    return _speculative_executor
+
+
+def available_ocr_engines() -> List[str]:
+    """Names of the OCR engines that imported successfully"""
+    engines = []
+    if SURYA_AVAILABLE:
+        engines.append('surya')
+    else:
+        logger.warning("Surya not available")
+    if PADDLE_AVAILABLE:
+        engines.append('paddle')
+    else:
+        logger.warning("PaddleOCR not available")
+    return engines
+
+
+def run_ocr_engine(engine: str, image: Image.Image) -> Dict:
+    """
+    Run one OCR engine and score the result by extracted-field completeness
+    
+    Returns:
+        Dictionary with engine, text, confidence, completeness and latency
+    """
+    emit('engine_started', engine=engine)
+    start_time = time.time()
+    outcome = 'ok'
+    try:
+        with _engine_locks[engine]:
+            text, confidence = OCR_ENGINES[engine](image)
+    except Exception as e:
+        logger.error(f"{engine} OCR failed: {e}")
+        text, confidence = "", 0.0
+        outcome = 'error'
+    elapsed = time.time() - start_time
+    observe('ocr_engine', engine, elapsed, outcome)
+    
+    completeness = field_completeness(extract_fields(text)) if text else 0.0
+    get_cascade_policy().record(engine, elapsed, completeness)
+    logger.info(f"{engine} extracted {len(text)} chars in {elapsed:.2f}s "
+                f"(field completeness {completeness:.0%}): '{text[:200]}'...")
+    emit('engine_finished', engine=engine, completeness=round(completeness, 2), seconds=round(elapsed, 2))
+    
+    return {
+        'engine': engine,
+        'text': text,
+        'confidence': confidence,
+        'completeness': completeness,
+        'latency': elapsed
+    }
+
+
+def _result_rank(result: Dict) -> Tuple[float, float, int]:
+    """Sort key for picking the best OCR result"""
+    return result['completeness'], result['confidence'], len(result['text'].strip())
+
+
 def extract_text_from_image(image: Image.Image) -> Tuple[str, float, str]:
     """
-    Extract text from image using Surya (primary) with PaddleOCR fallback
+    Extract text from image using a confidence-driven engine cascade
+    
+    Engines are tried cheapest-expected-cost first (from observed history).
+    A result is accepted once it yields the identity fields (name and DOB);
+    otherwise the next engine runs and the most complete result wins. When
+    OCR_SPECULATIVE is enabled and the image quality is low, the secondary
+    engine starts in parallel instead of after the primary finishes.
     
     Args:
         image: PIL Image object
@@ -324,40 +408,47 @@ def extract_text_from_image(image: Image.Image) -> Tuple[str, float, str]:
     Returns:
         Tuple of (extracted text, confidence score, engine used)
     """
-    surya_text = ""
-    paddle_text = ""
-    
-    # Try Surya first
-    if SURYA_AVAILABLE:
-        try:
-            text, confidence = extract_text_surya(image)
-            surya_text = text
-            logger.info(f"Surya extracted {len(text)} chars: '{text[:200]}'...")
-            if text and len(text.strip()) > 10:
-                return text, confidence, 'surya'
-            logger.warning(f"Surya OCR returned insufficient text (only {len(text.strip())} chars), trying PaddleOCR...")
-        except Exception as e:
-            logger.error(f"Surya OCR failed: {e}, trying PaddleOCR...")
-    else:
-        logger.warning("Surya not available")
-    
-    # Fallback to PaddleOCR
-    if PADDLE_AVAILABLE:
-        try:
-            text, confidence = extract_text_paddle(image)
-            paddle_text = text
-            logger.info(f"PaddleOCR extracted {len(text)} chars: '{text[:200]}'...")
-            if text and len(text.strip()) > 10:
-                return text, confidence, 'paddle'
-            logger.error(f"PaddleOCR also returned insufficient text (only {len(text.strip())} chars)")
-        except Exception as e:
-            logger.error(f"PaddleOCR also failed: {e}")
-    else:
-        logger.warning("PaddleOCR not available")
+    policy = get_cascade_policy()
+    engines = policy.order(available_ocr_engines())
+    results = []
+    
+    if len(engines) > 1:
+        quality = image_quality_score(image)
+        logger.info(f"OCR cascade order {engines}, image quality {quality:.2f}, history {policy.snapshot()}")
+        
+        if policy.should_speculate(quality):
+            logger.info(f"Low image quality - running {engines[1]} speculatively alongside {engines[0]}")
+            executor = get_speculative_executor()
+            # Each run gets its own copy of the request context so its progress events reach the client
+            pending = {executor.submit(contextvars.copy_context().run, run_ocr_engine, engine, image)
+                       for engine in engines[:2]}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results.append(result)
+                    if result['completeness'] >= ACCEPT_COMPLETENESS:
+                        # The other engine keeps running in the background; its
+                        # outcome still feeds the cascade history
+                        return result['text'], result['confidence'], result['engine']
+            engines = engines[2:]
+    
+    for engine in engines:
+        result = run_ocr_engine(engine, image)
+        results.append(result)
+        if result['completeness'] >= ACCEPT_COMPLETENESS:
+            return result['text'], result['confidence'], result['engine']
+        logger.warning(f"{engine} result incomplete ({result['completeness']:.0%} of identity fields), trying next engine...")
+    
+    if results:
+        best = max(results, key=_result_rank)
+        if len(best['text'].strip()) > OCR_MIN_TEXT_CHARS:
+            logger.info(f"No engine extracted every identity field, using best result from {best['engine']}")
+            return best['text'], best['confidence'], best['engine']
     
     # Provide detailed error message
-    error_details = f"Surya: {len(surya_text)} chars, PaddleOCR: {len(paddle_text)} chars"
-    logger.error(f"Both OCR engines failed. {error_details}")
+    error_details = ", ".join(f"{r['engine']}: {len(r['text'])} chars" for r in results) or "no engines available"
+    logger.error(f"All OCR engines failed. {error_details}")
     raise Exception(f"Both OCR engines failed to extract sufficient text. {error_details}")
 
 
@@ -371,46 +462,7 @@ def detect_dc_id(text: str) -> bool:
     Returns:
         True if DC ID, False otherwise
     """
-    text_upper = text.upper()
-    
-    # DC indicators
-    dc_indicators = [
-        'DISTRICT OF COLUMBIA',
-        'DISTRICT COLUMBIA',
-        'WASHINGTON DC',
-        'WASHINGTON, DC',
-        'WASH DC',
-        'DC DMV',
-        'DEPARTMENT OF MOTOR VEHICLES',
-        'DRIVER LICENSE',
-        'DRIVER\'S LICENSE',
-    ]
-    
-    # Check for DC indicators
-    for indicator in dc_indicators:
-        if indicator in text_upper:
-            logger.info(f"DC ID detected: Found '{indicator}'")
-            return True
-    
-    # Check for DC in address section
-    if re.search(r'\bDC\b.*?\d{5}', text_upper):
-        logger.info("DC ID detected: Found DC with ZIP code")
-        return True
-    
-    logger.info("Non-DC ID detected")
-    return False
-
-
-def get_random_dc_address() -> Dict[str, str]:
-    """
-    Get a random DC address from the database
-    
-    Returns:
-        Dictionary with address fields
-    """
-    address = random.choice(DC_ADDRESSES)
-    logger.info(f"Assigned random DC address: {address['street']}")
-    return address
+    return extract_fields(text)['isDC']
 
 
 def extract_name(text: str) -> Dict[str, str]:
@@ -420,56 +472,7 @@ def extract_name(text: str) -> Dict[str, str]:
     Returns:
         Dictionary with firstName, middleInitial, lastName, suffix
     """
-    result = {
-        'firstName': '',
-        'middleInitial': '',
-        'lastName': '',
-        'suffix': ''
-    }
-    
-    # Pattern 1: "LN LASTNAME FN FIRSTNAME" or "LN: LASTNAME FN: FIRSTNAME"
-    pattern1 = re.search(r'LN[:\s]+([A-Z][A-Za-z]+)[,\s]+FN[:\s]+([A-Z][A-Za-z]+)', text, re.IGNORECASE)
-    if pattern1:
-        result['lastName'] = pattern1.group(1).strip().title()
-        result['firstName'] = pattern1.group(2).strip().title()
-        logger.info(f"Name extracted (Pattern 1): {result['firstName']} {result['lastName']}")
-        return result
-    
-    # Pattern 2: "LASTNAME, FIRSTNAME" (all caps)
-    pattern2 = re.search(r'\b([A-Z]{2,})[,\s]+([A-Z]{2,})\b', text)
-    if pattern2:
-        result['lastName'] = pattern2.group(1).strip().title()
-        result['firstName'] = pattern2.group(2).strip().title()
-        logger.info(f"Name extracted (Pattern 2): {result['firstName']} {result['lastName']}")
-        return result
-    
-    # Pattern 3: "FirstName LastName" (Title case after keywords like "Name:", "DL Name", etc.)
-    pattern3 = re.search(r'(?:Name|DL\s*Name|Full\s*Name)[:\s]+([A-Z][a-z]+)\s+([A-Z][a-z]+)', text, re.IGNORECASE)
-    if pattern3:
-        result['firstName'] = pattern3.group(1).strip().title()
-        result['lastName'] = pattern3.group(2).strip().title()
-        logger.info(f"Name extracted (Pattern 3): {result['firstName']} {result['lastName']}")
-        return result
-    
-    # Pattern 4: Search for two consecutive capitalized words (fallback)
-    lines = text.split('\n')
-    for line in lines:
-        words = re.findall(r'\b[A-Z][a-z]{1,}\b', line)
-        if len(words) >= 2:
-            # Skip common words
-            skip_words = {'Date', 'Birth', 'License', 'Driver', 'Drivers', 'Class', 'Sex', 'Height', 
-                         'Eyes', 'Hair', 'Address', 'City', 'State', 'Zip', 'Issue', 'Expires', 
-                         'Endorsements', 'Restrictions', 'District', 'Columbia', 'Washington'}
-            
-            filtered_words = [w for w in words if w not in skip_words]
-            if len(filtered_words) >= 2:
-                result['firstName'] = filtered_words[0]
-                result['lastName'] = filtered_words[1]
-                logger.info(f"Name extracted (Pattern 4): {result['firstName']} {result['lastName']}")
-                return result
-    
-    logger.warning("Could not extract name from OCR text")
-    return result
+    return extract_fields(text)['name']
 
 
 def extract_dob(text: str) -> str:
@@ -479,61 +482,7 @@ def extract_dob(text: str) -> str:
     Returns:
         Date in YYYY-MM-DD format, or empty string
     """
-    # Pattern 1: DOB: MM/DD/YYYY or DOB MM/DD/YYYY
-    pattern1 = re.search(r'DOB[:\s]*(\d{1,2})[/-](\d{1,2})[/-](\d{4})', text, re.IGNORECASE)
-    if pattern1:
-        month, day, year = pattern1.groups()
-        try:
-            datetime(int(year), int(month), int(day))
-            dob = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-            logger.info(f"DOB extracted (Pattern 1): {dob}")
-            return dob
-        except ValueError:
-            pass
-    
-    # Pattern 2: Birth: MM/DD/YYYY or Birth MM/DD/YYYY
-    pattern2 = re.search(r'Birth[:\s]*(\d{1,2})[/-](\d{1,2})[/-](\d{4})', text, re.IGNORECASE)
-    if pattern2:
-        month, day, year = pattern2.groups()
-        try:
-            datetime(int(year), int(month), int(day))
-            dob = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-            logger.info(f"DOB extracted (Pattern 2): {dob}")
-            return dob
-        except ValueError:
-            pass
-    
-    # Pattern 3: Standalone date MM/DD/YYYY (with validation)
-    pattern3 = re.findall(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b', text)
-    for match in pattern3:
-        month, day, year = match
-        try:
-            # Validate it's a reasonable birth date (between 1920 and 2010)
-            year_int = int(year)
-            if 1920 <= year_int <= 2010:
-                datetime(year_int, int(month), int(day))
-                dob = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                logger.info(f"DOB extracted (Pattern 3): {dob}")
-                return dob
-        except ValueError:
-            continue
-    
-    # Pattern 4: MMDDYYYY format (8 consecutive digits)
-    pattern4 = re.findall(r'\b(\d{2})(\d{2})(\d{4})\b', text)
-    for match in pattern4:
-        month, day, year = match
-        try:
-            year_int = int(year)
-            if 1920 <= year_int <= 2010:
-                datetime(year_int, int(month), int(day))
-                dob = f"{year}-{month}-{day}"
-                logger.info(f"DOB extracted (Pattern 4): {dob}")
-                return dob
-        except ValueError:
-            continue
-    
-    logger.warning("Could not extract DOB from OCR text")
-    return ''
+    return extract_fields(text)['dateOfBirth']
 
 
 def extract_address(text: str) -> Dict[str, str]:
@@ -543,41 +492,7 @@ def extract_address(text: str) -> Dict[str, str]:
     Returns:
         Dictionary with street, aptSuite, city, state, zip
     """
-    result = {
-        'street': '',
-        'aptSuite': '',
-        'city': 'Washington',
-        'state': 'DC',
-        'zip': ''
-    }
-    
-    # Extract ZIP code (5 digits, possibly followed by -XXXX)
-    zip_matches = re.findall(r'\b(\d{5})(?:-\d{4})?\b', text)
-    # DC ZIP codes start with 200 or 204
-    for zip_code in zip_matches:
-        if zip_code.startswith('200') or zip_code.startswith('204'):
-            result['zip'] = zip_code
-            logger.info(f"ZIP extracted: {zip_code}")
-            break
-    
-    # Extract street address (number + street name + street type)
-    street_types = r'(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Place|Pl|Terrace|Ter|Court|Ct|Circle|Cir)'
-    street_match = re.search(
-        rf'(\d+\s+[A-Za-z\s]+\s*{street_types}\.?\s*(?:NW|NE|SW|SE)?)',
-        text,
-        re.IGNORECASE
-    )
-    if street_match:
-        result['street'] = street_match.group(1).strip()
-        logger.info(f"Street extracted: {result['street']}")
-    
-    # Extract apartment/suite
-    apt_match = re.search(r'(?:Apt|Apartment|Suite|Unit|#)\s*([A-Z0-9]+)', text, re.IGNORECASE)
-    if apt_match:
-        result['aptSuite'] = f"Apt {apt_match.group(1)}"
-        logger.info(f"Apt/Suite extracted: {result['aptSuite']}")
-    
-    return result
+    return extract_fields(text)['address']
 
 
 def extract_id_data(image_base64: str) -> Dict:
@@ -606,29 +521,26 @@ def extract_id_data(image_base64: str) -> Dict:
         logger.info(f"OCR text extracted ({len(text)} chars):\n{text}")
         logger.info("=" * 60)
         
-        if not text or len(text.strip()) < 10:
+        if not text or len(text.strip()) < OCR_MIN_TEXT_CHARS:
             return {
                 'success': False,
                 'error': 'Could not extract sufficient text from image. Please ensure the ID is clear, well-lit, and in focus.'
             }
         
-        # Detect if DC ID
-        is_dc = detect_dc_id(text)
-        
-        # Extract name (always extracted)
-        name_data = extract_name(text)
-        
-        # Extract DOB (always extracted)
-        dob = extract_dob(text)
+        # Resolve name, DOB, address and DC indicators in one pass
+        fields = extract_fields(text)
+        is_dc = fields['isDC']
+        name_data = fields['name']
+        dob = fields['dateOfBirth']
         
         # Extract address based on ID type
         if is_dc:
             # DC ID: Extract actual address
-            address_data = extract_address(text)
+            address_data = fields['address']
             logger.info(f"DC ID - Address extracted: {address_data}")
         else:
-            # Non-DC ID: Use random DC address
-            address_data = get_random_dc_address()
+            # Non-DC ID: Use a pooled DC address
+            address_data = sample_dc_address()
             logger.info(f"Non-DC ID - Random DC address assigned")
         
         # Combine all data
@@ -650,6 +562,7 @@ def extract_id_data(image_base64: str) -> Dict:
         final_confidence = (confidence * 0.7) + (field_confidence * 0.3)
         
         logger.info(f"Extraction complete: {filled_required}/{len(required_fields)} required fields extracted")
+        emit('fields_parsed', fields=filled_required, required=len(required_fields), isDC=is_dc)
         logger.info(f"Final confidence: {final_confidence:.2%}")
         
         return {
@@ -657,6 +570,8 @@ def extract_id_data(image_base64: str) -> Dict:
             'data': extracted_data,
             'isDC': is_dc,
             'confidence': round(final_confidence, 2),
+            'fieldConfidence': fields['confidence'],
+            'fieldPatterns': fields['patterns'],
             'ocrEngine': engine
         }
         
@@ -0,0 +1,61 @@
+"""
+Progress events for long-running requests
+Pipeline code calls emit('stage', key=value) at milestones (image decoded,
+OCR engine started, form filled, ...). The events go to whichever reporter
+the current request installed with reporting(), or nowhere when no client
+is listening, so emit() costs a context variable lookup on the normal path.
+
+The reporter is held in a context variable: it follows the request into
+thread pools that copy the context (worker_pools.py does), and worker_pools
+relays events from its process pools back to the parent.
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Reporter = Callable[[str, Dict], None]
+
+_reporter: contextvars.ContextVar[Optional[Reporter]] = contextvars.ContextVar('progress_reporter', default=None)
+
+
+def emit(stage: str, **details):
+    """
+    Report that the current request reached a stage
+
+    Args:
+        stage: Stage name, e.g. 'decoded' or 'engine_started'
+        **details: JSON-serializable extras (engine name, counts, ...)
+    """
+    reporter = _reporter.get()
+    if reporter is None:
+        return
+    try:
+        reporter(stage, details)
+    except Exception as e:
+        # A client that went away must never break the work itself
+        logger.debug(f"Progress reporter failed for {stage}: {e}")
+
+
+def current_reporter() -> Optional[Reporter]:
+    """The reporter installed for the current request, if any"""
+    return _reporter.get()
+
+
+@contextmanager
+def reporting(reporter: Optional[Reporter]):
+    """
+    Send progress events emitted inside the block to reporter
+
+    Usage:
+        with reporting(lambda stage, details: events.put((stage, details))):
+            extract_id_data(image)
+    """
+    token = _reporter.set(reporter)
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
@@ -3,25 +3,141 @@ QuickBase Form Automation using Playwright
 Handles form submission via browser automation
 """
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
 from datetime import datetime
 import os
 import base64
 import tempfile
-from typing import Dict, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
+from urllib.parse import urlparse
 import logging
+import time
+import uuid
+
+from age_eligibility import MINIMUM_AGE, dob_age
+from metrics import REGISTRY, observe, span
+from failure_artifacts import capture_page
+from progress import emit
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _env_list(name: str, default: str) -> tuple:
+    return tuple(item.strip().lower() for item in os.environ.get(name, default).split(',') if item.strip())
+
+
+# Request interception: only the form page, its scripts and its XHR are needed to fill
+# and submit. Everything else costs load time and renderer memory, and third-party
+# analytics beacons are what kept 'networkidle' from ever settling.
+QB_BLOCK_REQUESTS = os.environ.get('QB_BLOCK_REQUESTS', '1').lower() in ('1', 'true', 'yes')
+# Hosts allowed to serve anything (subdomains included); the QuickBase host is always allowed
+QB_ALLOWED_DOMAINS = _env_list('QB_ALLOWED_DOMAINS', 'quickbase.com')
+# Resource types aborted even from allowed hosts. Add 'stylesheet' once the form has been
+# verified to reveal its conditional fields without QuickBase's CSS.
+QB_BLOCKED_RESOURCE_TYPES = _env_list('QB_BLOCKED_RESOURCE_TYPES', 'image,media,font,manifest,texttrack,eventsource,websocket')
+# URL substrings aborted even from allowed hosts (analytics and keep-alive beacons)
+QB_BLOCKED_URL_PATTERNS = _env_list(
+    'QB_BLOCKED_URL_PATTERNS', 'analytics,beacon,gtag,googletagmanager,hotjar,newrelic,nr-data,segment.io,doubleclick')
+
+QB_VIEWPORT_WIDTH, QB_VIEWPORT_HEIGHT = (
+    int(v) for v in os.environ.get('QB_VIEWPORT', '1024x768').lower().split('x'))
+
+# Chromium flags for a short-lived, single-page headless session
+QB_LAUNCH_ARGS = [
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-dev-shm-usage',       # /dev/shm is 64MB in containers; use /tmp instead
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--mute-audio',
+    '--renderer-process-limit=1',
+] + [arg for arg in os.environ.get('QB_EXTRA_LAUNCH_ARGS', '').split() if arg]
+
+# Upper bound on waiting for a submission to complete; failures usually resolve in seconds
+QB_SUBMIT_TIMEOUT_MS = int(os.environ.get('QB_SUBMIT_TIMEOUT_MS', '60000'))
+# Poll slice between checks of the POST status; the page itself is watched by a MutationObserver
+COMPLETION_POLL_MS = 500
+
+SUCCESS_PAGE_IDS = ('18', '40')
+
+# Containers QuickBase renders validation and save errors into
+ERROR_SELECTORS = '.error, .validation-error, label.error, .errMsg, .errormessage, .error-message, .field-error'
+# Wider net for describing a failure once we know the submission failed
+ERROR_SCRAPE_SELECTORS = ERROR_SELECTORS + (
+    ', [class*="error"], [class*="Error"], div[style*="color: red"], span[style*="color: red"]')
+
+# Visible, non-empty, de-duplicated texts of the elements matching a selector list
+COLLECT_ERRORS_JS = """
+(selectors) => {
+    const messages = [];
+    for (const el of document.querySelectorAll(selectors)) {
+        if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) continue;
+        const text = (el.innerText || '').trim();
+        if (text && !messages.includes(text)) messages.push(text);
+    }
+    return messages;
+}
+"""
+
+# Resolves (truthy) on the success page or once an error message is visible. Evaluated
+# with polling='mutation', so it re-runs on every DOM change instead of on a timer.
+# The pageid parameter is compared whole (pageID=180 is not page 18).
+COMPLETION_JS = """
+([successIds, selectors]) => {
+    const pageId = [...new URL(location.href).searchParams].find(([key]) => key.toLowerCase() === 'pageid');
+    if (pageId && successIds.includes(pageId[1])) return {outcome: 'success', messages: []};
+    const messages = (%s)(selectors);
+    return messages.length ? {outcome: 'validation_error', messages} : null;
+}
+""" % COLLECT_ERRORS_JS.strip()
+
+# Per-keystroke delay when typing into masked inputs (phone)
+TYPING_DELAY_MS = 100
+
+# Sets a (possibly read-only) input's value only if it is empty
+FILL_IF_EMPTY_JS = "(el, value) => { if (!el.value) el.value = value; }"
+
+
+def is_form_submission(response) -> bool:
+    """Whether a response answers the form submit: a POST navigating the page, not a background XHR"""
+    request = response.request
+    return request.method == 'POST' and request.is_navigation_request() and request.frame.parent_frame is None
+
+
+class FillStep(NamedTuple):
+    """One form interaction; optional steps log a warning instead of failing the submission"""
+    action: str              # fill, select, type, upload, check, check_if_visible, wait_visible, fill_if_empty
+    selector: str
+    value: Any = None        # text / option / file path, or timeout (ms) for wait_visible
+    optional: bool = False
+    log: Optional[str] = None
+
+
+BROWSER_REQUESTS = REGISTRY.counter(
+    'checkin_browser_requests_total',
+    'Requests made by the form automation browser, by whether interception let them through',
+    ('outcome',)
+)
+
+
 class QuickBaseFormAutomation:
     """Automates QuickBase medical cannabis application form submission"""
     
-    DC_FORM_URL = "https://octo.quickbase.com/db/bscn22va8?a=dbpage&pageid=23"
-    NONDC_FORM_URL = "https://octo.quickbase.com/db/bscn22va8?a=dbpage&pageID=39"
-    DC_SUCCESS_URL = "https://octo.quickbase.com/db/bscn22va8?a=dbpage&pageID=18"
-    NONDC_SUCCESS_URL = "https://octo.quickbase.com/db/bscn22va8?a=dbpage&pageID=40"
+    # Overridable so the automation can run against a local form simulator
+    # (scripts/quickbase_simulator.py) for load and performance testing
+    BASE_URL = os.environ.get('QUICKBASE_BASE_URL', 'https://octo.quickbase.com').rstrip('/')
+    
+    BASE_HOST = urlparse(BASE_URL).hostname or ''
+    
+    DC_FORM_URL = f"{BASE_URL}/db/bscn22va8?a=dbpage&pageid=23"
+    NONDC_FORM_URL = f"{BASE_URL}/db/bscn22va8?a=dbpage&pageID=39"
+    DC_SUCCESS_URL = f"{BASE_URL}/db/bscn22va8?a=dbpage&pageID=18"
+    NONDC_SUCCESS_URL = f"{BASE_URL}/db/bscn22va8?a=dbpage&pageID=40"
     
     # Time period mapping for Non-DC residents
     TIME_PERIOD_MAP = {
@@ -43,16 +159,241 @@ class QuickBaseFormAutomation:
         self.headless = headless
         self.slow_mo = slow_mo
     
+    def should_block_request(self, url: str, resource_type: str) -> bool:
+        """
+        Decide whether the automation browser should skip a request
+        
+        Args:
+            url: Request URL
+            resource_type: Playwright resource type (document, script, image, ...)
+            
+        Returns:
+            True if the request should be aborted
+        """
+        if resource_type == 'document':
+            return False
+        host = (urlparse(url).hostname or '').lower()
+        allowed = host == self.BASE_HOST or any(
+            host == domain or host.endswith('.' + domain) for domain in QB_ALLOWED_DOMAINS)
+        if not allowed or resource_type in QB_BLOCKED_RESOURCE_TYPES:
+            return True
+        lowered = url.lower()
+        return any(pattern in lowered for pattern in QB_BLOCKED_URL_PATTERNS)
+    
+    def build_fill_steps(self, application_data: Dict, resident_type: str, id_image_path: str) -> List[FillStep]:
+        """
+        The ordered form interactions for one application
+        
+        Shared by the sync runner below and the async engine (quickbase_engine.py)
+        so both fill the form identically.
+        
+        Args:
+            application_data: Application fields (see submit_application)
+            resident_type: 'dc' or 'nondc'
+            id_image_path: ID image file for the upload fields
+            
+        Returns:
+            List of FillStep
+        """
+        data = application_data
+        steps = []
+        
+        def name_fields():
+            steps.append(FillStep('fill', 'input[name="_fid_6"]', data['firstName']))
+            if data.get('middleInitial'):
+                steps.append(FillStep('fill', 'input[name="_fid_7"]', data['middleInitial'][:1]))
+            steps.append(FillStep('fill', 'input[name="_fid_8"]', data['lastName']))
+            if data.get('suffix'):
+                steps.append(FillStep('fill', 'input[name="_fid_35"]', data['suffix']))
+        
+        def phone_field(log: str):
+            # Phone is typed, not filled, because the field has input masking
+            steps.append(FillStep('wait_visible', 'input[name="_fid_17"]', 2000))
+            steps.append(FillStep('type', 'input[name="_fid_17"]', data['phoneNumber'], log=log))
+        
+        if resident_type == 'dc':
+            # Application Type
+            steps.append(FillStep('select', 'select[name="_fid_76"]', 'Initial'))
+            name_fields()
+            # DC DMV Real ID (set to "Yes" as requested) reveals its file upload field
+            steps.append(FillStep('select', 'select[name="_fid_122"]', 'Yes'))
+            steps.append(FillStep('wait_visible', 'input[name="_fid_121"]', 5000, optional=True,
+                                  log="DC DMV Real ID field visible"))
+            steps.append(FillStep('fill', 'input[name="_fid_11"]', data['dateOfBirth']))
+            # Address fields
+            steps.append(FillStep('fill', 'input[name="_fid_12"]', data['street']))
+            if data.get('aptSuite'):
+                steps.append(FillStep('fill', 'input[name="_fid_13"]', data['aptSuite']))
+            steps.append(FillStep('fill', 'input[name="_fid_14"]', data.get('city', 'Washington')))
+            steps.append(FillStep('select', 'select[name="_fid_15"]', data.get('state', 'DC')))
+            steps.append(FillStep('fill', 'input[name="_fid_16"]', data['zip']))
+            phone_field("Phone number filled")
+            steps.append(FillStep('fill', 'input[name="_fid_18"]', data['email']))
+            steps.append(FillStep('fill', 'input[name="_fid_117"]', data['email']))
+            # Certification Type reveals the Self Certification checkbox (fid_176)
+            steps.append(FillStep('wait_visible', 'select[name="_fid_124"]', 2000, optional=True))
+            steps.append(FillStep('select', 'select[name="_fid_124"]', 'Self certification', optional=True))
+            steps.append(FillStep('wait_visible', 'input[name="_fid_176"]', 5000, optional=True,
+                                  log="Self certification checkbox visible"))
+            # Government ID and DC DMV Real ID uploads
+            steps.append(FillStep('upload', 'input[name="_fid_50"]', id_image_path, log="Government ID uploaded"))
+            steps.append(FillStep('upload', 'input[name="_fid_121"]', id_image_path, log="DC DMV Real ID uploaded"))
+            # NOTE: Do NOT interact with Reduced Fee dropdown - leave it at default
+        else:
+            # Time Period (required for Non-DC)
+            if data.get('timePeriod'):
+                time_period_value = self.TIME_PERIOD_MAP.get(data['timePeriod'], '30 days ($20)')
+                steps.append(FillStep('select', 'select[name="_fid_204"]', time_period_value,
+                                      log=f"Time Period set to: {time_period_value}"))
+            name_fields()
+            steps.append(FillStep('fill', 'input[name="_fid_11"]', data['dateOfBirth']))
+            # Address fields
+            steps.append(FillStep('fill', 'input[name="_fid_12"]', data['street']))
+            if data.get('aptSuite'):
+                steps.append(FillStep('fill', 'input[name="_fid_13"]', data['aptSuite']))
+            # Country (default to United States)
+            steps.append(FillStep('select', 'select[name="_fid_175"]', 'United States of America'))
+            steps.append(FillStep('fill', 'input[name="_fid_14"]', data.get('city', '')))
+            steps.append(FillStep('select', 'select[name="_fid_15"]', data.get('state', '')))
+            steps.append(FillStep('fill', 'input[name="_fid_16"]', data['zip']))
+            if data.get('phoneNumber'):
+                phone_field("Phone number filled (Non-DC)")
+            steps.append(FillStep('fill', 'input[name="_fid_18"]', data['email']))
+            steps.append(FillStep('fill', 'input[name="_fid_117"]', data['email']))
+            steps.append(FillStep('upload', 'input[name="_fid_50"]', id_image_path,
+                                  log="Government ID uploaded for Non-DC resident"))
+            # Payment Method (Online only for Non-DC)
+            steps.append(FillStep('select', 'select[name="_fid_120"]', 'Online', optional=True,
+                                  log="Payment method set to Online"))
+        
+        # Signature Section (Common for both)
+        steps.append(FillStep('check', 'input[name="_fid_72"]'))
+        steps.append(FillStep('check_if_visible', 'input[name="_fid_176"]', optional=True))
+        steps.append(FillStep('fill', 'input[name="_fid_59"]', f"{data['firstName']} {data['lastName']}"))
+        # Date is read-only and normally prefilled; set it directly if it isn't
+        steps.append(FillStep('fill_if_empty', 'input[name="_fid_60"]', datetime.now().strftime("%Y-%m-%d")))
+        return steps
+    
+    def run_fill_steps(self, page, steps: List[FillStep]):
+        """
+        Perform fill steps on a page in order
+        
+        Args:
+            page: Playwright page (sync API)
+            steps: Steps from build_fill_steps
+        """
+        for step in steps:
+            try:
+                if step.action == 'fill':
+                    page.fill(step.selector, step.value)
+                elif step.action == 'select':
+                    page.select_option(step.selector, step.value)
+                elif step.action == 'type':
+                    page.click(step.selector)
+                    page.locator(step.selector).press_sequentially(step.value, delay=TYPING_DELAY_MS)
+                elif step.action == 'upload':
+                    page.set_input_files(step.selector, step.value)
+                elif step.action == 'check':
+                    page.check(step.selector)
+                elif step.action == 'check_if_visible':
+                    if page.is_visible(step.selector):
+                        page.check(step.selector)
+                elif step.action == 'wait_visible':
+                    page.wait_for_selector(step.selector, state='visible', timeout=step.value)
+                elif step.action == 'fill_if_empty':
+                    page.eval_on_selector(step.selector, FILL_IF_EMPTY_JS, step.value)
+            except Exception as e:
+                if not step.optional:
+                    raise
+                logger.warning(f"Optional step {step.action} {step.selector} skipped: {e}")
+                continue
+            if step.log:
+                logger.info(step.log)
+    
+    def collect_error_messages(self, page, selectors: str) -> list:
+        """
+        Visible error texts on the page, gathered in a single evaluate call
+        
+        Args:
+            page: Playwright page
+            selectors: Comma-separated CSS selectors for error containers
+            
+        Returns:
+            List of distinct, non-empty error messages
+        """
+        try:
+            return page.evaluate(COLLECT_ERRORS_JS, selectors)
+        except Exception as e:
+            logger.warning(f"Could not check for validation errors: {e}")
+            return []
+    
+    def wait_for_completion(self, page, post_statuses: list, timeout_ms: int) -> Dict:
+        """
+        Wait for the first sign that a submitted form succeeded or failed
+        
+        Races the success URL, the HTTP status of the form POST, and error
+        containers appearing in the DOM (watched by a MutationObserver), so a
+        failed submission returns as soon as the failure is visible instead of
+        after the full timeout.
+        
+        Args:
+            page: Playwright page the form was submitted from
+            post_statuses: Statuses of form submission responses, appended by a
+                response listener (see is_form_submission())
+            timeout_ms: Give up after this long
+            
+        Returns:
+            Dictionary with outcome ('success', 'validation_error', 'http_error'
+            or 'timeout'), error messages and the last POST status
+        """
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            status = post_statuses[-1] if post_statuses else None
+            if status is not None and status >= 400:
+                try:
+                    page.wait_for_load_state('domcontentloaded', timeout=5000)
+                except PlaywrightTimeout:
+                    pass
+                return {'outcome': 'http_error', 'messages': [], 'status': status}
+            
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                return {'outcome': 'timeout', 'messages': [], 'status': status}
+            
+            try:
+                handle = page.wait_for_function(
+                    COMPLETION_JS, arg=[list(SUCCESS_PAGE_IDS), ERROR_SELECTORS],
+                    polling='mutation', timeout=min(COMPLETION_POLL_MS, remaining_ms)
+                )
+                result = handle.json_value()
+                result['status'] = status
+                return result
+            except PlaywrightTimeout:
+                continue
+            except PlaywrightError:
+                # The submit navigated away mid-check; wait for the next document and look again
+                try:
+                    page.wait_for_load_state('domcontentloaded', timeout=max(1, min(5000, remaining_ms)))
+                except PlaywrightTimeout:
+                    pass
+    
+    def _route_request(self, route, blocked: list):
+        request = route.request
+        if self.should_block_request(request.url, request.resource_type):
+            blocked.append(request.url)
+            BROWSER_REQUESTS.inc('blocked')
+            route.abort()
+        else:
+            BROWSER_REQUESTS.inc('allowed')
+            route.continue_()
+    
     def calculate_age(self, dob_str: str) -> int:
         """Calculate age from date of birth string (YYYY-MM-DD)"""
-        try:
-            dob = datetime.strptime(dob_str, "%Y-%m-%d")
-            today = datetime.today()
-            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-            return age
-        except ValueError as e:
+        age = dob_age(dob_str)
+        if age is None:
             logger.error(f"Invalid DOB format: {dob_str}. Expected YYYY-MM-DD")
             raise ValueError(f"Invalid date format: {dob_str}")
+        return age
     
     def save_base64_to_temp_file(self, base64_data: str, filename: str = "temp_id.jpg") -> str:
         """
@@ -82,7 +423,8 @@ class QuickBaseFormAutomation:
         logger.info(f"Saved temporary file: {temp_path}")
         return temp_path
 
-    def submit_application(self, application_data: Dict, auto_submit: bool = False, resident_type: str = 'dc') -> Dict:
+    def submit_application(self, application_data: Dict, auto_submit: bool = False, resident_type: str = 'dc',
+                           submission_id: Optional[str] = None) -> Dict:
         """
         Submit application to QuickBase form via browser automation
         
@@ -104,235 +446,96 @@ class QuickBaseFormAutomation:
                 - timePeriod: str (optional, for Non-DC residents)
             resident_type: 'dc' or 'nondc'
             auto_submit: If True, submit the form automatically (default: False)
+            submission_id: ID failure artifacts are indexed under (generated if not given)
                 
         Returns:
             Dictionary with success status and message
         """
         temp_file_path = None
+        submission_id = submission_id or uuid.uuid4().hex[:12]
         
         try:
             # Validate age (must be 21+ for self-certification)
             age = self.calculate_age(application_data['dateOfBirth'])
-            if age < 21:
+            if age < MINIMUM_AGE:
                 return {
                     'success': False,
-                    'error': f'Self-certification requires age 21+. Applicant age: {age}',
+                    'error': f'Self-certification requires age {MINIMUM_AGE}+. Applicant age: {age}',
                     'age': age
                 }
             
             # Save ID image to temporary file
             temp_file_path = self.save_base64_to_temp_file(
                 application_data['idImageBase64'],
-                f"id_{application_data['lastName']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+                f"id_{submission_id}.jpg"
             )
             
             # Launch browser
             with sync_playwright() as p:
-                browser = p.chromium.launch(headless=self.headless, slow_mo=self.slow_mo)
-                context = browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                )
-                page = context.new_page()
+                with span('browser', 'launch'):
+                    browser = p.chromium.launch(headless=self.headless, slow_mo=self.slow_mo, args=QB_LAUNCH_ARGS)
+                    context = browser.new_context(
+                        viewport={'width': QB_VIEWPORT_WIDTH, 'height': QB_VIEWPORT_HEIGHT},
+                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+                        service_workers='block'
+                    )
+                    blocked_requests = []
+                    if QB_BLOCK_REQUESTS:
+                        context.route('**/*', lambda route: self._route_request(route, blocked_requests))
+                    page = context.new_page()
+                emit('browser_launched')
                 
                 # Select appropriate form URL based on resident type
                 form_url = self.DC_FORM_URL if resident_type == 'dc' else self.NONDC_FORM_URL
                 logger.info(f"Navigating to {resident_type.upper()} form: {form_url}")
-                page.goto(form_url, wait_until='networkidle', timeout=30000)
-                
                 # Capture console messages for debugging
                 console_messages = []
                 page.on("console", lambda msg: console_messages.append(f"{msg.type}: {msg.text}"))
-
-                # Wait for form to be ready
-                try:
-                    page.wait_for_selector('form[name="qdbform"]', timeout=10000)
-                    logger.info("Form loaded successfully")
-                except PlaywrightTimeout:
-                    logger.error("Timeout waiting for form to load. QuickBase might be down or URL changed.")
-                    page.screenshot(path=f"form_load_timeout_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-                    raise
-                
-                # Fill Section 1: Patient Information
-                logger.info("Filling patient information...")
                 
-                if resident_type == 'dc':
-                    # DC Resident Form Fields
-                    # Application Type
-                    page.select_option('select[name="_fid_76"]', 'Initial')
-                    
-                    # Name fields
-                    page.fill('input[name="_fid_6"]', application_data['firstName'])
-                    if application_data.get('middleInitial'):
-                        page.fill('input[name="_fid_7"]', application_data['middleInitial'][:1])
-                    page.fill('input[name="_fid_8"]', application_data['lastName'])
-                    if application_data.get('suffix'):
-                        page.fill('input[name="_fid_35"]', application_data['suffix'])
-                    
-                    # DC DMV Real ID (set to "Yes" as requested)
-                    page.select_option('select[name="_fid_122"]', 'Yes')
-                    # Wait for conditional field (DC DMV Real ID file upload) to appear instead of waiting fixed time
+                # Ready once the form element is in the DOM; background requests
+                # (beacons, polling) never let the network go idle
+                with span('browser', 'goto'):
+                    page.goto(form_url, wait_until='domcontentloaded', timeout=30000)
                     try:
-                        page.wait_for_selector('input[name="_fid_121"]', state='visible', timeout=5000)
-                        logger.info("DC DMV Real ID field visible")
+                        page.wait_for_selector('form[name="qdbform"]', state='attached', timeout=10000)
+                        logger.info("Form loaded successfully")
                     except PlaywrightTimeout:
-                        logger.warning("Timeout waiting for DC DMV Real ID field, continuing anyway")
-                    
-                    # Date of Birth
-                    page.fill('input[name="_fid_11"]', application_data['dateOfBirth'])
-                    
-                    # Address fields
-                    page.fill('input[name="_fid_12"]', application_data['street'])
-                    if application_data.get('aptSuite'):
-                        page.fill('input[name="_fid_13"]', application_data['aptSuite'])
-                    page.fill('input[name="_fid_14"]', application_data.get('city', 'Washington'))
-                    page.select_option('select[name="_fid_15"]', application_data.get('state', 'DC'))
-                    page.fill('input[name="_fid_16"]', application_data['zip'])
-                    
-                    # Contact information
-                    # Phone Number
-                    page.wait_for_selector('input[name="_fid_17"]', state='visible', timeout=2000)
-                    # Use typing for phone number as it has input masking
-                    page.click('input[name="_fid_17"]')
-                    page.locator('input[name="_fid_17"]').press_sequentially(application_data['phoneNumber'], delay=100)
-                    logger.info("Phone number filled")
-                    
-                    # Email fields
-                    page.fill('input[name="_fid_18"]', application_data['email'])
-                    page.fill('input[name="_fid_117"]', application_data['email'])
-                    
-                    # Certification Type
-                    try:
-                        page.wait_for_selector('select[name="_fid_124"]', state='visible', timeout=2000)
-                        page.select_option('select[name="_fid_124"]', 'Self certification')
-                        # Wait for Self Certification checkbox (fid_176) to appear
-                        try:
-                            page.wait_for_selector('input[name="_fid_176"]', state='visible', timeout=5000)
-                            logger.info("Self certification checkbox visible")
-                        except PlaywrightTimeout:
-                            logger.warning("Timeout waiting for Self certification checkbox")
-                    except PlaywrightTimeout:
-                        logger.warning("Certification type dropdown not visible")
-                    
-                    # Upload Government ID
-                    page.set_input_files('input[name="_fid_50"]', temp_file_path)
-                    logger.info("Government ID uploaded")
-                    
-                    # Upload DC DMV Real ID file
-                    page.set_input_files('input[name="_fid_121"]', temp_file_path)
-                    logger.info("DC DMV Real ID uploaded")
-                    
-                    # NOTE: Do NOT interact with Reduced Fee dropdown - leave it at default
-                    
-                else:
-                    # Non-DC Resident Form Fields
-                    logger.info("Filling Non-DC resident form...")
-                    
-                    # Time Period (required for Non-DC)
-                    if application_data.get('timePeriod'):
-                        time_period_value = self.TIME_PERIOD_MAP.get(application_data['timePeriod'], '30 days ($20)')
-                        page.select_option('select[name="_fid_204"]', time_period_value)
-                        logger.info(f"Time Period set to: {time_period_value}")
-                    
-                    # Name fields
-                    page.fill('input[name="_fid_6"]', application_data['firstName'])
-                    if application_data.get('middleInitial'):
-                        page.fill('input[name="_fid_7"]', application_data['middleInitial'][:1])
-                    page.fill('input[name="_fid_8"]', application_data['lastName'])
-                    if application_data.get('suffix'):
-                        page.fill('input[name="_fid_35"]', application_data['suffix'])
-                    
-                    # Date of Birth
-                    page.fill('input[name="_fid_11"]', application_data['dateOfBirth'])
-                    
-                    # Address fields
-                    page.fill('input[name="_fid_12"]', application_data['street'])
-                    if application_data.get('aptSuite'):
-                        page.fill('input[name="_fid_13"]', application_data['aptSuite'])
-                    
-                    # Country (default to United States)
-                    page.select_option('select[name="_fid_175"]', 'United States of America')
-                    
-                    page.fill('input[name="_fid_14"]', application_data.get('city', ''))
-                    page.select_option('select[name="_fid_15"]', application_data.get('state', ''))
-                    page.fill('input[name="_fid_16"]', application_data['zip'])
-                    
-                    # Contact information
-                    # Phone Number
-                    if application_data.get('phoneNumber'):
-                        page.wait_for_selector('input[name="_fid_17"]', state='visible', timeout=2000)
-                        # Use typing for phone number as it has input masking
-                        page.click('input[name="_fid_17"]')
-                        page.locator('input[name="_fid_17"]').press_sequentially(application_data['phoneNumber'], delay=100)
-                        logger.info("Phone number filled (Non-DC)")
-                    
-                    # Email fields
-                    page.fill('input[name="_fid_18"]', application_data['email'])
-                    page.fill('input[name="_fid_117"]', application_data['email'])
-                    
-                    # Upload Government ID
-                    page.set_input_files('input[name="_fid_50"]', temp_file_path)
-                    logger.info("Government ID uploaded for Non-DC resident")
-                    
-                    # Payment Method (Online only for Non-DC)
-                    try:
-                        page.select_option('select[name="_fid_120"]', 'Online')
-                        logger.info("Payment method set to Online")
-                    except Exception as e:
-                        logger.warning(f"Could not set payment method: {e}")
-                
-                # Signature Section (Common for both)
-                logger.info("Completing signature section...")
-                
-                # Check Terms & Conditions
-                page.check('input[name="_fid_72"]')
-                
-                # Check Self Certification (if visible)
-                try:
-                    if page.is_visible('input[name="_fid_176"]'):
-                        page.check('input[name="_fid_176"]')
-                        logger.info("Self certification checkbox checked")
-                except Exception as e:
-                    logger.warning(f"Self certification checkbox not found: {e}")
+                        logger.error("Timeout waiting for form to load. QuickBase might be down or URL changed.")
+                        capture_page(page, 'form_load_timeout', submission_id)
+                        raise
+                if blocked_requests:
+                    logger.info(f"Blocked {len(blocked_requests)} requests while loading the form")
+                    logger.debug(f"Blocked requests: {blocked_requests}")
+                emit('form_loaded')
                 
-                # Signature name
+                # Fill Section 1: Patient Information
+                logger.info(f"Filling {resident_type.upper()} resident form...")
+                fill_start = time.perf_counter()
+                self.run_fill_steps(page, self.build_fill_steps(application_data, resident_type, temp_file_path))
                 signature_name = f"{application_data['firstName']} {application_data['lastName']}"
-                page.fill('input[name="_fid_59"]', signature_name)
-                
-                # Date field
-                date_value = page.input_value('input[name="_fid_60"]')
-                if not date_value:
-                    today = datetime.now().strftime("%Y-%m-%d")
-                    # We can't verify read-only fields easily via input value sometimes, so using evaluate
-                    page.evaluate(f'document.querySelector("input[name=\\"_fid_60\\"]").value = "{today}"')
                 
                 logger.info(f"{resident_type.upper()} form filled completely.")
+                observe('browser', 'fill', time.perf_counter() - fill_start)
+                emit('form_filled')
                 
                 if auto_submit:
                     logger.info("Auto-submit enabled. Checking for validation errors...")
                     
                     # Check for validation errors immediately (no wait)
-                    error_messages = []
-                    try:
-                        errors = page.query_selector_all('.error, .validation-error, label.error, .errMsg')
-                        for error in errors:
-                            if error.is_visible():
-                                error_text = error.inner_text()
-                                if error_text and error_text.strip():
-                                    error_messages.append(error_text)
-                                    logger.warning(f"Validation error found: {error_text}")
-                    except Exception as e:
-                        logger.warning(f"Could not check for validation errors: {e}")
+                    error_messages = self.collect_error_messages(page, ERROR_SELECTORS)
+                    for error_text in error_messages:
+                        logger.warning(f"Validation error found: {error_text}")
                     
                     if error_messages:
-                        error_screenshot = f"validation_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                        page.screenshot(path=error_screenshot)
+                        artifact_id = capture_page(page, 'validation_error', submission_id,
+                                                   {'errorMessages': error_messages})
                         browser.close()
                         return {
                             'success': False,
                             'error': 'Form has validation errors',
                             'errorMessages': error_messages,
-                            'screenshot': error_screenshot
+                            'submissionId': submission_id,
+                            'artifactId': artifact_id
                         }
                     
                     logger.info("No validation errors found. Submitting form...")
@@ -348,88 +551,67 @@ class QuickBaseFormAutomation:
                                 'error': 'Submit button is disabled - form may have validation errors'
                             }
                     
+                    # Record the status of the form POST so a server error ends the wait
+                    post_statuses = []
+                    page.on("response", lambda response: post_statuses.append(response.status)
+                            if is_form_submission(response) else None)
+                    
                     # Submit form
-                    page.click('input[type="submit"]')
+                    with span('browser', 'submit'):
+                        page.click('input[type="submit"]')
+                    emit('submitted')
                     
-                    # Wait for navigation to success page OR error
+                    # Wait for whichever happens first: success page (DC: pageID=18,
+                    # Non-DC: pageID=40), an error response, or an error message on the page
+                    logger.info("Waiting for submission to complete...")
                     try:
-                        # Wait for URL to change to success page
-                        # DC: pageID=18, Non-DC: pageID=40
-                        logger.info("Waiting for redirection to success page...")
-                        
-                        try:
-                            # Wait up to 60s for the URL to match success pattern
-                            page.wait_for_url(
-                                lambda url: 'pageID=18' in url or 'pageid=18' in url.lower() or
-                                           'pageID=40' in url or 'pageid=40' in url.lower(),
-                                timeout=60000
-                            )
-                            # If we get here, we are on success page
-                            current_url = page.url
-                            logger.info(f"Successfully redirected to success page: {current_url}")
-                            
-                            success_result = {
-                                'success': True,
-                                'message': 'Application submitted successfully',
-                                'redirectUrl': current_url,
-                                'submittedData': {
-                                    'name': signature_name,
-                                    'email': application_data['email'],
-                                    'dob': application_data['dateOfBirth']
-                                }
-                            }
-                            browser.close()
-                            return success_result
-                            
-                        except PlaywrightTimeout:
-                            # Timeout waiting for URL change - likely an error on page
-                            logger.warning("Timeout waiting for success URL. Checking for errors on current page...")
-                            pass # Fall through to error checking
-                        
-                        current_url = page.url
-
-                        # Capture errors if we didn't redirect
-                        error_screenshot = f"submission_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                        page.screenshot(path=error_screenshot)
-                        
-                        # Capture full page HTML for debugging
-                        page_html = page.content()
-                        html_dump = f"submission_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-                        with open(html_dump, 'w', encoding='utf-8') as f:
-                            f.write(page_html)
-
-                        # Extract error messages
-                        error_messages = []
-                        error_selectors = [
-                            '.error', '.validation-error', 'label.error', '.errMsg',
-                            '[class*="error"]', '[class*="Error"]',
-                            'div[style*="color: red"]', 'span[style*="color: red"]',
-                            '.errormessage', '.error-message', '.field-error'
-                        ]
-
-                        for selector in error_selectors:
-                            errors = page.query_selector_all(selector)
-                            for error in errors:
-                                if error.is_visible():
-                                    error_text = error.inner_text()
-                                    if error_text and error_text.strip() and error_text not in error_messages:
-                                        error_messages.append(error_text)
-                        
-                        browser.close()
-                        return {
-                            'success': False,
-                            'error': 'Form submission failed - did not redirect to success page',
-                            'currentUrl': current_url,
-                            'errorMessages': error_messages if error_messages else ['Unknown error - form did not submit'],
-                            'consoleMessages': console_messages,
-                            'screenshot': error_screenshot,
-                            'htmlDump': html_dump
-                        }
-
+                        with span('browser', 'completion_wait'):
+                            completion = self.wait_for_completion(page, post_statuses, QB_SUBMIT_TIMEOUT_MS)
                     except Exception as e:
                         logger.error(f"Error during submission verification: {e}")
                         browser.close()
                         raise
+                    
+                    current_url = page.url
+                    if completion['outcome'] == 'success':
+                        logger.info(f"Successfully redirected to success page: {current_url}")
+                        success_result = {
+                            'success': True,
+                            'message': 'Application submitted successfully',
+                            'redirectUrl': current_url,
+                            'submissionId': submission_id,
+                            'submittedData': {
+                                'name': signature_name,
+                                'email': application_data['email'],
+                                'dob': application_data['dateOfBirth']
+                            }
+                        }
+                        browser.close()
+                        return success_result
+                    
+                    logger.warning(f"Submission did not reach the success page ({completion['outcome']}): {current_url}")
+                    
+                    error_messages = completion['messages'] or self.collect_error_messages(page, ERROR_SCRAPE_SELECTORS)
+                    
+                    # Screenshot and HTML are written in the background
+                    artifact_id = capture_page(page, 'submission_error', submission_id, {
+                        'failureReason': completion['outcome'],
+                        'httpStatus': completion['status'],
+                        'errorMessages': error_messages,
+                        'consoleMessages': console_messages[-50:],
+                    })
+                    browser.close()
+                    return {
+                        'success': False,
+                        'error': 'Form submission failed - did not redirect to success page',
+                        'failureReason': completion['outcome'],
+                        'httpStatus': completion['status'],
+                        'currentUrl': current_url,
+                        'errorMessages': error_messages if error_messages else ['Unknown error - form did not submit'],
+                        'consoleMessages': console_messages,
+                        'submissionId': submission_id,
+                        'artifactId': artifact_id
+                    }
 
                 else:
                     # Auto-submit disabled
@@ -0,0 +1,483 @@
+"""
+Concurrent QuickBase form submissions in a single browser
+Runs several applications at once, each in its own isolated browser context,
+inside one Chromium driven by Playwright's async API on a background event
+loop. DC and Non-DC applications wait in separate bounded queues that are
+served alternately, and a full queue rejects new work immediately instead of
+letting requests pile up behind the browser.
+
+The engine exposes the same submit_application() as QuickBaseFormAutomation,
+so the app can use either (QB_ENGINE=async selects this one).
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+
+from admission import time_remaining
+from age_eligibility import MINIMUM_AGE
+from failure_artifacts import capture_page_async
+from metrics import REGISTRY, observe, span
+from progress import current_reporter, emit, reporting
+from quickbase_browser_automation import (
+    BROWSER_REQUESTS, COLLECT_ERRORS_JS, COMPLETION_JS, COMPLETION_POLL_MS, ERROR_SCRAPE_SELECTORS,
+    ERROR_SELECTORS, FILL_IF_EMPTY_JS, QB_BLOCK_REQUESTS, QB_LAUNCH_ARGS, QB_SUBMIT_TIMEOUT_MS,
+    QB_VIEWPORT_HEIGHT, QB_VIEWPORT_WIDTH, SUCCESS_PAGE_IDS, TYPING_DELAY_MS, FillStep,
+    QuickBaseFormAutomation, is_form_submission
+)
+from worker_pools import POOL_CONFIG, PoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Submissions in flight at once (one browser context each)
+ENGINE_CONCURRENCY = int(os.environ.get('QB_ENGINE_CONCURRENCY', '4'))
+# Submissions allowed to wait per resident type before new ones are rejected
+ENGINE_QUEUE_SIZE = int(os.environ.get('QB_ENGINE_QUEUE_SIZE', '8'))
+# Upper bound for one submission once it has started (page load + fill + completion wait)
+ENGINE_JOB_TIMEOUT = float(os.environ.get('QB_ENGINE_JOB_TIMEOUT', '180'))
+
+RESIDENT_TYPES = ('dc', 'nondc')
+
+ENGINE_JOBS = REGISTRY.gauge(
+    'checkin_qb_engine_jobs',
+    'Form submissions in the concurrent engine by state (queued, active)',
+    ('state', 'resident_type')
+)
+ENGINE_REJECTED = REGISTRY.counter(
+    'checkin_qb_engine_rejected_total',
+    'Form submissions rejected because the engine queue was full',
+    ('resident_type',)
+)
+
+
+class SubmissionJob:
+    """One queued application and the future its caller is waiting on"""
+
+    def __init__(self, application_data: Dict, auto_submit: bool, resident_type: str, submission_id: str):
+        self.application_data = application_data
+        self.auto_submit = auto_submit
+        self.resident_type = resident_type
+        self.submission_id = submission_id
+        self.enqueued_at = time.perf_counter()
+        self.future = concurrent.futures.Future()
+        # Progress reporter of the waiting request; the job runs on the engine's loop
+        self.reporter = current_reporter()
+        # Set when the submit button is clicked: from then on a failure may have gone through
+        self.submitted = False
+
+
+class QuickBaseSubmissionEngine:
+    """Multi-context form automation on a background asyncio loop"""
+
+    def __init__(self, headless: bool = True, concurrency: int = ENGINE_CONCURRENCY,
+                 queue_size: int = ENGINE_QUEUE_SIZE):
+        """
+        Initialize the engine (the browser starts on first use)
+
+        Args:
+            headless: Run browser in headless mode (no UI)
+            concurrency: Submissions processed at once
+            queue_size: Waiting submissions allowed per resident type
+        """
+        self.headless = headless
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        # Age check, temp files, fill plan and request policy are shared with the sync automation
+        self.automation = QuickBaseFormAutomation(headless=headless)
+
+        self._queues = {resident_type: deque() for resident_type in RESIDENT_TYPES}
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._active = 0
+        self._completed = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._work_available: Optional[asyncio.Event] = None
+        self._browser = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._playwright = None
+
+    # ------------------------------------------------------------------
+    # Caller side (any thread)
+    # ------------------------------------------------------------------
+
+    def submit_application(self, application_data: Dict, auto_submit: bool = False, resident_type: str = 'dc',
+                           submission_id: Optional[str] = None) -> Dict:
+        """
+        Queue an application and wait for its result
+
+        Same arguments and result shape as QuickBaseFormAutomation.submit_application.
+        When the queue for this resident type is full the call returns at once
+        with queueFull set instead of waiting.
+
+        Raises:
+            PoolBusy: The wait ran out while the job was already running (job
+                is its future), or the request's deadline came before the job
+                left the queue
+        """
+        if resident_type not in self._queues:
+            return {'success': False, 'error': f'Invalid resident type: {resident_type}'}
+        self._ensure_started()
+
+        job = SubmissionJob(application_data, auto_submit, resident_type,
+                            submission_id or uuid.uuid4().hex[:12])
+        with self._lock:
+            if len(self._queues[resident_type]) >= self.queue_size:
+                ENGINE_REJECTED.inc(resident_type)
+                logger.warning(f"{resident_type.upper()} submission queue full ({self.queue_size}) - rejecting")
+                return {
+                    'success': False,
+                    'error': 'Submission queue is full, please try again shortly',
+                    'queueFull': True,
+                    'submissionId': job.submission_id
+                }
+            self._queues[resident_type].append(job)
+            ENGINE_JOBS.inc('queued', resident_type)
+            busy = self._active >= self.concurrency
+            ahead = len(self._queues[resident_type]) - 1
+        if busy:
+            emit('queued', pool='browser', ahead=ahead)
+        self._loop.call_soon_threadsafe(self._work_available.set)
+
+        # Queue wait is bounded by the queue size; each job is bounded by ENGINE_JOB_TIMEOUT.
+        # Nobody waits past the request's deadline (see admission.py), though.
+        wait_limit, reason = ENGINE_JOB_TIMEOUT * (self.queue_size / max(1, self.concurrency) + 2), 'timeout'
+        remaining = time_remaining()
+        if remaining is not None and remaining < wait_limit:
+            wait_limit, reason = max(0.0, remaining), 'deadline'
+        try:
+            return job.future.result(timeout=wait_limit)
+        except concurrent.futures.TimeoutError:
+            retry_after = POOL_CONFIG['browser']['retry_after']
+            if not job.future.cancel():
+                # Already in a browser and may still submit; don't report a failure a retry would repeat
+                raise PoolBusy('browser', reason, retry_after, job=job.future)
+            logger.warning(f"Submission {job.submission_id} dropped from the queue ({reason})")
+            if reason == 'deadline':
+                raise PoolBusy('browser', reason, retry_after)
+            return {
+                'success': False,
+                'error': 'Timed out waiting for the browser automation',
+                'submissionId': job.submission_id
+            }
+
+    def stats(self) -> Dict:
+        """Queue depths and counters"""
+        with self._lock:
+            return {
+                'queued': {resident_type: len(queue) for resident_type, queue in self._queues.items()},
+                'active': self._active,
+                'completed': self._completed,
+                'concurrency': self.concurrency,
+                'queueSize': self.queue_size,
+            }
+
+    def shutdown(self, timeout: float = 10.0):
+        """Close the browser and stop the event loop"""
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_browser(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop = None
+
+    def _ensure_started(self):
+        if not (self._thread and self._thread.is_alive()):
+            with self._lock:
+                if not (self._thread and self._thread.is_alive()):
+                    self._started.clear()
+                    self._thread = threading.Thread(target=self._run_loop, name='qb-engine', daemon=True)
+                    self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._work_available = asyncio.Event()
+        self._browser_lock = asyncio.Lock()
+        for index in range(self.concurrency):
+            self._loop.create_task(self._worker(index))
+        self._started.set()
+        logger.info(f"QuickBase submission engine started ({self.concurrency} concurrent, "
+                    f"queue {self.queue_size} per resident type)")
+        self._loop.run_forever()
+
+    # ------------------------------------------------------------------
+    # Event loop side
+    # ------------------------------------------------------------------
+
+    def _next_job(self) -> Optional[SubmissionJob]:
+        """Take the next job, alternating between DC and Non-DC when both are waiting"""
+        with self._lock:
+            for offset in range(len(RESIDENT_TYPES)):
+                resident_type = RESIDENT_TYPES[(self._turn + offset) % len(RESIDENT_TYPES)]
+                queue = self._queues[resident_type]
+                while queue:
+                    job = queue.popleft()
+                    ENGINE_JOBS.dec('queued', resident_type)
+                    if job.future.set_running_or_notify_cancel():
+                        self._turn = (self._turn + offset + 1) % len(RESIDENT_TYPES)
+                        self._active += 1
+                        return job
+            return None
+
+    async def _worker(self, index: int):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._work_available.clear()
+                await self._work_available.wait()
+                continue
+
+            observe('qb_engine', 'queue_wait', time.perf_counter() - job.enqueued_at)
+            ENGINE_JOBS.inc('active', job.resident_type)
+            try:
+                with reporting(job.reporter):
+                    emit('started')
+                    result = await asyncio.wait_for(self._run_job(job), ENGINE_JOB_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Submission {job.submission_id} exceeded {ENGINE_JOB_TIMEOUT}s")
+                result = {'success': False, 'error': 'Browser automation timed out',
+                          'submissionId': job.submission_id}
+                if job.submitted:
+                    # Cancelled while waiting for QuickBase to confirm, as a completion-wait timeout
+                    result['failureReason'] = 'timeout'
+            except Exception as e:
+                logger.error(f"Automation error: {str(e)}", exc_info=True)
+                result = {'success': False, 'error': f'Browser automation failed: {str(e)}',
+                          'submissionId': job.submission_id}
+                if job.submitted:
+                    result['outcomeUnknown'] = True
+            finally:
+                ENGINE_JOBS.dec('active', job.resident_type)
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+            job.future.set_result(result)
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                with span('browser', 'launch'):
+                    self._browser = await self._playwright.chromium.launch(
+                        headless=self.headless, args=QB_LAUNCH_ARGS)
+                logger.info("QuickBase engine browser launched")
+            return self._browser
+
+    async def _close_browser(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _route_request(self, route, blocked: List[str]):
+        request = route.request
+        if self.automation.should_block_request(request.url, request.resource_type):
+            blocked.append(request.url)
+            BROWSER_REQUESTS.inc('blocked')
+            await route.abort()
+        else:
+            BROWSER_REQUESTS.inc('allowed')
+            await route.continue_()
+
+    async def _run_job(self, job: SubmissionJob) -> Dict:
+        """Async counterpart of QuickBaseFormAutomation.submit_application for one job"""
+        data = job.application_data
+        resident_type = job.resident_type
+        submission_id = job.submission_id
+
+        age = self.automation.calculate_age(data['dateOfBirth'])
+        if age < MINIMUM_AGE:
+            return {
+                'success': False,
+                'error': f'Self-certification requires age {MINIMUM_AGE}+. Applicant age: {age}',
+                'age': age
+            }
+
+        temp_file_path = None
+        context = None
+        try:
+            temp_file_path = await asyncio.to_thread(
+                self.automation.save_base64_to_temp_file, data['idImageBase64'], f"id_{submission_id}.jpg")
+            browser = await self._get_browser()
+            with span('browser', 'new_context'):
+                context = await browser.new_context(
+                    viewport={'width': QB_VIEWPORT_WIDTH, 'height': QB_VIEWPORT_HEIGHT},
+                    user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+                    service_workers='block'
+                )
+                blocked_requests = []
+                if QB_BLOCK_REQUESTS:
+                    await context.route('**/*', lambda route: self._route_request(route, blocked_requests))
+                page = await context.new_page()
+            emit('browser_launched')
+
+            console_messages = []
+            page.on("console", lambda msg: console_messages.append(f"{msg.type}: {msg.text}"))
+
+            form_url = self.automation.DC_FORM_URL if resident_type == 'dc' else self.automation.NONDC_FORM_URL
+            logger.info(f"[{submission_id}] Navigating to {resident_type.upper()} form")
+            with span('browser', 'goto'):
+                await page.goto(form_url, wait_until='domcontentloaded', timeout=30000)
+                try:
+                    await page.wait_for_selector('form[name="qdbform"]', state='attached', timeout=10000)
+                except PlaywrightTimeout:
+                    logger.error(f"[{submission_id}] Timeout waiting for form to load")
+                    await capture_page_async(page, 'form_load_timeout', submission_id)
+                    raise
+            emit('form_loaded')
+
+            fill_start = time.perf_counter()
+            await self._run_fill_steps(page, self.automation.build_fill_steps(data, resident_type, temp_file_path))
+            observe('browser', 'fill', time.perf_counter() - fill_start)
+            emit('form_filled')
+            signature_name = f"{data['firstName']} {data['lastName']}"
+            submitted_data = {'name': signature_name, 'email': data['email'], 'dob': data['dateOfBirth']}
+
+            if not job.auto_submit:
+                return {
+                    'success': True,
+                    'message': 'Form filled successfully. Ready for manual review.',
+                    'formUrl': page.url,
+                    'autoSubmit': False,
+                    'filledData': submitted_data,
+                    'submissionId': submission_id
+                }
+
+            error_messages = await page.evaluate(COLLECT_ERRORS_JS, ERROR_SELECTORS)
+            if error_messages:
+                artifact_id = await capture_page_async(page, 'validation_error', submission_id,
+                                                       {'errorMessages': error_messages})
+                return {
+                    'success': False,
+                    'error': 'Form has validation errors',
+                    'errorMessages': error_messages,
+                    'submissionId': submission_id,
+                    'artifactId': artifact_id
+                }
+
+            post_statuses = []
+            page.on("response", lambda response: post_statuses.append(response.status)
+                    if is_form_submission(response) else None)
+            job.submitted = True
+            with span('browser', 'submit'):
+                await page.click('input[type="submit"]')
+            emit('submitted')
+            with span('browser', 'completion_wait'):
+                completion = await self._wait_for_completion(page, post_statuses, QB_SUBMIT_TIMEOUT_MS)
+
+            if completion['outcome'] == 'success':
+                logger.info(f"[{submission_id}] Successfully redirected to success page")
+                return {
+                    'success': True,
+                    'message': 'Application submitted successfully',
+                    'redirectUrl': page.url,
+                    'submissionId': submission_id,
+                    'submittedData': submitted_data
+                }
+
+            error_messages = completion['messages'] or await page.evaluate(COLLECT_ERRORS_JS, ERROR_SCRAPE_SELECTORS)
+            artifact_id = await capture_page_async(page, 'submission_error', submission_id, {
+                'failureReason': completion['outcome'],
+                'httpStatus': completion['status'],
+                'errorMessages': error_messages,
+                'consoleMessages': console_messages[-50:],
+            })
+            return {
+                'success': False,
+                'error': 'Form submission failed - did not redirect to success page',
+                'failureReason': completion['outcome'],
+                'httpStatus': completion['status'],
+                'currentUrl': page.url,
+                'errorMessages': error_messages if error_messages else ['Unknown error - form did not submit'],
+                'consoleMessages': console_messages,
+                'submissionId': submission_id,
+                'artifactId': artifact_id
+            }
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except PlaywrightError as e:
+                    logger.warning(f"Could not close browser context: {e}")
+            if temp_file_path and os.path.exists(temp_file_path):
+                try:
+                    os.remove(temp_file_path)
+                except Exception as e:
+                    logger.warning(f"Could not delete temporary file: {e}")
+
+    async def _run_fill_steps(self, page, steps: List[FillStep]):
+        """Async counterpart of QuickBaseFormAutomation.run_fill_steps"""
+        for step in steps:
+            try:
+                if step.action == 'fill':
+                    await page.fill(step.selector, step.value)
+                elif step.action == 'select':
+                    await page.select_option(step.selector, step.value)
+                elif step.action == 'type':
+                    await page.click(step.selector)
+                    await page.locator(step.selector).press_sequentially(step.value, delay=TYPING_DELAY_MS)
+                elif step.action == 'upload':
+                    await page.set_input_files(step.selector, step.value)
+                elif step.action == 'check':
+                    await page.check(step.selector)
+                elif step.action == 'check_if_visible':
+                    if await page.is_visible(step.selector):
+                        await page.check(step.selector)
+                elif step.action == 'wait_visible':
+                    await page.wait_for_selector(step.selector, state='visible', timeout=step.value)
+                elif step.action == 'fill_if_empty':
+                    await page.eval_on_selector(step.selector, FILL_IF_EMPTY_JS, step.value)
+            except Exception as e:
+                if not step.optional:
+                    raise
+                logger.warning(f"Optional step {step.action} {step.selector} skipped: {e}")
+                continue
+            if step.log:
+                logger.debug(step.log)
+
+    async def _wait_for_completion(self, page, post_statuses: list, timeout_ms: int) -> Dict:
+        """Async counterpart of QuickBaseFormAutomation.wait_for_completion"""
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            status = post_statuses[-1] if post_statuses else None
+            if status is not None and status >= 400:
+                try:
+                    await page.wait_for_load_state('domcontentloaded', timeout=5000)
+                except PlaywrightTimeout:
+                    pass
+                return {'outcome': 'http_error', 'messages': [], 'status': status}
+
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                return {'outcome': 'timeout', 'messages': [], 'status': status}
+
+            try:
+                handle = await page.wait_for_function(
+                    COMPLETION_JS, arg=[list(SUCCESS_PAGE_IDS), ERROR_SELECTORS],
+                    polling='mutation', timeout=min(COMPLETION_POLL_MS, remaining_ms)
+                )
+                result = await handle.json_value()
+                result['status'] = status
+                return result
+            except PlaywrightTimeout:
+                continue
+            except PlaywrightError:
+                try:
+                    await page.wait_for_load_state('domcontentloaded', timeout=max(1, min(5000, remaining_ms)))
+                except PlaywrightTimeout:
+                    pass
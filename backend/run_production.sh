@@ -9,13 +9,29 @@ source venv/bin/activate
 export FLASK_ENV=production
 export DISABLE_MODEL_SOURCE_CHECK=True
 
+# SERVER_MODE=asgi serves the I/O-bound endpoints with async handlers under
+# uvicorn (asgi_app.py); OCR and submissions still run in Flask on a thread pool.
+# One worker: the handlers are async, and every worker would start its own
+# OCR process pool, browser(s) and admission limits (sized for the container)
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec uvicorn asgi_app:app \
+        --host 0.0.0.0 \
+        --port 5001 \
+        --workers 1 \
+        --timeout-keep-alive 5
+fi
+
 # Start Gunicorn with production settings
-# - 2 workers (adjust based on CPU cores)
+# - 1 gthread worker with 32 threads: OCR, barcode scans and submissions run
+#   in their own worker pools (worker_pools.py, sized to CPU cores), so the
+#   request threads stay free for the light routes
 # - 120 second timeout (for slow OCR operations)
 # - Bind to all interfaces on port 5001
 exec gunicorn \
     --bind 0.0.0.0:5001 \
-    --workers 2 \
+    --workers 1 \
+    --worker-class gthread \
+    --threads 32 \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
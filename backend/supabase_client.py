@@ -2,14 +2,144 @@
 Supabase client for storing customer data and ID images
 """
 import os
+import asyncio
 import base64
 import logging
 from datetime import datetime
-from typing import Dict, Optional, Tuple
-from supabase import create_client, Client
+from typing import Dict, Iterable, List, Optional, Tuple
+from supabase import acreate_client, create_client, AsyncClient, Client
+
+from customer_lookup import CUSTOMER_CACHE, CUSTOMER_LOOKUPS, LOOKUP_COLUMNS, best_match, license_hash, lookup_keys
+from metrics import mark_failed, timed
 
 logger = logging.getLogger(__name__)
 
+# Storage bucket for form automation failure screenshots and HTML (see failure_artifacts.py)
+ARTIFACT_BUCKET = os.environ.get('FAILURE_ARTIFACT_BUCKET', 'failure-artifacts')
+
+# Columns added by migrations that a database may not have yet; writes retry without them
+OPTIONAL_COLUMNS = ('raw_barcode_data', 'license_hash')
+# Optional columns the database reported missing; left out of later writes and lookups
+_missing_columns = set()
+
+# Rows one bulk lookup may return (Supabase caps responses at 1000 rows by default)
+BULK_LOOKUP_LIMIT = 1000
+
+
+def customer_row(customer_data: Dict, status: str = 'pending') -> Dict:
+    """
+    Map application fields to a customers table row
+    
+    Args:
+        customer_data: Dictionary with customer information (camelCase keys)
+        status: Initial status
+    
+    Returns:
+        Row dictionary without None values
+    """
+    db_data = {
+        'first_name': customer_data.get('firstName', ''),
+        'last_name': customer_data.get('lastName', ''),
+        'date_of_birth': customer_data.get('dateOfBirth'),
+        'email': customer_data.get('email'),
+        'phone': customer_data.get('phoneNumber'),
+        'street_address': customer_data.get('street'),
+        'city': customer_data.get('city', 'Washington'),
+        'state': customer_data.get('state', 'DC'),
+        'zip_code': customer_data.get('zip'),
+        'resident_type': customer_data.get('residentType', 'dc'),
+        'barcode': customer_data.get('barcode'),
+        # 'raw_barcode_data': customer_data.get('rawBarcodeData'), # Column missing in DB
+        'location': customer_data.get('location'),
+        'status': status,
+        # Include registration details if provided (for direct check-in)
+        'registration_id': customer_data.get('registrationId'),
+        'expiration_date': customer_data.get('expirationDate'),
+        'checked_in_at': customer_data.get('checkedInAt'),
+        # Returning-customer lookup key (see customer_lookup.py)
+        'license_hash': license_hash(customer_data.get('licenseNumber') or customer_data.get('barcode'))
+    }
+    
+    # Remove None values and columns the database doesn't have
+    return {k: v for k, v in db_data.items() if v is not None and k not in _missing_columns}
+
+
+def is_missing_column_error(e: Exception) -> bool:
+    """PGRST204: the row references a column the table doesn't have ('raw_barcode_data', 'license_hash')"""
+    return any(column in str(e) for column in OPTIONAL_COLUMNS) or (hasattr(e, 'code') and e.code == 'PGRST204')
+
+
+def drop_missing_columns(e: Exception, db_data: Dict):
+    """
+    Remove the optional column a missing-column error names from db_data
+    
+    The column is remembered so later writes leave it out up front; if the
+    error names none of them, all optional columns are dropped this time.
+    """
+    missing = [column for column in OPTIONAL_COLUMNS if column in str(e)]
+    if missing:
+        _missing_columns.update(missing)
+    for column in missing or OPTIONAL_COLUMNS:
+        if column in db_data:
+            logger.warning(f"Column '{column}' not found, retrying without it.")
+            del db_data[column]
+
+
+def _quoted(value: str) -> str:
+    """Value quoted for a PostgREST filter, so commas and parentheses in it are literal"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def lookup_filter(keys: Dict[str, str]) -> str:
+    """PostgREST or= filter matching any of the lookup keys (values quoted)"""
+    return ','.join(f'{column}.eq.{_quoted(value)}' for column, value in keys.items())
+
+
+def bulk_lookup_filter(ids: Iterable[int], keys_list: Iterable[Dict[str, str]]) -> str:
+    """PostgREST or= filter matching any id or lookup key, one in.() list per column"""
+    keys_list = list(keys_list)
+    branches = []
+    ids = sorted({int(i) for i in ids})
+    if ids:
+        branches.append(f"id.in.({','.join(map(str, ids))})")
+    for column in LOOKUP_COLUMNS:
+        values = sorted({keys[column] for keys in keys_list if column in keys})
+        if values and column not in _missing_columns:
+            branches.append(f"{column}.in.({','.join(map(_quoted, values))})")
+    return ','.join(branches)
+
+
+def export_select(columns: Iterable[str]) -> str:
+    """Select list for an export page; id is needed to fetch the next page"""
+    columns = list(columns)
+    return ','.join(columns if 'id' in columns else ['id'] + columns)
+
+
+def filter_customer_page(query, after_id: int, limit: int, status: Optional[str], date_field: str,
+                         since: Optional[str], until: Optional[str]):
+    """Apply an export page's keyset and filters to a customers select"""
+    query = query.gt('id', after_id).order('id').limit(limit)
+    if status:
+        query = query.eq('status', status)
+    if since:
+        query = query.gte(date_field, since)
+    if until:
+        query = query.lt(date_field, until)
+    return query
+
+
+def usable_lookup_keys(keys: Dict[str, str]) -> Dict[str, str]:
+    """Lookup keys whose column exists in the database"""
+    return {column: value for column, value in keys.items() if column not in _missing_columns}
+
+
+def lookup_query(client, keys: Dict[str, str]):
+    """Newest customers matching any lookup key; each branch of the OR uses its column's index"""
+    columns = ', '.join(['id'] + [c for c in LOOKUP_COLUMNS if c not in _missing_columns])
+    return client.table('customers').select(columns).or_(lookup_filter(keys)) \
+        .order('created_at', desc=True).limit(10)
+
+
 class SupabaseManager:
     """Manages Supabase database and storage operations"""
     
@@ -32,6 +162,7 @@ class SupabaseManager:
         """Check if Supabase is properly configured"""
         return self.client is not None
     
+    @timed('supabase')
     def upload_id_image(self, image_base64: str, customer_id: int, side: str = 'front') -> Optional[str]:
         """
         Upload ID image to Supabase Storage
@@ -93,15 +224,19 @@ class SupabaseManager:
                     return public_url
                 except Exception as url_error:
                     logger.error(f"Failed to get public URL for {filename}: {url_error}")
+                    mark_failed()
                     return None
             else:
                 logger.error(f"Upload failed for {filename}. Response: {response}")
+                mark_failed()
                 return None
             
         except Exception as e:
             logger.error(f"Failed to upload {side} ID image: {e}", exc_info=True)
+            mark_failed()
             return None
     
+    @timed('supabase')
     def store_customer(self, customer_data: Dict, status: str = 'pending') -> Optional[int]:
         """
         Store customer data in database
@@ -118,40 +253,15 @@ class SupabaseManager:
             return None
         
         try:
-            # Prepare data for insertion
-            db_data = {
-                'first_name': customer_data.get('firstName', ''),
-                'last_name': customer_data.get('lastName', ''),
-                'date_of_birth': customer_data.get('dateOfBirth'),
-                'email': customer_data.get('email'),
-                'phone': customer_data.get('phoneNumber'),
-                'street_address': customer_data.get('street'),
-                'city': customer_data.get('city', 'Washington'),
-                'state': customer_data.get('state', 'DC'),
-                'zip_code': customer_data.get('zip'),
-                'resident_type': customer_data.get('residentType', 'dc'),
-                'barcode': customer_data.get('barcode'),
-                # 'raw_barcode_data': customer_data.get('rawBarcodeData'), # Column missing in DB
-                'location': customer_data.get('location'),
-                'status': status,
-                # Include registration details if provided (for direct check-in)
-                'registration_id': customer_data.get('registrationId'),
-                'expiration_date': customer_data.get('expirationDate'),
-                'checked_in_at': customer_data.get('checkedInAt')
-            }
-            
-            # Remove None values
-            db_data = {k: v for k, v in db_data.items() if v is not None}
+            db_data = customer_row(customer_data, status)
 
             # Insert into database
             try:
                 response = self.client.table('customers').insert(db_data).execute()
             except Exception as e:
-                # Handle PGRST204: Missing column 'raw_barcode_data'
-                if 'raw_barcode_data' in str(e) or (hasattr(e, 'code') and e.code == 'PGRST204'):
-                    logger.warning("Column 'raw_barcode_data' not found, retrying without it.")
-                    if 'raw_barcode_data' in db_data:
-                        del db_data['raw_barcode_data']
+                # Handle PGRST204: Missing column 'raw_barcode_data' / 'license_hash'
+                if is_missing_column_error(e):
+                    drop_missing_columns(e, db_data)
                     response = self.client.table('customers').insert(db_data).execute()
                 else:
                     raise e
@@ -159,14 +269,17 @@ class SupabaseManager:
             if response.data and len(response.data) > 0:
                 customer_id = response.data[0]['id']
                 logger.info(f"Customer stored successfully: ID {customer_id}")
+                CUSTOMER_CACHE.put(lookup_keys(db_data), customer_id)
                 return customer_id
             
             return None
             
         except Exception as e:
             logger.error(f"Failed to store customer: {e}")
+            mark_failed()
             return None
     
+    @timed('supabase')
     def update_customer_images(self, customer_id: int, front_url: Optional[str], back_url: Optional[str]) -> bool:
         """
         Update customer record with ID image URLs
@@ -202,8 +315,10 @@ class SupabaseManager:
             
         except Exception as e:
             logger.error(f"Failed to update customer images: {e}")
+            mark_failed()
             return False
     
+    @timed('supabase')
     def update_customer_checkin(self, customer_id: int, checkin_data: Dict) -> bool:
         """
         Update customer record with check-in information
@@ -213,34 +328,154 @@ class SupabaseManager:
             checkin_data: Dictionary containing check-in fields
         
         Returns:
-            True if successful, False otherwise
+            True if the row was updated, False if there is no customer with that id
+        
+        Raises:
+            Exception: The update failed (the caller can't tell whether the row exists)
         """
         if not self.is_configured():
             return False
         
+        checkin_data = {k: v for k, v in checkin_data.items() if k not in _missing_columns}
         try:
-            try:
+            response = self.client.table('customers').update(checkin_data).eq('id', customer_id).execute()
+        except Exception as e:
+            # Handle PGRST204: Missing column 'raw_barcode_data' / 'license_hash'
+            if is_missing_column_error(e):
+                drop_missing_columns(e, checkin_data)
                 response = self.client.table('customers').update(checkin_data).eq('id', customer_id).execute()
-            except Exception as e:
-                # Handle PGRST204: Missing column 'raw_barcode_data'
-                if 'raw_barcode_data' in str(e) or (hasattr(e, 'code') and e.code == 'PGRST204'):
-                    logger.warning("Column 'raw_barcode_data' not found in update, retrying without it.")
-                    if 'raw_barcode_data' in checkin_data:
-                        del checkin_data['raw_barcode_data']
-                    response = self.client.table('customers').update(checkin_data).eq('id', customer_id).execute()
-                else:
-                    raise e
-            
-            if response.data:
-                logger.info(f"Updated customer {customer_id} with check-in data: {list(checkin_data.keys())}")
-                return True
             else:
-                logger.error(f"Failed to update customer {customer_id} - no data returned")
-                return False
-            
+                logger.error(f"Failed to update customer check-in: {e}")
+                raise e
+        
+        if response.data:
+            logger.info(f"Updated customer {customer_id} with check-in data: {list(checkin_data.keys())}")
+            CUSTOMER_CACHE.put(lookup_keys(response.data[0]), customer_id)
+            return True
+        logger.warning(f"Customer {customer_id} not updated - no such row")
+        # The row is gone; don't send returning customers to it again
+        CUSTOMER_CACHE.forget(customer_id)
+        return False
+    
+    @timed('supabase')
+    def find_customer(self, keys: Dict[str, str]) -> Optional[Dict]:
+        """
+        Find an existing customer by registration ID, barcode or license hash
+        
+        Args:
+            keys: {column: value} from customer_lookup.lookup_keys()
+        
+        Returns:
+            The row matching the most specific key (id and lookup columns), or
+            None if there is no match
+        
+        Raises:
+            Exception: The query failed (not the same as no match: check-in must
+                not create a second record for a returning customer)
+        """
+        keys = usable_lookup_keys(keys)
+        if not self.is_configured() or not keys:
+            return None
+        
+        try:
+            response = lookup_query(self.client, keys).execute()
         except Exception as e:
-            logger.error(f"Failed to update customer check-in: {e}")
-            return False
+            if not is_missing_column_error(e):
+                logger.error(f"Failed to look up customer: {e}")
+                raise e
+            drop_missing_columns(e, keys)
+            if not keys:
+                return None
+            response = lookup_query(self.client, keys).execute()
+        
+        return best_match(response.data or [], keys)
+    
+    def find_customer_id(self, keys: Dict[str, str]) -> Optional[int]:
+        """
+        ID of the existing customer matching keys (see find_customer; raises
+        if the query fails)
+        
+        Recent matches are answered from the in-process cache without a query.
+        """
+        customer_id = CUSTOMER_CACHE.get(keys)
+        if customer_id:
+            CUSTOMER_LOOKUPS.inc('cache', 'hit')
+            return customer_id
+        
+        row = self.find_customer(keys)
+        CUSTOMER_LOOKUPS.inc('database', 'hit' if row else 'miss')
+        if not row:
+            return None
+        CUSTOMER_CACHE.put(keys, row['id'])
+        return row['id']
+    
+    @timed('supabase')
+    def find_customers_bulk(self, ids: Iterable[int], keys_list: Iterable[Dict[str, str]]) -> List[Dict]:
+        """
+        Customers matching any of many ids or lookup keys, in one query
+        
+        Args:
+            ids: Customer ids
+            keys_list: Lookup keys (customer_lookup.lookup_keys()) of many check-ins
+        
+        Returns:
+            Rows with id, names and lookup columns, newest first
+        
+        Raises:
+            Exception: The query failed
+        """
+        if not self.is_configured():
+            return []
+        ids, keys_list = list(ids), list(keys_list)
+        row_filter = bulk_lookup_filter(ids, keys_list)
+        if not row_filter:
+            return []
+        columns = ', '.join(['id', 'first_name', 'last_name'] +
+                            [c for c in LOOKUP_COLUMNS if c not in _missing_columns])
+        try:
+            response = self.client.table('customers').select(columns).or_(row_filter) \
+                .order('created_at', desc=True).limit(BULK_LOOKUP_LIMIT).execute()
+        except Exception as e:
+            if not is_missing_column_error(e):
+                raise e
+            drop_missing_columns(e, {})
+            if 'license_hash' not in _missing_columns:
+                raise e
+            # Retry without the license hash column
+            return self.find_customers_bulk(ids, keys_list)
+        return response.data or []
+    
+    @timed('supabase')
+    def write_customers(self, rows: List[Dict], upsert: bool = False) -> List[Dict]:
+        """
+        Insert many customer rows, or upsert them on id, in one request
+        
+        Args:
+            rows: Rows with the same columns (PostgREST takes the columns of the first)
+            upsert: Update the rows whose id exists instead of inserting
+        
+        Returns:
+            The written rows, in order
+        
+        Raises:
+            Exception: The write failed
+        """
+        if not self.is_configured() or not rows:
+            return []
+        rows = [{k: v for k, v in row.items() if k not in _missing_columns} for row in rows]
+        table = self.client.table('customers')
+        try:
+            response = (table.upsert(rows, on_conflict='id') if upsert else table.insert(rows)).execute()
+        except Exception as e:
+            if not is_missing_column_error(e):
+                raise e
+            for row in rows:
+                drop_missing_columns(e, row)
+            response = (table.upsert(rows, on_conflict='id') if upsert else table.insert(rows)).execute()
+        written = response.data or []
+        for row in written:
+            CUSTOMER_CACHE.put(lookup_keys(row), row['id'])
+        return written
     
     def store_customer_with_images(
         self, 
@@ -275,6 +510,7 @@ class SupabaseManager:
         
         return customer_id, success
     
+    @timed('supabase')
     def get_customer(self, customer_id: int) -> Optional[Dict]:
         """
         Retrieve customer data by ID
@@ -298,8 +534,10 @@ class SupabaseManager:
             
         except Exception as e:
             logger.error(f"Failed to get customer: {e}")
+            mark_failed()
             return None
     
+    @timed('supabase')
     def list_customers(self, limit: int = 100, status: Optional[str] = None) -> list:
         """
         List customers with optional filtering
@@ -326,4 +564,232 @@ class SupabaseManager:
             
         except Exception as e:
             logger.error(f"Failed to list customers: {e}")
+            mark_failed()
+            return []
+    
+    @timed('supabase')
+    def customer_page(self, after_id: int, limit: int, columns: Iterable[str], status: Optional[str] = None,
+                      date_field: str = 'created_at', since: Optional[str] = None,
+                      until: Optional[str] = None) -> List[Dict]:
+        """
+        One page of customers by id, for keyset-paginated export
+        
+        Args:
+            after_id: Return customers with a larger id
+            limit: Page size
+            columns: Columns to select (id is always included)
+            status: Optional status filter
+            date_field: Column the since/until range applies to
+            since: Optional start of the range (inclusive)
+            until: Optional end of the range (exclusive)
+        
+        Returns:
+            Rows ordered by id
+        
+        Raises:
+            Exception: The query failed
+        """
+        if not self.is_configured():
+            return []
+        query = self.client.table('customers').select(export_select(columns))
+        response = filter_customer_page(query, after_id, limit, status, date_field, since, until).execute()
+        return response.data or []
+    
+    @timed('supabase')
+    def upload_artifact(self, path: str, data: bytes, content_type: str) -> Optional[str]:
+        """
+        Upload a failure artifact file to Supabase Storage
+        
+        Args:
+            path: Object path inside the artifacts bucket
+            data: File contents
+            content_type: MIME type stored with the object
+        
+        Returns:
+            Public URL of the uploaded file or None if failed
+        """
+        if not self.is_configured():
+            return None
+        
+        try:
+            bucket = self.client.storage.from_(ARTIFACT_BUCKET)
+            bucket.upload(path, data, file_options={"content-type": content_type})
+            return bucket.get_public_url(path)
+        except Exception as e:
+            logger.error(f"Failed to upload artifact {path}: {e}")
+            mark_failed()
+            return None
+
+
+class AsyncSupabaseManager:
+    """
+    Async counterpart of SupabaseManager for the ASGI serving mode (asgi_app.py)
+    
+    Covers the check-in and admin operations; the client is created on first use
+    because creating it needs a running event loop.
+    """
+    
+    def __init__(self, client: Optional[AsyncClient] = None):
+        self.url = os.environ.get('SUPABASE_URL', '')
+        self.key = os.environ.get('SUPABASE_SERVICE_KEY', '')
+        self.client = client
+        self._client_lock: Optional[asyncio.Lock] = None
+        
+        if client is None and (not self.url or not self.key):
+            logger.warning("Supabase credentials not configured - async client disabled")
+    
+    def is_configured(self) -> bool:
+        """Check if Supabase credentials (or an injected client) are available"""
+        return self.client is not None or bool(self.url and self.key)
+    
+    async def _get_client(self):
+        if self.client is None:
+            if self._client_lock is None:
+                self._client_lock = asyncio.Lock()
+            async with self._client_lock:
+                if self.client is None:
+                    self.client = await acreate_client(self.url, self.key)
+                    logger.info("Async Supabase client initialized successfully")
+        return self.client
+    
+    @timed('supabase')
+    async def store_customer(self, customer_data: Dict, status: str = 'pending') -> Optional[int]:
+        """Async SupabaseManager.store_customer"""
+        if not self.is_configured():
+            logger.warning("Supabase not configured - cannot store customer")
+            return None
+        
+        try:
+            client = await self._get_client()
+            db_data = customer_row(customer_data, status)
+            try:
+                response = await client.table('customers').insert(db_data).execute()
+            except Exception as e:
+                if is_missing_column_error(e):
+                    drop_missing_columns(e, db_data)
+                    response = await client.table('customers').insert(db_data).execute()
+                else:
+                    raise e
+            
+            if response.data and len(response.data) > 0:
+                customer_id = response.data[0]['id']
+                logger.info(f"Customer stored successfully: ID {customer_id}")
+                CUSTOMER_CACHE.put(lookup_keys(db_data), customer_id)
+                return customer_id
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to store customer: {e}")
+            mark_failed()
+            return None
+    
+    @timed('supabase')
+    async def update_customer_checkin(self, customer_id: int, checkin_data: Dict) -> bool:
+        """Async SupabaseManager.update_customer_checkin (raises if the update fails)"""
+        if not self.is_configured():
+            return False
+        
+        client = await self._get_client()
+        checkin_data = {k: v for k, v in checkin_data.items() if k not in _missing_columns}
+        try:
+            response = await client.table('customers').update(checkin_data).eq('id', customer_id).execute()
+        except Exception as e:
+            if is_missing_column_error(e):
+                drop_missing_columns(e, checkin_data)
+                response = await client.table('customers').update(checkin_data).eq('id', customer_id).execute()
+            else:
+                logger.error(f"Failed to update customer check-in: {e}")
+                raise e
+        
+        if response.data:
+            logger.info(f"Updated customer {customer_id} with check-in data: {list(checkin_data.keys())}")
+            CUSTOMER_CACHE.put(lookup_keys(response.data[0]), customer_id)
+            return True
+        logger.warning(f"Customer {customer_id} not updated - no such row")
+        CUSTOMER_CACHE.forget(customer_id)
+        return False
+    
+    @timed('supabase')
+    async def find_customer(self, keys: Dict[str, str]) -> Optional[Dict]:
+        """Async SupabaseManager.find_customer (raises if the query fails)"""
+        keys = usable_lookup_keys(keys)
+        if not self.is_configured() or not keys:
+            return None
+        
+        client = await self._get_client()
+        try:
+            response = await lookup_query(client, keys).execute()
+        except Exception as e:
+            if not is_missing_column_error(e):
+                logger.error(f"Failed to look up customer: {e}")
+                raise e
+            drop_missing_columns(e, keys)
+            if not keys:
+                return None
+            response = await lookup_query(client, keys).execute()
+        
+        return best_match(response.data or [], keys)
+    
+    async def find_customer_id(self, keys: Dict[str, str]) -> Optional[int]:
+        """Async SupabaseManager.find_customer_id"""
+        customer_id = CUSTOMER_CACHE.get(keys)
+        if customer_id:
+            CUSTOMER_LOOKUPS.inc('cache', 'hit')
+            return customer_id
+        
+        row = await self.find_customer(keys)
+        CUSTOMER_LOOKUPS.inc('database', 'hit' if row else 'miss')
+        if not row:
+            return None
+        CUSTOMER_CACHE.put(keys, row['id'])
+        return row['id']
+    
+    @timed('supabase')
+    async def get_customer(self, customer_id: int) -> Optional[Dict]:
+        """Async SupabaseManager.get_customer"""
+        if not self.is_configured():
+            return None
+        
+        try:
+            client = await self._get_client()
+            response = await client.table('customers').select('*').eq('id', customer_id).execute()
+            if response.data and len(response.data) > 0:
+                return response.data[0]
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to get customer: {e}")
+            mark_failed()
+            return None
+    
+    @timed('supabase')
+    async def list_customers(self, limit: int = 100, status: Optional[str] = None) -> list:
+        """Async SupabaseManager.list_customers"""
+        if not self.is_configured():
+            return []
+        
+        try:
+            client = await self._get_client()
+            query = client.table('customers').select('*').order('created_at', desc=True).limit(limit)
+            if status:
+                query = query.eq('status', status)
+            response = await query.execute()
+            return response.data if response.data else []
+            
+        except Exception as e:
+            logger.error(f"Failed to list customers: {e}")
+            mark_failed()
+            return []
+    
+    @timed('supabase')
+    async def customer_page(self, after_id: int, limit: int, columns: Iterable[str], status: Optional[str] = None,
+                            date_field: str = 'created_at', since: Optional[str] = None,
+                            until: Optional[str] = None) -> List[Dict]:
+        """Async SupabaseManager.customer_page"""
+        if not self.is_configured():
             return []
+        client = await self._get_client()
+        query = client.table('customers').select(export_select(columns))
+        response = await filter_customer_page(query, after_id, limit, status, date_field, since, until).execute()
+        return response.data or []
@@ -0,0 +1,429 @@
+"""
+Workload-isolated worker pools
+Heavy routes hand their work to a separately sized pool so they can't starve
+the light ones:
+
+- vision:  OCR, a process pool; each process loads its own models, so by
+           default it gets as many processes as there are usable CPU cores
+           and VISION_WORKER_MEMORY_MB shares of memory (at least one)
+- barcode: server-side barcode decoding, a thread pool sized to the cores
+           (zxing-cpp and OpenCV release the GIL); kept apart from OCR so a
+           50 ms scan never queues behind a multi-second OCR run
+- browser: QuickBase form automation, a small thread pool (one browser each)
+
+Light routes (barcode text parsing, age validation, check-in, admin) run on
+the server's own request threads, which now only wait on pool futures while
+heavy work is in progress. Each pool admits at most workers + queue jobs;
+beyond that, when a job outlives the pool timeout, and when the request's
+deadline (see admission.py) comes first, callers get PoolBusy and the route
+answers 503 with Retry-After. A job that had already started when the caller
+stopped waiting keeps running; PoolBusy.job is its future, so the caller can
+pick up its result later (see idempotency.settle_later()) rather than invite
+a retry that repeats it.
+
+Jobs keep the caller's context (deadline, progress reporter): thread pools
+run them in a copy of it, and process pools relay progress events back over
+a multiprocessing queue. The same queue carries the pool processes' metric
+samples to the server's registry. Other in-memory state stays per process:
+each OCR process keeps its own cascade history (ocr_cascade) and DC address
+rotation (dc_address_pool).
+
+Set WORKER_POOLS=0 to run everything on the request thread as before.
+"""
+
+import contextvars
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from admission import time_remaining
+from metrics import REGISTRY, forward_to
+from progress import current_reporter, emit, reporting
+
+logger = logging.getLogger(__name__)
+
+WORKER_POOLS_ENABLED = os.environ.get('WORKER_POOLS', '1').lower() not in ('0', 'false', 'no')
+
+# Process start method for process pools; 'spawn' keeps children clear of the
+# server's threads and locks
+POOL_START_METHOD = os.environ.get('POOL_START_METHOD', 'spawn')
+
+# Memory one OCR process uses with its models loaded
+VISION_WORKER_MEMORY_MB = int(os.environ.get('VISION_WORKER_MEMORY_MB', '2048'))
+
+
+def available_cpus() -> int:
+    """CPU cores this process may run on (respects affinity masks and cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory_mb() -> Optional[int]:
+    """Memory limit of the container (cgroup v2 or v1), else physical memory; None if unknown"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        # 'max' (v2) or a huge number (v1) means no limit
+        if limit.isdigit() and int(limit) < 1 << 60:
+            return int(limit) // (1 << 20)
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1 << 20)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_vision_workers() -> int:
+    """
+    OCR processes that fit the machine: one per usable core, but no more than
+    the memory shares left after one for the server process itself
+    """
+    workers = available_cpus()
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        workers = min(workers, memory_mb // VISION_WORKER_MEMORY_MB - 1)
+    return max(1, workers)
+
+
+POOL_CONFIG = {
+    'vision': {
+        'kind': os.environ.get('VISION_POOL_KIND', 'process'),
+        'workers': int(os.environ.get('VISION_POOL_WORKERS', '0')) or default_vision_workers(),
+        'queue_size': int(os.environ.get('VISION_POOL_QUEUE', '4')),
+        'timeout': float(os.environ.get('VISION_POOL_TIMEOUT', '60')),
+        'retry_after': int(os.environ.get('VISION_POOL_RETRY_AFTER', '5')),
+    },
+    'barcode': {
+        'kind': 'thread',
+        'workers': int(os.environ.get('BARCODE_POOL_WORKERS', '0')) or available_cpus(),
+        'queue_size': int(os.environ.get('BARCODE_POOL_QUEUE', '8')),
+        'timeout': float(os.environ.get('BARCODE_POOL_TIMEOUT', '20')),
+        'retry_after': int(os.environ.get('BARCODE_POOL_RETRY_AFTER', '2')),
+    },
+    'browser': {
+        'kind': 'thread',
+        'workers': int(os.environ.get('BROWSER_POOL_WORKERS', '2')),
+        'queue_size': int(os.environ.get('BROWSER_POOL_QUEUE', '4')),
+        'timeout': float(os.environ.get('BROWSER_POOL_TIMEOUT', '180')),
+        'retry_after': int(os.environ.get('BROWSER_POOL_RETRY_AFTER', '30')),
+    },
+}
+
+POOL_JOBS = REGISTRY.gauge(
+    'checkin_pool_jobs',
+    'Jobs admitted to a worker pool (queued or running)',
+    ('pool',)
+)
+POOL_REJECTED = REGISTRY.counter(
+    'checkin_pool_rejected_total',
+    'Jobs shed by a worker pool (queue_full, timeout or deadline)',
+    ('pool', 'reason')
+)
+POOL_JOB_SECONDS = REGISTRY.histogram(
+    'checkin_pool_job_duration_seconds',
+    'Time from admission to result, including the wait for a free worker',
+    ('pool',)
+)
+
+
+class PoolBusy(Exception):
+    """
+    A pool shed the job; the caller should answer 503 with Retry-After
+
+    Args:
+        pool: Pool name
+        reason: queue_full, timeout or deadline
+        retry_after: Retry-After hint in seconds
+        job: Future of the job if it had already started and is still running
+            (None if it never ran)
+    """
+
+    def __init__(self, pool: str, reason: str, retry_after: int, job: Optional[Future] = None):
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+        self.job = job
+        super().__init__(f"{pool} pool {reason.replace('_', ' ')}")
+
+
+class WorkPool:
+    """
+    Bounded executor with admission control
+
+    Args:
+        name: Pool name (metrics label)
+        kind: 'process' or 'thread'
+        workers: Jobs running at once
+        queue_size: Jobs allowed to wait for a worker
+        timeout: Seconds a caller waits for a result before giving up
+        retry_after: Minimum Retry-After hint when shedding
+        initializer: Run once in each process-pool worker (must be picklable)
+        initargs: Arguments for initializer
+    """
+
+    def __init__(self, name: str, kind: str, workers: int, queue_size: int, timeout: float,
+                 retry_after: int, initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.name = name
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._admitted = 0
+        # Moving average of job time, used to estimate Retry-After
+        self._avg_seconds = 0.0
+
+        # Process pools: job id -> (reporter, event set when the job's last progress event arrived)
+        self._progress_queue = None
+        self._reporters: Dict[int, tuple] = {}
+        self._job_ids = itertools.count(1)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == 'process':
+                    mp_context = multiprocessing.get_context(POOL_START_METHOD)
+                    if self._progress_queue is None:
+                        self._progress_queue = mp_context.Queue()
+                        threading.Thread(target=self._relay_progress, name=f'{self.name}-progress',
+                                         daemon=True).start()
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=mp_context, initializer=_init_process_worker,
+                        initargs=(self._progress_queue, self.initializer, self.initargs)
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix=f'{self.name}-pool')
+                logger.info(f"{self.name} pool started: {self.kind}, {self.workers} workers, "
+                            f"queue {self.queue_size}, timeout {self.timeout:.0f}s")
+            return self._executor
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and wait for its result
+
+        Raises:
+            PoolBusy: The pool is full, or the job didn't finish within the timeout
+                or before the request's deadline
+        """
+        timeout = self.timeout
+        remaining = time_remaining()
+        if remaining is not None:
+            # Don't start work whose result would arrive after the client gave up
+            if remaining <= self.expected_wait():
+                self._shed('deadline')
+            timeout = min(timeout, remaining)
+
+        if not self._slots.acquire(blocking=False):
+            self._shed('queue_full')
+
+        start = time.perf_counter()
+        with self._lock:
+            self._admitted += 1
+            ahead = max(0, self._admitted - self.workers)
+        POOL_JOBS.inc(self.name)
+        if ahead:
+            emit('queued', pool=self.name, ahead=ahead)
+
+        reporter = current_reporter()
+        job_id = None
+        try:
+            executor = self._get_executor()
+            if self.kind == 'process':
+                if reporter is not None:
+                    job_id = next(self._job_ids)
+                    self._reporters[job_id] = (reporter, threading.Event())
+                future = executor.submit(_run_job, job_id, fn, args, kwargs)
+            else:
+                future = executor.submit(contextvars.copy_context().run, _run_job, None, fn, args, kwargs)
+        except BaseException:
+            self._reporters.pop(job_id, None)
+            self._release(start)
+            raise
+        # The slot is held until the job really ends, even if the caller stops waiting
+        future.add_done_callback(lambda _: self._release(start))
+
+        try:
+            result = future.result(timeout=timeout)
+            if job_id is not None:
+                # Progress travels separately from the result; let the last events arrive first
+                self._reporters[job_id][1].wait(0.5)
+            return result
+        except FutureTimeout:
+            # A job still waiting for a worker is dropped; one already running can't be stopped
+            started = not future.cancel()
+            self._shed('timeout' if timeout == self.timeout else 'deadline', job=future if started else None)
+        except BrokenProcessPool:
+            # A worker process died (e.g. out of memory); start fresh processes next time
+            logger.error(f"{self.name} pool worker died - restarting pool")
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            self._reporters.pop(job_id, None)
+
+    def _relay_progress(self):
+        """
+        Hand progress events from pool processes to the reporters of the waiting
+        requests, and their metric samples to the registry
+        """
+        while True:
+            job_id, stage, details = self._progress_queue.get()
+            if job_id is None:
+                REGISTRY.record(*details)
+                continue
+            entry = self._reporters.get(job_id)
+            if entry is None:
+                continue
+            reporter, finished = entry
+            if stage is None:
+                finished.set()
+                continue
+            try:
+                reporter(stage, details)
+            except Exception as e:
+                logger.debug(f"Progress relay failed for {stage}: {e}")
+
+    def _release(self, start: float):
+        seconds = time.perf_counter() - start
+        POOL_JOB_SECONDS.observe(seconds, self.name)
+        POOL_JOBS.dec(self.name)
+        with self._lock:
+            self._admitted -= 1
+            self._avg_seconds = seconds if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * seconds
+        self._slots.release()
+
+    def _shed(self, reason: str, job: Optional[Future] = None):
+        POOL_REJECTED.inc(self.name, reason)
+        retry_after = self.estimate_retry_after()
+        if job is not None:
+            logger.warning(f"{self.name} pool stopped waiting ({reason}); the job keeps running")
+        else:
+            logger.warning(f"{self.name} pool shedding ({reason}), retry after {retry_after}s")
+        raise PoolBusy(self.name, reason, retry_after, job)
+
+    def expected_wait(self) -> float:
+        """Seconds a job submitted now would likely take: the backlog divided across workers"""
+        with self._lock:
+            return math.ceil((self._admitted + 1) / self.workers) * self._avg_seconds
+
+    def estimate_retry_after(self) -> int:
+        """Seconds until a slot is likely free, at least retry_after"""
+        with self._lock:
+            backlog = self._admitted / self.workers * self._avg_seconds
+        return max(self.retry_after, math.ceil(backlog))
+
+    def stats(self) -> Dict:
+        """Current load, for /health"""
+        with self._lock:
+            return {
+                'kind': self.kind,
+                'workers': self.workers,
+                'queueSize': self.queue_size,
+                'admitted': self._admitted,
+                'avgJobSeconds': round(self._avg_seconds, 3),
+            }
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Set in each process-pool worker by _init_process_worker
+_worker_progress_queue = None
+
+
+def _init_process_worker(progress_queue, initializer: Optional[Callable], initargs: tuple):
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+    # (None, 'metric', sample) messages: recorded by the server process, not here
+    forward_to(lambda *sample: progress_queue.put((None, 'metric', sample)))
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_job(job_id: Optional[int], fn: Callable, args: tuple, kwargs: Dict):
+    """
+    Pool-side wrapper around a job
+
+    In a process pool with a listening request (job_id set), progress events
+    go back through the pool's queue, followed by an end marker. In a thread
+    pool the caller's reporter is already in the copied context.
+    """
+    if job_id is None:
+        emit('started')
+        return fn(*args, **kwargs)
+
+    def relay(stage, details):
+        _worker_progress_queue.put((job_id, stage, details))
+
+    try:
+        with reporting(relay):
+            emit('started')
+            return fn(*args, **kwargs)
+    finally:
+        _worker_progress_queue.put((job_id, None, None))
+
+
+_pools: Dict[str, WorkPool] = {}
+_pools_lock = threading.Lock()
+_initializers: Dict[str, tuple] = {}
+
+
+def set_pool_initializer(name: str, initializer: Callable, *initargs):
+    """
+    Register a function to run in each worker of a process pool before it takes jobs
+
+    Must be called before the pool's first job (used by the load test to
+    install its OCR stub in the vision processes).
+    """
+    _initializers[name] = (initializer, initargs)
+
+
+def get_pool(name: str) -> WorkPool:
+    """The named pool, created on first use from POOL_CONFIG"""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                initializer, initargs = _initializers.get(name, (None, ()))
+                pool = _pools[name] = WorkPool(name, initializer=initializer, initargs=initargs,
+                                               **POOL_CONFIG[name])
+    return pool
+
+
+def run_in_pool(name: str, fn: Callable, *args, **kwargs):
+    """
+    Run fn in the named pool, or inline when worker pools are disabled
+
+    Raises:
+        PoolBusy: The pool shed the job
+    """
+    if not WORKER_POOLS_ENABLED:
+        return fn(*args, **kwargs)
+    return get_pool(name).run(fn, *args, **kwargs)
+
+
+def pool_stats() -> Dict:
+    """Stats for the pools started so far"""
+    return {name: pool.stats() for name, pool in list(_pools.items())}
@@ -0,0 +1,35 @@
+-- Returning-customer lookup (backend/customer_lookup.py)
+-- Run this in your Supabase SQL Editor. Check-in without a customerId looks
+-- for an earlier record by license hash, registration ID or barcode before
+-- creating a new one; these indexes keep each of those lookups to an index scan.
+
+-- Salted HMAC-SHA256 of the AAMVA license number (DAQ); written by the backend
+-- when LICENSE_HASH_SALT is set
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS license_hash TEXT;
+
+-- Lookups filter on one key and take the newest match
+CREATE INDEX IF NOT EXISTS idx_customers_license_hash_created
+ON customers(license_hash, created_at DESC) WHERE license_hash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_customers_registration_id_created
+ON customers(registration_id, created_at DESC) WHERE registration_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_customers_barcode_created
+ON customers(barcode, created_at DESC) WHERE barcode IS NOT NULL;
+
+-- Superseded by the indexes above
+DROP INDEX IF EXISTS idx_customers_registration_id;
+DROP INDEX IF EXISTS idx_customers_barcode;
+
+COMMENT ON COLUMN customers.license_hash IS 'HMAC-SHA256 of the normalized license number, keyed with LICENSE_HASH_SALT';
+
+-- Optional backfill for existing rows, whose barcode holds the license number.
+-- Use the same value as LICENSE_HASH_SALT; the backend uppercases the number
+-- and strips everything but letters and digits before hashing.
+-- CREATE EXTENSION IF NOT EXISTS pgcrypto;
+-- UPDATE customers
+-- SET license_hash = encode(hmac(regexp_replace(upper(barcode), '[^0-9A-Z]', '', 'g'), '<LICENSE_HASH_SALT>', 'sha256'), 'hex')
+-- WHERE license_hash IS NULL AND barcode IS NOT NULL;
+
+-- Verify
+-- SELECT indexname FROM pg_indexes WHERE tablename = 'customers';
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+AAMVA parser throughput benchmark and differential fuzzer
+Measures parse_aamva_barcode + format_date (the /api/parse-barcode hot path)
+over a corpus of synthetic payloads, and checks that the production parser
+still agrees with a frozen reference implementation on mutated inputs.
+
+Usage:
+    python bench_aamva_parser.py bench --parses 1000000
+    python bench_aamva_parser.py fuzz --cases 200000 --output fuzz_failures.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from barcode_service import parse_aamva_barcode, format_date  # noqa: E402
+from aamva_corpus import generate_corpus  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# Reference implementation: the original per-call-regex parser, kept verbatim
+# (minus logging) so optimizations of the production parser can be checked
+# for identical output. Do not "improve" this copy.
+# ---------------------------------------------------------------------------
+
+REFERENCE_CODES = [
+    'DCA', 'DCB', 'DCD', 'DBA', 'DCS', 'DAC', 'DAD', 'DBD', 'DBB', 'DBC',
+    'DAY', 'DAU', 'DAG', 'DAI', 'DAJ', 'DAK', 'DAQ', 'DCF', 'DCG', 'DDE',
+    'DDF', 'DDG', 'DAH', 'DAZ', 'DCI', 'DCJ', 'DCM', 'DCN', 'DCO', 'DCP',
+    'DCQ', 'DCR', 'DDA', 'DDB', 'DDC', 'DDD', 'DAW', 'DAX', 'DCE', 'DCL',
+    'DAA', 'DAB', 'DAE', 'DAF', 'DAM', 'DAN', 'DAO', 'DAR', 'DAS', 'DAT',
+    'Dbf', 'Dbg'
+]
+
+REFERENCE_FIELDS = {
+    'DCS': 'lastName', 'DAC': 'firstName', 'DAD': 'middleName', 'DBB': 'dateOfBirth',
+    'DAG': 'street', 'DAH': 'street2', 'DAI': 'city', 'DAJ': 'state', 'DAK': 'zip',
+    'DAQ': 'licenseNumber', 'DBC': 'sex', 'DAY': 'eyeColor', 'DAU': 'height'
+}
+
+
+def reference_parse(barcode_text: str) -> Dict:
+    known_codes_pattern = '|'.join(REFERENCE_CODES)
+    parsed_data = {}
+    for code, field in REFERENCE_FIELDS.items():
+        pattern = rf'({code})\s*(.*?)(?=[\n\r\x1e]|(?:{known_codes_pattern})|$)'
+        match = re.search(pattern, barcode_text, re.IGNORECASE)
+        if match:
+            value = match.group(2).strip()
+            value = re.sub(r'<lf>', '', value, flags=re.IGNORECASE)
+            value = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', value)
+            value = value.strip()
+            if value:
+                parsed_data[field] = value
+    return parsed_data
+
+
+def reference_format_date(date_str: str, input_format: str = 'MMDDYYYY') -> str:
+    try:
+        clean_date = date_str.strip()[:8]
+        if input_format == 'MMDDYYYY' and len(clean_date) == 8:
+            if clean_date.isdigit():
+                month, day, year = clean_date[:2], clean_date[2:4], clean_date[4:]
+                return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+        elif input_format == 'YYYYMMDD' and len(clean_date) == 8:
+            if clean_date.isdigit():
+                year, month, day = clean_date[:4], clean_date[4:6], clean_date[6:]
+                return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+        return date_str
+    except Exception:
+        return date_str
+
+
+def expected_format_date(date_str: str) -> str:
+    """
+    reference_format_date plus the intended behaviour changes since it was
+    frozen (format_date now uses age_eligibility.normalize_dob):
+
+    - years outside 1900-2099 are no longer dates (the input comes back unchanged)
+    - YYYYMMDD (AAMVA version 01, Canadian cards), YYYY-MM-DD and MM/DD/YYYY
+      are accepted as well as MMDDYYYY
+    """
+    expected = reference_format_date(date_str)
+    if expected != date_str:
+        return expected if 1900 <= int(expected.split('-')[0]) <= 2099 else date_str
+    text = date_str.strip()
+    candidates = []
+    match = re.fullmatch(r'(\d{4})-(\d{1,2})-(\d{1,2})', text[:10])
+    if match:
+        candidates.append(match.groups())
+    match = re.fullmatch(r'(\d{1,2})/(\d{1,2})/(\d{4})', text)
+    if match:
+        month, day, year = match.groups()
+        candidates.append((year, month, day))
+    if len(text[:8]) == 8 and text[:8].isdigit():
+        candidates.append((text[:4], text[4:6], text[6:8]))
+    for year, month, day in candidates:
+        try:
+            if 1900 <= int(year) <= 2099:
+                return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return date_str
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def parse_one(text: str) -> Dict:
+    """What /api/parse-barcode does per request before building the response"""
+    parsed = parse_aamva_barcode(text)
+    if 'dateOfBirth' in parsed:
+        parsed['dateOfBirth'] = format_date(parsed['dateOfBirth'])
+    return parsed
+
+
+def allocation_profile(corpus: List[str], samples: int) -> Dict:
+    """Average traced allocation count and peak bytes for one parse"""
+    tracemalloc.start(1)
+    blocks = []
+    peaks = []
+    try:
+        for text in corpus[:samples]:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            parse_one(text)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            after = tracemalloc.take_snapshot()
+            # Allocations made during the parse that are still alive count once;
+            # short-lived ones show up in the peak
+            blocks.append(sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0))
+    finally:
+        tracemalloc.stop()
+    return {
+        'liveBlocksPerParse': round(sum(blocks) / len(blocks), 1),
+        'peakBytesPerParse': round(sum(peaks) / len(peaks)),
+    }
+
+
+def run_bench(args) -> Dict:
+    corpus = [text for text, _ in generate_corpus(args.corpus, args.seed)]
+    total = args.parses
+
+    # Warm up regex caches / compiled patterns
+    for text in corpus:
+        parse_one(text)
+
+    start = time.perf_counter()
+    done = 0
+    while done < total:
+        for text in corpus:
+            parse_one(text)
+        done += len(corpus)
+    elapsed = time.perf_counter() - start
+
+    ref_start = time.perf_counter()
+    ref_done = 0
+    while ref_done < min(total, args.reference_parses):
+        for text in corpus:
+            parsed = reference_parse(text)
+            if 'dateOfBirth' in parsed:
+                reference_format_date(parsed['dateOfBirth'])
+        ref_done += len(corpus)
+    ref_elapsed = time.perf_counter() - ref_start
+
+    report = {
+        'parses': done,
+        'seconds': round(elapsed, 3),
+        'parsesPerSec': round(done / elapsed),
+        'usPerParse': round(elapsed / done * 1e6, 2),
+        'referenceParsesPerSec': round(ref_done / ref_elapsed) if ref_done else None,
+        **allocation_profile(corpus, args.alloc_samples),
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Differential fuzzing
+# ---------------------------------------------------------------------------
+
+INTERESTING_FRAGMENTS = ['<LF>', '<lf>', '\n', '\r', '\x1e', '\x00', ' ', 'DAC', 'Dad', 'dbb',
+                         'DAK', 'Dbf', '@', 'ANSI ', 'é', '\x85', '00000000', '13451990']
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """Apply 1-4 random structural mutations"""
+    for _ in range(rng.randint(1, 4)):
+        op = rng.randrange(7)
+        pos = rng.randrange(len(text) + 1)
+        if op == 0 and text:  # delete a span
+            text = text[:pos] + text[pos + rng.randint(1, 8):]
+        elif op == 1:  # insert a meaningful fragment
+            text = text[:pos] + rng.choice(INTERESTING_FRAGMENTS) + text[pos:]
+        elif op == 2 and text:  # replace a character with a random one
+            text = text[:pos] + chr(rng.randrange(0, 0x250)) + text[pos + 1:]
+        elif op == 3:  # swap case of a span
+            end = pos + rng.randint(1, 12)
+            text = text[:pos] + text[pos:end].swapcase() + text[end:]
+        elif op == 4:  # truncate
+            text = text[:pos]
+        elif op == 5 and text:  # duplicate a span
+            end = pos + rng.randint(1, 20)
+            text = text[:end] + text[pos:end] + text[end:]
+        elif op == 6:  # separators -> <LF> literals (or back)
+            text = text.replace('\n', '<LF>') if rng.random() < 0.5 else text.replace('<LF>', '\n')
+    return text
+
+
+def run_fuzz(args) -> Dict:
+    rng = random.Random(args.seed)
+    corpus = [text for text, _ in generate_corpus(args.corpus, args.seed)]
+    failures = []
+
+    for i in range(args.cases):
+        text = mutate(rng.choice(corpus), rng)
+        try:
+            actual = parse_aamva_barcode(text)
+            actual_dob = format_date(actual['dateOfBirth']) if 'dateOfBirth' in actual else None
+        except Exception as e:
+            actual, actual_dob = {'exception': repr(e)}, None
+        expected = reference_parse(text)
+        expected_dob = expected_format_date(expected['dateOfBirth']) if 'dateOfBirth' in expected else None
+
+        if actual != expected or actual_dob != expected_dob:
+            failures.append({'input': text, 'expected': expected, 'actual': actual,
+                             'expectedDob': expected_dob, 'actualDob': actual_dob})
+            if len(failures) >= args.max_failures:
+                break
+
+    report = {'cases': i + 1, 'failures': len(failures), 'seed': args.seed}
+    print(json.dumps(report, indent=2))
+    if failures:
+        with open(args.output, 'w') as f:
+            json.dump(failures, f, indent=2)
+        print(f"Mismatching inputs written to {args.output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    bench = sub.add_parser('bench', help='measure parses/sec and allocations per parse')
+    bench.add_argument('--parses', type=int, default=1_000_000)
+    bench.add_argument('--reference-parses', type=int, default=100_000,
+                       help='parses of the reference implementation for comparison (0 to skip)')
+    bench.add_argument('--alloc-samples', type=int, default=200)
+
+    fuzz = sub.add_parser('fuzz', help='differential fuzzing against the reference parser')
+    fuzz.add_argument('--cases', type=int, default=100_000)
+    fuzz.add_argument('--max-failures', type=int, default=50)
+    fuzz.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'aamva_fuzz_failures.json'),
+                      help='where mismatching inputs are written (default: the temp directory)')
+
+    for p in (bench, fuzz):
+        p.add_argument('--corpus', type=int, default=500, help='distinct synthetic payloads')
+        p.add_argument('--seed', type=int, default=0)
+        p.add_argument('--log', action='store_true', help="keep the parser's logging on (as in production)")
+
+    args = parser.parse_args()
+    if not args.log:
+        logging.disable(logging.CRITICAL)
+
+    report = run_bench(args) if args.mode == 'bench' else run_fuzz(args)
+    sys.exit(1 if report.get('failures') else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Barcode decode benchmark over a synthetic AAMVA PDF417 corpus
+Renders synthetic license payloads as PDF417 on an ID-card-like scene, applies
+controlled degradations (blur, rotation, perspective, glare, JPEG compression,
+low resolution) and runs decode_barcode plus each engine on its own.
+
+Reports decode success rate, p50/p95 latency, variants tried and peak memory,
+and writes everything as JSON so runs can be compared across commits.
+
+Usage:
+    python bench_barcode.py --samples 20 --output bench_barcode.json
+    python bench_barcode.py --degradations clean,blur --engines pipeline,zxing-cpp
+    python bench_barcode.py --compare before.json --output after.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+import zxingcpp
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import barcode_service  # noqa: E402
+from aamva_corpus import generate_corpus  # noqa: E402
+
+# Scene geometry: a CR80 card at ~300 dpi on a phone-photo sized background
+CARD_SIZE = (1012, 638)
+PHOTO_SIZE = (2016, 1512)
+
+# name -> list of (level label, parameter)
+DEGRADATIONS = {
+    'clean': [('none', None)],
+    'blur': [('sigma1.5', 1.5), ('sigma3', 3.0)],
+    'rotation': [('15deg', 15), ('90deg', 90), ('180deg', 180)],
+    'perspective': [('mild', 0.06), ('strong', 0.12)],
+    'glare': [('soft', 0.5), ('hard', 0.9)],
+    'jpeg': [('q30', 30), ('q10', 10)],
+    'lowres': [('50pct', 0.5), ('30pct', 0.3)],
+}
+
+
+# zxing-cpp's default (HRI) text mode spells control characters out
+HRI_CONTROL_CODES = {'<LF>': '\n', '<CR>': '\r', '<RS>': '\x1e', '<GS>': '\x1d'}
+
+
+def render_pdf417(text: str, scale: int = 2) -> np.ndarray:
+    """Render payload text as a PDF417 symbol (uint8, black on white)"""
+    if hasattr(zxingcpp, 'create_barcode'):
+        symbol = zxingcpp.create_barcode(text, zxingcpp.BarcodeFormat.PDF417)
+        return np.ascontiguousarray(np.asarray(symbol.to_image(scale=scale)))
+    return zxingcpp.write_barcode(zxingcpp.BarcodeFormat.PDF417, text, 0, 0)
+
+
+def render_scene(payload: str, rng: random.Random) -> np.ndarray:
+    """Place the barcode on a card with some text, and the card on a table"""
+    card = np.full((CARD_SIZE[1], CARD_SIZE[0]), 225, np.uint8)
+    for i in range(4):
+        cv2.putText(card, f"SAMPLE {rng.randint(1000, 9999)} LINE {i}", (40, 50 + 34 * i),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, 60, 2)
+    symbol = render_pdf417(payload)
+    target_width = CARD_SIZE[0] - 80
+    if symbol.shape[1] != target_width:
+        height = int(symbol.shape[0] * target_width / symbol.shape[1])
+        symbol = cv2.resize(symbol, (target_width, height), interpolation=cv2.INTER_NEAREST)
+    y = CARD_SIZE[1] - symbol.shape[0] - 30
+    card[y:y + symbol.shape[0], 40:40 + symbol.shape[1]] = symbol
+
+    photo = np.full((PHOTO_SIZE[1], PHOTO_SIZE[0]), 90, np.uint8)
+    x0 = (PHOTO_SIZE[0] - CARD_SIZE[0]) // 2 + rng.randint(-200, 200)
+    y0 = (PHOTO_SIZE[1] - CARD_SIZE[1]) // 2 + rng.randint(-150, 150)
+    photo[y0:y0 + CARD_SIZE[1], x0:x0 + CARD_SIZE[0]] = card
+    return photo
+
+
+def degrade(image: np.ndarray, kind: str, param, rng: random.Random) -> np.ndarray:
+    """Apply one degradation to a grayscale scene"""
+    h, w = image.shape
+    if kind == 'blur':
+        return cv2.GaussianBlur(image, (0, 0), param)
+    if kind == 'rotation':
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), param, 1.0)
+        if param % 180 == 90:
+            matrix[0, 2] += (h - w) / 2
+            matrix[1, 2] += (w - h) / 2
+            return cv2.warpAffine(image, matrix, (h, w), borderValue=90)
+        return cv2.warpAffine(image, matrix, (w, h), borderValue=90)
+    if kind == 'perspective':
+        d = param * min(w, h)
+        src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+        dst = np.float32([[d * rng.random(), d * rng.random()], [w - d * rng.random(), d * rng.random()],
+                          [w - d * rng.random(), h - d * rng.random()], [d * rng.random(), h - d * rng.random()]])
+        return cv2.warpPerspective(image, cv2.getPerspectiveTransform(src, dst), (w, h), borderValue=90)
+    if kind == 'glare':
+        mask = np.zeros_like(image, dtype=np.float32)
+        center = (w // 2 + rng.randint(-150, 150), h // 2 + rng.randint(0, 200))
+        cv2.ellipse(mask, center, (260, 120), rng.randint(0, 180), 0, 360, 1.0, -1)
+        mask = cv2.GaussianBlur(mask, (0, 0), 60)
+        return np.clip(image + mask * param * 255, 0, 255).astype(np.uint8)
+    if kind == 'lowres':
+        small = cv2.resize(image, (int(w * param), int(h * param)), interpolation=cv2.INTER_AREA)
+        return small
+    return image
+
+
+def encode_upload(image: np.ndarray, quality: int = 90) -> str:
+    """Encode as the kiosk would upload it: base64 JPEG data URI"""
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, 'JPEG', quality=quality)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def engine_runners() -> Dict[str, Callable]:
+    """Decode entry points to benchmark, keyed by report name"""
+    runners = {'pipeline': lambda variants: barcode_service.decode_barcode(variants)[0]}
+    if barcode_service.ZXING_AVAILABLE:
+        runners['zxing-cpp'] = barcode_service.decode_barcode_zxing
+    if barcode_service.PYZBAR_AVAILABLE:
+        runners['pyzbar'] = barcode_service.decode_barcode_pyzbar
+    if barcode_service.PDF417_AVAILABLE:
+        runners['pdf417decoder'] = barcode_service.decode_barcode_pdf417decoder
+    return runners
+
+
+def normalize_text(text: str) -> str:
+    """Map HRI control-code spellings back to the raw characters for comparison"""
+    for token, char in HRI_CONTROL_CODES.items():
+        text = text.replace(token, char)
+    return text.strip('\r\n')
+
+
+def run_once(runner: Callable, upload: str, expected: str) -> Dict:
+    """Decode one upload end to end (base64 -> gray -> variants -> engine)"""
+    start = time.perf_counter()
+    gray = barcode_service.process_barcode_image(upload)
+    variants = barcode_service.preprocess_for_barcode(gray)
+    text = runner(variants)
+    elapsed = time.perf_counter() - start
+    return {
+        'success': bool(text) and normalize_text(text) == normalize_text(expected),
+        'latency': elapsed,
+        # Variants are built lazily, so the number built is the number tried
+        'variants': len(variants),
+    }
+
+
+def measure_peak_memory(runner: Callable, upload: str, expected: str) -> float:
+    """Peak traced allocation (MB) for one decode, measured in a separate run"""
+    tracemalloc.start()
+    try:
+        run_once(runner, upload, expected)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(values, pct))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_benchmark(args) -> Dict:
+    rng = random.Random(args.seed)
+    corpus = generate_corpus(args.samples, args.seed)
+    runners = engine_runners()
+    selected = [e for e in args.engines.split(',') if e in runners] if args.engines != 'all' else list(runners)
+    degradations = args.degradations.split(',') if args.degradations != 'all' else list(DEGRADATIONS)
+
+    results = {}
+    for kind in degradations:
+        for level, param in DEGRADATIONS[kind]:
+            # Same scenes for every engine
+            uploads = []
+            for payload, _ in corpus:
+                scene = degrade(render_scene(payload, rng), kind, param, rng)
+                quality = param if kind == 'jpeg' else 90
+                uploads.append((encode_upload(scene, quality), payload))
+
+            for engine in selected:
+                runner = runners[engine]
+                samples = [run_once(runner, upload, payload) for upload, payload in uploads]
+                latencies = [s['latency'] * 1000 for s in samples]
+                peaks = [measure_peak_memory(runner, upload, payload)
+                         for upload, payload in uploads[:args.memory_samples]]
+                summary = {
+                    'samples': len(samples),
+                    'successRate': round(sum(s['success'] for s in samples) / len(samples), 3),
+                    'p50Ms': round(percentile(latencies, 50), 1),
+                    'p95Ms': round(percentile(latencies, 95), 1),
+                    'meanVariants': round(sum(s['variants'] for s in samples) / len(samples), 2),
+                    'peakMemoryMB': round(max(peaks), 1) if peaks else None,
+                }
+                results.setdefault(engine, {})[f"{kind}/{level}"] = summary
+                # peakMemoryMB is null in the JSON when --memory-samples is 0
+                peak = f"{summary['peakMemoryMB']}MB" if peaks else 'n/a'
+                print(f"{engine:<14} {kind + '/' + level:<22} success {summary['successRate']:>6.1%}  "
+                      f"p50 {summary['p50Ms']:>8.1f}ms  p95 {summary['p95Ms']:>8.1f}ms  "
+                      f"variants {summary['meanVariants']:>5.2f}  peak {peak}")
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'samples': args.samples,
+            'seed': args.seed,
+            'engines': selected,
+        },
+        'results': results,
+    }
+
+
+def compare(previous: Dict, current: Dict):
+    """Print success-rate and p50 deltas against a previous run"""
+    print(f"\nComparison {previous['meta']['commit']} -> {current['meta']['commit']}")
+    for engine, cases in current['results'].items():
+        for case, now in cases.items():
+            before = previous['results'].get(engine, {}).get(case)
+            if not before:
+                continue
+            print(f"{engine:<14} {case:<22} success {before['successRate']:>6.1%} -> {now['successRate']:>6.1%}  "
+                  f"p50 {before['p50Ms']:>8.1f} -> {now['p50Ms']:>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=20, help='payloads per degradation level')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', default='all', help='pipeline,zxing-cpp,pyzbar,pdf417decoder or all')
+    parser.add_argument('--degradations', default='all', help=','.join(DEGRADATIONS) + ' or all')
+    parser.add_argument('--memory-samples', type=int, default=3,
+                        help='samples per case re-run under tracemalloc for peak memory')
+    parser.add_argument('--output', default='bench_barcode.json')
+    parser.add_argument('--compare', help='previous JSON result to diff against')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    report = run_benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+OCR accuracy-vs-latency benchmark over a folder of labelled ID images
+Runs every engine / PaddleOCR variant / resolution combination, scores the
+extracted name, DOB and address against ground truth and prints a Pareto
+table of field accuracy against latency, so production settings
+(OCR_MAX_DIMENSION, OCR_PADDLE_ACCEPT_CHARS, OCR_PADDLE_VARIANT_STOP_CHARS)
+can be chosen from data.
+
+Each image needs a JSON sidecar with the same stem (front.jpg -> front.json):
+    {"firstName": "JOHN", "lastName": "SMITH", "dateOfBirth": "1985-02-12",
+     "street": "123 MAIN ST NW", "city": "WASHINGTON", "state": "DC", "zip": "20001"}
+Fields that are missing or empty in the sidecar are not scored.
+
+Usage:
+    python bench_ocr.py ./id_images --resolutions 1200,1800,2500 --output bench_ocr.json
+    python bench_ocr.py ./id_images --configs surya,paddle:original --isolate
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import ocr_service  # noqa: E402
+from image_decode import decode_image  # noqa: E402
+from ocr_fields import extract_fields  # noqa: E402
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic')
+
+SCORED_FIELDS = ('firstName', 'lastName', 'dateOfBirth', 'street', 'city', 'state', 'zip')
+
+# Field groups reported in the summary table
+FIELD_GROUPS = {
+    'name': ('firstName', 'lastName'),
+    'dob': ('dateOfBirth',),
+    'address': ('street', 'city', 'state', 'zip'),
+}
+
+# Grid for replaying the PaddleOCR retry policy from per-variant results
+ACCEPT_CHARS_GRID = (0, 10, 20, 40, 80)
+STOP_CHARS_GRID = (30, 50, 100, 200, 10**9)
+
+
+def load_dataset(folder: str) -> List[Dict]:
+    """Images with a JSON ground-truth sidecar, sorted by path"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(folder, '*'))):
+        stem, ext = os.path.splitext(path)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        label_path = stem + '.json'
+        if not os.path.exists(label_path):
+            print(f"Skipping {path}: no {os.path.basename(label_path)}")
+            continue
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        with open(label_path) as f:
+            truth = json.load(f)
+        samples.append({'path': path, 'bytes': image_bytes, 'truth': truth})
+    return samples
+
+
+def normalize(value: str) -> str:
+    """Uppercase, drop punctuation and collapse whitespace"""
+    value = re.sub(r'[^A-Z0-9 ]', ' ', str(value).upper())
+    return ' '.join(value.split())
+
+
+def score_fields(text: str, truth: Dict) -> Dict[str, Optional[bool]]:
+    """Per-field correctness of the fields extracted from OCR text (None = unlabelled)"""
+    fields = extract_fields(text) if text else {'name': {}, 'dateOfBirth': '', 'address': {}}
+    extracted = {**fields['name'], 'dateOfBirth': fields['dateOfBirth'], **fields['address']}
+    scores = {}
+    for field in SCORED_FIELDS:
+        expected = truth.get(field)
+        if not expected:
+            scores[field] = None
+            continue
+        actual = extracted.get(field) or ''
+        if field == 'zip':
+            scores[field] = normalize(actual)[:5] == normalize(expected)[:5]
+        else:
+            scores[field] = normalize(actual) == normalize(expected)
+    return scores
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def config_runners() -> Dict[str, Callable]:
+    """
+    OCR configurations keyed by name
+
+    'cascade' is the production path, 'paddle' the full retry policy,
+    'paddle:<variant>' a single PaddleOCR pass on one preprocessing variant.
+    """
+    runners = {}
+    if ocr_service.SURYA_AVAILABLE:
+        runners['surya'] = lambda image: ocr_service.extract_text_surya(image)[0]
+    if ocr_service.PADDLE_AVAILABLE:
+        runners['paddle'] = lambda image: ocr_service.extract_text_paddle(image)[0]
+        for name in ('original', 'grayscale', 'high_contrast', 'binary'):
+            runners[f'paddle:{name}'] = _paddle_variant_runner(name)
+    if runners:
+        runners['cascade'] = lambda image: ocr_service.extract_text_from_image(image)[0]
+    return runners
+
+
+def _paddle_variant_runner(variant_name: str):
+    def run(image):
+        for name, variant in ocr_service.paddle_variants(image):
+            if name == variant_name:
+                text, _ = ocr_service.extract_text_paddle_single(
+                    ocr_service.get_paddle_ocr(), ocr_service.paddle_variant_array(variant))
+                return text
+        raise ValueError(f"Unknown PaddleOCR variant {variant_name}")
+    return run
+
+
+def run_config(config: str, resolution: int, samples: List[Dict]) -> Dict:
+    """Run one configuration over every sample"""
+    runner = config_runners()[config]
+
+    # Load models outside the timed region
+    warm = decode_image(samples[0]['bytes'], max_dimension=resolution, mode='RGB')
+    try:
+        runner(warm)
+    except Exception:
+        pass
+
+    rss_before = current_rss_mb()
+    per_image = []
+    for sample in samples:
+        image = decode_image(sample['bytes'], max_dimension=resolution, mode='RGB')
+        start = time.perf_counter()
+        try:
+            text = runner(image) or ''
+        except Exception as e:
+            print(f"  {config}@{resolution} failed on {sample['path']}: {e}")
+            text = ''
+        elapsed = time.perf_counter() - start
+        per_image.append({
+            'path': sample['path'],
+            'latency': elapsed,
+            'chars': len(text.strip()),
+            'scores': score_fields(text, sample['truth']),
+        })
+
+    return {
+        'config': config,
+        'resolution': resolution,
+        'perImage': per_image,
+        'rssMB': round(current_rss_mb(), 1),
+        'rssGrowthMB': round(current_rss_mb() - rss_before, 1),
+        'peakRssMB': round(peak_rss_mb(), 1),
+    }
+
+
+def _run_config_isolated(args):
+    config, resolution, folder = args
+    logging.disable(logging.WARNING)
+    ocr_service.OCR_DEBUG_IMAGES = False
+    return run_config(config, resolution, load_dataset(folder))
+
+
+def summarize(result: Dict) -> Dict:
+    """Accuracy per field group and latency percentiles for one configuration"""
+    per_image = result['perImage']
+    latencies = [r['latency'] * 1000 for r in per_image]
+    summary = {
+        'config': result['config'],
+        'resolution': result['resolution'],
+        'p50Ms': round(float(np.percentile(latencies, 50)), 1),
+        'p95Ms': round(float(np.percentile(latencies, 95)), 1),
+        'rssMB': result['rssMB'],
+        'peakRssMB': result['peakRssMB'],
+    }
+    all_scores = []
+    for group, fields in FIELD_GROUPS.items():
+        scores = [r['scores'][f] for r in per_image for f in fields if r['scores'][f] is not None]
+        all_scores.extend(scores)
+        summary[f'{group}Accuracy'] = round(sum(scores) / len(scores), 3) if scores else None
+    summary['accuracy'] = round(sum(all_scores) / len(all_scores), 3) if all_scores else 0.0
+    return summary
+
+
+def mark_pareto(summaries: List[Dict]):
+    """Flag configurations no other configuration beats on both accuracy and p50 latency"""
+    for s in summaries:
+        s['pareto'] = not any(
+            o is not s and o['accuracy'] >= s['accuracy'] and o['p50Ms'] <= s['p50Ms']
+            and (o['accuracy'] > s['accuracy'] or o['p50Ms'] < s['p50Ms'])
+            for o in summaries
+        )
+
+
+def replay_paddle_policy(results: List[Dict]) -> List[Dict]:
+    """
+    Replay extract_text_paddle's thresholds offline from single-variant runs
+
+    For each resolution and (accept, stop) pair, walk the variants in the
+    production order using the recorded per-variant text lengths, summing the
+    latency of every pass that would have run and scoring the result it would
+    have kept.
+    """
+    by_key = {(r['config'], r['resolution']): r for r in results}
+    order = ['original', 'grayscale', 'high_contrast', 'binary']
+    replays = []
+    for resolution in sorted({r['resolution'] for r in results}):
+        runs = [by_key.get((f'paddle:{name}', resolution)) for name in order]
+        if not all(runs):
+            continue
+        for accept in ACCEPT_CHARS_GRID:
+            for stop in STOP_CHARS_GRID:
+                latencies, scores = [], []
+                for i in range(len(runs[0]['perImage'])):
+                    passes = [run['perImage'][i] for run in runs]
+                    elapsed = passes[0]['latency']
+                    best = passes[0]
+                    if best['chars'] <= accept:
+                        for p in passes[1:]:
+                            elapsed += p['latency']
+                            if p['chars'] > best['chars']:
+                                best = p
+                            if best['chars'] > stop:
+                                break
+                    latencies.append(elapsed * 1000)
+                    scores.extend(v for v in best['scores'].values() if v is not None)
+                replays.append({
+                    'config': f"paddle accept>{accept} stop>{stop if stop < 10**9 else 'never'}",
+                    'resolution': resolution,
+                    'accuracy': round(sum(scores) / len(scores), 3) if scores else 0.0,
+                    'p50Ms': round(float(np.percentile(latencies, 50)), 1),
+                    'p95Ms': round(float(np.percentile(latencies, 95)), 1),
+                })
+    mark_pareto(replays)
+    return replays
+
+
+def print_table(title: str, rows: List[Dict], columns: List[str]):
+    print(f"\n{title}")
+    header = f"{'':2}{'config':<34}{'res':>6}" + ''.join(f"{c:>14}" for c in columns)
+    print(header)
+    print('-' * len(header))
+    for row in sorted(rows, key=lambda r: (r['p50Ms'], -r['accuracy'])):
+        cells = ''.join(f"{'-' if row.get(c) is None else row[c]:>14}" for c in columns)
+        print(f"{'* ' if row.get('pareto') else '  '}{row['config']:<34}{row['resolution']:>6}{cells}")
+    print("* = Pareto-optimal (no other configuration is both faster and more accurate)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help='folder of ID images with JSON ground-truth sidecars')
+    parser.add_argument('--configs', default='all',
+                        help='comma-separated subset of surya,paddle,paddle:<variant>,cascade or all')
+    parser.add_argument('--resolutions', default='1200,1800,2500',
+                        help='longest-side limits to decode at (OCR_MAX_DIMENSION candidates)')
+    parser.add_argument('--isolate', action='store_true',
+                        help='run each configuration in a fresh process so RSS is not shared')
+    parser.add_argument('--output', default='bench_ocr.json')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    ocr_service.OCR_DEBUG_IMAGES = False
+
+    samples = load_dataset(args.folder)
+    if not samples:
+        sys.exit(f"No labelled images found in {args.folder}")
+
+    runners = config_runners()
+    if not runners:
+        sys.exit("No OCR engine available (install surya-ocr and/or paddleocr)")
+    configs = list(runners) if args.configs == 'all' else [c for c in args.configs.split(',') if c in runners]
+    resolutions = [int(r) for r in args.resolutions.split(',')]
+    jobs = [(config, resolution) for config in configs for resolution in resolutions]
+    print(f"{len(samples)} images, {len(jobs)} configurations")
+
+    if args.isolate:
+        context = multiprocessing.get_context('spawn')
+        results = []
+        for config, resolution in jobs:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(_run_config_isolated, ((config, resolution, args.folder),)))
+    else:
+        results = [run_config(config, resolution, samples) for config, resolution in jobs]
+
+    summaries = [summarize(r) for r in results]
+    mark_pareto(summaries)
+    print_table('Configurations', summaries,
+                ['accuracy', 'nameAccuracy', 'dobAccuracy', 'addressAccuracy', 'p50Ms', 'p95Ms', 'rssMB'])
+
+    replays = replay_paddle_policy(results)
+    if replays:
+        print_table('PaddleOCR retry thresholds (replayed from single-variant runs)', replays,
+                    ['accuracy', 'p50Ms', 'p95Ms'])
+
+    with open(args.output, 'w') as f:
+        json.dump({'summaries': summaries, 'paddlePolicy': replays, 'runs': results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
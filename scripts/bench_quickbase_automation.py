@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+QuickBase form automation benchmark against the local simulator
+Runs QuickBaseFormAutomation.submit_application end to end (real Chromium via
+Playwright) against quickbase_simulator.py under several network and failure
+profiles. Reports time-to-submit with a per-stage breakdown (launch, goto,
+fill, submit, redirect wait), peak browser RSS, and checks that the fields
+the simulator received match the application (a regression test for the
+fill steps).
+
+Usage:
+    python bench_quickbase_automation.py --runs 5 --output bench_qb.json
+    python bench_quickbase_automation.py --cases dc,nondc --compare before.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+from urllib.request import Request, urlopen
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from quickbase_simulator import DEFAULT_CONFIG, start_simulator  # noqa: E402
+
+# name -> (resident type, simulator overrides, expected outcome: 'success' or the failureReason)
+CASES = {
+    'dc': ('dc', {}, 'success'),
+    'nondc': ('nondc', {}, 'success'),
+    'dc_slow_network': ('dc', {'page_latency_ms': 1200, 'asset_latency_ms': 300,
+                               'submit_latency_ms': 1500, 'redirect_latency_ms': 500}, 'success'),
+    'dc_busy_page': ('dc', {'beacon_seconds': 8.0}, 'success'),
+    'dc_slow_reveal': ('dc', {'reveal_delay_ms': 2000}, 'success'),
+    'dc_validation_error': ('dc', {'failure_rate': 1.0, 'failure_mode': 'validation'}, 'validation_error'),
+    'dc_server_error': ('dc', {'failure_rate': 1.0, 'failure_mode': 'http500'}, 'http_error'),
+}
+
+# Error the simulator's injected validation failure shows on the form
+SIMULATED_VALIDATION_ERROR = 'Your record could not be saved'
+
+APPLICATION = {
+    'firstName': 'John',
+    'middleInitial': 'M',
+    'lastName': 'Doe',
+    'dateOfBirth': '1990-01-15',
+    'street': '123 Main St NW',
+    'aptSuite': 'Apt 4B',
+    'city': 'Washington',
+    'state': 'DC',
+    'zip': '20001',
+    'phoneNumber': '(202) 555-0123',
+    'email': 'john.doe@example.com',
+    'timePeriod': '90days',
+}
+
+# Simulator field -> expected value (callables get the application)
+EXPECTED_FIELDS = {
+    'common': {
+        '_fid_6': lambda a: a['firstName'],
+        '_fid_7': lambda a: a['middleInitial'][:1],
+        '_fid_8': lambda a: a['lastName'],
+        '_fid_11': lambda a: a['dateOfBirth'],
+        '_fid_12': lambda a: a['street'],
+        '_fid_13': lambda a: a['aptSuite'],
+        '_fid_16': lambda a: a['zip'],
+        '_fid_17': lambda a: a['phoneNumber'],
+        '_fid_18': lambda a: a['email'],
+        '_fid_117': lambda a: a['email'],
+        '_fid_72': lambda a: '1',
+        '_fid_59': lambda a: f"{a['firstName']} {a['lastName']}",
+        '_fid_131': lambda a: '',  # Reduced Fee must be left at its default
+    },
+    'dc': {
+        '_fid_76': lambda a: 'Initial',
+        '_fid_122': lambda a: 'Yes',
+        '_fid_124': lambda a: 'Self certification',
+        '_fid_176': lambda a: '1',
+        '_fid_14': lambda a: a['city'],
+        '_fid_15': lambda a: a['state'],
+    },
+    'nondc': {
+        '_fid_204': lambda a: '90 days ($50)',
+        '_fid_175': lambda a: 'United States of America',
+        '_fid_120': lambda a: 'Online',
+    },
+}
+
+FILE_FIELDS = {'dc': ['_fid_50', '_fid_121'], 'nondc': ['_fid_50']}
+
+STAGE_PATTERN = re.compile(
+    r'^checkin_stage_duration_seconds_(sum|count)\{stage="browser",name="([^"]+)",outcome="[^"]+"\} (\S+)$',
+    re.MULTILINE)
+REQUESTS_PATTERN = re.compile(r'^checkin_browser_requests_total\{outcome="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+def id_image_base64() -> str:
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (400, 640, 3), np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def simulator_call(base_url: str, path: str, payload: Dict = None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = Request(base_url + path, data=data, headers={'Content-Type': 'application/json'},
+                      method='POST' if data else 'GET')
+    with urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def descendant_rss_mb(root_pid: int) -> float:
+    """Total RSS of every process below root_pid (the browser and its renderers)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    total_pages = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total_pages += int(f.read().split()[1])
+        except (OSError, ValueError):
+            continue
+    return total_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class RssSampler(threading.Thread):
+    """Tracks peak RSS of this process's children while a run is in progress"""
+
+    def __init__(self, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0.0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, descendant_rss_mb(os.getpid()))
+
+
+def browser_stage_totals() -> Dict[str, List[float]]:
+    """name -> [sum seconds, count] for the browser stages recorded so far"""
+    from metrics import render_prometheus
+    totals = {}
+    for kind, name, value in STAGE_PATTERN.findall(render_prometheus()):
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0 if kind == 'sum' else 1] += float(value)
+    return totals
+
+
+def browser_request_counts() -> Dict[str, float]:
+    """outcome (allowed/blocked) -> requests seen by the automation's interception so far"""
+    from metrics import render_prometheus
+    return {outcome: float(value) for outcome, value in REQUESTS_PATTERN.findall(render_prometheus())}
+
+
+def check_fields(resident_type: str, fields: Dict[str, str], application: Dict) -> List[str]:
+    """Differences between what the simulator received and what was meant to be filled"""
+    mismatches = []
+    expected = {**EXPECTED_FIELDS['common'], **EXPECTED_FIELDS[resident_type]}
+    for fid, value in expected.items():
+        want = value(application)
+        if fields.get(fid, '') != want:
+            mismatches.append(f"{fid}: expected {want!r}, got {fields.get(fid, '')!r}")
+    for fid in FILE_FIELDS[resident_type]:
+        if not fields.get(fid):
+            mismatches.append(f"{fid}: no file uploaded")
+    return mismatches
+
+
+def outcome_problems(expected: str, result: Dict, posted: bool) -> List[str]:
+    """
+    Ways a run's result differs from the case's expected outcome
+
+    Every case submits the form, so the simulator must have received the
+    POST; a failure that happened before it (e.g. Chromium not launching)
+    never counts as the expected failure.
+    """
+    if not posted:
+        return [f"no submission reached the simulator: {result.get('error')}"]
+    if expected == 'success':
+        return [] if result.get('success') else [f"submission failed: {result.get('error')}"]
+    if result.get('success'):
+        return [f"expected {expected}, but the submission succeeded"]
+    problems = []
+    if result.get('failureReason') != expected:
+        problems.append(f"expected failureReason {expected!r}, got {result.get('failureReason')!r}: "
+                        f"{result.get('error')}")
+    if expected == 'validation_error' and not any(SIMULATED_VALIDATION_ERROR in message
+                                                  for message in result.get('errorMessages') or []):
+        problems.append(f"simulator error message not reported: {result.get('errorMessages')}")
+    if expected == 'http_error' and not (result.get('httpStatus') or 0) >= 500:
+        problems.append(f"expected httpStatus >= 500, got {result.get('httpStatus')!r}")
+    return problems
+
+
+def run_case(automation, base_url: str, name: str, runs: int) -> Dict:
+    resident_type, overrides, expected = CASES[name]
+    simulator_call(base_url, '/__config', {**DEFAULT_CONFIG, **overrides})
+    application = dict(APPLICATION, idImageBase64=id_image_base64())
+    if resident_type == 'nondc':
+        application.update({'city': 'Baltimore', 'state': 'MD', 'zip': '21201'})
+
+    latencies, peaks, mismatches, outcomes, problems = [], [], [], [], []
+    stages_before = browser_stage_totals()
+    requests_before = browser_request_counts()
+    for _ in range(runs):
+        submissions_before = len(simulator_call(base_url, '/__submissions'))
+        posts_before = simulator_call(base_url, '/__stats')['counts']['submissions']
+        sampler = RssSampler()
+        sampler.start()
+        start = time.perf_counter()
+        result = automation.submit_application(application, auto_submit=True, resident_type=resident_type)
+        latencies.append(time.perf_counter() - start)
+        sampler.stopped.set()
+        sampler.join()
+        peaks.append(sampler.peak)
+        outcomes.append(bool(result.get('success')))
+
+        posted = simulator_call(base_url, '/__stats')['counts']['submissions'] > posts_before
+        problems.extend(outcome_problems(expected, result, posted))
+        submissions = simulator_call(base_url, '/__submissions')
+        if len(submissions) > submissions_before:
+            mismatches.extend(check_fields(resident_type, submissions[-1]['fields'], application))
+
+    stages_after = browser_stage_totals()
+    requests_per_run = {outcome: round((count - requests_before.get(outcome, 0)) / runs, 1)
+                        for outcome, count in browser_request_counts().items()}
+    stages = {}
+    for stage, (total, count) in stages_after.items():
+        before_total, before_count = stages_before.get(stage, [0.0, 0])
+        if count > before_count:
+            stages[stage] = round((total - before_total) / (count - before_count) * 1000, 1)
+
+    summary = {
+        'runs': runs,
+        'expectSuccess': expected == 'success',
+        'expectedOutcome': expected,
+        'successRate': round(sum(outcomes) / runs, 3),
+        'asExpected': not problems,
+        'unexpected': sorted(set(problems)),
+        'p50Ms': round(float(np.percentile(latencies, 50)) * 1000, 1),
+        'p95Ms': round(float(np.percentile(latencies, 95)) * 1000, 1),
+        'stageMeanMs': stages,
+        'requestsPerRun': requests_per_run,
+        'peakBrowserRssMB': round(max(peaks), 1),
+        'fieldMismatches': sorted(set(mismatches)),
+    }
+    print(f"{name:<22} success {summary['successRate']:>6.1%}  p50 {summary['p50Ms']:>8.0f}ms  "
+          f"p95 {summary['p95Ms']:>8.0f}ms  rss {summary['peakBrowserRssMB']:>6.0f}MB  "
+          f"{'OK' if summary['asExpected'] and not summary['fieldMismatches'] else 'REGRESSION'}")
+    if stages:
+        print(' ' * 24 + '  '.join(f"{k} {v:.0f}ms" for k, v in stages.items()))
+    for problem in summary['unexpected'] + summary['fieldMismatches']:
+        print(' ' * 24 + problem)
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='submissions per case')
+    parser.add_argument('--cases', default='all', help=','.join(CASES) + ' or all')
+    parser.add_argument('--output', default='bench_quickbase_automation.json')
+    parser.add_argument('--compare', help='previous JSON result to diff against')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    simulator = start_simulator()
+    base_url = f'http://127.0.0.1:{simulator.server_address[1]}'
+    # Read by the automation at import time
+    os.environ['QUICKBASE_BASE_URL'] = base_url
+    from quickbase_browser_automation import QuickBaseFormAutomation
+    automation = QuickBaseFormAutomation(headless=True)
+
+    cases = list(CASES) if args.cases == 'all' else [c for c in args.cases.split(',') if c in CASES]
+    results = {name: run_case(automation, base_url, name, args.runs) for name in cases}
+    simulator.shutdown()
+
+    report = {
+        'meta': {'commit': git_commit(), 'timestamp': datetime.now().isoformat(), 'runs': args.runs},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nComparison {previous['meta']['commit']} -> {report['meta']['commit']}")
+        for name, now in results.items():
+            before = previous['results'].get(name)
+            if before:
+                print(f"{name:<22} p50 {before['p50Ms']:>8.0f} -> {now['p50Ms']:>8.0f}ms  "
+                      f"rss {before['peakBrowserRssMB']:>6.0f} -> {now['peakBrowserRssMB']:>6.0f}MB")
+
+    regressions = [n for n, r in results.items() if not r['asExpected'] or r['fieldMismatches']]
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the Flask API
+Starts the app with local stand-ins (see loadtest_app.py) in-process, under
+gunicorn or under uvicorn (ASGI serving mode), starts the QuickBase simulator, and drives kiosk check-in
+flows from concurrent virtual users. Reports throughput, tail latency and
+error rate per endpoint, and worker saturation: requests outstanding against
+the worker slots, plus per-endpoint http_requests_in_flight from /metrics.
+
+Flows (weights set with --mix):
+    barcode_new       parse-barcode -> validate-age -> submit-application -> complete-checkin
+    barcode_existing  parse-barcode -> complete-checkin (existing card holder)
+    photo_new         extract-id -> submit-application -> complete-checkin
+    camera_barcode    scan-barcode -> complete-checkin
+    admin             admin customer list
+
+Usage:
+    python loadtest.py --users 20 --duration 60
+    python loadtest.py --mode gunicorn --workers 2 --threads 1 --users 10 --ocr-latency-ms 3000
+    python loadtest.py --mode uvicorn --workers 2 --users 50 --db-latency-ms 100
+    python loadtest.py --mix barcode_new=5,barcode_existing=3,admin=1 --output loadtest.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.client import HTTPConnection
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'backend'))
+
+from aamva_corpus import generate_corpus  # noqa: E402
+from quickbase_simulator import start_simulator  # noqa: E402
+
+DEFAULT_MIX = 'barcode_new=4,barcode_existing=4,photo_new=1,camera_barcode=1,admin=0.5'
+
+LOCATIONS = ['3106 Mt Pleasant St NW', '1834 Columbia Rd NW', '2400 14th St NW']
+
+IN_FLIGHT_PATTERN = re.compile(r'^http_requests_in_flight\{endpoint="([^"]*)"\} (\S+)$', re.MULTILINE)
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def synthetic_id_photo(rng: random.Random, size=(1600, 1000)) -> str:
+    """A noisy JPEG about the size of a kiosk ID photo, as a data URI"""
+    noise = np.random.default_rng(rng.randint(0, 2**31)).integers(90, 200, (size[1] // 4, size[0] // 4, 3), np.uint8)
+    image = Image.fromarray(noise).resize(size, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def barcode_photo(payload: str, rng: random.Random) -> Optional[str]:
+    """A rendered PDF417 scene for /api/scan-barcode (needs zxing-cpp and OpenCV)"""
+    try:
+        from bench_barcode import render_scene, encode_upload
+    except ImportError:
+        return None
+    return encode_upload(render_scene(payload, rng))
+
+
+class Payloads:
+    """Pre-built request bodies so clients spend no time generating them"""
+
+    def __init__(self, seed: int, count: int = 200):
+        rng = random.Random(seed)
+        self.corpus = generate_corpus(count, seed)
+        self.photos = [synthetic_id_photo(rng) for _ in range(4)]
+        self.barcode_photos = [p for p in (barcode_photo(text, rng) for text, _ in self.corpus[:4]) if p]
+
+    def identity(self, rng: random.Random) -> Tuple[str, Dict]:
+        return rng.choice(self.corpus)
+
+    def application(self, rng: random.Random, parsed: Dict) -> Dict:
+        data = parsed.get('data', {}) if parsed else {}
+        first = data.get('firstName') or 'John'
+        last = data.get('lastName') or 'Doe'
+        resident_type = 'dc' if parsed and parsed.get('isDC') else 'nondc'
+        return {
+            'firstName': first,
+            'middleInitial': data.get('middleInitial', ''),
+            'lastName': last,
+            'suffix': '',
+            'dateOfBirth': data.get('dateOfBirth') or '1985-02-12',
+            'street': data.get('street') or '123 Main St NW',
+            'aptSuite': data.get('aptSuite', ''),
+            'city': data.get('city') or 'Washington',
+            'state': data.get('state') or 'DC',
+            'zip': data.get('zip') or '20001',
+            'phoneNumber': f"(202) 555-{rng.randint(0, 9999):04d}",
+            'email': f"{first}.{last}.{rng.randint(0, 10**6)}@example.com".lower().replace(' ', ''),
+            'idImageBase64': rng.choice(self.photos),
+            'idImageBackBase64': None,
+            'location': rng.choice(LOCATIONS),
+            'residentType': resident_type,
+            'timePeriod': '30days' if resident_type == 'nondc' else None,
+        }
+
+    def checkin(self, rng: random.Random, customer_id=None, application: Dict = None) -> Dict:
+        data = {
+            'registrationId': f"REG{rng.randint(100000, 999999)}",
+            'expirationDate': '2027-12-31',
+            'barcode': str(rng.randint(10**8, 10**9 - 1)),
+            'location': rng.choice(LOCATIONS),
+        }
+        if customer_id:
+            data['customerId'] = customer_id
+        else:
+            application = application or {}
+            data.update({
+                'firstName': application.get('firstName', 'Jane'),
+                'lastName': application.get('lastName', 'Roe'),
+                'email': application.get('email', f"jane.roe.{rng.randint(0, 10**6)}@example.com"),
+                'phoneNumber': application.get('phoneNumber', '(202) 555-0100'),
+            })
+        return data
+
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Per-endpoint latency samples and status counts from every client"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.flows = defaultdict(lambda: {'completed': 0, 'failed': 0})
+        self.outstanding = 0
+
+    def begin(self):
+        with self.lock:
+            self.outstanding += 1
+
+    def record(self, endpoint: str, latency: float, status: int):
+        with self.lock:
+            self.outstanding -= 1
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+
+    def flow(self, name: str, ok: bool):
+        with self.lock:
+            self.flows[name]['completed' if ok else 'failed'] += 1
+
+
+class VirtualUser:
+    """One kiosk: runs flows back to back with think time between steps"""
+
+    def __init__(self, host: str, port: int, payloads: Payloads, recorder: Recorder,
+                 flows: List[Tuple[str, float]], think: float, seed: int, timeout: float):
+        self.host, self.port = host, port
+        self.payloads = payloads
+        self.recorder = recorder
+        self.flow_names = [name for name, _ in flows]
+        self.flow_weights = [weight for _, weight in flows]
+        self.think = think
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+
+    def call(self, method: str, path: str, body: Dict = None, idempotent: bool = False) -> Tuple[int, Dict]:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        # The client's own timeout is its deadline; admission control sheds work that can't meet it
+        headers['X-Request-Timeout-Ms'] = str(int(self.timeout * 1000))
+        if idempotent:
+            # Like the kiosk, so the idempotency store is part of the measured path
+            headers['Idempotency-Key'] = uuid.uuid4().hex
+        self.recorder.begin()
+        start = time.perf_counter()
+        status, result = 0, {}
+        try:
+            # A fresh connection per request: the development server closes them anyway
+            connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            status = response.status
+            raw = response.read()
+            connection.close()
+            result = json.loads(raw) if raw else {}
+        except (OSError, ValueError):
+            pass
+        self.recorder.record(f"{method} {path.split('?')[0]}", time.perf_counter() - start, status)
+        return status, result
+
+    def pause(self):
+        if self.think:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think)
+
+    def run(self, deadline: float):
+        while time.time() < deadline:
+            name = self.rng.choices(self.flow_names, self.flow_weights)[0]
+            ok = getattr(self, f'flow_{name}')()
+            self.recorder.flow(name, ok)
+            self.pause()
+
+    def _submit_and_checkin(self, parsed: Dict) -> bool:
+        application = self.payloads.application(self.rng, parsed)
+        self.pause()
+        status, submitted = self.call('POST', '/api/submit-application', application, idempotent=True)
+        if status != 200:
+            return False
+        self.pause()
+        status, _ = self.call('POST', '/api/complete-checkin',
+                              self.payloads.checkin(self.rng, submitted.get('customerId'), application), idempotent=True)
+        return status == 200
+
+    def flow_barcode_new(self) -> bool:
+        text, _ = self.payloads.identity(self.rng)
+        status, parsed = self.call('POST', '/api/parse-barcode', {'barcodeText': text})
+        if status != 200:
+            return False
+        self.call('POST', '/api/validate-age', {'dateOfBirth': parsed['data'].get('dateOfBirth', '')})
+        return self._submit_and_checkin(parsed)
+
+    def flow_barcode_existing(self) -> bool:
+        text, _ = self.payloads.identity(self.rng)
+        status, parsed = self.call('POST', '/api/parse-barcode', {'barcodeText': text})
+        if status != 200:
+            return False
+        self.pause()
+        application = self.payloads.application(self.rng, parsed)
+        status, _ = self.call('POST', '/api/complete-checkin', self.payloads.checkin(self.rng, None, application),
+                              idempotent=True)
+        return status == 200
+
+    def flow_photo_new(self) -> bool:
+        status, parsed = self.call('POST', '/api/extract-id', {'image': self.rng.choice(self.payloads.photos)})
+        if status != 200:
+            return False
+        return self._submit_and_checkin(parsed)
+
+    def flow_camera_barcode(self) -> bool:
+        if not self.payloads.barcode_photos:
+            return self.flow_barcode_existing()
+        status, parsed = self.call('POST', '/api/scan-barcode', {'image': self.rng.choice(self.payloads.barcode_photos)})
+        if status != 200:
+            return False
+        self.pause()
+        application = self.payloads.application(self.rng, parsed)
+        status, _ = self.call('POST', '/api/complete-checkin', self.payloads.checkin(self.rng, None, application),
+                              idempotent=True)
+        return status == 200
+
+    def flow_admin(self) -> bool:
+        status, _ = self.call('GET', '/api/admin/customers?limit=50')
+        return status == 200
+
+
+class SaturationSampler(threading.Thread):
+    """
+    Samples requests in flight: client-side (sent, not yet answered) and
+    server-side per endpoint from /metrics
+
+    Under sync gunicorn workers a scrape is only answered by an idle worker,
+    so the server-side numbers read low; the client-side count, which also
+    includes requests queued in the listen backlog, is what saturation is
+    judged on.
+    """
+
+    def __init__(self, host: str, port: int, interval: float, recorder: Recorder):
+        super().__init__(daemon=True, name='metrics-scraper')
+        self.host, self.port, self.interval = host, port, interval
+        self.recorder = recorder
+        self.samples: List[Dict[str, float]] = []
+        self.outstanding: List[int] = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.outstanding.append(self.recorder.outstanding)
+            try:
+                connection = HTTPConnection(self.host, self.port, timeout=5)
+                connection.request('GET', '/metrics')
+                text = connection.getresponse().read().decode()
+                connection.close()
+            except OSError:
+                continue
+            sample = {endpoint: float(value) for endpoint, value in IN_FLIGHT_PATTERN.findall(text)
+                      if endpoint != '/metrics'}
+            self.samples.append(sample)
+
+    def summary(self, capacity: Optional[int]) -> Dict:
+        if not self.samples or not self.outstanding:
+            return {}
+        endpoints = sorted({e for s in self.samples for e in s})
+        totals = [sum(s.values()) for s in self.samples]
+        result = {
+            'samples': len(self.samples),
+            'meanOutstanding': round(sum(self.outstanding) / len(self.outstanding), 2),
+            'maxOutstanding': max(self.outstanding),
+            'meanInFlight': round(sum(totals) / len(totals), 2),
+            'maxInFlight': max(totals),
+            'perEndpoint': {e: {'mean': round(sum(s.get(e, 0) for s in self.samples) / len(self.samples), 2),
+                                'max': max(s.get(e, 0) for s in self.samples)} for e in endpoints},
+        }
+        if capacity:
+            result['capacity'] = capacity
+            result['saturatedFraction'] = round(
+                sum(o >= capacity for o in self.outstanding) / len(self.outstanding), 3)
+        return result
+
+
+# ---------------------------------------------------------------------------
+# Servers
+# ---------------------------------------------------------------------------
+
+def wait_until_healthy(host: str, port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App did not become healthy on {host}:{port}")
+
+
+def start_inprocess(host: str, port: int):
+    """Serve loadtest_app in this process on the threaded development server"""
+    from werkzeug.serving import make_server
+    import loadtest_app
+    server = make_server(host, port, loadtest_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+    return server.shutdown
+
+
+def start_gunicorn(host: str, port: int, workers: int, threads: int, env: Dict[str, str]):
+    """Serve loadtest_app under gunicorn with the production worker settings"""
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'{host}:{port}', '--workers', str(workers),
+               '--threads', str(threads), '--timeout', '120', '--chdir', SCRIPTS_DIR, 'loadtest_app:app']
+    process = subprocess.Popen(command, env={**os.environ, **env})
+    return lambda: (process.terminate(), process.wait(10))
+
+
+def start_uvicorn(host: str, port: int, workers: int, env: Dict[str, str]):
+    """Serve loadtest_app in the ASGI serving mode (asgi_app.py) under uvicorn"""
+    command = [sys.executable, '-m', 'uvicorn', '--host', host, '--port', str(port), '--workers', str(workers),
+               '--log-level', 'warning', '--app-dir', SCRIPTS_DIR, '--factory', 'loadtest_app:create_asgi']
+    process = subprocess.Popen(command, env={**os.environ, **env})
+    return lambda: (process.terminate(), process.wait(10))
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def build_report(recorder: Recorder, sampler: SaturationSampler, elapsed: float, args, capacity) -> Dict:
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[endpoint]
+        ms = [l * 1000 for l in latencies]
+        errors = sum(count for status, count in statuses.items() if status == 0 or status >= 500)
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'throughputRps': round(len(latencies) / elapsed, 2),
+            'errorRate': round(errors / len(latencies), 4),
+            'p50Ms': round(percentile(ms, 50), 1),
+            'p95Ms': round(percentile(ms, 95), 1),
+            'p99Ms': round(percentile(ms, 99), 1),
+            'maxMs': round(max(ms), 1),
+            'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        }
+    return {
+        'config': {k: v for k, v in vars(args).items()},
+        'durationSeconds': round(elapsed, 1),
+        'totalRps': round(sum(len(l) for l in recorder.latencies.values()) / elapsed, 2),
+        'endpoints': endpoints,
+        'flows': dict(recorder.flows),
+        'saturation': sampler.summary(capacity),
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<36}{'req':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for endpoint, s in report['endpoints'].items():
+        print(f"{endpoint:<36}{s['requests']:>7}{s['throughputRps']:>8}{s['errorRate'] * 100:>6.1f}%"
+              f"{s['p50Ms']:>8.0f}ms{s['p95Ms']:>7.0f}ms{s['p99Ms']:>7.0f}ms{s['maxMs']:>7.0f}ms")
+    print(f"\nTotal {report['totalRps']} req/s over {report['durationSeconds']}s")
+    for name, counts in report['flows'].items():
+        print(f"  flow {name:<18} completed {counts['completed']:>6}  failed {counts['failed']:>5}")
+    saturation = report['saturation']
+    if saturation:
+        line = (f"Outstanding requests: mean {saturation['meanOutstanding']}, max {saturation['maxOutstanding']}"
+                f" (server-side in flight: mean {saturation['meanInFlight']}, max {saturation['maxInFlight']:.0f})")
+        if 'capacity' in saturation:
+            line += (f"\n{saturation['capacity']} worker slots "
+                     f"(saturated {saturation['saturatedFraction']:.0%} of samples)")
+        print(line)
+        for endpoint, s in saturation['perEndpoint'].items():
+            print(f"  {endpoint:<34} mean {s['mean']:>6}  max {s['max']:>4.0f}")
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    flows = []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if not hasattr(VirtualUser, f'flow_{name.strip()}'):
+            raise SystemExit(f"Unknown flow '{name}'")
+        flows.append((name.strip(), float(weight or 1)))
+    return flows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn', 'uvicorn'], default='inprocess')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn/uvicorn workers')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual kiosks')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--think-ms', type=float, default=500, help='mean pause between flow steps')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='flow=weight,...')
+    parser.add_argument('--no-pools', action='store_true',
+                        help='run OCR, barcode scans and submissions on the request thread (WORKER_POOLS=0)')
+    parser.add_argument('--db-latency-ms', type=float, default=20)
+    parser.add_argument('--ocr-latency-ms', type=float, default=1500)
+    parser.add_argument('--real-ocr', action='store_true', help='use the installed OCR engines')
+    parser.add_argument('--quickbase', choices=['http', 'browser', 'engine'], default='http',
+                        help='submit via plain HTTP, the Playwright automation or the concurrent engine')
+    parser.add_argument('--quickbase-url', help='use an already running simulator')
+    parser.add_argument('--timeout', type=float, default=180,
+                        help='client timeout in seconds, also sent as the request deadline')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='loadtest.json')
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    flows = parse_mix(args.mix)
+
+    simulator = None
+    quickbase_url = args.quickbase_url
+    if not quickbase_url:
+        simulator = start_simulator(host, 0)
+        quickbase_url = f'http://{host}:{simulator.server_address[1]}'
+
+    env = {
+        'QUICKBASE_BASE_URL': quickbase_url,
+        'LOADTEST_QUICKBASE': args.quickbase,
+        'LOADTEST_DB_LATENCY_MS': str(args.db_latency_ms),
+        'LOADTEST_STUB_OCR': '0' if args.real_ocr else '1',
+        'LOADTEST_OCR_LATENCY_MS': str(args.ocr_latency_ms),
+        'WORKER_POOLS': '0' if args.no_pools else '1',
+        # Shared by every gunicorn worker so customer IDs resolve across workers
+        'LOADTEST_DB': os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'supabase.sqlite3'),
+    }
+
+    print("Building payloads...")
+    payloads = Payloads(args.seed)
+
+    if args.mode == 'gunicorn':
+        stop_server = start_gunicorn(host, args.port, args.workers, args.threads, env)
+        capacity = args.workers * args.threads
+    elif args.mode == 'uvicorn':
+        stop_server = start_uvicorn(host, args.port, args.workers, env)
+        # Async routes have no fixed slot count; only forwarded Flask routes are bounded
+        capacity = None
+    else:
+        os.environ.update(env)
+        import logging
+        logging.disable(logging.WARNING)
+        stop_server = start_inprocess(host, args.port)
+        capacity = None
+
+    try:
+        wait_until_healthy(host, args.port)
+        print(f"Running {args.users} users for {args.duration:.0f}s against {args.mode} app "
+              f"(QuickBase {args.quickbase} -> {quickbase_url})")
+
+        recorder = Recorder()
+        sampler = SaturationSampler(host, args.port, 0.25, recorder)
+        sampler.start()
+        deadline = time.time() + args.duration
+        users = [VirtualUser(host, args.port, payloads, recorder, flows, args.think_ms / 1000,
+                             args.seed + i, args.timeout) for i in range(args.users)]
+        threads = [threading.Thread(target=u.run, args=(deadline,), daemon=True) for u in users]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+        sampler.stopped.set()
+
+        report = build_report(recorder, sampler, elapsed, args, capacity)
+        print_report(report)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    finally:
+        stop_server()
+        if simulator:
+            simulator.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+The Flask app with local stand-ins installed, as a WSGI entry point (app)
+or wrapped in the ASGI serving mode (create_asgi factory). Serve it in-process (loadtest.py
+does this), under gunicorn or under uvicorn:
+
+    QUICKBASE_BASE_URL=http://127.0.0.1:8765 \\
+        gunicorn -w 2 --chdir scripts loadtest_app:app
+    QUICKBASE_BASE_URL=http://127.0.0.1:8765 \\
+        uvicorn --workers 2 --app-dir scripts --factory loadtest_app:create_asgi
+
+Environment:
+    LOADTEST_DB               SQLite file for the fake Supabase (default: in-memory per worker)
+    LOADTEST_DB_LATENCY_MS    Added to every fake Supabase call (default: 20)
+    LOADTEST_QUICKBASE        'http' (post the form without a browser), 'browser'
+                              (real Playwright automation against QUICKBASE_BASE_URL) or
+                              'engine' (the concurrent multi-context engine, same target)
+    QUICKBASE_BASE_URL        Where the QuickBase simulator runs
+    LOADTEST_STUB_OCR         '1' to replace the OCR engines with a canned-text stub (default)
+    LOADTEST_OCR_LATENCY_MS   Time the OCR stub spends per image (default: 1500)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import app as backend_app  # noqa: E402
+from worker_pools import set_pool_initializer  # noqa: E402
+from loadtest_fakes import (  # noqa: E402
+    HttpFormAutomation, create_fake_async_supabase_manager, create_fake_supabase_manager, install_fake_ocr
+)
+
+QUICKBASE_BASE_URL = os.environ.get('QUICKBASE_BASE_URL', 'http://127.0.0.1:8765')
+
+
+def install_fakes():
+    """Swap the app's lazily created service singletons for local stand-ins"""
+    backend_app._supabase_manager = create_fake_supabase_manager(
+        os.environ.get('LOADTEST_DB', ':memory:'),
+        float(os.environ.get('LOADTEST_DB_LATENCY_MS', '20')) / 1000
+    )
+
+    mode = os.environ.get('LOADTEST_QUICKBASE', 'http')
+    # The automation reads QUICKBASE_BASE_URL at import time
+    if mode == 'browser':
+        backend_app._qb_automation_instance = backend_app.get_qb_automation_class()(headless=True)
+    elif mode == 'engine':
+        from quickbase_engine import QuickBaseSubmissionEngine
+        backend_app._qb_automation_instance = QuickBaseSubmissionEngine(headless=True)
+    else:
+        backend_app._qb_automation_instance = HttpFormAutomation(QUICKBASE_BASE_URL)
+
+    if os.environ.get('LOADTEST_STUB_OCR', '1') == '1':
+        ocr_latency = float(os.environ.get('LOADTEST_OCR_LATENCY_MS', '1500')) / 1000
+        install_fake_ocr(ocr_latency)
+        # OCR runs in the vision pool's processes, which need the stub too
+        set_pool_initializer('vision', install_fake_ocr, ocr_latency)
+
+
+def create_asgi():
+    """The ASGI app, with its async Supabase manager on the same fake database"""
+    import asgi_app
+    asgi_app._async_supabase_manager = create_fake_async_supabase_manager(backend_app._supabase_manager)
+    return asgi_app.app
+
+
+install_fakes()
+app = backend_app.app
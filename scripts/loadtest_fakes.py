@@ -0,0 +1,496 @@
+"""
+Local stand-ins for the external services the API depends on
+Used by loadtest_app.py / loadtest.py so the Flask app can be load-tested
+without Supabase, QuickBase or OCR models:
+
+- FakeSupabaseClient: SQLite-backed replacement for the supabase-py client,
+  plugged into the real SupabaseManager so its query code still runs
+  (AsyncFakeSupabaseClient does the same for AsyncSupabaseManager)
+- HttpFormAutomation: submits the QuickBase form to quickbase_simulator.py
+  over plain HTTP (no browser)
+- fake_ocr_engine: returns canned ID text after a configurable delay
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Supabase
+# ---------------------------------------------------------------------------
+
+class FakeResponse:
+    """Mimics the .data attribute of a postgrest / storage response"""
+
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+# One PostgREST filter value: double-quoted (backslash escapes) or bare
+_VALUE = r'"(?:[^"\\]|\\.)*"|[^,()]*'
+
+
+def _unquote(value: str) -> str:
+    return re.sub(r'\\(.)', r'\1', value[1:-1]) if value.startswith('"') else value
+
+
+class FakeQuery:
+    """
+    The subset of the postgrest query builder SupabaseManager uses
+
+    Rows are stored as JSON documents; filters and ordering go through
+    json_extract so they run in SQLite rather than in Python.
+    """
+
+    def __init__(self, client: 'FakeSupabaseClient', table: str):
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._columns = '*'
+        self._payload = None
+        self._on_conflict = None
+        self._where: List[str] = []
+        self._params: List = []
+        self._order: List[str] = []
+        self._limit = None
+        self._offset = 0
+        self._single = False
+        self._count = None
+
+    # Operations
+    def select(self, columns: str = '*', count: Optional[str] = None):
+        self._op, self._columns, self._count = 'select', columns, count
+        return self
+
+    def insert(self, data):
+        self._op, self._payload = 'insert', data
+        return self
+
+    def upsert(self, data, on_conflict: str = 'id', **kwargs):
+        self._op, self._payload, self._on_conflict = 'upsert', data, on_conflict
+        return self
+
+    def update(self, data: Dict):
+        self._op, self._payload = 'update', data
+        return self
+
+    def delete(self):
+        self._op = 'delete'
+        return self
+
+    # Filters
+    def _filter(self, column: str, operator: str, value):
+        if column == 'id':
+            self._where.append(f'id {operator} ?')
+        else:
+            self._where.append(f"json_extract(data, '$.{column}') {operator} ?")
+        self._params.append(value)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, '=', value)
+
+    def neq(self, column, value):
+        return self._filter(column, '!=', value)
+
+    def gt(self, column, value):
+        return self._filter(column, '>', value)
+
+    def gte(self, column, value):
+        return self._filter(column, '>=', value)
+
+    def lt(self, column, value):
+        return self._filter(column, '<', value)
+
+    def lte(self, column, value):
+        return self._filter(column, '<=', value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self._where.append('0')
+            return self
+        target = 'id' if column == 'id' else f"json_extract(data, '$.{column}')"
+        self._where.append(f"{target} IN ({','.join('?' * len(values))})")
+        self._params.extend(values)
+        return self
+
+    def or_(self, filters: str):
+        """PostgREST or=(...) with eq and in branches: 'col.eq."quoted, value",col.in.(1,"b")'"""
+        clauses = []
+        for column, operator, operand in re.findall(rf'(\w+)\.(eq|in)\.(\((?:(?:{_VALUE}),?)*\)|{_VALUE})', filters):
+            target = 'id' if column == 'id' else f"json_extract(data, '$.{column}')"
+            values = re.findall(_VALUE, operand[1:-1]) if operator == 'in' else [operand]
+            values = [_unquote(v) for v in values if v]
+            clauses.append(f"{target} IN ({','.join('?' * len(values))})" if values else '0')
+            self._params.extend(values)
+        self._where.append('(' + (' OR '.join(clauses) or '0') + ')')
+        return self
+
+    def is_(self, column, value):
+        target = 'id' if column == 'id' else f"json_extract(data, '$.{column}')"
+        self._where.append(f"{target} IS {'NULL' if value in (None, 'null') else 'NOT NULL'}")
+        return self
+
+    # Modifiers
+    def order(self, column: str, desc: bool = False):
+        target = 'id' if column == 'id' else f"json_extract(data, '$.{column}')"
+        self._order.append(f"{target} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self.limit(1)
+
+    def execute(self) -> FakeResponse:
+        self._client.simulate_latency()
+        return self._run()
+
+    def _run(self) -> FakeResponse:
+        with self._client.lock:
+            data = getattr(self, f'_execute_{self._op}')()
+        if self._single:
+            return FakeResponse(data[0] if data else None)
+        return FakeResponse(data, len(data) if self._count else None)
+
+    def _where_sql(self) -> str:
+        clauses = ['tbl = ?'] + self._where
+        return ' WHERE ' + ' AND '.join(clauses)
+
+    def _select_rows(self) -> List[Dict]:
+        sql = 'SELECT id, data FROM rows' + self._where_sql()
+        if self._order:
+            sql += ' ORDER BY ' + ', '.join(self._order)
+        if self._limit is not None:
+            sql += f' LIMIT {int(self._limit)} OFFSET {int(self._offset)}'
+        rows = self._client.db.execute(sql, [self._table] + self._params).fetchall()
+        return [dict(json.loads(data), id=row_id) for row_id, data in rows]
+
+    def _project(self, rows: List[Dict]) -> List[Dict]:
+        if self._columns.strip() == '*':
+            return rows
+        columns = [c.strip() for c in self._columns.split(',')]
+        return [{c: row.get(c) for c in columns} for row in rows]
+
+    def _execute_select(self) -> List[Dict]:
+        return self._project(self._select_rows())
+
+    def _insert_row(self, row: Dict) -> Dict:
+        row = dict(row)
+        row.setdefault('created_at', datetime.now().isoformat())
+        cursor = self._client.db.execute(
+            'INSERT INTO rows (tbl, data) VALUES (?, ?)', (self._table, json.dumps(row)))
+        return dict(row, id=cursor.lastrowid)
+
+    def _execute_insert(self) -> List[Dict]:
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        inserted = [self._insert_row(row) for row in rows]
+        self._client.db.commit()
+        return inserted
+
+    def _execute_upsert(self) -> List[Dict]:
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        keys = [k.strip() for k in (self._on_conflict or 'id').split(',')]
+        result = []
+        for row in rows:
+            match = FakeQuery(self._client, self._table)
+            for key in keys:
+                match.eq(key, row.get(key))
+            existing = match._select_rows()
+            if existing:
+                merged = {k: v for k, v in {**existing[0], **row}.items() if k != 'id'}
+                self._client.db.execute('UPDATE rows SET data = ? WHERE id = ?',
+                                        (json.dumps(merged), existing[0]['id']))
+                result.append(dict(merged, id=existing[0]['id']))
+            else:
+                result.append(self._insert_row(row))
+        self._client.db.commit()
+        return result
+
+    def _execute_update(self) -> List[Dict]:
+        updated = []
+        for row in self._select_rows():
+            merged = {k: v for k, v in {**row, **self._payload}.items() if k != 'id'}
+            self._client.db.execute('UPDATE rows SET data = ? WHERE id = ?', (json.dumps(merged), row['id']))
+            updated.append(dict(merged, id=row['id']))
+        self._client.db.commit()
+        return updated
+
+    def _execute_delete(self) -> List[Dict]:
+        rows = self._select_rows()
+        self._client.db.executemany('DELETE FROM rows WHERE id = ?', [(r['id'],) for r in rows])
+        self._client.db.commit()
+        return rows
+
+
+class FakeBucket:
+    """Storage bucket that records object sizes (contents are discarded)"""
+
+    def __init__(self, client: 'FakeSupabaseClient', bucket: str):
+        self._client = client
+        self._bucket = bucket
+
+    def upload(self, path: str, file, file_options: Dict = None) -> FakeResponse:
+        self._client.simulate_latency()
+        size = len(file) if isinstance(file, (bytes, bytearray)) else os.path.getsize(file)
+        with self._client.lock:
+            try:
+                self._client.db.execute('INSERT INTO objects (bucket, path, size) VALUES (?, ?, ?)',
+                                        (self._bucket, path, size))
+                self._client.db.commit()
+            except sqlite3.IntegrityError:
+                raise Exception(f"The resource already exists: {self._bucket}/{path}")
+        return FakeResponse({'path': path, 'fullPath': f'{self._bucket}/{path}'})
+
+    def get_public_url(self, path: str) -> str:
+        return f'{self._client.url}/storage/v1/object/public/{self._bucket}/{path}'
+
+
+class FakeStorage:
+    def __init__(self, client: 'FakeSupabaseClient'):
+        self._client = client
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self._client, bucket)
+
+
+class FakeSupabaseClient:
+    """
+    SQLite-backed stand-in for supabase.Client
+
+    Args:
+        path: SQLite database file (':memory:' for a throwaway database)
+        latency: Seconds added to every call, to model the network round trip
+    """
+
+    url = 'http://supabase.local'
+
+    def __init__(self, path: str = ':memory:', latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT, data TEXT)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS rows_tbl ON rows (tbl)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS objects (bucket TEXT, path TEXT, size INTEGER, '
+                        'PRIMARY KEY (bucket, path))')
+        self.db.commit()
+        self.storage = FakeStorage(self)
+
+    def simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+
+class AsyncFakeQuery(FakeQuery):
+    """FakeQuery whose execute() is awaited, like supabase.AsyncClient queries"""
+
+    async def execute(self) -> FakeResponse:
+        if self._client.latency:
+            await asyncio.sleep(self._client.latency)
+        return self._run()
+
+
+class AsyncFakeSupabaseClient:
+    """
+    Stand-in for supabase.AsyncClient sharing a FakeSupabaseClient's database
+
+    Args:
+        sync_client: Client whose SQLite database, lock and latency are reused
+    """
+
+    def __init__(self, sync_client: FakeSupabaseClient):
+        self.url = sync_client.url
+        self.latency = sync_client.latency
+        self.lock = sync_client.lock
+        self.db = sync_client.db
+
+    def table(self, name: str) -> AsyncFakeQuery:
+        return AsyncFakeQuery(self, name)
+
+
+def create_fake_supabase_manager(path: str = ':memory:', latency: float = 0.0):
+    """A real SupabaseManager whose client is a FakeSupabaseClient"""
+    from supabase_client import SupabaseManager
+    manager = SupabaseManager()
+    manager.client = FakeSupabaseClient(path, latency)
+    return manager
+
+
+def create_fake_async_supabase_manager(sync_manager):
+    """A real AsyncSupabaseManager reading and writing the same fake database as sync_manager"""
+    from supabase_client import AsyncSupabaseManager
+    return AsyncSupabaseManager(client=AsyncFakeSupabaseClient(sync_manager.client))
+
+
+# ---------------------------------------------------------------------------
+# QuickBase
+# ---------------------------------------------------------------------------
+
+# Same labels the browser automation selects for Non-DC time periods
+TIME_PERIOD_MAP = {
+    '3days': '3 days ($10)',
+    '30days': '30 days ($20)',
+    '90days': '90 days ($50)',
+    '180days': '180 days ($75)',
+    '365days': '365 days ($100)'
+}
+
+
+def _multipart(fields: Dict[str, str], files: Dict[str, bytes]):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, content in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="id.jpg"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class HttpFormAutomation:
+    """
+    Drop-in for QuickBaseFormAutomation that posts the form without a browser
+
+    Fills the same _fid_* fields the Playwright automation fills and follows
+    the simulator's redirect, returning the same result shape.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def submit_application(self, application_data: Dict, auto_submit: bool = False, resident_type: str = 'dc',
+                           submission_id: Optional[str] = None) -> Dict:
+        import base64
+        pageid = '23' if resident_type == 'dc' else '39'
+        form_url = f'{self.base_url}/db/bscn22va8?a=dbpage&pageid={pageid}'
+        try:
+            with urlopen(form_url, timeout=self.timeout) as response:
+                response.read()
+
+            image = application_data['idImageBase64']
+            image = base64.b64decode(image.split(',')[1] if ',' in image else image)
+            signature_name = f"{application_data['firstName']} {application_data['lastName']}"
+            fields = {
+                '_fid_6': application_data['firstName'],
+                '_fid_7': (application_data.get('middleInitial') or '')[:1],
+                '_fid_8': application_data['lastName'],
+                '_fid_35': application_data.get('suffix') or '',
+                '_fid_11': application_data['dateOfBirth'],
+                '_fid_12': application_data['street'],
+                '_fid_13': application_data.get('aptSuite') or '',
+                '_fid_14': application_data.get('city', 'Washington' if resident_type == 'dc' else ''),
+                '_fid_15': application_data.get('state', 'DC' if resident_type == 'dc' else ''),
+                '_fid_16': application_data['zip'],
+                '_fid_17': application_data.get('phoneNumber') or '',
+                '_fid_18': application_data['email'],
+                '_fid_117': application_data['email'],
+                '_fid_72': '1',
+                '_fid_59': signature_name,
+                '_fid_60': datetime.now().strftime('%Y-%m-%d'),
+            }
+            files = {'_fid_50': image}
+            if resident_type == 'dc':
+                fields.update({'_fid_76': 'Initial', '_fid_122': 'Yes', '_fid_124': 'Self certification',
+                               '_fid_176': '1'})
+                files['_fid_121'] = image
+            else:
+                fields.update({
+                    '_fid_204': TIME_PERIOD_MAP.get(application_data.get('timePeriod'), '30 days ($20)'),
+                    '_fid_175': 'United States of America',
+                    '_fid_120': 'Online',
+                })
+
+            if not auto_submit:
+                return {'success': True, 'message': 'Form filled successfully. Ready for manual review.',
+                        'formUrl': form_url, 'autoSubmit': False}
+
+            body, content_type = _multipart(fields, files)
+            request = Request(f'{self.base_url}/db/bscn22va8?act=API_AddRecord&pageid={pageid}',
+                              data=body, headers={'Content-Type': content_type}, method='POST')
+            with urlopen(request, timeout=self.timeout) as response:
+                current_url = response.geturl()
+                response.read()
+
+            query = {key.lower(): value for key, value in parse_qsl(urlsplit(current_url).query)}
+            if query.get('pageid') in ('18', '40'):
+                return {
+                    'success': True,
+                    'message': 'Application submitted successfully',
+                    'redirectUrl': current_url,
+                    'submittedData': {
+                        'name': signature_name,
+                        'email': application_data['email'],
+                        'dob': application_data['dateOfBirth']
+                    }
+                }
+            return {
+                'success': False,
+                'error': 'Form submission failed - did not redirect to success page',
+                'currentUrl': current_url,
+                'errorMessages': ['Unknown error - form did not submit']
+            }
+        except Exception as e:
+            logger.error(f"Simulated form submission failed: {e}")
+            return {'success': False, 'error': f'Browser automation failed: {str(e)}'}
+
+
+# ---------------------------------------------------------------------------
+# OCR
+# ---------------------------------------------------------------------------
+
+FAKE_OCR_IDENTITIES = [
+    ('SMITH', 'JOHN', '02/12/1985', '123 MAIN ST NW', '20001'),
+    ('GARCIA', 'MARIA', '07/04/1979', '1600 PENNSYLVANIA AVE NW', '20500'),
+    ('NGUYEN', 'WEI', '11/30/1992', '3106 MT PLEASANT ST NW', '20010'),
+    ('OKAFOR', 'KWAME', '03/15/1968', '2400 14TH ST NW', '20009'),
+]
+
+
+def make_fake_ocr_engine(latency: float = 0.0):
+    """OCR engine stub: sleeps for latency seconds and returns DC license text"""
+    def fake_ocr_engine(image):
+        if latency:
+            time.sleep(latency * random.uniform(0.8, 1.2))
+        last, first, dob, street, zip_code = random.choice(FAKE_OCR_IDENTITIES)
+        text = (f"DISTRICT OF COLUMBIA\nDRIVER LICENSE\nLN {last}\nFN {first}\nDOB {dob}\n"
+                f"{street}\nWASHINGTON, DC {zip_code}")
+        return text, 0.93
+    return fake_ocr_engine
+
+
+def install_fake_ocr(latency: float = 0.0):
+    """Replace the OCR engines with the stub (decode and field extraction stay real)"""
+    import ocr_service
+    ocr_service.SURYA_AVAILABLE = False
+    ocr_service.PADDLE_AVAILABLE = True
+    ocr_service.OCR_ENGINES['paddle'] = make_fake_ocr_engine(latency)
+    ocr_service.OCR_DEBUG_IMAGES = False
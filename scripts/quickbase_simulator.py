@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Local QuickBase form simulator
+Serves DC (pageid=23) and Non-DC (pageID=39) replicas of the qdbform pages
+with the same _fid_* field names and the behaviour the form automation has
+to cope with:
+
+- conditional reveals: the DC DMV Real ID upload (_fid_121) appears after
+  _fid_122 = Yes, the self-certification checkbox (_fid_176) after
+  _fid_124 = Self certification
+- the masked phone input (_fid_17), which reformats as (XXX) XXX-XXXX while
+  typing and only accepts a complete number
+- client- and server-side validation errors (.errMsg) for missing required
+  fields, mismatched emails and malformed dates
+- success redirects to pageID=18 (DC) / pageID=40 (Non-DC)
+- page assets and a polling beacon, so network-idle waits behave like the
+  real page
+
+Latency and failures can be injected per stage, from the command line or at
+runtime by POSTing JSON to /__config. /__stats and /__submissions expose
+counters and the recorded submissions for regression checks.
+
+Point the automation at it with QUICKBASE_BASE_URL=http://127.0.0.1:8765
+
+Usage:
+    python quickbase_simulator.py --port 8765
+    python quickbase_simulator.py --page-latency-ms 800 --submit-latency-ms 1500 --failure-rate 0.1
+"""
+
+import argparse
+import email.parser
+import email.policy
+import html
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = '/db/bscn22va8'
+
+# pageid -> form, and form -> success pageID
+FORM_PAGES = {'23': 'dc', '39': 'nondc'}
+SUCCESS_PAGES = {'dc': '18', 'nondc': '40'}
+
+US_STATES = ['DC', 'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN',
+             'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH',
+             'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT',
+             'VT', 'VA', 'WA', 'WV', 'WI', 'WY']
+
+TIME_PERIODS = ['3 days ($10)', '30 days ($20)', '90 days ($50)', '180 days ($75)', '365 days ($100)']
+
+# Fields the form rejects the submission without
+REQUIRED_FIELDS = {
+    'dc': ['_fid_76', '_fid_6', '_fid_8', '_fid_122', '_fid_11', '_fid_12', '_fid_14', '_fid_15',
+           '_fid_16', '_fid_17', '_fid_18', '_fid_117', '_fid_124', '_fid_50', '_fid_72', '_fid_59'],
+    'nondc': ['_fid_204', '_fid_6', '_fid_8', '_fid_11', '_fid_12', '_fid_175', '_fid_14', '_fid_15',
+              '_fid_16', '_fid_18', '_fid_117', '_fid_50', '_fid_120', '_fid_72', '_fid_59'],
+}
+
+# Required only once revealed: field -> (controlling field, value that reveals it)
+CONDITIONAL_FIELDS = {
+    '_fid_121': ('_fid_122', 'Yes'),
+    '_fid_176': ('_fid_124', 'Self certification'),
+}
+
+PHONE_PATTERN = re.compile(r'^\(\d{3}\) \d{3}-\d{4}$')
+DATE_PATTERNS = ('%Y-%m-%d', '%m-%d-%Y', '%m/%d/%Y')
+
+DEFAULT_CONFIG = {
+    'page_latency_ms': 0,        # GET of the form page
+    'asset_latency_ms': 0,       # each script / stylesheet / image
+    'submit_latency_ms': 0,      # POST handling before the redirect
+    'redirect_latency_ms': 0,    # GET of the success page
+    'reveal_delay_ms': 150,      # before conditional fields appear
+    'jitter': 0.2,               # +/- fraction applied to every latency
+    'beacon_seconds': 2.0,       # how long the page keeps polling after load
+    'failure_rate': 0.0,         # fraction of valid submissions that fail anyway
+    'failure_mode': 'validation',  # 'validation' (errMsg page), 'http500' or 'hang'
+    'hang_seconds': 90,
+}
+
+PAGE_SCRIPT = """
+(function () {
+  var form = document.forms['qdbform'];
+  var revealDelay = %(reveal_delay)d;
+  function field(name) { return form.elements[name]; }
+  function wrapper(name) { return document.getElementById('wrap' + name); }
+  function reveal(target, show) {
+    setTimeout(function () { wrapper(target).style.display = show ? '' : 'none'; }, show ? revealDelay : 0);
+  }
+  var conditions = %(conditions)s;
+  Object.keys(conditions).forEach(function (target) {
+    var control = field(conditions[target][0]);
+    if (!control) return;
+    control.addEventListener('change', function () { reveal(target, control.value === conditions[target][1]); });
+  });
+
+  var phone = field('_fid_17');
+  phone.addEventListener('input', function () {
+    var d = phone.value.replace(/\\D/g, '').slice(0, 10);
+    var out = d;
+    if (d.length > 6) out = '(' + d.slice(0, 3) + ') ' + d.slice(3, 6) + '-' + d.slice(6);
+    else if (d.length > 3) out = '(' + d.slice(0, 3) + ') ' + d.slice(3);
+    else if (d.length > 0) out = '(' + d;
+    phone.value = out;
+  });
+
+  var required = %(required)s;
+  form.addEventListener('submit', function (event) {
+    var errors = document.getElementById('errors');
+    errors.innerHTML = '';
+    var messages = [];
+    required.forEach(function (name) {
+      var el = field(name);
+      var wrap = wrapper(name);
+      if (!el || (wrap && wrap.style.display === 'none')) return;
+      var empty = el.type === 'checkbox' ? !el.checked : (el.type === 'file' ? !el.files.length : !el.value);
+      if (empty) messages.push('Please enter a value for ' + el.getAttribute('data-label'));
+    });
+    if (phone.value && !/^\\(\\d{3}\\) \\d{3}-\\d{4}$/.test(phone.value)) messages.push('Phone number is incomplete');
+    if (field('_fid_18').value !== field('_fid_117').value) messages.push('Email addresses do not match');
+    if (messages.length) {
+      event.preventDefault();
+      messages.forEach(function (m) {
+        var div = document.createElement('div');
+        div.className = 'errMsg';
+        div.textContent = m;
+        errors.appendChild(div);
+      });
+    }
+  });
+})();
+"""
+
+BEACON_SCRIPT = """
+(function () {
+  var until = Date.now() + %(beacon_ms)d;
+  function ping() {
+    if (Date.now() > until) return;
+    fetch('/res/beacon?t=' + Date.now()).then(function () { setTimeout(ping, 300); });
+  }
+  window.addEventListener('load', ping);
+})();
+"""
+
+
+def _wrap(fid: str, label: str, control: str, hidden: bool = False) -> str:
+    style = ' style="display:none"' if hidden else ''
+    return f'<div class="field" id="wrap{fid}"{style}><label for="{fid}">{label}</label>{control}</div>'
+
+
+def _text(fid: str, label: str, input_type: str = 'text', hidden: bool = False, extra: str = '') -> str:
+    control = f'<input type="{input_type}" name="{fid}" id="{fid}" data-label="{label}"{extra}>'
+    return _wrap(fid, label, control, hidden)
+
+
+def _select(fid: str, label: str, options) -> str:
+    opts = ''.join(f'<option value="{html.escape(o)}">{html.escape(o)}</option>' for o in [''] + list(options))
+    return _wrap(fid, label, f'<select name="{fid}" id="{fid}" data-label="{label}">{opts}</select>')
+
+
+def render_form(form: str, pageid: str, config: Dict, errors: List[str] = ()) -> str:
+    """HTML for one application form, field names and reveal logic as on QuickBase"""
+    fields = []
+    if form == 'dc':
+        fields.append(_select('_fid_76', 'Application Type', ['Initial', 'Renewal']))
+    else:
+        fields.append(_select('_fid_204', 'Time Period', TIME_PERIODS))
+    fields += [
+        _text('_fid_6', 'First Name'), _text('_fid_7', 'Middle Initial', extra=' maxlength="1"'),
+        _text('_fid_8', 'Last Name'), _text('_fid_35', 'Suffix'),
+    ]
+    if form == 'dc':
+        fields.append(_select('_fid_122', 'DC DMV Real ID', ['Yes', 'No']))
+        fields.append(_text('_fid_121', 'DC DMV Real ID Upload', 'file', hidden=True))
+    fields += [_text('_fid_11', 'Date of Birth'), _text('_fid_12', 'Street'), _text('_fid_13', 'Apt/Suite')]
+    if form == 'nondc':
+        fields.append(_select('_fid_175', 'Country', ['United States of America', 'Canada', 'Other']))
+    fields += [
+        _text('_fid_14', 'City'), _select('_fid_15', 'State', US_STATES), _text('_fid_16', 'ZIP'),
+        _text('_fid_17', 'Phone', 'tel', extra=' placeholder="(___) ___-____"'),
+        _text('_fid_18', 'Email'), _text('_fid_117', 'Confirm Email'),
+    ]
+    if form == 'dc':
+        fields.append(_select('_fid_124', 'Certification Type', ['Physician recommendation', 'Self certification']))
+        fields.append(_text('_fid_176', 'Self Certification', 'checkbox', hidden=True, extra=' value="1"'))
+    fields.append(_text('_fid_50', 'Government ID', 'file'))
+    if form == 'nondc':
+        fields.append(_select('_fid_120', 'Payment Method', ['Online', 'In person']))
+    fields += [
+        _select('_fid_131', 'Reduced Fee', ['No', 'Yes']),
+        _text('_fid_72', 'I agree to the Terms &amp; Conditions', 'checkbox', extra=' value="1"'),
+        _text('_fid_59', 'Signature'),
+        _text('_fid_60', 'Date', extra=f' readonly value="{datetime.now().strftime("%m-%d-%Y")}"'),
+    ]
+
+    script = PAGE_SCRIPT % {
+        'reveal_delay': config['reveal_delay_ms'],
+        'conditions': json.dumps(CONDITIONAL_FIELDS),
+        'required': json.dumps(REQUIRED_FIELDS[form] + list(CONDITIONAL_FIELDS)),
+    }
+    beacon = BEACON_SCRIPT % {'beacon_ms': int(config['beacon_seconds'] * 1000)}
+    error_html = ''.join(f'<div class="errMsg">{html.escape(e)}</div>' for e in errors)
+    return f"""<!DOCTYPE html>
+<html><head><title>Medical Cannabis Application</title>
+<link rel="stylesheet" href="/res/qb.css">
+<script src="/res/qbcore.js"></script>
+</head>
+<body>
+<img src="/res/logo.png" alt="ABCA">
+<div id="errors">{error_html}</div>
+<form name="qdbform" method="POST" enctype="multipart/form-data" action="{DB_PATH}?act=API_AddRecord&amp;pageid={pageid}">
+{''.join(fields)}
+<input type="submit" value="Submit">
+</form>
+<script>{script}</script>
+<script>{beacon}</script>
+</body></html>"""
+
+
+def render_success(form: str) -> str:
+    return f"""<!DOCTYPE html>
+<html><head><title>Application Received</title><link rel="stylesheet" href="/res/qb.css"></head>
+<body><h1>Thank you</h1><p>Your {form.upper()} application has been received.</p></body></html>"""
+
+
+# Static assets: path -> (content type, body)
+ASSETS = {
+    '/res/qb.css': ('text/css', 'body{font-family:sans-serif}.field{margin:6px 0}.errMsg{color:red}' * 200),
+    '/res/qbcore.js': ('application/javascript', '/* framework */' + 'var qb=qb||{};' * 4000),
+    '/res/logo.png': ('image/png', 'x' * 20000),
+    '/res/beacon': ('application/json', '{}'),
+}
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, str]:
+    """Form fields from a multipart/form-data body (file fields map to their filename)"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if not name:
+            continue
+        filename = part.get_filename()
+        if filename is not None:
+            fields[name] = filename if part.get_payload(decode=True) else ''
+        else:
+            fields[name] = part.get_content().strip()
+    return fields
+
+
+def validate_submission(form: str, fields: Dict[str, str]) -> List[str]:
+    """Server-side validation, mirroring what QuickBase rejects"""
+    errors = []
+    for fid in REQUIRED_FIELDS[form]:
+        if not fields.get(fid):
+            errors.append(f'Please enter a value for {fid}')
+    for fid, (control, value) in CONDITIONAL_FIELDS.items():
+        if fields.get(control) == value and not fields.get(fid):
+            errors.append(f'Please enter a value for {fid}')
+    if fields.get('_fid_17') and not PHONE_PATTERN.match(fields['_fid_17']):
+        errors.append('Phone number is incomplete')
+    if fields.get('_fid_18') != fields.get('_fid_117'):
+        errors.append('Email addresses do not match')
+    dob = fields.get('_fid_11', '')
+    if dob and not any(_parses(dob, fmt) for fmt in DATE_PATTERNS):
+        errors.append('Date of Birth is not a valid date')
+    return errors
+
+
+def _parses(value: str, fmt: str) -> bool:
+    try:
+        datetime.strptime(value, fmt)
+        return True
+    except ValueError:
+        return False
+
+
+class SimulatorState:
+    """Configuration, counters and recorded submissions shared by the handlers"""
+
+    def __init__(self, config: Dict = None, keep_submissions: int = 200):
+        self.lock = threading.Lock()
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.counts = {'pages': 0, 'assets': 0, 'submissions': 0, 'accepted': 0, 'rejected': 0, 'injected': 0}
+        self.submissions = deque(maxlen=keep_submissions)
+        self.rng = random.Random()
+
+    def bump(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+    def delay(self, key: str):
+        """Sleep for the configured latency of one stage, with jitter"""
+        with self.lock:
+            base = self.config[key] / 1000
+            jitter = self.config['jitter']
+            factor = self.rng.uniform(1 - jitter, 1 + jitter)
+        if base > 0:
+            time.sleep(base * factor)
+
+    def inject_failure(self) -> str:
+        """Failure mode to apply to this submission, or '' for none"""
+        with self.lock:
+            if self.rng.random() < self.config['failure_rate']:
+                self.counts['injected'] += 1
+                return self.config['failure_mode']
+        return ''
+
+
+class QuickBaseSimulatorHandler(BaseHTTPRequestHandler):
+    server_version = 'QuickBaseSimulator/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self) -> SimulatorState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status: int, body: str = '', headers: Dict[str, str] = None,
+              content_type: str = 'text/html; charset=utf-8'):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _json(self, data, status: int = 200):
+        self._send(status, json.dumps(data, indent=2), content_type='application/json')
+
+    def _page(self) -> Tuple[str, Dict[str, str]]:
+        url = urlsplit(self.path)
+        query = {k.lower(): v[0] for k, v in parse_qs(url.query).items()}
+        return url.path, query
+
+    def do_GET(self):
+        path, query = self._page()
+        if path == '/__stats':
+            with self.state.lock:
+                self._json({'counts': dict(self.state.counts), 'config': dict(self.state.config)})
+            return
+        if path == '/__submissions':
+            with self.state.lock:
+                self._json(list(self.state.submissions))
+            return
+        if path in ASSETS:
+            self.state.bump('assets')
+            self.state.delay('asset_latency_ms')
+            content_type, body = ASSETS[path]
+            self._send(200, body, {'Cache-Control': 'no-store'}, content_type)
+            return
+        if path != DB_PATH:
+            self._send(404, 'Not found')
+            return
+
+        pageid = query.get('pageid', '')
+        self.state.bump('pages')
+        if pageid in FORM_PAGES:
+            self.state.delay('page_latency_ms')
+            with self.state.lock:
+                config = dict(self.state.config)
+            self._send(200, render_form(FORM_PAGES[pageid], pageid, config))
+        elif pageid in SUCCESS_PAGES.values():
+            self.state.delay('redirect_latency_ms')
+            form = 'dc' if pageid == SUCCESS_PAGES['dc'] else 'nondc'
+            self._send(200, render_success(form))
+        else:
+            self._send(404, 'Unknown page')
+
+    def do_POST(self):
+        path, query = self._page()
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        if path == '/__config':
+            updates = json.loads(body or b'{}')
+            with self.state.lock:
+                unknown = [k for k in updates if k not in DEFAULT_CONFIG]
+                if not unknown:
+                    self.state.config.update(updates)
+                config = dict(self.state.config)
+            self._json({'error': f'Unknown keys: {unknown}'} if unknown else config, 400 if unknown else 200)
+            return
+
+        form = FORM_PAGES.get(query.get('pageid', ''))
+        if path != DB_PATH or not form:
+            self._send(404, 'Not found')
+            return
+
+        self.state.bump('submissions')
+        fields = parse_multipart(self.headers.get('Content-Type', ''), body)
+        self.state.delay('submit_latency_ms')
+
+        errors = validate_submission(form, fields)
+        failure = '' if errors else self.state.inject_failure()
+        if failure == 'validation':
+            errors = ['Your record could not be saved. Please try again.']
+        elif failure == 'http500':
+            self.state.bump('rejected')
+            self._send(500, '<h1>Internal Server Error</h1>')
+            return
+        elif failure == 'hang':
+            with self.state.lock:
+                hang = self.state.config['hang_seconds']
+            time.sleep(hang)
+
+        with self.state.lock:
+            self.state.submissions.append({
+                'form': form,
+                'time': datetime.now().isoformat(),
+                'accepted': not errors,
+                'errors': errors,
+                'fields': fields,
+            })
+
+        if errors:
+            self.state.bump('rejected')
+            with self.state.lock:
+                config = dict(self.state.config)
+            page = render_form(form, query['pageid'], config, errors)
+            self._send(200, page)
+            return
+
+        self.state.bump('accepted')
+        self._send(303, '', {'Location': f"{DB_PATH}?a=dbpage&pageID={SUCCESS_PAGES[form]}"})
+
+
+def create_simulator(host: str = '127.0.0.1', port: int = 0, config: Dict = None) -> ThreadingHTTPServer:
+    """Create the simulator server; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), QuickBaseSimulatorHandler)
+    server.daemon_threads = True
+    server.state = SimulatorState(config)
+    return server
+
+
+def start_simulator(host: str = '127.0.0.1', port: int = 0, config: Dict = None) -> ThreadingHTTPServer:
+    """Start the simulator on a background thread"""
+    server = create_simulator(host, port, config)
+    threading.Thread(target=server.serve_forever, name='quickbase-simulator', daemon=True).start()
+    logger.info(f"QuickBase simulator listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    for key, default in DEFAULT_CONFIG.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    server = create_simulator(args.host, args.port, config)
+    print(f"DC form:     http://{args.host}:{args.port}{DB_PATH}?a=dbpage&pageid=23")
+    print(f"Non-DC form: http://{args.host}:{args.port}{DB_PATH}?a=dbpage&pageID=39")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()